@@ -2,10 +2,11 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, jsonify, request, render_template
 from flask_sqlalchemy import SQLAlchemy
 from twilio.twiml.messaging_response import MessagingResponse
 import os
+import time
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
@@ -17,6 +18,7 @@ def create_app(config_name='default'):
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///bjj_academy.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['REDIS_URL'] = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
     # Initialize the database
     db.init_app(app)
@@ -24,41 +26,147 @@ def create_app(config_name='default'):
     # Import and register dashboard blueprint here to avoid circular imports
     from app.api.dashboard_routes import dashboard_bp
     from app.services.message_handler import MessageHandler
+    from app.services.async_reply import AsyncReplyService, async_reply_enabled
+    from app.services.message_dispatcher import (
+        MessageDispatcher, dispatcher_enabled, process_message_job
+    )
+    from app.services.admission_control import AdmissionController
+    from app.services.idempotency import IdempotencyGuard, get_idempotency_store
+    from app.utils.metrics import metrics, render_prometheus, start_multiprocess_flusher
+    from app.utils.database import pool_stats
+    from app.utils.schema import ensure_schema
+    from app.services.semantic_cache import semantic_cache_enabled, get_semantic_cache
+    from app.services.prompt_compiler import get_prompt_compiler
+
+    # Métricas compartidas entre procesos (METRICS_MULTIPROC_DIR)
+    start_multiprocess_flusher()
 
     # Create tables if they don't exist
     with app.app_context():
         db.create_all()
 
+    # Tablas de las migraciones que usa el SQL directo (lead_summary, ...) en bases existentes
+    ensure_schema()
+
     # Inicializar message handler
     message_handler = MessageHandler()
+    app.extensions['message_handler'] = message_handler
+    
+    # Dispatcher por teléfono: orden estricto por remitente, paralelo entre remitentes
+    dispatcher = None
+    if async_reply_enabled() or dispatcher_enabled():
+        dispatcher = MessageDispatcher()
+    app.extensions['message_dispatcher'] = dispatcher
+    
+    # Modo de respuesta fuera de banda (ACK inmediato a Twilio)
+    reply_service = None
+    if async_reply_enabled():
+        reply_service = AsyncReplyService(message_handler, dispatcher=dispatcher)
+    app.extensions['reply_service'] = reply_service
+    
+    # Deduplicación de reintentos de Twilio por MessageSid
+    idempotency = IdempotencyGuard(get_idempotency_store(app.config['REDIS_URL']))
+    app.extensions['idempotency'] = idempotency
+    
+    # Límite de requests en vuelo con cola acotada (load shedding)
+    admission = AdmissionController()
+    app.extensions['admission'] = admission
+    
+    def process_sync(from_number, incoming_msg, sender_name):
+        """Procesa el mensaje y devuelve la respuesta dentro del request"""
+        if not dispatcher:
+            return message_handler.process_message(from_number, incoming_msg, sender_name)
+        
+        # Procesar en el shard del remitente y esperar la respuesta
+        if dispatcher.mode == 'process':
+            future = dispatcher.submit(
+                from_number, process_message_job,
+                from_number, incoming_msg, sender_name
+            )
+        else:
+            future = dispatcher.submit(
+                from_number, message_handler.process_message,
+                from_number, incoming_msg, sender_name
+            )
+        return future.result()
     
     # Ruta raíz para Twilio
     @app.route('/', methods=['GET', 'POST'])
     def root():
         """Ruta raíz que Twilio busca"""
         if request.method == 'POST':
+            started = time.perf_counter()
+            
             # Obtener datos del mensaje
             incoming_msg = request.values.get('Body', '').strip()
             from_number = request.values.get('From', '').replace('whatsapp:', '')
             sender_name = request.values.get('ProfileName', '')
+            message_sid = request.values.get('MessageSid', '')
             
             print(f"[PHONE] Mensaje de {from_number}: {incoming_msg}")
             
-            # Procesar mensaje y guardar en BD
-            response_text = message_handler.process_message(
-                from_number, 
-                incoming_msg, 
-                sender_name
-            )
-            
-            # Crear respuesta de Twilio
             resp = MessagingResponse()
-            resp.message(response_text)
+            
+            # Reintento de Twilio: no repetir el trabajo, devolver la respuesta guardada
+            if message_sid:
+                is_new, cached_reply = idempotency.claim(message_sid)
+                if not is_new:
+                    if cached_reply:
+                        resp.message(cached_reply)
+                    return str(resp)
+            
+            try:
+                with admission.admit() as admitted:
+                    if not admitted:
+                        # Sobrecarga: respuesta rápida sin OpenAI
+                        response_text = message_handler.process_degraded(
+                            from_number, incoming_msg, sender_name
+                        )
+                        mode = 'shed'
+                    elif reply_service:
+                        # Guardar y responder vacío; la respuesta sale por la API REST
+                        reply_service.accept(from_number, incoming_msg, sender_name)
+                        response_text = None
+                        mode = 'async'
+                    else:
+                        response_text = process_sync(from_number, incoming_msg, sender_name)
+                        mode = 'sync'
+                
+                if response_text:
+                    resp.message(response_text)
+                    if message_sid:
+                        idempotency.store_reply(message_sid, response_text)
+            except Exception:
+                # Permitir que el reintento de Twilio vuelva a procesar el mensaje
+                if message_sid:
+                    idempotency.release(message_sid)
+                raise
+            
+            metrics.observe('webhook_request_seconds', time.perf_counter() - started, mode=mode)
             
             return str(resp)
         else:
             return jsonify({'status': 'active', 'webhook': 'ready'})
     
+    # Latencias por etapa del pipeline
+    @app.route('/webhook/stats')
+    def webhook_stats():
+        stats = metrics.snapshot()
+        if dispatcher:
+            stats['dispatcher'] = dispatcher.stats()
+        if admission.enabled:
+            stats['admission'] = admission.stats()
+        stats['db_pools'] = pool_stats()
+        stats['system_prompt'] = get_prompt_compiler().stats()
+        if semantic_cache_enabled():
+            stats['semantic_cache'] = get_semantic_cache().stats()
+        return jsonify(stats)
+    
+    # Métricas en formato Prometheus (todas las etapas, todos los procesos)
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+    
     # Health endpoint
     @app.route('/health')
     def health():
@@ -2,48 +2,30 @@
 API Routes para el Dashboard - Versión Mejorada
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from datetime import datetime, timedelta
-from app.utils.database import get_db_connection
+from app.utils.database import get_db_connection, get_read_connection
+from app.utils.queries import queries, leads_query_name, SORT_KEYS
+from app.utils import lead_summary, message_archive, export
 
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api')
 
 @dashboard_bp.route('/stats')
 def get_stats():
     """Obtener estadísticas generales"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-
+    with get_read_connection() as conn:
         # Total de leads
-        cursor.execute("SELECT COUNT(*) as total FROM lead")
-        total_leads = cursor.fetchone()['total']
+        total_leads = queries.fetchone(conn, 'dashboard.stats_total_leads')['total']
 
         # Leads por status
-        cursor.execute("""
-            SELECT status, COUNT(*) as count
-            FROM lead
-            GROUP BY status
-        """)
-        status_counts = {row['status']: row['count'] for row in cursor.fetchall()}
+        status_counts = {row['status']: row['count']
+                         for row in queries.fetchall(conn, 'dashboard.stats_by_status')}
 
         # Leads con cita confirmada
-        cursor.execute("""
-            SELECT COUNT(DISTINCT lead_id) as total
-            FROM appointment
-            WHERE status = 'scheduled' AND confirmed = 1
-        """)
-        scheduled = cursor.fetchone()['total']
+        scheduled = queries.fetchone(conn, 'dashboard.stats_scheduled')['total']
 
         # Leads que necesitan seguimiento (>3 días sin contacto y no agendados)
-        cursor.execute("""
-            SELECT COUNT(DISTINCT l.id) as total
-            FROM lead l
-            LEFT JOIN conversation c ON l.id = c.lead_id
-            WHERE l.status NOT IN ('scheduled', 'engaged')
-            AND (c.last_message_at IS NULL OR
-                 julianday('now') - julianday(c.last_message_at) > 3)
-        """)
-        needs_followup = cursor.fetchone()['total']
+        needs_followup = queries.fetchone(conn, 'dashboard.stats_needs_followup')['total']
 
         # Tasa de conversión (leads agendados / total leads)
         conversion_rate = round((scheduled / total_leads * 100) if total_leads > 0 else 0, 1)
@@ -65,58 +47,16 @@ def get_leads():
     status_filter = request.args.get('status')
     needs_followup = request.args.get('needs_followup') == 'true'
 
-    base_query = """
-        SELECT
-            l.id,
-            l.phone_number,
-            l.name,
-            l.status,
-            l.interest_level,
-            l.source,
-            l.created_at,
-            COUNT(DISTINCT c.id) as conversations,
-            COUNT(m.id) as total_messages,
-            MAX(c.last_message_at) as last_contact,
-            MAX(m.timestamp) as last_message_time,
-            (SELECT sender FROM message m2
-             WHERE m2.conversation_id = c.id
-             ORDER BY timestamp DESC LIMIT 1) as last_sender,
-            (SELECT appointment_datetime FROM appointment
-             WHERE lead_id = l.id AND status = 'scheduled'
-             ORDER BY created_at DESC LIMIT 1) as next_appointment
-        FROM lead l
-        LEFT JOIN conversation c ON l.id = c.lead_id
-        LEFT JOIN message m ON c.id = m.conversation_id
-        WHERE 1=1
-    """
-
-    params = []
-
-    if status_filter:
-        base_query += " AND l.status = ?"
-        params.append(status_filter)
-
-    base_query += """
-        GROUP BY l.id
-    """
+    params = [status_filter] if status_filter else []
+    query_name = leads_query_name(status=bool(status_filter), followup=needs_followup)
 
-    if needs_followup:
-        base_query += """
-            HAVING (last_contact IS NULL OR
-                    julianday('now') - julianday(last_contact) > 3)
-            AND l.status NOT IN ('scheduled', 'engaged')
-        """
-
-    base_query += " ORDER BY l.created_at DESC"
-
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(base_query, params)
+    with get_read_connection() as conn:
+        rows = queries.fetchall(conn, query_name, params)
 
         leads = []
         now = datetime.now()
 
-        for row in cursor.fetchall():
+        for row in rows:
             # Calcular días sin contacto
             days_since_contact = None
             if row['last_contact']:
@@ -217,27 +157,17 @@ def determine_next_action(status, interest_level, days_since_contact, last_sende
 @dashboard_bp.route('/leads/<int:lead_id>')
 def get_lead_detail(lead_id):
     """Obtener detalle de un lead específico"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-
+    with get_read_connection() as conn:
         # Información del lead
-        cursor.execute("SELECT * FROM lead WHERE id = ?", (lead_id,))
-        lead = cursor.fetchone()
+        lead = queries.fetchone(conn, 'dashboard.lead_by_id', (lead_id,))
 
         if not lead:
             return jsonify({'error': 'Lead no encontrado'}), 404
 
-        # Mensajes del lead
-        cursor.execute("""
-            SELECT m.*, c.id as conv_id
-            FROM message m
-            JOIN conversation c ON m.conversation_id = c.id
-            WHERE c.lead_id = ?
-            ORDER BY m.timestamp ASC
-        """, (lead_id,))
-
+        # Mensajes del lead: primero los archivados (conversaciones cerradas), después los activos
         messages = []
-        for row in cursor.fetchall():
+        for row in message_archive.archived_messages(conn, lead_id) + \
+                queries.fetchall(conn, 'dashboard.lead_messages', (lead_id,)):
             messages.append({
                 'id': row['id'],
                 'sender': row['sender'],
@@ -247,14 +177,8 @@ def get_lead_detail(lead_id):
             })
 
         # Citas del lead
-        cursor.execute("""
-            SELECT * FROM appointment
-            WHERE lead_id = ?
-            ORDER BY appointment_datetime DESC
-        """, (lead_id,))
-
         appointments = []
-        for row in cursor.fetchall():
+        for row in queries.fetchall(conn, 'dashboard.lead_appointments', (lead_id,)):
             appointments.append({
                 'id': row['id'],
                 'datetime': row['appointment_datetime'],
@@ -284,13 +208,8 @@ def update_lead_status(lead_id):
         return jsonify({'error': 'Status requerido'}), 400
 
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            UPDATE lead
-            SET status = ?, updated_at = ?
-            WHERE id = ?
-        """, (new_status, datetime.now().isoformat(), lead_id))
+        queries.execute(conn, 'dashboard.update_lead_status',
+                        (new_status, datetime.now().isoformat(), lead_id))
 
         conn.commit()
 
@@ -304,22 +223,11 @@ def add_lead_note(lead_id):
         return jsonify({'error': 'Nota requerida'}), 400
 
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-
         # Buscar conversación activa
-        cursor.execute("""
-            SELECT id FROM conversation
-            WHERE lead_id = ? AND status = 'active'
-            LIMIT 1
-        """, (lead_id,))
-
-        conv = cursor.fetchone()
+        conv = queries.fetchone(conn, 'conversation.active_by_lead', (lead_id,))
         if conv:
-            conv_id = conv['id']
-            cursor.execute("""
-                INSERT INTO message (conversation_id, sender, content, intent_detected)
-                VALUES (?, 'admin', ?, 'note')
-            """, (conv_id, note))
+            cursor = queries.execute(conn, 'message.insert', (conv['id'], 'admin', note, 'note'))
+            lead_summary.record_message(conn, cursor.lastrowid)
 
         conn.commit()
 
@@ -329,26 +237,9 @@ def add_lead_note(lead_id):
 @dashboard_bp.route('/appointments')
 def get_appointments():
     """Obtener todas las citas"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT
-                a.id,
-                a.appointment_datetime,
-                a.status,
-                a.confirmed,
-                l.name,
-                l.phone_number,
-                l.id as lead_id
-            FROM appointment a
-            JOIN lead l ON a.lead_id = l.id
-            WHERE a.status != 'cancelled'
-            ORDER BY a.appointment_datetime ASC
-        """)
-
+    with get_read_connection() as conn:
         appointments = []
-        for row in cursor.fetchall():
+        for row in queries.fetchall(conn, 'dashboard.appointments'):
             appointments.append({
                 'id': row['id'],
                 'datetime': row['appointment_datetime'],
@@ -359,4 +250,58 @@ def get_appointments():
                 'lead_id': row['lead_id']
             })
 
-    return jsonify(appointments)
\ No newline at end of file
+    return jsonify(appointments)
+
+@dashboard_bp.route('/export/<any(leads, conversations):kind>')
+def export_rows(kind):
+    """
+    Exportar leads o mensajes en streaming (NDJSON o CSV)
+    ?format=ndjson|csv&status=&source=&since=AAAA-MM-DD&until=AAAA-MM-DD&after=<id>
+    Con Accept-Encoding: gzip la respuesta se comprime al vuelo
+    Para retomar una descarga cortada: after=<último id recibido>
+    Los mensajes incluyen los archivados (message_archive), en orden de id
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.EXPORT_FORMATS:
+        return jsonify({'error': f"format debe ser uno de: {', '.join(export.EXPORT_FORMATS)}"}), 400
+
+    try:
+        after = int(request.args.get('after', 0))
+        since = export.parse_bound(request.args.get('since'))
+        until = export.parse_bound(request.args.get('until'), end=True)
+    except ValueError:
+        return jsonify({'error': 'after debe ser un entero y since/until fechas ISO (AAAA-MM-DD)'}), 400
+
+    compress = 'gzip' in request.accept_encodings
+    chunks = export.export(
+        kind, fmt, compress,
+        status=request.args.get('status'),
+        source=request.args.get('source'),
+        since=since,
+        until=until,
+        after=after
+    )
+
+    response = Response(chunks, content_type=export.CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@dashboard_bp.route('/admin/queries')
+def get_query_stats():
+    """Consultas con más tiempo acumulado en este proceso (?top=N&sort=total_seconds)"""
+    try:
+        top = int(request.args.get('top', 10))
+    except ValueError:
+        return jsonify({'error': 'top debe ser un entero'}), 400
+
+    sort = request.args.get('sort', 'total_seconds')
+    if sort not in SORT_KEYS:
+        return jsonify({'error': f"sort debe ser uno de: {', '.join(SORT_KEYS)}"}), 400
+
+    return jsonify({
+        'sort': sort,
+        'queries': queries.top(top, by=sort)
+    })
@@ -0,0 +1,137 @@
+"""
+Punto de entrada ASGI para el pipeline asíncrono del webhook de WhatsApp
+Un solo proceso atiende muchas conversaciones en paralelo sobre un event loop
+
+Uso:
+    uvicorn app.asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import json
+import time
+import logging
+from urllib.parse import parse_qs
+from twilio.twiml.messaging_response import MessagingResponse
+from app.services.async_message_handler import AsyncMessageHandler
+from app.services.idempotency import IdempotencyGuard, get_idempotency_store
+from app.utils.metrics import metrics, render_prometheus, start_multiprocess_flusher
+from app.utils.schema import ensure_schema
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATHS = ('/', '/webhook/whatsapp')
+
+
+class AsyncWebhookApp:
+    """Aplicación ASGI mínima con las rutas del webhook de Twilio"""
+
+    def __init__(self, message_handler=None, idempotency=None):
+        self.message_handler = message_handler or AsyncMessageHandler()
+        self.idempotency = idempotency or IdempotencyGuard(get_idempotency_store())
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        if scope['type'] != 'http':
+            return
+
+        path = scope['path']
+        method = scope['method']
+
+        if path in WEBHOOK_PATHS and method == 'POST':
+            form = await self._read_form(receive)
+            body = await self.handle_webhook(form)
+            await self._respond(send, 200, body, 'application/xml')
+        elif path in WEBHOOK_PATHS and method == 'GET':
+            await self._respond_json(send, {'status': 'active', 'webhook': 'ready'})
+        elif path == '/health':
+            await self._respond_json(send, {'status': 'healthy', 'message': 'Server is running'})
+        elif path == '/webhook/stats':
+            await self._respond_json(send, metrics.snapshot())
+        elif path == '/metrics':
+            await self._respond(send, 200, render_prometheus(), 'text/plain; version=0.0.4')
+        else:
+            await self._respond_json(send, {'error': 'Not found'}, status=404)
+
+    async def handle_webhook(self, form):
+        """Procesa un POST de Twilio y devuelve el TwiML de respuesta"""
+        started = time.perf_counter()
+
+        incoming_msg = form.get('Body', '').strip()
+        from_number = form.get('From', '').replace('whatsapp:', '')
+        sender_name = form.get('ProfileName', '')
+        message_sid = form.get('MessageSid', '')
+
+        resp = MessagingResponse()
+
+        if message_sid:
+            is_new, cached_reply = self.idempotency.claim(message_sid)
+            if not is_new:
+                if cached_reply:
+                    resp.message(cached_reply)
+                return str(resp)
+
+        try:
+            response_text = await self.message_handler.process_message(
+                from_number, incoming_msg, sender_name
+            )
+        except Exception:
+            if message_sid:
+                self.idempotency.release(message_sid)
+            raise
+
+        if message_sid:
+            self.idempotency.store_reply(message_sid, response_text)
+
+        resp.message(response_text)
+        metrics.observe('webhook_request_seconds', time.perf_counter() - started, mode='asyncio')
+        return str(resp)
+
+    async def _read_form(self, receive):
+        """Lee el cuerpo application/x-www-form-urlencoded completo"""
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+
+        parsed = parse_qs(b''.join(chunks).decode('utf-8'), keep_blank_values=True)
+        return {key: values[0] for key, values in parsed.items()}
+
+    async def _respond(self, send, status, body, content_type):
+        payload = body.encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', content_type.encode('ascii')),
+                (b'content-length', str(len(payload)).encode('ascii')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _respond_json(self, send, data, status=200):
+        await self._respond(send, status, json.dumps(data), 'application/json')
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_multiprocess_flusher()
+                logger.info("✅ Webhook asíncrono iniciado")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app():
+    """Crea la aplicación ASGI del webhook"""
+    # Tablas de las migraciones que usa el SQL directo (lead_summary, ...) en bases existentes
+    ensure_schema()
+    return AsyncWebhookApp()
+
+
+app = create_asgi_app()
@@ -9,6 +9,7 @@ Gestiona tareas asíncronas y programadas como:
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_init
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -51,8 +52,45 @@ celery_app.conf.beat_schedule = {
         'task': 'app.tasks.reminder_tasks.update_expired_trials',
         'schedule': crontab(hour=3, minute=0),  # Diario a las 3:00 AM
     },
+
+    # Checkpoint del WAL de SQLite y reporte de su tamaño
+    'checkpoint-wal': {
+        'task': 'app.tasks.maintenance_tasks.checkpoint_wal',
+        'schedule': int(os.getenv('DB_CHECKPOINT_INTERVAL_SECONDS', 300)),  # Cada 5 minutos
+    },
 }
 
+# Copia de solo lectura del dashboard, renovada antes de quedar vieja
+if os.getenv('DB_READ_MODE', 'primary').lower() == 'snapshot':
+    celery_app.conf.beat_schedule['refresh-read-snapshot'] = {
+        'task': 'app.tasks.maintenance_tasks.refresh_read_snapshot',
+        'schedule': max(1, int(float(os.getenv('DB_READ_SNAPSHOT_SECONDS', 60)) / 2)),
+    }
+
+# Resumen de los mensajes viejos de cada conversación (llama a OpenAI)
+if os.getenv('CONVERSATION_SUMMARY', 'false').lower() in ('1', 'true', 'yes'):
+    celery_app.conf.beat_schedule['summarize-conversations'] = {
+        'task': 'app.tasks.maintenance_tasks.summarize_conversations',
+        'schedule': int(os.getenv('SUMMARY_INTERVAL_SECONDS', 600)),  # Cada 10 minutos
+    }
+
+# Archivar mensajes viejos de conversaciones cerradas (borra filas de message)
+if os.getenv('DB_ARCHIVE_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+    celery_app.conf.beat_schedule['archive-old-messages'] = {
+        'task': 'app.tasks.maintenance_tasks.archive_old_messages',
+        'schedule': crontab(hour=4, minute=0),  # Diario a las 4:00 AM
+    }
+
+# Métricas de los workers en METRICS_MULTIPROC_DIR (los procesos hijos reinician el flusher)
+from app.utils.metrics import start_multiprocess_flusher
+start_multiprocess_flusher()
+
+# Tablas de las migraciones que usan las tareas (lead_summary, ...) en bases existentes
+@worker_init.connect
+def _ensure_schema(**kwargs):
+    from app.utils.schema import ensure_schema
+    ensure_schema()
+
 # Auto-descubrir tareas en el módulo app.tasks
 celery_app.autodiscover_tasks(['app.tasks'])
 
@@ -0,0 +1,132 @@
+"""
+Control de admisión para el webhook de WhatsApp
+Limita los requests en vuelo y la cola de espera; cuando OpenAI se pone lento,
+los requests que no entran reciben una respuesta degradada en vez de acumularse
+hasta que todo expire
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    Semáforo con cola acotada y tiempo máximo de espera
+    - max_in_flight: requests procesándose a la vez (0 = sin límite)
+    - max_queue: requests que pueden esperar un lugar
+    - queue_timeout: segundos que un request espera antes de ser descartado
+    """
+
+    def __init__(self, max_in_flight=None, max_queue=None, queue_timeout=None):
+        if max_in_flight is None:
+            max_in_flight = int(os.getenv('WEBHOOK_MAX_IN_FLIGHT', 0))
+        if max_queue is None:
+            max_queue = int(os.getenv('WEBHOOK_MAX_QUEUE', 64))
+        if queue_timeout is None:
+            queue_timeout = int(os.getenv('WEBHOOK_QUEUE_TIMEOUT_MS', 2000)) / 1000.0
+
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._in_flight = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+        if self.enabled:
+            logger.info(f"✅ Control de admisión: {max_in_flight} en vuelo, "
+                        f"cola {max_queue}, espera máx {queue_timeout}s")
+
+    @property
+    def enabled(self):
+        return self.max_in_flight > 0
+
+    def acquire(self):
+        """
+        Intenta obtener un lugar
+
+        Returns:
+            True si el request fue admitido, False si debe tomar el camino degradado
+        """
+        if not self.enabled:
+            return True
+
+        started = time.monotonic()
+
+        with self._cond:
+            if self._in_flight < self.max_in_flight:
+                self._admit(0.0)
+                return True
+
+            if self._waiting >= self.max_queue:
+                self._shed('queue_full')
+                return False
+
+            self._waiting += 1
+            metrics.set_gauge('admission_queue_depth', self._waiting)
+            try:
+                deadline = started + self.queue_timeout
+                while self._in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._shed('timeout')
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+                metrics.set_gauge('admission_queue_depth', self._waiting)
+
+            self._admit(time.monotonic() - started)
+            return True
+
+    def release(self):
+        """Libera el lugar de un request admitido"""
+        if not self.enabled:
+            return
+
+        with self._cond:
+            self._in_flight -= 1
+            metrics.set_gauge('admission_in_flight', self._in_flight)
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self):
+        """
+        Context manager que indica si el request fue admitido
+
+        Usage:
+            with admission.admit() as admitted:
+                if not admitted:
+                    return degraded_reply()
+        """
+        admitted = self.acquire()
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    def _admit(self, waited):
+        # Se llama con self._cond tomado
+        self._in_flight += 1
+        metrics.set_gauge('admission_in_flight', self._in_flight)
+        metrics.observe('admission_queue_wait_seconds', waited)
+
+    def _shed(self, reason):
+        metrics.inc('admission_shed_total', reason=reason)
+        logger.warning(f"[SHED] Request descartado por sobrecarga ({reason})")
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'waiting': self._waiting
+            }
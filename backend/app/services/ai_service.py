@@ -18,6 +18,10 @@ load_dotenv(override=True)
 from openai import OpenAI
 
 from app.models import Lead, Conversation, Message, Academy
+from app.services.semantic_cache import semantic_cache_enabled, get_semantic_cache, prompt_version
+from app.services.faq_fast_path import FaqFastPath
+from app.services.history_assembler import assemble_history, history_fetch_limit
+from app.services.prompt_compiler import get_prompt_compiler, render_lead_context
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +35,9 @@ class AIService:
     def __init__(self):
         """Inicializa el cliente de OpenAI"""
         
+        # Clasificador de preguntas frecuentes: detecta los mensajes de agendamiento
+        self.fast_path = FaqFastPath()
+        
         # FORZAR RECARGA DE VARIABLES DE ENTORNO
         load_dotenv(override=True)
         
@@ -87,10 +94,16 @@ class AIService:
             # Construir el historial de mensajes
             messages = [{"role": "system", "content": system_prompt}]
             
-            # Agregar historial si está habilitado
-            if use_history:
-                history = self._get_conversation_history(conversation)
-                messages.extend(history)
+            # Agregar historial si está habilitado (dentro del presupuesto de tokens)
+            history = self._get_conversation_history(conversation) if use_history else []
+            messages.extend(assemble_history(history, self.model))
+            
+            # Primer mensaje: puede servir una respuesta ya dada a otro lead
+            cache_key = None if history else self._semantic_cache_key(academy, message)
+            if cache_key:
+                cached = get_semantic_cache().lookup(cache_key[0], message, cache_key[1])
+                if cached:
+                    return cached
             
             # Agregar el mensaje actual
             messages.append({"role": "user", "content": message})
@@ -114,6 +127,12 @@ class AIService:
             # Actualizar métricas (opcional)
             self._update_ai_metrics(conversation, response)
             
+            # Solo respuestas que no nombran al lead se comparten
+            name = (lead.name or '').strip()
+            if cache_key and ai_response and (not name or name == 'WhatsApp User'
+                                              or name.split()[0].lower() not in ai_response.lower()):
+                get_semantic_cache().store(cache_key[0], message, cache_key[1], ai_response)
+            
             return ai_response
             
         except Exception as e:
@@ -123,28 +142,35 @@ class AIService:
     def _build_system_prompt(self, academy: Academy, lead: Lead) -> str:
         """
         Construye el prompt del sistema con información de BJJ Mingo
+        Prefijo precompilado (igual para todos los leads) + contexto del prospecto al final
         """
-        try:
-            # Intentar importar el prompt base desde academy_info
-            from app.config.academy_info import get_system_prompt_base
-            base_prompt = get_system_prompt_base()
-            
-            # Agregar información del prospecto
-            lead_info = f"""
-
-CONTEXTO DEL PROSPECTO:
-- Nombre: {lead.name if lead.name != 'WhatsApp User' else 'No proporcionado'}
-- Teléfono: {lead.phone}
-- Estado: {lead.status}
-- Fuente: {lead.source}
-"""
-            
-            return base_prompt + lead_info
-            
-        except ImportError:
+        base_prompt = get_prompt_compiler().get_prefix()
+        if base_prompt is None:
             # Fallback si no se puede importar academy_info
             logger.warning("No se pudo importar academy_info, usando prompt por defecto")
             return self._get_default_prompt(academy, lead)
+        
+        return base_prompt + render_lead_context([
+            ('Nombre', lead.name if lead.name != 'WhatsApp User' else 'No proporcionado'),
+            ('Teléfono', lead.phone),
+            ('Estado', lead.status),
+            ('Fuente', lead.source),
+        ])
+    
+    def _semantic_cache_key(self, academy: Academy, message: str) -> Optional[tuple]:
+        """
+        (academia, versión del prompt) para la caché semántica, o None si no aplica
+        El prompt por defecto incluye datos del lead: sin academy_info no se cachea
+        Los mensajes de agendamiento (mismo criterio que MessageHandler) no se
+        sirven ni se guardan: la respuesta depende del lead y no se comparte
+        """
+        if not semantic_cache_enabled() or self.fast_path.classify(message)['blocked']:
+            return None
+        compiler = get_prompt_compiler()
+        if compiler.get_prefix() is None:
+            return None
+        namespace = (academy.name if academy else None) or 'default'
+        return namespace, prompt_version(compiler.prefix_hash, self.model, self.temperature)
     
     def _get_default_prompt(self, academy: Academy, lead: Lead) -> str:
         """Prompt por defecto si academy_info no está disponible"""
@@ -206,11 +232,13 @@ INSTRUCCIONES:
     def _get_conversation_history(
         self,
         conversation: Conversation,
-        limit: int = 10
+        limit: Optional[int] = None
     ) -> List[Dict[str, str]]:
         """
         Obtiene el historial de conversación para contexto
+        (por defecto history_fetch_limit(), lo mismo que MessageHandler)
         """
+        limit = limit or history_fetch_limit()
         history = []
 
         try:
@@ -7,14 +7,16 @@ Incluye notificaciones automáticas al staff
 from datetime import datetime, timedelta
 import re
 import logging
-from app.utils.database import get_db_connection, get_db_cursor
+from app.utils.database import get_db_connection, unit_of_work, default_db_path
+from app.utils.metrics import metrics
+from app.utils.queries import queries
 
 logger = logging.getLogger(__name__)
 
 
 class AppointmentScheduler:
     def __init__(self):
-        self.db_path = 'bjj_academy.db'
+        self.db_path = default_db_path()
 
         # Inicializar servicio de notificaciones
         try:
@@ -61,6 +63,7 @@ class AppointmentScheduler:
             4: 'Jueves', 5: 'Viernes', 6: 'Sábado', 7: 'Domingo'
         }
     
+    @metrics.timed('scheduler_stage_seconds', stage='available_slots')
     def get_available_slots(self, clase_tipo=None, days_ahead=14):
         """
         Obtiene slots disponibles para los próximos días
@@ -95,6 +98,7 @@ class AppointmentScheduler:
         
         return available
     
+    @metrics.timed('scheduler_stage_seconds', stage='parse_request')
     def parse_appointment_request(self, message, lead_id=None):
         """Interpretar mensaje para extraer tipo de clase, día y hora"""
         message_lower = message.lower()
@@ -170,85 +174,87 @@ class AppointmentScheduler:
         
         return None
     
+    @metrics.timed('scheduler_stage_seconds', stage='book_trial_week')
     def book_trial_week(self, lead_id, clase_tipo, notes=None):
         """
         Registra una semana de prueba para un prospecto
         NUEVO: Envía notificación al staff + Programa recordatorios automáticos 24hrs antes
+        La notificación y los recordatorios salen después del commit, para no
+        retener el lock de escritura durante llamadas de red
         """
-        with get_db_cursor(db_path=self.db_path) as cursor:
-            # Verificar si ya tiene una semana de prueba activa
-            cursor.execute("""
-                SELECT COUNT(*) FROM trial_weeks
-                WHERE lead_id = ? AND status = 'active'
-            """, (lead_id,))
-
-            if cursor.fetchone()[0] > 0:
-                return {
-                    'success': False,
-                    'message': 'Ya tenés una semana de prueba activa.'
-                }
-
-            start_date = datetime.now()
-            end_date = start_date + timedelta(days=7)
+        start_date = datetime.now()
+        end_date = start_date + timedelta(days=7)
+
+        try:
+            horario = self.horarios[clase_tipo]
+
+            with unit_of_work(db_path=self.db_path) as cursor:
+                # Verificar si ya tiene una semana de prueba activa
+                if queries.fetchone(cursor, 'trial_week.active_count', (lead_id,))[0] > 0:
+                    return {
+                        'success': False,
+                        'message': 'Ya tenés una semana de prueba activa.'
+                    }
 
-            try:
                 # Registrar la semana de prueba
-                cursor.execute("""
-                    INSERT INTO trial_weeks
-                    (lead_id, clase_tipo, start_date, end_date, status, notes)
-                    VALUES (?, ?, ?, ?, 'active', ?)
-                """, (lead_id, clase_tipo, start_date.strftime('%Y-%m-%d'),
-                      end_date.strftime('%Y-%m-%d'), notes))
+                queries.execute(cursor, 'trial_week.insert', (
+                    lead_id, clase_tipo, start_date.strftime('%Y-%m-%d'),
+                    end_date.strftime('%Y-%m-%d'), notes))
 
                 trial_id = cursor.lastrowid
 
                 # Actualizar status del lead
-                cursor.execute("""
-                    UPDATE leads
-                    SET status = 'trial_scheduled', lead_score = 9
-                    WHERE id = ?
-                """, (lead_id,))
+                queries.execute(cursor, 'leads.mark_trial_scheduled', (lead_id,))
 
                 # Obtener información del lead para la notificación
-                cursor.execute("""
-                    SELECT phone, name FROM leads WHERE id = ?
-                """, (lead_id,))
-                lead_data = cursor.fetchone()
-
-                # Preparar información para notificación
-                horario = self.horarios[clase_tipo]
-                dias_texto = self._get_dias_texto(horario['dias'])
-                next_class_date = self._get_next_class_date(clase_tipo)
-
-                # NUEVO: Enviar notificación al staff de la academia
-                if self.notifier:
-                    lead_info = {
-                        'name': lead_data[1] if lead_data else 'No proporcionado',
-                        'phone': lead_data[0] if lead_data else 'No proporcionado',
-                        'status': 'trial_scheduled'
-                    }
+                lead_data = queries.fetchone(cursor, 'leads.contact', (lead_id,))
 
-                    trial_info = {
-                        'clase_nombre': horario['nombre'],
-                        'start_date': start_date.strftime('%Y-%m-%d'),
-                        'dias_texto': dias_texto,
-                        'hora': horario['hora'],
-                        'notes': notes or 'Agendado vía WhatsApp'
-                    }
+                academy_phone = self._get_phone(cursor=cursor)
+
+        except Exception as e:
+            logger.error(f"Error registrando semana de prueba: {e}")
+            return {
+                'success': False,
+                'message': f'Error al registrar: {str(e)}'
+            }
+
+        # Preparar información para notificación
+        dias_texto = self._get_dias_texto(horario['dias'])
+        next_class_date = self._get_next_class_date(clase_tipo)
+
+        # NUEVO: Enviar notificación al staff de la academia
+        if self.notifier:
+            lead_info = {
+                'name': lead_data[1] if lead_data else 'No proporcionado',
+                'phone': lead_data[0] if lead_data else 'No proporcionado',
+                'status': 'trial_scheduled'
+            }
+
+            trial_info = {
+                'clase_nombre': horario['nombre'],
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'dias_texto': dias_texto,
+                'hora': horario['hora'],
+                'notes': notes or 'Agendado vía WhatsApp'
+            }
 
-                    # Enviar notificación
+            # Enviar notificación (la semana ya quedó registrada aunque falle)
+            try:
+                with metrics.timer('scheduler_stage_seconds', stage='notify_staff'):
                     notification_result = self.notifier.notify_new_trial_booking(lead_info, trial_info)
 
-                    if notification_result['success']:
-                        logger.info(f"✅ Notificación enviada al staff para lead {lead_id}")
-                    else:
-                        logger.warning(f"⚠️ No se pudo enviar notificación: {notification_result['message']}")
+                if notification_result['success']:
+                    logger.info(f"✅ Notificación enviada al staff para lead {lead_id}")
+                else:
+                    logger.warning(f"⚠️ No se pudo enviar notificación: {notification_result['message']}")
+            except Exception as e:
+                logger.error(f"⚠️ Error notificando al staff (no crítico): {e}")
 
-                # NUEVO: Programar recordatorios automáticos 24 horas antes de cada clase
-                self._schedule_reminders(lead_id, trial_id, clase_tipo, start_date)
+        # NUEVO: Programar recordatorios automáticos 24 horas antes de cada clase
+        self._schedule_reminders(lead_id, trial_id, clase_tipo, start_date)
 
-                # Mensaje de confirmación para el cliente (SIN link de calendario)
-                confirmation = f"""✅ ¡SEMANA DE PRUEBA CONFIRMADA!
+        # Mensaje de confirmación para el cliente (SIN link de calendario)
+        confirmation = f"""✅ ¡SEMANA DE PRUEBA CONFIRMADA!
 
 📋 Detalles:
 - Clase: {horario['nombre']}
@@ -269,33 +275,27 @@ class AppointmentScheduler:
 🎯 *La academia te contactará pronto para confirmar tu asistencia.*
 🔔 *Te enviaremos un recordatorio 24 horas antes de cada clase.*
 
-📞 Cualquier duda: {self._get_phone()}
+📞 Cualquier duda: {academy_phone}
 
 ¡Te esperamos! 🥋"""
 
-                return {
-                    'success': True,
-                    'message': confirmation,
-                    'trial_id': trial_id
-                }
-
-            except Exception as e:
-                logger.error(f"Error registrando semana de prueba: {e}")
-                return {
-                    'success': False,
-                    'message': f'Error al registrar: {str(e)}'
-                }
+        return {
+            'success': True,
+            'message': confirmation,
+            'trial_id': trial_id
+        }
     
     def _get_dias_texto(self, dias_nums):
         """Convierte lista de números de días a texto"""
         return ', '.join([self.dias_nombres[d] for d in dias_nums])
     
-    def _get_phone(self):
-        """Obtiene el teléfono de la academia"""
-        with get_db_connection(db_path=self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT phone FROM academies WHERE id = 1")
-            result = cursor.fetchone()
+    def _get_phone(self, cursor=None):
+        """Obtiene el teléfono de la academia (en el cursor recibido o en una conexión propia)"""
+        if cursor is None:
+            with get_db_connection(db_path=self.db_path) as conn:
+                return self._get_phone(cursor=conn.cursor())
+
+        result = queries.fetchone(cursor, 'academies.phone')
         return result[0] if result else '+506-8888-8888'
     
     def format_available_slots_message(self, slots, clase_tipo=None):
@@ -329,6 +329,7 @@ class AppointmentScheduler:
 
         return message
 
+    @metrics.timed('scheduler_stage_seconds', stage='schedule_reminders')
     def _schedule_reminders(self, lead_id, trial_week_id, clase_tipo, start_date):
         """
         Programa recordatorios automáticos para cada clase de la semana
@@ -0,0 +1,224 @@
+"""
+Message Handler ASÍNCRONO (asyncio)
+Misma lógica que MessageHandler pero con AsyncOpenAI y SQLite asíncrono,
+para que un solo proceso atienda cientos de conversaciones en paralelo
+sin ocupar un hilo del sistema por cada llamada a OpenAI
+"""
+
+import os
+import asyncio
+import logging
+from app.services.message_handler import MessageHandler
+from app.services.history_assembler import history_fetch_limit
+from app.utils.async_database import get_async_db_connection, get_async_db_cursor
+from app.utils.database import db_stage
+from app.utils.metrics import metrics
+from app.utils.queries import queries
+from app.utils import lead_summary
+
+try:
+    from openai import AsyncOpenAI
+    ASYNC_OPENAI_AVAILABLE = True
+except ImportError:
+    ASYNC_OPENAI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMessageHandler(MessageHandler):
+    """
+    Variante asyncio de MessageHandler
+    Reutiliza el prompt, la detección de agendamiento y las respuestas de emergencia;
+    todos los métodos con I/O son corutinas
+    """
+
+    def _initialize_openai(self):
+        """Inicializar cliente asíncrono de OpenAI"""
+        super()._initialize_openai()
+
+        if self.ai_enabled:
+            if ASYNC_OPENAI_AVAILABLE:
+                self.openai_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+                logger.info("✅ Cliente AsyncOpenAI configurado")
+            else:
+                logger.error("❌ AsyncOpenAI no disponible en esta versión de openai")
+                self.ai_enabled = False
+                self.openai_client = None
+
+    async def process_message(self, phone_number, message, name=None):
+        """Procesar mensaje - SIEMPRE intenta IA primero"""
+        logger.info(f"\n[PHONE] Mensaje de {phone_number}: {message}")
+
+        lead_id, conv_id = await self.persist_inbound(phone_number, message, name)
+        return await self.generate_reply(lead_id, conv_id, message)
+
+    async def persist_inbound(self, phone_number, message, name=None):
+        """Guarda lead, conversación y mensaje entrante en una sola conexión"""
+        with db_stage('persist'):
+            async with get_async_db_cursor(db_path=self.db_path) as cursor:
+                lead_id = await self._get_or_create_lead(cursor, phone_number, name)
+                conv_id = await self._get_or_create_conversation(cursor, lead_id)
+                await self._insert_message(cursor, conv_id, 'user', message)
+
+        return lead_id, conv_id
+
+    async def generate_reply(self, lead_id, conv_id, message):
+        """Genera (plantilla de preguntas frecuentes u OpenAI), guarda la respuesta y actualiza el lead"""
+        response, intent = self._fast_path_reply(message)
+        if response is None:
+            response = await self._generate_ai_response(message, lead_id, conv_id)
+
+        with db_stage('save_reply'):
+            async with get_async_db_cursor(db_path=self.db_path) as cursor:
+                await self._insert_message(cursor, conv_id, 'assistant', response, intent)
+                await self._update_lead_status(cursor, lead_id, message)
+
+        return response
+
+    async def _generate_ai_response(self, message, lead_id, conv_id):
+        """Genera respuesta PRIORIZANDO IA + detección de agendamiento"""
+        if self.ai_enabled and self.openai_client:
+            try:
+                with db_stage('context'):
+                    lead_info, academy_info, history, summary = await self._load_context(lead_id, conv_id)
+
+                cached, cache_key = self._cached_reply(message, academy_info, history)
+                if cached:
+                    return cached
+
+                system_prompt = self._build_system_prompt(academy_info, lead_info)
+                messages = [{"role": "system", "content": system_prompt}]
+                messages.extend(self._prompt_history(history, summary))
+                messages.append({"role": "user", "content": message})
+
+                with metrics.timer('message_stage_seconds', stage='openai'):
+                    response = await self.openai_client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature
+                    )
+
+                ai_response = response.choices[0].message.content
+                logger.info(f"[SUCCESS] Respuesta generada: {len(ai_response)} caracteres")
+
+                booking_detected = self._detect_booking_intent(message, ai_response, history)
+
+                if booking_detected and self.scheduler:
+                    logger.info("[BOOKING] Intención de agendamiento detectada")
+                    # El scheduler es síncrono (BD + notificaciones): correrlo en un hilo
+                    booking = await asyncio.to_thread(self._try_booking, message, lead_id)
+                    if booking:
+                        return ai_response + "\n\n" + booking
+
+                if not booking_detected:
+                    self._remember_reply(cache_key, message, ai_response, lead_info)
+
+                return ai_response
+
+            except Exception as e:
+                logger.error(f"[ERROR] Fallo OpenAI: {e}")
+
+        logger.warning("[FALLBACK] OpenAI no disponible, usando respuesta de emergencia")
+        return self._get_emergency_response(message)
+
+    def _try_booking(self, message, lead_id):
+        """Parsea y registra la semana de prueba; devuelve la confirmación o None"""
+        with metrics.timer('message_stage_seconds', stage='booking_parse'):
+            parsed = self.scheduler.parse_appointment_request(message, lead_id)
+
+        if not parsed['parsed']:
+            logger.info("[BOOKING] No se pudo parsear fecha/hora")
+            return None
+
+        with db_stage('booking'), metrics.timer('message_stage_seconds', stage='book_trial_week'):
+            result = self.scheduler.book_trial_week(
+                lead_id,
+                parsed.get('clase_tipo', 'adultos_jiujitsu'),
+                f"Agendado via WhatsApp: {message}"
+            )
+
+        if result['success']:
+            logger.info("[BOOKING] Semana de prueba registrada")
+            return result['message']
+
+        logger.warning(f"[BOOKING] Error: {result['message']}")
+        return None
+
+    # ========== MÉTODOS DE BASE DE DATOS ==========
+
+    @metrics.timed('message_stage_seconds', stage='context')
+    async def _load_context(self, lead_id, conv_id, limit=None):
+        """Lee lead, academia e historial en una sola conexión"""
+        limit = limit or history_fetch_limit()
+        async with get_async_db_connection(db_path=self.db_path) as conn:
+            row = await queries.afetchone(conn, 'lead.info', (lead_id,))
+            lead_info = {
+                'id': row[0],
+                'phone': row[1],
+                'name': row[2],
+                'status': row[3],
+                'interest_level': row[4],
+                'source': row[5]
+            } if row else {}
+
+            row = await queries.afetchone(conn, 'academy.info')
+            if row:
+                academy_info = {
+                    'name': row[0],
+                    'description': row[1],
+                    'instructor': f"{row[2]} ({row[3]})" if row[2] else 'Instructores certificados',
+                    'phone': row[4],
+                    'location': f"{row[5]}, {row[6]}" if row[5] and row[6] else 'Santo Domingo de Heredia, Costa Rica'
+                }
+            else:
+                academy_info = {'name': 'BJJ Mingo', 'phone': '+506-8888-8888'}
+
+            history = [
+                {'sender': r[0], 'content': r[1], 'timestamp': r[2], 'id': r[3]}
+                for r in await queries.afetchall(conn, 'message.history', (conv_id, limit))
+            ]
+            history.reverse()
+
+            row = await queries.afetchone(conn, 'conversation.summary', (conv_id,))
+            summary = {'summary': row[0], 'through_id': row[1] or 0} if row and row[0] else None
+
+        return lead_info, academy_info, history, summary
+
+    @metrics.timed('message_stage_seconds', stage='lead_lookup')
+    async def _get_or_create_lead(self, cursor, phone_number, name=None):
+        """Obtener o crear lead"""
+        lead = await queries.afetchone(cursor, 'lead.by_phone', (phone_number,))
+
+        if lead:
+            return lead[0]
+
+        await queries.aexecute(cursor, 'lead.insert', (phone_number, name or 'WhatsApp User'))
+        return cursor.lastrowid
+
+    @metrics.timed('message_stage_seconds', stage='conversation_lookup')
+    async def _get_or_create_conversation(self, cursor, lead_id):
+        """Obtener o crear conversación"""
+        conv = await queries.afetchone(cursor, 'conversation.active_by_lead', (lead_id,))
+
+        if conv:
+            return conv[0]
+
+        await queries.aexecute(cursor, 'conversation.insert', (lead_id,))
+        return cursor.lastrowid
+
+    @metrics.timed('message_stage_seconds', stage='save_message')
+    async def _insert_message(self, cursor, conv_id, sender, content, intent=None):
+        """Guardar mensaje"""
+        await queries.aexecute(cursor, 'message.insert', (conv_id, sender, content, intent))
+        await lead_summary.arecord_message(cursor, cursor.lastrowid)
+
+    @metrics.timed('message_stage_seconds', stage='status_update')
+    async def _update_lead_status(self, cursor, lead_id, message):
+        """Actualizar estado del lead"""
+        msg_lower = message.lower()
+
+        if any(word in msg_lower for word in ['agendar', 'clase', 'prueba', 'probar', 'semana']):
+            await queries.aexecute(cursor, 'lead.mark_interested', (lead_id,))
+        else:
+            await queries.aexecute(cursor, 'lead.mark_contacted', (lead_id,))
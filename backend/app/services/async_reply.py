@@ -0,0 +1,143 @@
+"""
+Servicio de respuestas fuera de banda para el webhook de WhatsApp
+El webhook guarda el mensaje entrante y responde a Twilio de inmediato;
+los workers del dispatcher generan la respuesta con IA y la envían por la API REST de Twilio
+"""
+
+import os
+import time
+import logging
+from app.services.burst_coalescer import BurstCoalescer
+from app.services.message_dispatcher import MessageDispatcher, get_worker_handler
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def async_reply_enabled():
+    """Indica si el modo de respuesta fuera de banda está activado"""
+    return os.getenv('WEBHOOK_ASYNC_REPLY', 'false').lower() in ('1', 'true', 'yes')
+
+
+def deliver_reply(message_handler, notifier, lead_id, conv_id, phone_number, message, accepted_at):
+    """Genera la respuesta con IA y la envía por Twilio REST"""
+    metrics.observe('reply_stage_seconds', time.time() - accepted_at, stage='queue_wait')
+
+    try:
+        with metrics.timer('reply_stage_seconds', stage='generate'):
+            response_text = message_handler.generate_reply(lead_id, conv_id, message)
+
+        with metrics.timer('reply_stage_seconds', stage='send'):
+            if notifier and notifier.twilio_available:
+                result = notifier._send_whatsapp_notification(phone_number, response_text)
+            else:
+                result = {'success': False, 'message': 'NotificationService no disponible'}
+
+        if result['success']:
+            metrics.inc('reply_sent_total')
+        else:
+            metrics.inc('reply_send_failures_total')
+            logger.error(f"❌ No se pudo enviar respuesta a {phone_number}: {result['message']}")
+
+        return result
+
+    except Exception as e:
+        metrics.inc('reply_send_failures_total')
+        logger.error(f"❌ Error entregando respuesta a {phone_number}: {e}")
+        return {'success': False, 'message': str(e)}
+
+    finally:
+        metrics.observe('reply_stage_seconds', time.time() - accepted_at, stage='total')
+
+
+# Notificador propio de cada proceso worker (modo proceso del dispatcher)
+_worker_notifier = None
+
+
+def deliver_reply_job(lead_id, conv_id, phone_number, message, accepted_at):
+    """Trabajo serializable de entrega para el modo proceso del dispatcher"""
+    global _worker_notifier
+    if _worker_notifier is None:
+        from app.services.notification_service import NotificationService
+        _worker_notifier = NotificationService()
+
+    return deliver_reply(
+        get_worker_handler(), _worker_notifier,
+        lead_id, conv_id, phone_number, message, accepted_at
+    )
+
+
+class AsyncReplyService:
+    """
+    Acepta mensajes entrantes y entrega la respuesta de IA en segundo plano
+    - accept(): parte rápida, corre dentro del request de Twilio
+    - ráfagas opcionales: varios mensajes seguidos se responden una sola vez
+    - la entrega (OpenAI + envío) corre en el shard del remitente, en orden
+    """
+
+    def __init__(self, message_handler, notifier=None, dispatcher=None, coalescer=None):
+        self.message_handler = message_handler
+        self.dispatcher = dispatcher or MessageDispatcher()
+
+        # Agrupar ráfagas si hay una ventana configurada
+        if coalescer is None and int(os.getenv('WEBHOOK_COALESCE_WINDOW_MS', 0)) > 0:
+            coalescer = BurstCoalescer(self._flush_burst)
+        self.coalescer = coalescer
+
+        if notifier is None:
+            try:
+                from app.services.notification_service import NotificationService
+                notifier = NotificationService()
+            except Exception as e:
+                logger.warning(f"⚠️ NotificationService no disponible: {e}")
+        self.notifier = notifier
+
+        logger.info(f"✅ AsyncReplyService iniciado ({self.dispatcher.num_shards} shards)")
+
+    def accept(self, phone_number, message, name=None):
+        """
+        Guarda el mensaje entrante y encola la respuesta
+
+        Returns:
+            Future con el resultado de la entrega
+        """
+        accepted_at = time.time()
+
+        # El lock del shard evita carreras al crear lead/conversación
+        with metrics.timer('webhook_stage_seconds', stage='persist'):
+            with self.dispatcher.lock_for(phone_number):
+                lead_id, conv_id = self.message_handler.persist_inbound(phone_number, message, name)
+
+        if self.coalescer:
+            # Cada mensaje queda guardado; la respuesta sale al cerrar la ráfaga
+            return self.coalescer.add(phone_number, (lead_id, conv_id, message, accepted_at))
+
+        return self._enqueue_reply(lead_id, conv_id, phone_number, message, accepted_at)
+
+    def _flush_burst(self, phone_number, items):
+        """Une una ráfaga en un solo turno del usuario y encola una única respuesta"""
+        lead_id, conv_id, _, _ = items[-1]
+        accepted_at = items[0][3]
+        merged = '\n'.join(item[2] for item in items)
+
+        return self._enqueue_reply(lead_id, conv_id, phone_number, merged, accepted_at)
+
+    def _enqueue_reply(self, lead_id, conv_id, phone_number, message, accepted_at):
+        """Encola la entrega en el shard del remitente"""
+        if self.dispatcher.mode == 'process':
+            return self.dispatcher.submit(
+                phone_number, deliver_reply_job,
+                lead_id, conv_id, phone_number, message, accepted_at
+            )
+
+        return self.dispatcher.submit(
+            phone_number, deliver_reply,
+            self.message_handler, self.notifier,
+            lead_id, conv_id, phone_number, message, accepted_at
+        )
+
+    def shutdown(self, wait=True):
+        """Detiene los workers (entregando antes las ráfagas pendientes)"""
+        if self.coalescer:
+            self.coalescer.shutdown()
+        self.dispatcher.shutdown(wait=wait)
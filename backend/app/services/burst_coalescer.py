@@ -0,0 +1,133 @@
+"""
+Agrupador de ráfagas de mensajes de WhatsApp
+Cuando un usuario manda "hola", "quiero info" y "precio?" en pocos segundos,
+se espera una ventana de silencio (debounce) y se responde una sola vez
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BurstCoalescer:
+    """
+    Acumula los mensajes de cada remitente y los entrega juntos a on_flush
+    - window_seconds: silencio necesario para cerrar la ráfaga
+    - max_wait_seconds: tope desde el primer mensaje, para no esperar indefinidamente
+
+    on_flush(phone_number, items) recibe la lista de items en orden de llegada
+    y debe devolver un Future (o un valor) con el resultado de la respuesta
+    """
+
+    def __init__(self, on_flush, window_seconds=None, max_wait_seconds=None):
+        if window_seconds is None:
+            window_seconds = int(os.getenv('WEBHOOK_COALESCE_WINDOW_MS', 0)) / 1000.0
+        if max_wait_seconds is None:
+            max_wait_seconds = int(os.getenv('WEBHOOK_COALESCE_MAX_WAIT_MS', 5000)) / 1000.0
+
+        self.on_flush = on_flush
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max(max_wait_seconds, window_seconds)
+
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='burst-coalescer', daemon=True)
+        self._thread.start()
+
+        logger.info(f"✅ BurstCoalescer iniciado: ventana {self.window_seconds}s, "
+                    f"máximo {self.max_wait_seconds}s")
+
+    def add(self, phone_number, item):
+        """
+        Agrega un mensaje a la ráfaga del remitente
+
+        Returns:
+            Future compartido por toda la ráfaga
+        """
+        now = time.monotonic()
+
+        with self._cond:
+            burst = self._pending.get(phone_number)
+            if burst is None:
+                burst = self._pending[phone_number] = {
+                    'items': [],
+                    'first_at': now,
+                    'future': Future()
+                }
+
+            burst['items'].append(item)
+            burst['deadline'] = min(now + self.window_seconds,
+                                    burst['first_at'] + self.max_wait_seconds)
+            self._cond.notify()
+
+        return burst['future']
+
+    def pending_count(self):
+        """Cantidad de remitentes con una ráfaga abierta"""
+        with self._cond:
+            return len(self._pending)
+
+    def _loop(self):
+        """Hilo que cierra las ráfagas cuyo plazo venció"""
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+
+                if not self._pending:
+                    return
+
+                phone_number, burst = min(self._pending.items(), key=lambda kv: kv[1]['deadline'])
+                remaining = burst['deadline'] - time.monotonic()
+
+                if remaining > 0 and self._running:
+                    self._cond.wait(remaining)
+                    continue
+
+                del self._pending[phone_number]
+
+            self._flush(phone_number, burst)
+
+    def _flush(self, phone_number, burst):
+        """Entrega una ráfaga cerrada y encadena su resultado al Future compartido"""
+        items = burst['items']
+        metrics.inc('burst_flushes_total')
+        metrics.inc('burst_messages_total', len(items))
+
+        if len(items) > 1:
+            logger.info(f"[BURST] {len(items)} mensajes de {phone_number} agrupados en uno")
+
+        future = burst['future']
+        try:
+            result = self.on_flush(phone_number, items)
+        except Exception as e:
+            logger.error(f"❌ Error entregando ráfaga de {phone_number}: {e}")
+            future.set_exception(e)
+            return
+
+        if isinstance(result, Future):
+            result.add_done_callback(lambda f: _copy_future(f, future))
+        else:
+            future.set_result(result)
+
+    def shutdown(self):
+        """Entrega las ráfagas pendientes y detiene el hilo"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+
+def _copy_future(source, target):
+    """Copia el resultado (o la excepción) de un Future a otro"""
+    exc = source.exception()
+    if exc is not None:
+        target.set_exception(exc)
+    else:
+        target.set_result(source.result())
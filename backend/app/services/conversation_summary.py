@@ -0,0 +1,163 @@
+"""
+Resumen acumulado de conversaciones largas
+Los leads vuelven semanas después; con solo los últimos mensajes crudos el
+modelo pierde el contexto, y con todos el prompt crece sin límite
+
+La tarea summarize_conversations (Celery) junta los mensajes viejos de cada
+conversación en conversation.summary (migrations/add_conversation_summary.sql):
+- Los últimos SUMMARY_KEEP_MESSAGES mensajes quedan crudos
+- Se resume cuando hay al menos SUMMARY_MIN_NEW_MESSAGES mensajes viejos
+  nuevos, hasta SUMMARY_MAX_FOLD por llamada a OpenAI (una conversación
+  atrasada se pone al día en varias pasadas)
+- El resumen nuevo = resumen anterior + esos mensajes, en SUMMARY_MAX_TOKENS
+
+El prompt de cada respuesta es: sistema + resumen + mensajes posteriores a
+summary_through_id, así su tamaño no depende del largo de la conversación
+"""
+
+import os
+import logging
+from app.utils.database import get_db_cursor
+from app.utils.metrics import metrics
+from app.utils.queries import queries
+from app.services.history_assembler import truncate, history_max_turn_tokens
+
+try:
+    from openai import OpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Resumís conversaciones de WhatsApp entre un prospecto y BJJ Mingo (academia de Jiu-Jitsu).
+Actualizá el resumen con los mensajes nuevos. Conservá solo lo que sirve para seguir la conversación:
+nombre, edad o para quién son las clases, experiencia, lesiones, horarios y precios que preguntó,
+clases agendadas, objeciones y lo que quedó pendiente. Escribí en español, en frases cortas, sin inventar."""
+
+SUMMARY_HEADER = "RESUMEN DE LA CONVERSACIÓN ANTERIOR (mensajes viejos):\n"
+
+SENDER_LABELS = {'user': 'Prospecto', 'assistant': 'Asistente'}
+
+
+def summary_keep_messages():
+    """Mensajes recientes que quedan crudos en el prompt (SUMMARY_KEEP_MESSAGES, default 6)"""
+    return max(1, int(os.getenv('SUMMARY_KEEP_MESSAGES', 6)))
+
+
+def summary_min_new_messages():
+    """Mensajes viejos sin resumir que justifican una llamada (SUMMARY_MIN_NEW_MESSAGES, default 6)"""
+    return max(1, int(os.getenv('SUMMARY_MIN_NEW_MESSAGES', 6)))
+
+
+def summary_message(summary):
+    """Mensaje de sistema con el resumen, para el prompt de OpenAI"""
+    return {"role": "system", "content": SUMMARY_HEADER + summary}
+
+
+class ConversationSummarizer:
+    """
+    Resume los mensajes viejos de las conversaciones activas
+    - client: cliente de OpenAI (default: uno nuevo con OPENAI_API_KEY;
+      OPENAI_BASE_URL apunta al servidor falso en pruebas)
+    - model: OPENAI_SUMMARY_MODEL, o OPENAI_MODEL
+    """
+
+    def __init__(self, db_path=None, client=None, model=None):
+        self.db_path = db_path
+        self.client = client if client is not None else self._make_client()
+        self.model = model or os.getenv('OPENAI_SUMMARY_MODEL') or os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+        self.max_tokens = int(os.getenv('SUMMARY_MAX_TOKENS', 250))
+        self.max_fold = max(1, int(os.getenv('SUMMARY_MAX_FOLD', 40)))
+        self.keep = summary_keep_messages()
+        self.min_new = summary_min_new_messages()
+
+    def _make_client(self):
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not OPENAI_AVAILABLE or not api_key:
+            return None
+        return OpenAI(api_key=api_key)
+
+    def pending(self, limit=100):
+        """IDs de las conversaciones que tienen mensajes para resumir"""
+        with get_db_cursor(db_path=self.db_path) as cursor:
+            rows = queries.fetchall(cursor, 'summary.pending', (self.keep + self.min_new, limit))
+        return [row[0] for row in rows]
+
+    def summarize(self, conv_id):
+        """
+        Junta los mensajes viejos de una conversación en su resumen
+
+        Returns:
+            Cantidad de mensajes resumidos (0 si no había suficientes o si
+            otra pasada resumió la conversación al mismo tiempo)
+        """
+        # Lectura corta: la llamada a OpenAI no tiene la BD tomada
+        with get_db_cursor(db_path=self.db_path) as cursor:
+            row = queries.fetchone(cursor, 'conversation.summary', (conv_id,))
+            if not row:
+                return 0
+            summary, through_id = row[0], row[1] or 0
+            messages = queries.fetchall(cursor, 'summary.messages', (conv_id, through_id))
+
+        fold = messages[:-self.keep][:self.max_fold]
+        if len(fold) < self.min_new:
+            return 0
+
+        with metrics.timer('summary_seconds', stage='openai'):
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": self._transcript(summary, fold)},
+                ],
+                max_tokens=self.max_tokens,
+                temperature=0
+            )
+        new_summary = (response.choices[0].message.content or '').strip()
+        if not new_summary:
+            return 0
+
+        with get_db_cursor(db_path=self.db_path) as cursor:
+            saved = queries.execute(cursor, 'summary.save',
+                                    (new_summary, fold[-1][0], conv_id, through_id)).rowcount
+        if not saved:
+            logger.info(f"[SUMMARY] Conversación {conv_id} ya resumida por otra pasada")
+            return 0
+
+        metrics.inc('summary_messages_folded_total', len(fold))
+        logger.info(f"📝 Conversación {conv_id}: {len(fold)} mensajes resumidos (hasta id {fold[-1][0]})")
+        return len(fold)
+
+    def _transcript(self, summary, messages):
+        limit = history_max_turn_tokens()
+        lines = [f"{SENDER_LABELS.get(sender, sender)}: {truncate(content or '', limit, self.model)}"
+                 for _, sender, content in messages]
+        return (f"Resumen actual:\n{summary or '(todavía no hay)'}\n\n"
+                f"Mensajes nuevos:\n" + '\n'.join(lines))
+
+    def run(self, limit=None):
+        """
+        Una pasada sobre las conversaciones pendientes
+
+        Returns:
+            Dict con conversations (resumidas), messages (resumidos) y errors
+        """
+        limit = limit or int(os.getenv('SUMMARY_BATCH', 100))
+        result = {'conversations': 0, 'messages': 0, 'errors': 0}
+        if self.client is None:
+            logger.warning("⚠️ OpenAI no configurado: no se resumen conversaciones")
+            return result
+
+        for conv_id in self.pending(limit):
+            try:
+                folded = self.summarize(conv_id)
+            except Exception as e:
+                logger.error(f"❌ Error resumiendo la conversación {conv_id}: {e}")
+                metrics.inc('summary_errors_total')
+                result['errors'] += 1
+                continue
+            if folded:
+                result['conversations'] += 1
+                result['messages'] += folded
+        return result
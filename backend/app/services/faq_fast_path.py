@@ -0,0 +1,228 @@
+"""
+Camino rápido para preguntas frecuentes (precios, horarios, ubicación)
+Clasifica el mensaje con palabras clave y, si la confianza alcanza el umbral,
+responde directo con los textos de academy_info sin llamar a OpenAI
+
+La clasificación es determinística (sin red ni modelo): el mismo mensaje
+siempre da la misma intención y confianza
+- Cada intención suma el peso de sus palabras clave (fuertes y débiles)
+- Cada palabra que no es de relleno ni del tema baja la confianza: un
+  mensaje largo suele pedir algo que la plantilla no contesta
+- Señales de agendamiento (agendar, días, horas, nombre) dejan la confianza
+  en 0: ese flujo lo maneja OpenAI + AppointmentScheduler
+"""
+
+import os
+import re
+import time
+import logging
+import unicodedata
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pesos de las palabras clave (el puntaje de una intención se corta en 1)
+STRONG = 0.8
+WEAK = 0.3
+
+# Factor por cada palabra que no se explica con el tema de la pregunta
+UNEXPLAINED_PENALTY = 0.85
+
+# Palabras clave ya normalizadas (minúsculas, sin tildes); pueden ser frases
+INTENT_KEYWORDS = {
+    'precios': {
+        STRONG: ['precio', 'precios', 'costo', 'costos', 'cuesta', 'cuestan', 'mensualidad',
+                 'mensualidades', 'tarifa', 'tarifas', 'cobran', 'cuanto sale', 'cuanto vale'],
+        WEAK: ['cuanto', 'pagar', 'pago', 'valor'],
+    },
+    'horarios': {
+        STRONG: ['horario', 'horarios', 'a que hora', 'que horas', 'que dias'],
+        WEAK: ['hora', 'horas', 'cuando', 'abren', 'turno', 'turnos'],
+    },
+    'ubicacion': {
+        STRONG: ['donde', 'ubicacion', 'ubicados', 'ubicadas', 'direccion', 'waze', 'como llego',
+                 'como llegar', 'mapa'],
+        WEAK: ['queda', 'quedan', 'lugar', 'local'],
+    },
+}
+
+# Orden de las respuestas cuando el mensaje pregunta por varias cosas
+INTENT_ORDER = ('precios', 'horarios', 'ubicacion')
+
+# Palabras que no cambian la pregunta: saludos, relleno y el tema de la academia
+NEUTRAL_WORDS = frozenset("""
+    hola holi buenas buenos dias tardes noches saludos pura vida gracias muchas porfa por favor
+    que cual cuales son es el la los las lo un una unos unas de del al a en y o e para con sus su
+    me te nos le les quisiera quiero queria querria saber preguntar consulta consultar
+    info informacion podria podrian puede pueden decir dar pasar tienen tiene hay ustedes usted
+    vos mi mis tambien ok okay disculpe disculpa perdon estan esta como
+    clase clases academia gimnasio gym jiu jitsu jiujitsu bjj mingo adulto adultos nino ninos
+    kids juniors junior striking combo paquete combinado mensual entrenar entrenamiento
+""".split())
+
+# Señales de que el mensaje es parte del agendamiento
+BOOKING_WORDS = ('agendar', 'agenda', 'reservar', 'reserva', 'apartar', 'mi nombre', 'me llamo',
+                 'inscribir', 'inscribirme', 'matricular', 'lunes', 'martes', 'miercoles', 'jueves',
+                 'viernes', 'sabado', 'domingo', 'manana', 'hoy')
+BOOKING_TIME = re.compile(r'\b\d{1,2}(:\d{2})?\s?(am|pm|hrs)\b|\b\d{1,2}:\d{2}\b')
+
+FAST_PATH_CLOSING = "¿Querés probar? La SEMANA DE PRUEBA es GRATIS, decime qué día te sirve 🥋"
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def fast_path_enabled():
+    """Indica si las preguntas frecuentes se responden sin OpenAI (opt-in: FAQ_FAST_PATH=true)"""
+    return os.getenv('FAQ_FAST_PATH', 'false').lower() in ('1', 'true', 'yes')
+
+
+def normalize(text):
+    """Minúsculas y sin tildes, para comparar con las palabras clave"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def _index(phrases):
+    """Primera palabra -> [(palabras, valor)] para buscar frases con un solo recorrido"""
+    index = {}
+    for phrase, value in phrases:
+        words = tuple(phrase.split())
+        index.setdefault(words[0], []).append((words, value))
+    return index
+
+
+def _matches(tokens, index):
+    """[(posiciones, valor)] de cada frase del índice que aparece en tokens"""
+    found = []
+    for start, token in enumerate(tokens):
+        for words, value in index.get(token, ()):
+            if tuple(tokens[start:start + len(words)]) == words:
+                found.append((range(start, start + len(words)), value))
+    return found
+
+
+_KEYWORD_INDEX = _index((phrase, (intent, weight))
+                        for intent, weights in INTENT_KEYWORDS.items()
+                        for weight, phrases in weights.items()
+                        for phrase in phrases)
+_BOOKING_INDEX = _index((phrase, True) for phrase in BOOKING_WORDS)
+
+
+class FaqFastPath:
+    """
+    Responde precios/horarios/ubicación con las plantillas de academy_info
+    - threshold: confianza mínima para responder sin OpenAI
+      (FAQ_FAST_PATH_THRESHOLD, default 0.7)
+
+    Métricas para ajustar el umbral:
+    - faq_fast_path_total{result=hit|miss|blocked|none, intent, band}: band es
+      la confianza redondeada hacia abajo a 0.1, así se puede calcular la tasa
+      de aciertos que daría cualquier otro umbral
+    - faq_fast_path_seconds{result}: latencia de clasificar y armar la respuesta
+    """
+
+    def __init__(self, threshold=None):
+        if threshold is None:
+            threshold = float(os.getenv('FAQ_FAST_PATH_THRESHOLD', 0.7))
+        self.threshold = threshold
+        self.templates = self._load_templates()
+
+    def _load_templates(self):
+        """Textos de academy_info por intención (se arman una sola vez)"""
+        try:
+            from app.config.academy_info import ACADEMY_INFO, get_horarios_texto, get_precios_texto
+        except ImportError:
+            logger.warning("⚠️ academy_info no disponible: camino rápido desactivado")
+            return {}
+
+        return {
+            'precios': get_precios_texto(),
+            'horarios': get_horarios_texto(),
+            'ubicacion': f"📍 {ACADEMY_INFO['location']}\n🗺️ Waze: {ACADEMY_INFO['waze_link']}",
+        }
+
+    def classify(self, message):
+        """
+        Clasifica el mensaje
+
+        Returns:
+            Dict con intents (lista en INTENT_ORDER), confidence (0 a 1) y
+            blocked (True si parece parte de un agendamiento)
+        """
+        text = normalize(message)
+        tokens = _TOKEN.findall(text)
+        explained = set()
+        matched = {}
+
+        # Cada frase suma una vez aunque se repita
+        for positions, (intent, weight) in _matches(tokens, _KEYWORD_INDEX):
+            explained.update(positions)
+            matched.setdefault(intent, {})[tuple(tokens[i] for i in positions)] = weight
+        scores = {intent: min(1.0, sum(matched[intent].values())) for intent in INTENT_ORDER if intent in matched}
+
+        blocked = bool(BOOKING_TIME.search(text)) or bool(_matches(tokens, _BOOKING_INDEX))
+        if not scores or blocked:
+            return {'intents': list(scores), 'confidence': 0.0, 'blocked': blocked}
+
+        unexplained = sum(1 for i, token in enumerate(tokens)
+                          if i not in explained and token not in NEUTRAL_WORDS and not token.isdigit())
+        confidence = min(scores.values()) * UNEXPLAINED_PENALTY ** unexplained
+        return {'intents': list(scores), 'confidence': round(confidence, 3), 'blocked': False}
+
+    def render(self, intents):
+        """Texto de las plantillas de las intenciones, en orden"""
+        return '\n\n'.join(self.templates[intent] for intent in intents)
+
+    def answer(self, message, threshold=None):
+        """
+        Respuesta de plantilla si la confianza alcanza el umbral
+
+        Args:
+            threshold: Umbral para esta llamada (default self.threshold);
+                con 0 responde ante cualquier palabra clave no bloqueada
+
+        Returns:
+            Tuple (intención, texto) o None. La intención es la de cada
+            plantilla unida con '+' (ej. 'precios+ubicacion')
+        """
+        threshold = self.threshold if threshold is None else threshold
+        result = self.classify(message)
+        if not self.templates or result['blocked'] or not result['intents'] \
+                or result['confidence'] < threshold:
+            return None
+        return '+'.join(result['intents']), self.render(result['intents'])
+
+    def reply(self, message):
+        """
+        Camino rápido del pipeline: answer() con métricas y log
+
+        Returns:
+            Tuple (intención, respuesta para el usuario) o None si va a OpenAI
+        """
+        started = time.perf_counter()
+        result = self.classify(message)
+        intent = '+'.join(result['intents']) or 'none'
+        band = f"{int(result['confidence'] * 10) / 10:.1f}"
+
+        if not result['intents']:
+            outcome = 'none'
+        elif result['blocked']:
+            outcome = 'blocked'
+        elif self.templates and result['confidence'] >= self.threshold:
+            outcome = 'hit'
+        else:
+            outcome = 'miss'
+
+        answer = None
+        if outcome == 'hit':
+            answer = intent, self.render(result['intents']) + "\n\n" + FAST_PATH_CLOSING
+
+        metrics.observe('faq_fast_path_seconds', time.perf_counter() - started, result=outcome)
+        metrics.inc('faq_fast_path_total', result=outcome, intent=intent, band=band)
+
+        if answer:
+            logger.info(f"[FAST PATH] Respuesta de plantilla '{intent}' (confianza {result['confidence']})")
+        elif outcome == 'miss':
+            logger.info(f"[FAST PATH] Confianza {result['confidence']} < {self.threshold} para '{intent}', "
+                        f"va a OpenAI")
+        return answer
@@ -0,0 +1,196 @@
+"""
+Escritor con group commit para las transacciones de mensajes
+Un solo hilo por proceso y base de datos toma las unidades de trabajo
+pendientes (guardar mensaje entrante, guardar respuesta) y las confirma
+juntas: un solo COMMIT (y un solo fsync) por lote en vez de uno por mensaje
+
+Cada llamador espera su Future, que se resuelve recién después del COMMIT
+del lote: la durabilidad es la misma que con una transacción propia
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future
+from app.utils.database import unit_of_work, default_db_path
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def group_commit_enabled():
+    """Indica si las escrituras del MessageHandler pasan por el escritor de group commit"""
+    return os.getenv('DB_GROUP_COMMIT', 'false').lower() in ('1', 'true', 'yes')
+
+
+class GroupCommitWriter:
+    """
+    Confirma en lotes las unidades de trabajo recibidas con submit()
+    - max_batch: máximo de unidades por COMMIT
+    - max_delay_seconds: espera desde la primera unidad del lote por más
+      unidades; con 0 el lote es lo que se acumuló mientras se confirmaba el anterior
+
+    Cada unidad work(cursor) corre dentro de un SAVEPOINT: si falla se deshace
+    solo esa unidad y su Future recibe la excepción; el resto del lote sigue
+    """
+
+    def __init__(self, db_path=None, max_batch=None, max_delay_seconds=None):
+        if max_batch is None:
+            max_batch = int(os.getenv('DB_GROUP_COMMIT_MAX_BATCH', 64))
+        if max_delay_seconds is None:
+            max_delay_seconds = float(os.getenv('DB_GROUP_COMMIT_MAX_DELAY_MS', 0)) / 1000.0
+
+        self.db_path = db_path or default_db_path()
+        self.max_batch = max(1, max_batch)
+        self.max_delay_seconds = max(0.0, max_delay_seconds)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='group-commit', daemon=True)
+        self._thread.start()
+
+        logger.info(f"✅ GroupCommitWriter iniciado: lotes de hasta {self.max_batch}, "
+                    f"espera {self.max_delay_seconds * 1000:g} ms")
+
+    def submit(self, work):
+        """
+        Encola una unidad de trabajo
+
+        Args:
+            work: Callable que recibe el cursor de la transacción del lote.
+                Corre en el hilo escritor con el contexto (db_stage, etc.)
+                del llamador; no debe hacer llamadas de red
+
+        Returns:
+            Future con el valor devuelto por work, resuelto después del COMMIT
+        """
+        future = Future()
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("GroupCommitWriter detenido")
+            self._queue.put((future, contextvars.copy_context(), work, time.perf_counter()))
+        return future
+
+    def run(self, work):
+        """submit() y espera el resultado (o la excepción) de la unidad"""
+        return self.submit(work).result()
+
+    def pending_count(self):
+        """Unidades encoladas que todavía no entraron a un lote"""
+        return self._queue.qsize()
+
+    def _loop(self):
+        """Hilo escritor: arma lotes y los confirma"""
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+
+            batch = [job]
+            stop = False
+            deadline = time.monotonic() + self.max_delay_seconds
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+                batch.append(job)
+
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        """Ejecuta las unidades del lote en una sola transacción"""
+        jobs = [job for job in batch if job[0].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+
+        outcomes = []
+        started = time.perf_counter()
+        try:
+            with unit_of_work(db_path=self.db_path) as cursor:
+                for future, context, work, _ in jobs:
+                    cursor.execute("SAVEPOINT group_commit")
+                    try:
+                        result = context.run(work, cursor)
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT group_commit")
+                        cursor.execute("RELEASE SAVEPOINT group_commit")
+                        outcomes.append((future, None, e))
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT group_commit")
+                        outcomes.append((future, result, None))
+        except Exception as e:
+            # Falló el BEGIN o el COMMIT: no quedó nada del lote
+            logger.error(f"❌ Error confirmando lote de {len(jobs)} escrituras: {e}")
+            metrics.inc('group_commit_failures_total')
+            for future, _, _, _ in jobs:
+                future.set_exception(e)
+            return
+
+        committed_at = time.perf_counter()
+        metrics.inc('group_commit_batches_total')
+        metrics.inc('group_commit_units_total', len(jobs))
+        metrics.observe('group_commit_seconds', committed_at - started)
+
+        for (future, result, error), job in zip(outcomes, jobs):
+            metrics.observe('group_commit_wait_seconds', committed_at - job[3])
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def shutdown(self):
+        """Confirma lo pendiente y detiene el hilo"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            self._queue.put(_STOP)
+        self._thread.join()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_group_commit_writer(db_path=None):
+    """Escritor compartido del proceso para una base de datos"""
+    db_path = db_path or default_db_path()
+    with _writers_lock:
+        writer = _writers.get(db_path)
+        if writer is None:
+            writer = _writers[db_path] = GroupCommitWriter(db_path)
+        return writer
+
+
+def shutdown_group_commit_writers():
+    """Detiene todos los escritores (fin del proceso, tests)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.shutdown()
+
+
+def _reset_after_fork():
+    # El hilo de flush no sobrevive al fork: el hijo (p. ej. un worker del
+    # dispatcher en modo process) arma sus propios escritores
+    global _writers_lock
+    _writers.clear()
+    _writers_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
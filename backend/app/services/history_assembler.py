@@ -0,0 +1,158 @@
+"""
+Historial de conversación con presupuesto de tokens
+Antes el historial era un número fijo de mensajes (5 en MessageHandler, 10
+en AIService): unas pocas respuestas largas de la IA inflaban el prompt y
+la latencia de OpenAI
+
+assemble_history() llena HISTORY_TOKEN_BUDGET desde el turno más nuevo
+hacia atrás:
+- Cada turno cuenta su contenido + TOKENS_PER_MESSAGE (formato de chat)
+- Un turno de más de HISTORY_MAX_TURN_TOKENS se recorta (se conserva el
+  principio y se marca con TRUNCATION_MARK)
+- El primer turno que no cabe corta el historial: nunca se salta un turno
+  para meter uno más viejo
+
+Los tokens se cuentan localmente con tiktoken (tokenizador del modelo,
+cargado una vez por proceso). Sin tiktoken, o si no puede cargar la
+codificación, se estima ~4 caracteres por token
+"""
+
+import os
+import logging
+import functools
+from app.utils.metrics import metrics
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Tokens que agrega el formato de chat por cada mensaje (rol y separadores)
+TOKENS_PER_MESSAGE = 4
+
+TRUNCATION_MARK = ' […]'
+
+CHARS_PER_TOKEN = 4
+
+
+def history_token_budget():
+    """Tokens máximos del historial en el prompt (HISTORY_TOKEN_BUDGET, default 1000)"""
+    return max(0, int(os.getenv('HISTORY_TOKEN_BUDGET', 1000)))
+
+
+def history_max_turn_tokens():
+    """Tokens máximos de un solo turno (HISTORY_MAX_TURN_TOKENS, default 300)"""
+    return max(1, int(os.getenv('HISTORY_MAX_TURN_TOKENS', 300)))
+
+
+def history_fetch_limit():
+    """Mensajes que se leen de la BD antes de aplicar el presupuesto (HISTORY_FETCH_LIMIT, default 10)"""
+    return max(1, int(os.getenv('HISTORY_FETCH_LIMIT', 10)))
+
+
+class HeuristicTokenizer:
+    """Estimación sin dependencias: un "token" cada CHARS_PER_TOKEN caracteres"""
+
+    name = 'heuristic'
+
+    def encode(self, text, disallowed_special=()):
+        return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+    def decode(self, tokens):
+        return ''.join(tokens)
+
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer(model=None):
+    """
+    Tokenizador del modelo (uno por proceso y modelo)
+
+    Returns:
+        Encoding de tiktoken, o HeuristicTokenizer si no está disponible
+    """
+    if TIKTOKEN_AVAILABLE:
+        try:
+            try:
+                return tiktoken.encoding_for_model(model or '')
+            except KeyError:
+                return tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            logger.warning(f"⚠️ tiktoken no pudo cargar el tokenizador ({e}), estimando tokens por caracteres")
+    return HeuristicTokenizer()
+
+
+def _encode(text, model):
+    # disallowed_special=(): el texto del usuario puede traer '<|endoftext|>'
+    return get_tokenizer(model).encode(text, disallowed_special=())
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text, model=None):
+    """Tokens del texto (los turnos del historial se vuelven a contar en cada mensaje: con caché)"""
+    return len(_encode(text or '', model))
+
+
+def truncate(text, max_tokens, model=None):
+    """Primeros max_tokens tokens del texto (con TRUNCATION_MARK si se recortó)"""
+    tokens = _encode(text, model)
+    if len(tokens) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(TRUNCATION_MARK, model))
+    return get_tokenizer(model).decode(tokens[:keep]).rstrip() + TRUNCATION_MARK
+
+
+def assemble_history(turns, model=None, budget=None, max_turn_tokens=None):
+    """
+    Turnos para el prompt dentro del presupuesto de tokens
+
+    Args:
+        turns: Mensajes en orden cronológico ({"role", "content"})
+        model: Modelo de OpenAI (elige el tokenizador)
+        budget: Tokens máximos (default HISTORY_TOKEN_BUDGET)
+        max_turn_tokens: Tokens máximos por turno (default HISTORY_MAX_TURN_TOKENS)
+
+    Returns:
+        Los turnos más nuevos que caben, en orden cronológico
+    """
+    budget = history_token_budget() if budget is None else budget
+    max_turn_tokens = history_max_turn_tokens() if max_turn_tokens is None else max_turn_tokens
+
+    selected = []
+    used = 0
+    full = 0
+    truncated = 0
+    fits = True
+
+    for turn in reversed(turns):
+        content = turn['content'] or ''
+        tokens = count_tokens(content, model)
+        full += tokens + TOKENS_PER_MESSAGE
+        if not fits:
+            continue
+
+        if tokens > max_turn_tokens:
+            content = truncate(content, max_turn_tokens, model)
+            tokens = count_tokens(content, model)
+            truncated += 1
+
+        if used + tokens + TOKENS_PER_MESSAGE > budget:
+            fits = False
+            continue
+        used += tokens + TOKENS_PER_MESSAGE
+        selected.append({"role": turn['role'], "content": content})
+
+    selected.reverse()
+    saved = full - used
+    dropped = len(turns) - len(selected)
+
+    metrics.observe('history_prompt_tokens', used)
+    if saved:
+        metrics.inc('history_tokens_saved_total', saved)
+        metrics.inc('history_turns_dropped_total', dropped)
+        metrics.inc('history_turns_truncated_total', truncated)
+        logger.info(f"[HISTORY] {len(selected)}/{len(turns)} turnos, {used} tokens "
+                    f"({saved} ahorrados, {truncated} recortados)")
+    return selected
@@ -0,0 +1,158 @@
+"""
+Deduplicación de webhooks de Twilio por MessageSid
+Twilio reintenta el webhook cuando respondemos lento; cada reintento trae el
+mismo MessageSid y no debe volver a pasar por el pipeline completo
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Prefijo para distinguir "respuesta guardada" de "en proceso" en Redis
+_REPLY_PREFIX = 'r:'
+
+
+class InMemoryIdempotencyStore:
+    """
+    LRU acotado con TTL, local a cada proceso
+    Cada entrada vale None mientras el mensaje se procesa y la respuesta al terminar
+    """
+
+    backend = 'memory'
+
+    def __init__(self, max_entries=None, ttl_seconds=None):
+        self.max_entries = max_entries or int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 10000))
+        self.ttl_seconds = ttl_seconds or int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 3600))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, message_sid):
+        """
+        Reserva un MessageSid
+
+        Returns:
+            Tuple (es_nuevo, respuesta_guardada)
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(message_sid)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(message_sid)
+                return False, entry[1]
+
+            self._entries[message_sid] = (now + self.ttl_seconds, None)
+            self._entries.move_to_end(message_sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return True, None
+
+    def store_reply(self, message_sid, reply):
+        """Guarda la respuesta generada para devolverla en los reintentos"""
+        with self._lock:
+            if message_sid in self._entries:
+                self._entries[message_sid] = (time.monotonic() + self.ttl_seconds, reply)
+
+    def release(self, message_sid):
+        """Libera la reserva (p.ej. si el procesamiento falló) para permitir el reintento"""
+        with self._lock:
+            self._entries.pop(message_sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisIdempotencyStore:
+    """Mismo contrato que InMemoryIdempotencyStore, compartido entre procesos vía Redis"""
+
+    backend = 'redis'
+
+    def __init__(self, client, ttl_seconds=None, key_prefix='bjj:msgsid:'):
+        self.client = client
+        self.ttl_seconds = ttl_seconds or int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 3600))
+        self.key_prefix = key_prefix
+
+    def _key(self, message_sid):
+        return f"{self.key_prefix}{message_sid}"
+
+    def claim(self, message_sid):
+        key = self._key(message_sid)
+        try:
+            if self.client.set(key, '', nx=True, ex=self.ttl_seconds):
+                return True, None
+
+            value = self.client.get(key)
+            if isinstance(value, bytes):
+                value = value.decode('utf-8')
+            if value and value.startswith(_REPLY_PREFIX):
+                return False, value[len(_REPLY_PREFIX):]
+            return False, None
+
+        except Exception as e:
+            # Si Redis falla, procesar el mensaje antes que perderlo
+            logger.error(f"❌ Error consultando Redis para {message_sid}: {e}")
+            return True, None
+
+    def store_reply(self, message_sid, reply):
+        try:
+            self.client.set(self._key(message_sid), _REPLY_PREFIX + reply, xx=True, ex=self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"❌ Error guardando respuesta en Redis para {message_sid}: {e}")
+
+    def release(self, message_sid):
+        try:
+            self.client.delete(self._key(message_sid))
+        except Exception as e:
+            logger.error(f"❌ Error liberando {message_sid} en Redis: {e}")
+
+
+class IdempotencyGuard:
+    """Envuelve un store y lleva contadores de hits/misses"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def claim(self, message_sid):
+        is_new, reply = self.store.claim(message_sid)
+        if is_new:
+            metrics.inc('idempotency_misses_total', backend=self.store.backend)
+        else:
+            metrics.inc('idempotency_hits_total', backend=self.store.backend)
+            logger.info(f"[IDEMPOTENCY] Reintento de Twilio ignorado: {message_sid}")
+        return is_new, reply
+
+    def store_reply(self, message_sid, reply):
+        self.store.store_reply(message_sid, reply)
+
+    def release(self, message_sid):
+        self.store.release(message_sid)
+
+
+def get_idempotency_store(redis_url=None):
+    """
+    Crea el store según IDEMPOTENCY_BACKEND ('memory' o 'redis')
+    Si Redis no está disponible, usa memoria
+
+    Args:
+        redis_url: URL de Redis de la configuración de la app (app.config['REDIS_URL']);
+                   sin ella (p. ej. en app.asgi) se usa REDIS_URL del entorno
+    """
+    backend = os.getenv('IDEMPOTENCY_BACKEND', 'memory').lower()
+
+    if backend == 'redis':
+        try:
+            import redis
+            client = redis.Redis.from_url(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+            client.ping()
+            logger.info("✅ Idempotencia de webhooks usando Redis")
+            return RedisIdempotencyStore(client)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis no disponible para idempotencia, usando memoria: {e}")
+
+    return InMemoryIdempotencyStore()
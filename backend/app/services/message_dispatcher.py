@@ -0,0 +1,148 @@
+"""
+Dispatcher de mensajes entrantes particionado por número de teléfono
+- Los mensajes de un mismo remitente se procesan estrictamente en orden
+- Remitentes distintos se procesan en paralelo (hilos o procesos)
+"""
+
+import os
+import time
+import zlib
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def dispatcher_enabled():
+    """Indica si el procesamiento síncrono debe pasar por el dispatcher"""
+    return os.getenv('MESSAGE_DISPATCHER', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _run_timed(enqueued_at, fn, args, kwargs):
+    """Ejecuta un trabajo y devuelve (inicio, resultado) - usado en modo proceso"""
+    started_at = time.time()
+    return started_at, fn(*args, **kwargs)
+
+
+class MessageDispatcher:
+    """
+    Reparte trabajos en N shards según un hash estable del teléfono
+    Cada shard es un executor de un solo worker, lo que garantiza el orden FIFO
+    por remitente; los shards corren en paralelo entre sí
+    """
+
+    def __init__(self, num_shards=None, mode=None):
+        self.num_shards = num_shards or int(os.getenv('MESSAGE_DISPATCHER_SHARDS', 8))
+        self.mode = (mode or os.getenv('MESSAGE_DISPATCHER_MODE', 'thread')).lower()
+
+        if self.mode not in ('thread', 'process'):
+            raise ValueError(f"Modo de dispatcher no válido: {self.mode}")
+
+        if self.mode == 'process':
+            self._executors = [ProcessPoolExecutor(max_workers=1) for _ in range(self.num_shards)]
+        else:
+            self._executors = [
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'shard-{i}')
+                for i in range(self.num_shards)
+            ]
+
+        self._locks = [threading.Lock() for _ in range(self.num_shards)]
+        self._depth = [0] * self.num_shards
+        self._depth_lock = threading.Lock()
+
+        logger.info(f"✅ MessageDispatcher iniciado: {self.num_shards} shards ({self.mode})")
+
+    def shard_for(self, phone_number):
+        """Shard asignado a un teléfono (estable entre procesos y reinicios)"""
+        return zlib.crc32((phone_number or '').encode('utf-8')) % self.num_shards
+
+    def lock_for(self, phone_number):
+        """Lock del shard de un teléfono, para trabajo que corre fuera del shard"""
+        return self._locks[self.shard_for(phone_number)]
+
+    def submit(self, phone_number, fn, *args, **kwargs):
+        """
+        Encola un trabajo en el shard del teléfono
+
+        En modo 'process' fn y sus argumentos deben ser serializables (pickle)
+
+        Returns:
+            Future con el resultado de fn
+        """
+        shard = self.shard_for(phone_number)
+        self._change_depth(shard, 1)
+        enqueued_at = time.time()
+
+        if self.mode == 'thread':
+            return self._executors[shard].submit(self._run, shard, enqueued_at, fn, args, kwargs)
+
+        # Modo proceso: el hijo devuelve (inicio, resultado) para medir la espera
+        outer = Future()
+        inner = self._executors[shard].submit(_run_timed, enqueued_at, fn, args, kwargs)
+
+        def _done(f):
+            self._change_depth(shard, -1)
+            try:
+                started_at, result = f.result()
+            except Exception as e:
+                outer.set_exception(e)
+                return
+            metrics.observe('dispatcher_wait_seconds', started_at - enqueued_at, shard=shard)
+            outer.set_result(result)
+
+        inner.add_done_callback(_done)
+        return outer
+
+    def _run(self, shard, enqueued_at, fn, args, kwargs):
+        """Ejecuta un trabajo dentro del hilo del shard"""
+        self._change_depth(shard, -1)
+        metrics.observe('dispatcher_wait_seconds', time.time() - enqueued_at, shard=shard)
+        return fn(*args, **kwargs)
+
+    def _change_depth(self, shard, delta):
+        with self._depth_lock:
+            self._depth[shard] += delta
+            depth = self._depth[shard]
+        metrics.set_gauge('dispatcher_queue_depth', depth, shard=shard)
+
+    def stats(self):
+        """Profundidad de cola y tiempos de espera por shard"""
+        with self._depth_lock:
+            depths = list(self._depth)
+
+        return [
+            {
+                'shard': shard,
+                'queue_depth': depths[shard],
+                'wait_seconds': metrics.get_histogram('dispatcher_wait_seconds', shard=shard)
+            }
+            for shard in range(self.num_shards)
+        ]
+
+    def shutdown(self, wait=True):
+        """Detiene todos los shards"""
+        for executor in self._executors:
+            executor.shutdown(wait=wait)
+
+
+# ========== TRABAJOS PARA MODO PROCESO ==========
+
+_worker_handler = None
+
+
+def get_worker_handler():
+    """MessageHandler propio de cada proceso worker (se crea una sola vez)"""
+    global _worker_handler
+    if _worker_handler is None:
+        from app.services.message_handler import MessageHandler
+        from app.utils.metrics import start_multiprocess_flusher
+        start_multiprocess_flusher()
+        _worker_handler = MessageHandler()
+    return _worker_handler
+
+
+def process_message_job(phone_number, message, name=None):
+    """Trabajo serializable que procesa un mensaje completo en un worker"""
+    return get_worker_handler().process_message(phone_number, message, name)
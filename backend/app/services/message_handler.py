@@ -7,7 +7,17 @@ import os
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
-from app.utils.database import get_db_connection, get_db_cursor
+from contextlib import contextmanager
+from app.utils.database import get_db_cursor, db_stage, unit_of_work, lock_key, default_db_path
+from app.utils.metrics import metrics
+from app.utils.queries import queries
+from app.utils import lead_summary
+from app.services.group_commit import group_commit_enabled, get_group_commit_writer
+from app.services.faq_fast_path import FaqFastPath, fast_path_enabled
+from app.services.semantic_cache import semantic_cache_enabled, get_semantic_cache, prompt_version
+from app.services.history_assembler import assemble_history, history_fetch_limit
+from app.services.conversation_summary import summary_message
+from app.services.prompt_compiler import get_prompt_compiler, render_lead_context
 
 # Cargar variables de entorno
 load_dotenv(override=True)
@@ -31,13 +41,16 @@ class MessageHandler:
     """
     
     def __init__(self):
-        self.db_path = 'bjj_academy.db'
+        self.db_path = default_db_path()
         self.openai_client = None
         self.ai_enabled = False
         
         # Intentar inicializar OpenAI
         self._initialize_openai()
         
+        # Preguntas frecuentes respondidas con plantillas de academy_info
+        self.fast_path = FaqFastPath()
+        
         # Importar AppointmentScheduler
         try:
             from app.services.appointment_scheduler import AppointmentScheduler
@@ -88,30 +101,93 @@ class MessageHandler:
     def process_message(self, phone_number, message, name=None):
         """
         Procesar mensaje - SIEMPRE intenta IA primero
+        Dos transacciones cortas: antes de OpenAI (guardar + leer contexto)
+        y después (guardar respuesta + actualizar lead). La llamada a OpenAI
+        no retiene el lock de escritura
         """
         logger.info(f"\n[PHONE] Mensaje de {phone_number}: {message}")
         
+        # Transacción 1: lead, conversación, mensaje del usuario y contexto
+        def persist(cursor):
+            lead_id, conv_id = self._persist_inbound(cursor, phone_number, message, name)
+            context = self._load_context(lead_id, conv_id, cursor=cursor) if self.ai_enabled else None
+            return lead_id, conv_id, context
+        
+        with db_stage('persist'):
+            lead_id, conv_id, context = self._write(persist)
+        
+        # Respuesta de IA (sin transacción abierta) + transacción 2
+        return self.generate_reply(lead_id, conv_id, message, context=context)
+    
+    def persist_inbound(self, phone_number, message, name=None):
+        """
+        Guarda el mensaje entrante (lead + conversación + mensaje)
+        Es la parte rápida del pipeline: no llama a OpenAI
+        
+        Returns:
+            Tuple (lead_id, conv_id)
+        """
+        with db_stage('persist'):
+            return self._write(lambda cursor: self._persist_inbound(cursor, phone_number, message, name))
+    
+    def _persist_inbound(self, cursor, phone_number, message, name=None):
+        """Pasos 1-3 dentro de la unidad de trabajo recibida"""
         # 1. Obtener o crear lead
-        lead_id = self._get_or_create_lead(phone_number, name)
+        lead_id = self._get_or_create_lead(phone_number, name, cursor=cursor)
         
         # 2. Obtener o crear conversación
-        conv_id = self._get_or_create_conversation(lead_id)
+        conv_id = self._get_or_create_conversation(lead_id, cursor=cursor)
         
         # 3. Guardar mensaje del usuario
-        self._save_message(conv_id, 'user', message)
+        self._save_message(conv_id, 'user', message, cursor=cursor)
         
-        # 4. INTENTAR GENERAR RESPUESTA CON IA
-        response = self._generate_ai_response(message, lead_id, conv_id)
+        return lead_id, conv_id
+    
+    def generate_reply(self, lead_id, conv_id, message, context=None):
+        """
+        Genera la respuesta para un mensaje ya guardado
+        Es la parte lenta del pipeline (OpenAI + agendamiento)
+        
+        Args:
+            context: (lead_info, academy_info, history, summary) ya leído en
+                la transacción del mensaje entrante; si es None se lee aquí
+        """
+        # 4. Preguntas frecuentes con plantilla; el resto, RESPUESTA CON IA
+        response, intent = self._fast_path_reply(message)
+        if response is None:
+            response = self._generate_ai_response(message, lead_id, conv_id, context=context)
         
-        # 5. Guardar respuesta del bot
-        self._save_message(conv_id, 'assistant', response)
+        # Transacción 2: respuesta del bot + estado del lead
+        def save_reply(cursor):
+            # 5. Guardar respuesta del bot
+            self._save_message(conv_id, 'assistant', response, intent=intent, cursor=cursor)
+            
+            # 6. Actualizar lead
+            self._update_lead_status(lead_id, message, cursor=cursor)
         
-        # 6. Actualizar lead
-        self._update_lead_status(lead_id, message)
+        with db_stage('save_reply'):
+            self._write(save_reply)
         
         return response
     
-    def _generate_ai_response(self, message, lead_id, conv_id):
+    def _fast_path_reply(self, message):
+        """
+        Respuesta de plantilla si el mensaje es una pregunta frecuente clara
+        
+        Returns:
+            Tuple (respuesta, intent a guardar) o (None, None) si va a OpenAI
+        """
+        if not fast_path_enabled():
+            return None, None
+        
+        answer = self.fast_path.reply(message)
+        if not answer:
+            return None, None
+        
+        intent, response = answer
+        return response, f'fast_path:{intent}'
+    
+    def _generate_ai_response(self, message, lead_id, conv_id, context=None):
         """
         Genera respuesta PRIORIZANDO IA + detección de agendamiento
         """
@@ -122,33 +198,40 @@ class MessageHandler:
                 logger.info("[DEBUG] Usando OpenAI para generar respuesta")
                 
                 # Obtener información del lead y academia
-                lead_info = self._get_lead_info(lead_id)
-                academy_info = self._get_academy_info()
-                history = self._get_conversation_history(conv_id, limit=5)
+                if context is None:
+                    with db_stage('context'):
+                        context = self._load_context(lead_id, conv_id)
+                lead_info, academy_info, history, summary = context
                 
                 logger.info(f"[DEBUG] Lead: {lead_info['name']}, Conv ID: {conv_id}")
                 
+                # Misma pregunta ya respondida a otro lead (caché semántica)
+                cached, cache_key = self._cached_reply(message, academy_info, history)
+                if cached:
+                    return cached
+                
                 # Construir prompt del sistema
                 system_prompt = self._build_system_prompt(academy_info, lead_info)
                 
                 # Construir mensajes para OpenAI
                 messages = [{"role": "system", "content": system_prompt}]
                 
-                # Agregar historial
-                for msg in history:
-                    role = "user" if msg['sender'] == 'user' else "assistant"
-                    messages.append({"role": role, "content": msg['content']})
+                # Agregar resumen de los mensajes viejos + historial (sin los
+                # mensajes del turno actual, que ya están guardados y van abajo
+                # como un solo mensaje), dentro del presupuesto de tokens
+                messages.extend(self._prompt_history(history, summary))
                 
                 # Agregar mensaje actual
                 messages.append({"role": "user", "content": message})
                 
                 # Llamar a OpenAI
-                response = self.openai_client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature
-                )
+                with metrics.timer('message_stage_seconds', stage='openai'):
+                    response = self.openai_client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature
+                    )
                 
                 ai_response = response.choices[0].message.content
 
@@ -161,15 +244,18 @@ class MessageHandler:
                     logger.info("[BOOKING] Intención de agendamiento detectada")
 
                     # Intentar parsear la fecha/hora del mensaje
-                    parsed = self.scheduler.parse_appointment_request(message, lead_id)
+                    with metrics.timer('message_stage_seconds', stage='booking_parse'):
+                        parsed = self.scheduler.parse_appointment_request(message, lead_id)
 
                     if parsed['parsed']:
                         # Crear la semana de prueba
-                        result = self.scheduler.book_trial_week(
-                            lead_id,
-                            parsed.get('clase_tipo', 'adultos_jiujitsu'),
-                            f"Agendado via WhatsApp: {message}"
-                        )
+                        with db_stage('booking'), \
+                                metrics.timer('message_stage_seconds', stage='book_trial_week'):
+                            result = self.scheduler.book_trial_week(
+                                lead_id,
+                                parsed.get('clase_tipo', 'adultos_jiujitsu'),
+                                f"Agendado via WhatsApp: {message}"
+                            )
 
                         if result['success']:
                             logger.info(f"[BOOKING] Semana de prueba registrada")
@@ -179,6 +265,9 @@ class MessageHandler:
                     else:
                         logger.info("[BOOKING] No se pudo parsear fecha/hora")
 
+                if not booking_detected:
+                    self._remember_reply(cache_key, message, ai_response, lead_info)
+
                 # OpenAI ahora maneja el CTA de forma natural - no agregamos nada automáticamente
                 return ai_response
                 
@@ -190,6 +279,56 @@ class MessageHandler:
         logger.warning("[FALLBACK] OpenAI no disponible, usando respuesta de emergencia")
         return self._get_emergency_response(message)
     
+    def _strip_pending_turn(self, history):
+        """
+        Quita del final del historial los mensajes del usuario aún sin respuesta
+        Son el turno actual (uno o varios si fue una ráfaga)
+        """
+        end = len(history)
+        while end > 0 and history[end - 1]['sender'] == 'user':
+            end -= 1
+        return history[:end]
+    
+    def _history_turns(self, history):
+        """Historial en formato de OpenAI, sin el turno pendiente"""
+        return [{"role": "user" if msg['sender'] == 'user' else "assistant", "content": msg['content']}
+                for msg in self._strip_pending_turn(history)]
+    
+    def _prompt_history(self, history, summary):
+        """Resumen (si hay) + los mensajes posteriores al resumen, dentro del presupuesto de tokens"""
+        messages = []
+        if summary:
+            messages.append(summary_message(summary['summary']))
+            history = [msg for msg in history if msg['id'] > summary['through_id']]
+        return messages + assemble_history(self._history_turns(history), self.model)
+    
+    def _cached_reply(self, message, academy_info, history):
+        """
+        Respuesta de la caché semántica para el primer turno de una conversación
+        Después del primer turno la respuesta depende del historial, y los
+        mensajes de agendamiento tienen que pasar por la detección de reservas
+        
+        Returns:
+            Tuple (respuesta o None, clave (academia, versión del prompt) o None)
+        """
+        if not semantic_cache_enabled() or self._strip_pending_turn(history) \
+                or self.fast_path.classify(message)['blocked']:
+            return None, None
+        
+        cache_key = (academy_info.get('name') or 'default',
+                     prompt_version(self._get_base_prompt(academy_info), self.model, self.temperature))
+        return get_semantic_cache().lookup(cache_key[0], message, cache_key[1]), cache_key
+    
+    def _remember_reply(self, cache_key, message, reply, lead_info):
+        """Guarda la respuesta en la caché semántica si no es personal (no nombra al lead)"""
+        if not cache_key or not reply:
+            return
+        name = (lead_info.get('name') or '').strip()
+        if name and name != 'WhatsApp User' and name.split()[0].lower() in reply.lower():
+            return
+        get_semantic_cache().store(cache_key[0], message, cache_key[1], reply)
+    
+    @metrics.timed('message_stage_seconds', stage='booking_detect')
     def _detect_booking_intent(self, user_message, ai_response, history):
         """
         Detecta si el usuario está intentando agendar una clase
@@ -235,26 +374,23 @@ class MessageHandler:
         
         return False
     
+    @metrics.timed('message_stage_seconds', stage='prompt_build')
     def _build_system_prompt(self, academy_info, lead_info):
-        """Construir prompt del sistema usando academy_info.py"""
-        try:
-            from app.config.academy_info import get_system_prompt_base
-            base_prompt = get_system_prompt_base()
-        except ImportError:
+        """Prompt del sistema: prefijo estable de academy_info.py + contexto del prospecto al final"""
+        return self._get_base_prompt(academy_info) + render_lead_context([
+            ('Nombre', lead_info.get('name', 'No proporcionado')),
+            ('Teléfono', lead_info.get('phone')),
+            ('Estado actual', lead_info.get('status')),
+            ('Fuente', lead_info.get('source', 'WhatsApp')),
+        ])
+    
+    def _get_base_prompt(self, academy_info):
+        """Parte del prompt que no depende del lead (prefijo precompilado o el prompt por defecto)"""
+        prefix = get_prompt_compiler().get_prefix()
+        if prefix is None:
             logger.warning("No se pudo importar academy_info, usando prompt por defecto")
-            base_prompt = self._get_default_system_prompt(academy_info)
-        
-        # Agregar información del prospecto
-        lead_context = f"""
-
-CONTEXTO DEL PROSPECTO:
-- Nombre: {lead_info.get('name', 'No proporcionado')}
-- Teléfono: {lead_info.get('phone')}
-- Estado actual: {lead_info.get('status')}
-- Fuente: {lead_info.get('source', 'WhatsApp')}
-"""
-        
-        return base_prompt + lead_context
+            return self._get_default_system_prompt(academy_info)
+        return prefix
     
     def _get_default_system_prompt(self, academy_info):
         """Prompt por defecto si no se puede importar academy_info"""
@@ -286,6 +422,37 @@ INSTRUCCIONES:
 6. Mencioná que la semana de prueba es GRATIS
 """
     
+    def process_degraded(self, phone_number, message, name=None):
+        """
+        Camino rápido bajo sobrecarga: responde sin llamar a OpenAI
+        El mensaje y la respuesta igual quedan guardados en el historial
+        """
+        response = self._get_degraded_response(message)
+        
+        try:
+            def persist(cursor):
+                lead_id, conv_id = self._persist_inbound(cursor, phone_number, message, name)
+                self._save_message(conv_id, 'assistant', response, intent='degraded', cursor=cursor)
+            
+            with db_stage('persist'):
+                self._write(persist)
+        except Exception as e:
+            logger.error(f"[DEGRADED] No se pudo guardar el mensaje: {e}")
+        
+        return response
+    
+    def _get_degraded_response(self, message):
+        """
+        Respuesta con la info de academy_info si la pregunta es de precios/horarios/ubicación
+        Usa el clasificador del camino rápido sin umbral: bajo sobrecarga
+        cualquier palabra clave alcanza
+        """
+        answer = self.fast_path.answer(message, threshold=0)
+        if answer:
+            return answer[1]
+        
+        return self._get_emergency_response(message)
+    
     def _get_emergency_response(self, message):
         """Respuesta de emergencia cuando OpenAI no funciona"""
         return (
@@ -297,63 +464,83 @@ INSTRUCCIONES:
         )
     
     # ========== MÉTODOS DE BASE DE DATOS ==========
+    # Todos aceptan el cursor de una unidad de trabajo en curso; sin cursor
+    # abren su propia conexión
+    
+    def _write(self, work):
+        """
+        Ejecuta work(cursor) en una transacción de escritura y devuelve su resultado
+        Con DB_GROUP_COMMIT=true se confirma junto con las de otros hilos
+        (un COMMIT por lote); si no, en una unidad de trabajo propia
+        """
+        if group_commit_enabled():
+            return get_group_commit_writer(self.db_path).run(work)
+        
+        with unit_of_work(db_path=self.db_path) as cursor:
+            return work(cursor)
+    
+    @contextmanager
+    def _cursor(self, cursor=None):
+        """Cursor recibido o uno propio que hace commit al salir"""
+        if cursor is not None:
+            yield cursor
+        else:
+            with get_db_cursor(db_path=self.db_path) as own:
+                yield own
     
-    def _get_or_create_lead(self, phone_number, name=None):
+    def _load_context(self, lead_id, conv_id, limit=None, cursor=None):
+        """Lee lead, academia e historial (en el cursor recibido o en una sola conexión)"""
+        limit = limit or history_fetch_limit()
+        with self._cursor(cursor) as cursor:
+            lead_info = self._get_lead_info(lead_id, cursor=cursor)
+            academy_info = self._get_academy_info(cursor=cursor)
+            history = self._get_conversation_history(conv_id, limit=limit, cursor=cursor)
+            summary = self._get_conversation_summary(conv_id, cursor=cursor)
+        return lead_info, academy_info, history, summary
+    
+    @metrics.timed('message_stage_seconds', stage='lead_lookup')
+    def _get_or_create_lead(self, phone_number, name=None, cursor=None):
         """Obtener o crear lead"""
-        with get_db_cursor(db_path=self.db_path) as cursor:
-            cursor.execute("SELECT id, name FROM lead WHERE phone_number = ?", (phone_number,))
-            lead = cursor.fetchone()
+        with self._cursor(cursor) as cursor:
+            # En PostgreSQL, otro worker con el mismo teléfono espera hasta el commit
+            # (evita leads y conversaciones activas duplicadas)
+            lock_key(cursor, phone_number)
+            lead = queries.fetchone(cursor, 'lead.by_phone', (phone_number,))
 
             if not lead:
-                cursor.execute("""
-                    INSERT INTO lead (academy_id, phone_number, name, source, status, interest_level)
-                    VALUES (1, ?, ?, 'whatsapp', 'new', 5)
-                """, (phone_number, name or 'WhatsApp User'))
+                queries.execute(cursor, 'lead.insert', (phone_number, name or 'WhatsApp User'))
                 lead_id = cursor.lastrowid
             else:
                 lead_id = lead[0]
 
         return lead_id
     
-    def _get_or_create_conversation(self, lead_id):
+    @metrics.timed('message_stage_seconds', stage='conversation_lookup')
+    def _get_or_create_conversation(self, lead_id, cursor=None):
         """Obtener o crear conversación"""
-        with get_db_cursor(db_path=self.db_path) as cursor:
-            cursor.execute("""
-                SELECT id FROM conversation
-                WHERE lead_id = ? AND status = 'active'
-            """, (lead_id,))
-            conv = cursor.fetchone()
+        with self._cursor(cursor) as cursor:
+            conv = queries.fetchone(cursor, 'conversation.active_by_lead', (lead_id,))
 
             if not conv:
-                cursor.execute("""
-                    INSERT INTO conversation (lead_id, academy_id, status)
-                    VALUES (?, 1, 'active')
-                """, (lead_id,))
+                queries.execute(cursor, 'conversation.insert', (lead_id,))
                 conv_id = cursor.lastrowid
             else:
                 conv_id = conv[0]
 
         return conv_id
     
-    def _save_message(self, conv_id, sender, content, intent=None):
+    @metrics.timed('message_stage_seconds', stage='save_message')
+    def _save_message(self, conv_id, sender, content, intent=None, cursor=None):
         """Guardar mensaje"""
-        with get_db_cursor(db_path=self.db_path) as cursor:
-            cursor.execute("""
-                INSERT INTO message (conversation_id, sender, content, intent_detected)
-                VALUES (?, ?, ?, ?)
-            """, (conv_id, sender, content, intent))
+        with self._cursor(cursor) as cursor:
+            queries.execute(cursor, 'message.insert', (conv_id, sender, content, intent))
+            lead_summary.record_message(cursor, cursor.lastrowid)
     
-    def _get_lead_info(self, lead_id):
+    @metrics.timed('message_stage_seconds', stage='lead_info')
+    def _get_lead_info(self, lead_id, cursor=None):
         """Obtener información del lead"""
-        with get_db_connection(db_path=self.db_path) as conn:
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT id, phone_number, name, status, interest_level, source
-                FROM lead WHERE id = ?
-            """, (lead_id,))
-
-            row = cursor.fetchone()
+        with self._cursor(cursor) as cursor:
+            row = queries.fetchone(cursor, 'lead.info', (lead_id,))
 
             if row:
                 return {
@@ -366,18 +553,11 @@ INSTRUCCIONES:
                 }
         return {}
     
-    def _get_academy_info(self):
+    @metrics.timed('message_stage_seconds', stage='academy_info')
+    def _get_academy_info(self, cursor=None):
         """Obtener información de la academia"""
-        with get_db_connection(db_path=self.db_path) as conn:
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT name, description, instructor_name, instructor_belt,
-                       phone, address_street, address_city
-                FROM academy WHERE id = 1
-            """)
-
-            row = cursor.fetchone()
+        with self._cursor(cursor) as cursor:
+            row = queries.fetchone(cursor, 'academy.info')
 
             if row:
                 return {
@@ -389,47 +569,40 @@ INSTRUCCIONES:
                 }
         return {'name': 'BJJ Mingo', 'phone': '+506-8888-8888'}
     
-    def _get_conversation_history(self, conv_id, limit=5):
+    @metrics.timed('message_stage_seconds', stage='history_fetch')
+    def _get_conversation_history(self, conv_id, limit=5, cursor=None):
         """Obtener historial de conversación"""
-        with get_db_connection(db_path=self.db_path) as conn:
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT sender, content, timestamp
-                FROM message
-                WHERE conversation_id = ?
-                ORDER BY id DESC
-                LIMIT ?
-            """, (conv_id, limit))
-
+        with self._cursor(cursor) as cursor:
             messages = []
-            for row in cursor.fetchall():
+            for row in queries.fetchall(cursor, 'message.history', (conv_id, limit)):
                 messages.append({
                     'sender': row[0],
                     'content': row[1],
-                    'timestamp': row[2]
+                    'timestamp': row[2],
+                    'id': row[3]
                 })
 
         # Invertir para orden cronológico
         messages.reverse()
         return messages
     
-    def _update_lead_status(self, lead_id, message):
+    def _get_conversation_summary(self, conv_id, cursor=None):
+        """Resumen de los mensajes viejos (tarea summarize_conversations), o None"""
+        with self._cursor(cursor) as cursor:
+            row = queries.fetchone(cursor, 'conversation.summary', (conv_id,))
+        if not row or not row[0]:
+            return None
+        return {'summary': row[0], 'through_id': row[1] or 0}
+    
+    @metrics.timed('message_stage_seconds', stage='status_update')
+    def _update_lead_status(self, lead_id, message, cursor=None):
         """Actualizar estado del lead"""
         msg_lower = message.lower()
 
-        with get_db_cursor(db_path=self.db_path) as cursor:
+        with self._cursor(cursor) as cursor:
             # Si muestra interés en clase
             if any(word in msg_lower for word in ['agendar', 'clase', 'prueba', 'probar', 'semana']):
-                cursor.execute("""
-                    UPDATE lead
-                    SET status = 'interested', interest_level = 8
-                    WHERE id = ? AND status != 'scheduled'
-                """, (lead_id,))
+                queries.execute(cursor, 'lead.mark_interested', (lead_id,))
             # Si es primera interacción
             else:
-                cursor.execute("""
-                    UPDATE lead
-                    SET status = 'contacted'
-                    WHERE id = ? AND status = 'new'
-                """, (lead_id,))
\ No newline at end of file
+                queries.execute(cursor, 'lead.mark_contacted', (lead_id,))
\ No newline at end of file
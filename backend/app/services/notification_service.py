@@ -42,6 +42,13 @@ class NotificationService:
                 return
 
             self.client = Client(account_sid, auth_token)
+
+            # Permite apuntar a un Twilio falso (pruebas de carga sin red)
+            api_base_url = os.getenv('TWILIO_API_BASE_URL')
+            if api_base_url:
+                self.client.api.base_url = api_base_url
+                logger.info(f"⚠️ Twilio API redirigida a {api_base_url}")
+
             self.twilio_available = True
 
             logger.info("✅ NotificationService inicializado con Twilio")
@@ -0,0 +1,156 @@
+"""
+Prompt del sistema precompilado, con un prefijo estable
+El prompt base (~3.3 KB de academy_info.py) es igual para todos los leads;
+lo único que cambia por mensaje es el contexto del prospecto. El compilador
+arma el prefijo una vez por versión de la configuración, lo normaliza y lo
+firma, y cada prompt es:
+
+    prefijo estable (idéntico byte a byte) + contexto del prospecto al final
+
+Así el caché de prompts del proveedor (que reconoce prefijos exactos)
+puede acertar, y armar el prompt es una concatenación
+
+La versión de la configuración es la huella del prompt base ya armado
+(ACADEMY_INFO más los textos de horarios y precios); se revisa a lo sumo
+cada PROMPT_CONFIG_CHECK_SECONDS (default 30) y solo si cambió se vuelve a
+compilar. invalidate() fuerza la recompilación
+
+Métricas:
+- system_prompt_compiles_total y system_prompt_compile_seconds
+- system_prompt_prefix_bytes
+- system_prompt_prefix_info{hash, version} = 1 para el prefijo vigente
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def _normalize(text):
+    """Mismos bytes siempre: saltos de línea \\n, sin espacios al final de las líneas ni del texto"""
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip() + '\n'
+
+
+def render_lead_context(fields):
+    """
+    Parte variable del prompt (va después del prefijo)
+
+    Args:
+        fields: Lista de (etiqueta, valor) en orden fijo
+    """
+    lines = '\n'.join(f"- {label}: {value}" for label, value in fields)
+    return f"\nCONTEXTO DEL PROSPECTO:\n{lines}\n"
+
+
+class SystemPromptCompiler:
+    """Prefijo del prompt compilado una vez por versión de academy_info"""
+
+    def __init__(self, check_seconds=None):
+        if check_seconds is None:
+            check_seconds = float(os.getenv('PROMPT_CONFIG_CHECK_SECONDS', 30))
+        self.check_seconds = check_seconds
+        self.prefix = None
+        self.prefix_hash = None
+        self.version = None
+        self.compiled_at = None
+        self.compiles = 0
+        self._next_check = 0.0
+        self._force = False
+        self._lock = threading.Lock()
+
+    def _render_base(self):
+        """Prompt base armado, o None si academy_info no está disponible"""
+        try:
+            from app.config.academy_info import get_system_prompt_base
+        except ImportError:
+            return None
+        return get_system_prompt_base()
+
+    def _compile(self, version, base):
+        started = time.perf_counter()
+        prefix = _normalize(base)
+        elapsed = time.perf_counter() - started
+
+        if self.prefix_hash:
+            metrics.set_gauge('system_prompt_prefix_info', 0, hash=self.prefix_hash, version=self.version)
+        self.prefix, self.prefix_hash, self.version = prefix, _digest(prefix), version
+        self.compiled_at = datetime.now().isoformat(timespec='seconds')
+        self.compiles += 1
+
+        metrics.inc('system_prompt_compiles_total')
+        metrics.observe('system_prompt_compile_seconds', elapsed)
+        metrics.set_gauge('system_prompt_prefix_bytes', len(prefix.encode('utf-8')))
+        metrics.set_gauge('system_prompt_prefix_info', 1, hash=self.prefix_hash, version=version)
+        logger.info(f"🧩 Prompt del sistema compilado: {len(prefix)} caracteres, hash {self.prefix_hash} "
+                    f"(config {version})")
+
+    def get_prefix(self):
+        """
+        Prefijo vigente (recompila si la configuración cambió)
+
+        Returns:
+            Texto del prefijo, o None si academy_info no está disponible
+        """
+        now = time.monotonic()
+        if now < self._next_check:
+            return self.prefix
+
+        with self._lock:
+            if now >= self._next_check:
+                # La huella es del texto armado: horarios y precios no están en ACADEMY_INFO
+                base = self._render_base()
+                version = _digest(base) if base is not None else None
+                if version is None:
+                    self.prefix = self.prefix_hash = self.version = None
+                elif self._force or version != self.version:
+                    self._compile(version, base)
+                    self._force = False
+                self._next_check = now + self.check_seconds
+        return self.prefix
+
+    def invalidate(self):
+        """Recompila en la próxima llamada aunque la huella no haya cambiado"""
+        with self._lock:
+            self._next_check = 0.0
+            self._force = True
+
+    def stats(self):
+        """Prefijo vigente para /webhook/stats"""
+        return {
+            'prefix_hash': self.prefix_hash,
+            'prefix_bytes': len(self.prefix.encode('utf-8')) if self.prefix else 0,
+            'config_version': self.version,
+            'compiled_at': self.compiled_at,
+            'compiles': self.compiles,
+        }
+
+
+_compiler = None
+_compiler_lock = threading.Lock()
+
+
+def get_prompt_compiler():
+    """Compilador compartido del proceso (MessageHandler, AsyncMessageHandler, AIService)"""
+    global _compiler
+    with _compiler_lock:
+        if _compiler is None:
+            _compiler = SystemPromptCompiler()
+        return _compiler
+
+
+def reset_prompt_compiler():
+    """Descarta el compilador del proceso (tests)"""
+    global _compiler
+    with _compiler_lock:
+        _compiler = None
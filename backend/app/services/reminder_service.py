@@ -8,7 +8,9 @@ import os
 import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from app.utils.database import get_db_connection, get_db_cursor
+from app.utils.database import get_db_connection, get_db_cursor, default_db_path
+from app.utils.metrics import metrics
+from app.utils.queries import queries
 
 load_dotenv(override=True)
 
@@ -24,7 +26,7 @@ class ReminderService:
     """
 
     def __init__(self):
-        self.db_path = 'bjj_academy.db'
+        self.db_path = default_db_path()
 
         # Inicializar servicio de notificaciones Twilio
         try:
@@ -64,6 +66,7 @@ class ReminderService:
             4: 'Jueves', 5: 'Viernes', 6: 'Sábado', 7: 'Domingo'
         }
 
+    @metrics.timed('reminder_stage_seconds', stage='schedule_trial_week')
     def schedule_trial_week_reminders(self, lead_id, trial_week_id, clase_tipo, start_date):
         """
         Programa recordatorios para toda la semana de prueba
@@ -135,6 +138,7 @@ class ReminderService:
             logger.error(f"Error programando recordatorios: {e}")
             return {'success': False, 'message': str(e)}
 
+    @metrics.timed('reminder_stage_seconds', stage='create_reminder')
     def _create_reminder(self, lead_id, trial_week_id=None, appointment_id=None,
                         clase_tipo='adultos_jiujitsu', class_datetime=None):
         """
@@ -146,23 +150,16 @@ class ReminderService:
         try:
             with get_db_cursor(db_path=self.db_path) as cursor:
                 # Verificar si ya existe un recordatorio para esta clase
-                cursor.execute("""
-                    SELECT id FROM class_reminders
-                    WHERE lead_id = ? AND class_datetime = ?
-                """, (lead_id, class_datetime.strftime('%Y-%m-%d %H:%M:%S')))
-
-                existing = cursor.fetchone()
+                existing = queries.fetchone(cursor, 'reminder.by_lead_and_time',
+                                            (lead_id, class_datetime.strftime('%Y-%m-%d %H:%M:%S')))
                 if existing:
                     logger.info(f"Recordatorio ya existe para lead {lead_id} en {class_datetime}")
                     return existing[0]
 
                 # Crear nuevo recordatorio
-                cursor.execute("""
-                    INSERT INTO class_reminders
-                    (lead_id, trial_week_id, appointment_id, clase_tipo, class_datetime, reminder_status)
-                    VALUES (?, ?, ?, ?, ?, 'pending')
-                """, (lead_id, trial_week_id, appointment_id, clase_tipo,
-                     class_datetime.strftime('%Y-%m-%d %H:%M:%S')))
+                queries.execute(cursor, 'reminder.insert', (
+                    lead_id, trial_week_id, appointment_id, clase_tipo,
+                    class_datetime.strftime('%Y-%m-%d %H:%M:%S')))
 
                 reminder_id = cursor.lastrowid
                 logger.info(f"Recordatorio creado: ID {reminder_id} para {class_datetime}")
@@ -172,6 +169,7 @@ class ReminderService:
             logger.error(f"Error creando recordatorio: {e}")
             return None
 
+    @metrics.timed('reminder_stage_seconds', stage='check_cycle')
     def check_and_send_reminders(self):
         """
         Verifica qué clases están a 24 horas y envía recordatorios
@@ -189,26 +187,11 @@ class ReminderService:
             logger.info(f"🔍 Buscando recordatorios entre {window_start} y {window_end}")
 
             # Buscar recordatorios pendientes en la ventana de tiempo
-            with get_db_connection(db_path=self.db_path) as conn:
-                cursor = conn.cursor()
-
-                cursor.execute("""
-                    SELECT
-                        cr.id,
-                        cr.lead_id,
-                        cr.clase_tipo,
-                        cr.class_datetime,
-                        l.name,
-                        l.phone_number
-                    FROM class_reminders cr
-                    JOIN lead l ON cr.lead_id = l.id
-                    WHERE cr.reminder_status = 'pending'
-                    AND cr.class_datetime BETWEEN ? AND ?
-                    ORDER BY cr.class_datetime
-                """, (window_start.strftime('%Y-%m-%d %H:%M:%S'),
-                     window_end.strftime('%Y-%m-%d %H:%M:%S')))
-
-                pending_reminders = cursor.fetchall()
+            with metrics.timer('reminder_stage_seconds', stage='query_due'), \
+                    get_db_connection(db_path=self.db_path) as conn:
+                pending_reminders = queries.fetchall(conn, 'reminder.due', (
+                    window_start.strftime('%Y-%m-%d %H:%M:%S'),
+                    window_end.strftime('%Y-%m-%d %H:%M:%S')))
 
             if not pending_reminders:
                 logger.info("No hay recordatorios pendientes en esta ventana")
@@ -249,6 +232,7 @@ class ReminderService:
             logger.error(f"Error verificando recordatorios: {e}")
             return {'success': False, 'error': str(e)}
 
+    @metrics.timed('reminder_stage_seconds', stage='send_reminder')
     def _send_reminder(self, reminder_id, lead_name, phone, clase_tipo, class_datetime_str):
         """
         Envía un recordatorio individual por WhatsApp
@@ -290,7 +274,8 @@ BJJ Mingo"""
 
             # Enviar mensaje por WhatsApp
             if self.notifier and self.notifier.twilio_available:
-                send_result = self.notifier._send_whatsapp_notification(phone, message)
+                with metrics.timer('reminder_stage_seconds', stage='whatsapp_send'):
+                    send_result = self.notifier._send_whatsapp_notification(phone, message)
 
                 if send_result['success']:
                     # Marcar como enviado
@@ -332,6 +317,7 @@ BJJ Mingo"""
             )
             return {'success': False, 'message': str(e)}
 
+    @metrics.timed('reminder_stage_seconds', stage='update_status')
     def _update_reminder_status(self, reminder_id, status, sent_at=None, error_message=None):
         """
         Actualiza el estado de un recordatorio
@@ -339,23 +325,12 @@ BJJ Mingo"""
         try:
             with get_db_cursor(db_path=self.db_path) as cursor:
                 if sent_at:
-                    cursor.execute("""
-                        UPDATE class_reminders
-                        SET reminder_status = ?, reminder_sent_at = ?
-                        WHERE id = ?
-                    """, (status, sent_at.strftime('%Y-%m-%d %H:%M:%S'), reminder_id))
+                    queries.execute(cursor, 'reminder.mark_sent',
+                                    (status, sent_at.strftime('%Y-%m-%d %H:%M:%S'), reminder_id))
                 elif error_message:
-                    cursor.execute("""
-                        UPDATE class_reminders
-                        SET reminder_status = ?, error_message = ?
-                        WHERE id = ?
-                    """, (status, error_message, reminder_id))
+                    queries.execute(cursor, 'reminder.mark_failed', (status, error_message, reminder_id))
                 else:
-                    cursor.execute("""
-                        UPDATE class_reminders
-                        SET reminder_status = ?
-                        WHERE id = ?
-                    """, (status, reminder_id))
+                    queries.execute(cursor, 'reminder.set_status', (status, reminder_id))
 
                 logger.info(f"Recordatorio {reminder_id} actualizado a estado: {status}")
 
@@ -369,13 +344,9 @@ BJJ Mingo"""
         """
         try:
             with get_db_connection(db_path=self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT COUNT(*) FROM class_reminders
-                    WHERE reminder_status = 'pending'
-                    AND class_datetime > datetime('now')
-                """)
-                count = cursor.fetchone()[0]
+                # Hora UTC como parámetro (igual que datetime('now')), válido en SQLite y PostgreSQL
+                count = queries.fetchone(conn, 'reminder.pending_count',
+                                         (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),))[0]
                 return count
         except Exception as e:
             logger.error(f"Error contando recordatorios: {e}")
@@ -389,11 +360,7 @@ BJJ Mingo"""
         try:
             # Obtener información del lead
             with get_db_connection(db_path=self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT name, phone_number FROM lead WHERE id = ?
-                """, (lead_id,))
-                lead_data = cursor.fetchone()
+                lead_data = queries.fetchone(conn, 'lead.contact', (lead_id,))
 
             if not lead_data:
                 return {'success': False, 'message': f'Lead {lead_id} no encontrado'}
@@ -0,0 +1,262 @@
+"""
+Caché semántica de respuestas de OpenAI
+Muchos leads mandan casi la misma pregunta; si una pregunta nueva se parece
+lo suficiente a una ya respondida (misma academia, misma versión del prompt),
+se reutiliza esa respuesta en vez de llamar a OpenAI
+
+Cada mensaje normalizado se convierte en un vector local, sin red ni GPU:
+n-gramas de caracteres (2 a 4) con hashing a SEMANTIC_CACHE_DIM columnas,
+frecuencia sublineal y pesos IDF calculados sobre las entradas de la caché.
+Los vectores viven en una matriz NumPy por academia; una búsqueda es un par
+de productos matriz-vector (similitud coseno contra todas las entradas)
+
+Las coincidencias son por palabras compartidas ("cuánto cuesta la
+mensualidad" ~ "cuanto cuesta mensualidad?"), no por sinónimos
+La caché es por proceso (en memoria)
+"""
+
+import os
+import re
+import time
+import zlib
+import hashlib
+import logging
+import threading
+from app.utils.metrics import metrics
+from app.services.faq_fast_path import normalize
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZES = (2, 3, 4)
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def semantic_cache_enabled():
+    """Indica si las respuestas de OpenAI se reutilizan entre leads"""
+    if os.getenv('SEMANTIC_CACHE', 'false').lower() not in ('1', 'true', 'yes'):
+        return False
+    if not NUMPY_AVAILABLE:
+        logger.warning("⚠️ SEMANTIC_CACHE=true pero numpy no está instalado")
+        return False
+    return True
+
+
+def prompt_version(*parts):
+    """Huella de lo que determina la respuesta (prompt base, modelo...): si cambia, la caché no aplica"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+class HashedNgramVectorizer:
+    """Texto -> vector de frecuencias de n-gramas de caracteres con hashing"""
+
+    def __init__(self, dim=None, sizes=NGRAM_SIZES):
+        self.dim = dim or int(os.getenv('SEMANTIC_CACHE_DIM', 2048))
+        self.sizes = sizes
+
+    def transform(self, text):
+        """
+        Vector float32 de dim columnas (log(1 + frecuencia))
+
+        Returns:
+            Vector, o None si el texto no tiene letras ni números
+        """
+        text = _NON_WORD.sub(' ', normalize(text)).strip()
+        if not text:
+            return None
+        padded = f' {text} '
+        indices = [zlib.crc32(padded[i:i + n].encode('utf-8')) % self.dim
+                   for n in self.sizes for i in range(len(padded) - n + 1)]
+        counts = np.bincount(indices, minlength=self.dim).astype(np.float32)
+        return np.log1p(counts)
+
+
+class _Namespace:
+    """Entradas de una academia: matriz de frecuencias + respuestas + orden LRU"""
+
+    def __init__(self, dim, version):
+        self.version = version
+        self.size = 0
+        self.tf = np.zeros((0, dim), dtype=np.float32)
+        self.tf_squared = np.zeros((0, dim), dtype=np.float32)
+        self.df = np.zeros(dim, dtype=np.float32)
+        self.last_used = np.zeros(0, dtype=np.int64)
+        self.answers = []
+        self.messages = []
+
+    def scores(self, vector):
+        """Similitud coseno TF-IDF del vector contra cada entrada"""
+        if not self.size:
+            return np.zeros(0, dtype=np.float32)
+        idf = np.log((1.0 + self.size) / (1.0 + self.df)) + 1.0
+        weights = idf * idf
+        numerator = self.tf[:self.size] @ (vector * weights)
+        norms = np.sqrt(self.tf_squared[:self.size] @ weights) * np.sqrt((vector * vector) @ weights)
+        return numerator / np.maximum(norms, 1e-12)
+
+    def put(self, slot, vector, message, answer, tick):
+        """Escribe la entrada en slot (una fila nueva o la de la entrada desalojada)"""
+        if slot < self.size:
+            self.df -= self.tf[slot] > 0
+        else:
+            if slot >= len(self.tf):
+                self._grow(max(16, 2 * len(self.tf)))
+            self.size += 1
+            self.answers.append(None)
+            self.messages.append(None)
+        self.tf[slot] = vector
+        self.tf_squared[slot] = vector * vector
+        self.df += vector > 0
+        self.last_used[slot] = tick
+        self.answers[slot] = answer
+        self.messages[slot] = message
+
+    def _grow(self, rows):
+        extra = rows - len(self.tf)
+        self.tf = np.vstack([self.tf, np.zeros((extra, self.tf.shape[1]), dtype=np.float32)])
+        self.tf_squared = np.vstack([self.tf_squared, np.zeros((extra, self.tf.shape[1]), dtype=np.float32)])
+        self.last_used = np.concatenate([self.last_used, np.zeros(extra, dtype=np.int64)])
+
+
+class SemanticCache:
+    """
+    Caché de respuestas por similitud
+    - threshold: similitud coseno mínima para reutilizar (SEMANTIC_CACHE_THRESHOLD, default 0.85)
+    - capacity: entradas por academia; al llenarse se desaloja la menos usada
+      recientemente (SEMANTIC_CACHE_SIZE, default 1000)
+
+    Cada academia (namespace) tiene su matriz. Cada entrada se guarda con la
+    versión del prompt; si llega una versión distinta (cambió academy_info,
+    el modelo...) las entradas de esa academia se descartan
+    """
+
+    def __init__(self, threshold=None, capacity=None, dim=None):
+        if threshold is None:
+            threshold = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.85))
+        if capacity is None:
+            capacity = int(os.getenv('SEMANTIC_CACHE_SIZE', 1000))
+
+        self.threshold = threshold
+        self.capacity = max(1, capacity)
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        self._tick = 0
+
+    def _namespace(self, namespace, version):
+        """Namespace de la academia, vacío si la versión del prompt cambió"""
+        entries = self._namespaces.get(namespace)
+        if entries is not None and entries.version != version:
+            logger.info(f"🔄 Caché semántica de '{namespace}' invalidada: cambió la versión del prompt")
+            metrics.inc('semantic_cache_invalidations_total')
+            entries = None
+        if entries is None:
+            entries = self._namespaces[namespace] = _Namespace(self.vectorizer.dim, version)
+            metrics.set_gauge('semantic_cache_entries', 0, namespace=namespace)
+        return entries
+
+    def _best(self, entries, vector):
+        scores = entries.scores(vector)
+        if not len(scores):
+            return None, 0.0
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def lookup(self, namespace, message, version):
+        """
+        Respuesta guardada para una pregunta parecida
+
+        Args:
+            namespace: Academia
+            message: Mensaje del usuario
+            version: prompt_version() de la respuesta que se generaría ahora
+
+        Returns:
+            Respuesta o None
+        """
+        started = time.perf_counter()
+        vector = self.vectorizer.transform(message)
+        answer = None
+        score = 0.0
+
+        if vector is not None:
+            with self._lock:
+                entries = self._namespace(namespace, version)
+                slot, score = self._best(entries, vector)
+                if slot is not None and score >= self.threshold:
+                    self._tick += 1
+                    entries.last_used[slot] = self._tick
+                    answer = entries.answers[slot]
+
+        result = 'hit' if answer is not None else 'miss'
+        metrics.observe('semantic_cache_seconds', time.perf_counter() - started, op='lookup')
+        metrics.inc('semantic_cache_total', result=result)
+        if answer is not None:
+            logger.info(f"[SEMANTIC CACHE] Respuesta reutilizada (similitud {score:.3f})")
+        return answer
+
+    def store(self, namespace, message, version, answer):
+        """Guarda la respuesta; si ya hay una pregunta casi igual, la reemplaza"""
+        vector = self.vectorizer.transform(message)
+        if vector is None or not answer:
+            return
+
+        with self._lock:
+            entries = self._namespace(namespace, version)
+            self._tick += 1
+            slot, score = self._best(entries, vector)
+            if slot is None or score < self.threshold:
+                if entries.size < self.capacity:
+                    slot = entries.size
+                else:
+                    slot = int(np.argmin(entries.last_used[:entries.size]))
+                    metrics.inc('semantic_cache_evictions_total')
+            entries.put(slot, vector, message, answer, self._tick)
+            metrics.set_gauge('semantic_cache_entries', entries.size, namespace=namespace)
+
+    def invalidate(self, namespace=None):
+        """Descarta las entradas de una academia (o de todas)"""
+        with self._lock:
+            names = [namespace] if namespace is not None else list(self._namespaces)
+            for name in names:
+                if self._namespaces.pop(name, None) is not None:
+                    metrics.set_gauge('semantic_cache_entries', 0, namespace=name)
+
+    def stats(self):
+        """Entradas por academia"""
+        with self._lock:
+            return {
+                'threshold': self.threshold,
+                'capacity': self.capacity,
+                'entries': {name: entries.size for name, entries in self._namespaces.items()},
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    """Caché compartida del proceso (MessageHandler, AsyncMessageHandler, AIService)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
+
+
+def reset_semantic_cache():
+    """Descarta la caché del proceso (tests, cambio de configuración)"""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -8,10 +8,12 @@ from app.tasks.reminder_tasks import (
     update_expired_trials,
     send_immediate_reminder
 )
+from app.tasks.maintenance_tasks import checkpoint_wal
 
 __all__ = [
     'check_and_send_reminders',
     'cleanup_old_reminders',
     'update_expired_trials',
-    'send_immediate_reminder'
+    'send_immediate_reminder',
+    'checkpoint_wal'
 ]
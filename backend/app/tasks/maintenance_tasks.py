@@ -0,0 +1,107 @@
+"""
+Tareas de Celery de mantenimiento de la base de datos
+"""
+
+import os
+import logging
+from app.celery_app import celery_app
+from app.utils.database import wal_checkpoint, default_db_path, refresh_read_snapshot
+from app.utils.message_archive import archive_messages
+from app.services.conversation_summary import ConversationSummarizer
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name='app.tasks.maintenance_tasks.checkpoint_wal')
+def checkpoint_wal(db_path=None):
+    """
+    Tarea periódica que pasa el WAL a la base de datos y reporta su tamaño
+    Usa PASSIVE (no bloquea a nadie); si el WAL supera DB_WAL_TRUNCATE_BYTES
+    usa TRUNCATE para devolverlo a cero
+    """
+    db_path = db_path or default_db_path()
+    truncate_bytes = int(os.getenv('DB_WAL_TRUNCATE_BYTES', 64 * 1024 * 1024))
+
+    try:
+        result = wal_checkpoint(db_path=db_path, mode='PASSIVE')
+
+        if result.get('wal_size_bytes', 0) > truncate_bytes:
+            logger.info(f"🧹 WAL de {result['wal_size_bytes']} bytes, ejecutando checkpoint TRUNCATE")
+            result = wal_checkpoint(db_path=db_path, mode='TRUNCATE')
+
+        if result.get('busy'):
+            logger.warning(f"⚠️ Checkpoint incompleto (lectores/escritores activos): {result}")
+        else:
+            logger.info(f"✅ Checkpoint WAL: {result}")
+
+        return {'success': True, **result}
+
+    except Exception as e:
+        logger.error(f"❌ Error en tarea checkpoint_wal: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+@celery_app.task(name='app.tasks.maintenance_tasks.refresh_read_snapshot')
+def refresh_snapshot(db_path=None):
+    """
+    Tarea periódica que renueva la copia de solo lectura del dashboard
+    (DB_READ_MODE=snapshot), así ninguna lectura del dashboard paga la copia
+    """
+    db_path = db_path or default_db_path()
+
+    try:
+        result = refresh_read_snapshot(db_path=db_path)
+        logger.info(f"📸 Snapshot de lectura renovado: {result}")
+        return {'success': True, **result}
+
+    except Exception as e:
+        logger.error(f"❌ Error en tarea refresh_read_snapshot: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+@celery_app.task(name='app.tasks.maintenance_tasks.archive_old_messages')
+def archive_old_messages(db_path=None):
+    """
+    Tarea diaria (con DB_ARCHIVE_ENABLED) que pasa los mensajes viejos de las
+    conversaciones cerradas al archivo mensual comprimido, para que la tabla
+    message siga chica. Con DB_ARCHIVE_CLOSE_IDLE cierra antes las inactivas
+    """
+    db_path = db_path or default_db_path()
+
+    try:
+        result = archive_messages(db_path=db_path)
+
+        if result['errors']:
+            logger.warning(f"⚠️ Archivo de mensajes con errores: {result}")
+        else:
+            logger.info(f"🗄️ Archivo de mensajes: {result}")
+
+        return {'success': not result['errors'], **result}
+
+    except Exception as e:
+        logger.error(f"❌ Error en tarea archive_old_messages: {e}")
+        return {'success': False, 'error': str(e)}
+
+
+@celery_app.task(name='app.tasks.maintenance_tasks.summarize_conversations')
+def summarize_conversations(db_path=None, limit=None):
+    """
+    Tarea periódica que junta los mensajes viejos de las conversaciones
+    activas en su resumen (conversation.summary), así el prompt de OpenAI
+    es resumen + últimos mensajes sin importar el largo de la conversación
+    """
+    db_path = db_path or default_db_path()
+
+    try:
+        result = ConversationSummarizer(db_path=db_path).run(limit=limit)
+
+        if result['errors']:
+            logger.warning(f"⚠️ Resumen de conversaciones con errores: {result}")
+        else:
+            logger.info(f"📝 Resumen de conversaciones: {result}")
+
+        return {'success': not result['errors'], **result}
+
+    except Exception as e:
+        logger.error(f"❌ Error en tarea summarize_conversations: {e}")
+        return {'success': False, 'error': str(e)}
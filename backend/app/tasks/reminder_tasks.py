@@ -7,7 +7,8 @@ import logging
 from datetime import datetime, timedelta
 from app.celery_app import celery_app
 from app.services.reminder_service import ReminderService
-from app.utils.database import get_db_connection, get_db_cursor
+from app.utils.database import get_db_connection, get_db_cursor, default_db_path
+from app.utils.queries import queries
 
 logger = logging.getLogger(__name__)
 
@@ -43,15 +44,10 @@ def cleanup_old_reminders(days_to_keep=30):
     try:
         cutoff_date = datetime.now() - timedelta(days=days_to_keep)
 
-        with get_db_cursor(db_path='bjj_academy.db') as cursor:
+        with get_db_cursor(db_path=default_db_path()) as cursor:
             # Eliminar recordatorios antiguos que ya fueron enviados o fallaron
-            cursor.execute("""
-                DELETE FROM class_reminders
-                WHERE class_datetime < ?
-                AND reminder_status IN ('sent', 'failed')
-            """, (cutoff_date.strftime('%Y-%m-%d %H:%M:%S'),))
-
-            deleted_count = cursor.rowcount
+            deleted_count = queries.execute(cursor, 'reminder.delete_old',
+                                            (cutoff_date.strftime('%Y-%m-%d %H:%M:%S'),)).rowcount
 
         logger.info(f"✅ Limpieza completada: {deleted_count} recordatorios antiguos eliminados")
 
@@ -77,16 +73,9 @@ def update_expired_trials():
     try:
         today = datetime.now().strftime('%Y-%m-%d')
 
-        with get_db_cursor(db_path='bjj_academy.db') as cursor:
+        with get_db_cursor(db_path=default_db_path()) as cursor:
             # Actualizar trial weeks expiradas
-            cursor.execute("""
-                UPDATE trial_weeks
-                SET status = 'expired'
-                WHERE status = 'active'
-                AND end_date < ?
-            """, (today,))
-
-            updated_count = cursor.rowcount
+            updated_count = queries.execute(cursor, 'trial_week.expire', (today,)).rowcount
 
         logger.info(f"✅ Actualización completada: {updated_count} trial weeks marcadas como expiradas")
 
@@ -118,12 +107,8 @@ def send_immediate_reminder(lead_id, clase_tipo, class_datetime_str):
         reminder_service = ReminderService()
 
         # Obtener información del lead
-        with get_db_connection(db_path='bjj_academy.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT name, phone_number FROM lead WHERE id = ?
-            """, (lead_id,))
-            lead_data = cursor.fetchone()
+        with get_db_connection(db_path=default_db_path()) as conn:
+            lead_data = queries.fetchone(conn, 'lead.contact', (lead_id,))
 
         if not lead_data:
             logger.error(f"Lead {lead_id} no encontrado")
@@ -0,0 +1,168 @@
+"""
+Async database utilities for the asyncio message pipeline.
+
+Mirrors the context managers in ``app.utils.database`` on top of aiosqlite,
+so coroutines can talk to the same SQLite file without blocking the event
+loop. Path resolution is shared with the sync layer through DatabaseConfig,
+and each connection gets the same pragma profile (WAL, busy_timeout, ...) as
+the sync pool, so async and sync writers wait for each other the same way.
+"""
+
+import time
+import sqlite3
+import asyncio
+import logging
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from app.utils.database import (
+    DatabaseConfig, record_db_time, days_since, statement_cache_size, connection_factory, get_pragmas
+)
+from app.utils.postgres import is_postgres_url
+
+try:
+    import aiosqlite
+    AIOSQLITE_AVAILABLE = True
+except ImportError:
+    AIOSQLITE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# SQLite admits a single writer. Coroutines of the same process queue on an
+# asyncio.Lock instead of spinning in SQLite's busy handler while the writer
+# holds the lock across awaits. One lock per (event loop, database path).
+_write_locks = weakref.WeakKeyDictionary()
+
+
+def _get_write_lock(db_path: str) -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    locks = _write_locks.setdefault(loop, {})
+    lock = locks.get(db_path)
+    if lock is None:
+        lock = locks[db_path] = asyncio.Lock()
+    return lock
+
+
+def _require_aiosqlite():
+    if not AIOSQLITE_AVAILABLE:
+        raise RuntimeError("aiosqlite is required for the async pipeline (pip install aiosqlite)")
+
+
+async def _apply_pragmas(conn, pragmas: dict):
+    """Async counterpart of ``apply_pragmas``: a busy journal_mode change is logged, not raised."""
+    for name, value in pragmas.items():
+        try:
+            await conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.OperationalError as e:
+            if name != 'journal_mode':
+                raise
+            logger.warning(f"Could not set journal_mode={value}: {e}")
+
+
+@asynccontextmanager
+async def get_async_db_connection(db_path: Optional[str] = None, row_factory: bool = True):
+    """
+    Async context manager for database connections.
+
+    Usage:
+        async with get_async_db_connection() as conn:
+            cursor = await conn.execute("SELECT * FROM lead")
+            rows = await cursor.fetchall()
+
+    Args:
+        db_path: Optional path to database file. If None, uses configured path.
+        row_factory: If True, use Row factory for dict-like access to columns.
+
+    Yields:
+        aiosqlite.Connection: Database connection object
+    """
+    _require_aiosqlite()
+
+    if db_path is None:
+        db_path = DatabaseConfig.get_db_path()
+    if is_postgres_url(db_path):
+        raise RuntimeError("The async pipeline supports SQLite only; serve the Flask webhook for PostgreSQL")
+
+    conn = None
+    started = time.perf_counter()
+    try:
+        conn = await aiosqlite.connect(db_path, cached_statements=statement_cache_size(),
+                                       factory=connection_factory())
+        await _apply_pragmas(conn, get_pragmas())
+        await conn.create_function('days_since', 1, days_since)
+
+        if row_factory:
+            conn.row_factory = sqlite3.Row
+
+        logger.debug(f"Async database connection opened: {db_path}")
+        yield conn
+
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+        if conn:
+            await conn.rollback()
+        raise
+
+    finally:
+        if conn:
+            await conn.close()
+            logger.debug("Async database connection closed")
+        record_db_time(started)
+
+
+@asynccontextmanager
+async def get_async_db_cursor(db_path: Optional[str] = None, row_factory: bool = True):
+    """
+    Async context manager that provides a database cursor.
+
+    Automatically commits on success and rolls back on error. Writers in the
+    same event loop are serialized, and the transaction starts with
+    BEGIN IMMEDIATE so it never has to upgrade a read lock mid-way.
+
+    Usage:
+        async with get_async_db_cursor() as cursor:
+            await cursor.execute("INSERT INTO lead (phone_number) VALUES (?)", (phone,))
+
+    Args:
+        db_path: Optional path to database file. If None, uses configured path.
+        row_factory: If True, use Row factory for dict-like access to columns.
+
+    Yields:
+        aiosqlite.Cursor: Database cursor object
+    """
+    if db_path is None:
+        db_path = DatabaseConfig.get_db_path()
+
+    async with _get_write_lock(db_path), \
+            get_async_db_connection(db_path=db_path, row_factory=row_factory) as conn:
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute("BEGIN IMMEDIATE")
+            yield cursor
+            await conn.commit()
+            logger.debug("Transaction committed")
+        except sqlite3.Error:
+            await conn.rollback()
+            logger.debug("Transaction rolled back")
+            raise
+        finally:
+            await cursor.close()
+
+
+async def async_execute_query(query: str, params: tuple = (), db_path: Optional[str] = None) -> list:
+    """
+    Execute a SELECT query and return all results.
+
+    Args:
+        query: SQL query string
+        params: Query parameters tuple
+        db_path: Optional database path
+
+    Returns:
+        List of Row objects (dict-like access)
+    """
+    async with get_async_db_connection(db_path=db_path) as conn:
+        cursor = await conn.execute(query, params)
+        return await cursor.fetchall()
@@ -4,16 +4,84 @@ Database utilities for centralized SQLite connection management.
 This module provides helper functions and context managers for consistent
 database access across the application, preventing connection leaks and
 ensuring proper resource cleanup.
+
+Connections are pooled per database file (``DB_POOL_SIZE``, default 10;
+0 disables pooling): the context managers check a connection out of the pool
+and return it on exit instead of opening and closing one on every call.
+
+Every new connection gets the pragma profile selected by ``DB_PRAGMA_PROFILE``
+(``performance`` by default: WAL journal, synchronous=NORMAL, larger page
+cache, memory-mapped I/O, in-memory temp tables). Individual pragmas can be
+overridden with ``DB_JOURNAL_MODE``, ``DB_SYNCHRONOUS``, ``DB_CACHE_SIZE``,
+``DB_MMAP_SIZE``, ``DB_BUSY_TIMEOUT`` and ``DB_TEMP_STORE``.
+
+A ``postgresql://`` URL as the database target (``DB_URL``, or a db_path
+argument) routes the same context managers to a psycopg pool; see
+``app.utils.postgres`` for how the SQLite-flavoured SQL is adapted.
+
+Read-only traffic (dashboard) can be routed away from the write path with
+``get_read_connection``: a read-only connection, a periodically refreshed
+snapshot (SQLite, ``DB_READ_MODE``) or a replica (PostgreSQL, ``DB_READ_URL``).
+
+Statements slower than ``DB_SLOW_QUERY_MS`` (default 250) are written with
+their EXPLAIN QUERY PLAN to a rotating JSON-lines log (``DB_SLOW_QUERY_LOG``);
+see SlowQueryLog.
 """
 
 import sqlite3
 import os
+import re
+import json
+import time
+import atexit
+import random
+import textwrap
+import threading
+import urllib.parse
+from collections import deque
 from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from typing import Optional, Any
 import logging
+from logging.handlers import RotatingFileHandler
+
+from app.utils.metrics import metrics
+from app.utils.queries import queries
+from app.utils.postgres import (
+    is_postgres_url, get_postgres_pool, postgres_pool_stats, close_postgres_pools, PostgresCursor
+)
 
 logger = logging.getLogger(__name__)
 
+# Pipeline stage that owns the connections opened in the current context.
+# Every connection records its open-to-close time in ``db_seconds{stage=...}``.
+_db_stage = ContextVar('db_stage', default='other')
+
+
+@contextmanager
+def db_stage(name: str):
+    """
+    Attribute the database time spent inside the block to a pipeline stage.
+
+    Usage:
+        with db_stage('persist'):
+            lead_id = self._get_or_create_lead(phone)
+
+    Args:
+        name: Stage label used in the ``db_seconds`` histogram.
+    """
+    token = _db_stage.set(name)
+    try:
+        yield
+    finally:
+        _db_stage.reset(token)
+
+
+def record_db_time(started: float):
+    """Record the time since ``started`` (perf_counter) under the current stage."""
+    metrics.observe('db_seconds', time.perf_counter() - started, stage=_db_stage.get())
+
 
 class DatabaseConfig:
     """Database configuration singleton."""
@@ -34,13 +102,660 @@ class DatabaseConfig:
 
     @classmethod
     def get_db_path(cls) -> str:
-        """Get the current database path."""
+        """
+        Get the current database target.
+
+        Either a SQLite file path or a PostgreSQL URL. Defaults to DB_URL,
+        then to bjj_academy.db in the current directory.
+        """
         if cls._db_path is None:
+            db_url = os.getenv('DB_URL')
+            if db_url:
+                cls._db_path = db_url
+                return cls._db_path
             # Default to bjj_academy.db in current directory
             cls._db_path = os.path.join(os.getcwd(), 'bjj_academy.db')
             logger.warning(f"Using default database path: {cls._db_path}")
         return cls._db_path
 
+    @classmethod
+    def get_dialect(cls, db_path: Optional[str] = None) -> str:
+        """'postgresql' or 'sqlite' for a target (default: the configured one)."""
+        return 'postgresql' if is_postgres_url(db_path or cls.get_db_path()) else 'sqlite'
+
+
+def default_db_path() -> str:
+    """Database used by the services and tasks: DB_URL, else bjj_academy.db."""
+    return os.getenv('DB_URL') or 'bjj_academy.db'
+
+
+# Pragma profiles applied once to every new connection. busy_timeout goes
+# first so that switching journal_mode waits for other connections.
+PRAGMA_PROFILES = {
+    # SQLite defaults (rollback journal, synchronous=FULL)
+    'default': {
+        'busy_timeout': 5000,
+    },
+    # Readers never block the writer (WAL); commits skip the per-transaction
+    # fsync (NORMAL is durable across app crashes, may lose the last
+    # transactions on power loss); 16 MB page cache per connection; 256 MB mmap
+    'performance': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Per-pragma environment overrides
+PRAGMA_ENV_OVERRIDES = {
+    'busy_timeout': 'DB_BUSY_TIMEOUT',
+    'journal_mode': 'DB_JOURNAL_MODE',
+    'synchronous': 'DB_SYNCHRONOUS',
+    'cache_size': 'DB_CACHE_SIZE',
+    'mmap_size': 'DB_MMAP_SIZE',
+    'temp_store': 'DB_TEMP_STORE',
+}
+
+_PRAGMA_VALUE = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def get_pragmas(profile: Optional[str] = None) -> dict:
+    """
+    Build the pragma settings for new connections.
+
+    Args:
+        profile: Profile name. If None, uses DB_PRAGMA_PROFILE (default 'performance').
+
+    Returns:
+        Ordered dict of pragma name -> value
+
+    Raises:
+        ValueError: Unknown profile or a value that is not a plain word/number
+    """
+    profile = profile or os.getenv('DB_PRAGMA_PROFILE', 'performance')
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown DB_PRAGMA_PROFILE '{profile}' (use {', '.join(PRAGMA_PROFILES)})")
+
+    pragmas = dict(PRAGMA_PROFILES[profile])
+    for name, env_var in PRAGMA_ENV_OVERRIDES.items():
+        value = os.getenv(env_var)
+        if value:
+            pragmas[name] = value
+
+    for name, value in pragmas.items():
+        if not _PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f"Invalid value for PRAGMA {name}: {value!r}")
+    return pragmas
+
+
+def statement_cache_size() -> int:
+    """
+    Compiled statements kept per connection (sqlite3 ``cached_statements``).
+
+    Every service query comes from the named registry in app.utils.queries,
+    so its text is identical on each call and hits this cache. Set with
+    DB_STATEMENT_CACHE_SIZE (default 128).
+    """
+    return max(0, int(os.getenv('DB_STATEMENT_CACHE_SIZE', 128)))
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: dict):
+    """
+    Apply pragma settings to a new connection.
+
+    A journal_mode change needs a moment without other writers; if it cannot
+    get one it is logged and retried on the next new connection.
+    """
+    for name, value in pragmas.items():
+        try:
+            conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.OperationalError as e:
+            if name != 'journal_mode':
+                raise
+            logger.warning(f"Could not set journal_mode={value}: {e}")
+
+
+def read_only_uri(db_path: str) -> str:
+    """SQLite URI that opens ``db_path`` read-only (``file:...?mode=ro``)."""
+    return f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+
+
+def _pragmas_for(db_path: str) -> dict:
+    """Pragmas for new connections to a target; read-only ones keep the file's journal mode."""
+    pragmas = get_pragmas()
+    if db_path.startswith('file:') and 'mode=ro' in db_path:
+        pragmas.pop('journal_mode', None)
+    return pragmas
+
+
+def days_since(value: Optional[str]) -> Optional[float]:
+    """
+    Days elapsed since a timestamp, as the ``days_since(ts)`` SQL function.
+
+    Same result as ``julianday('now') - julianday(ts)``: naive timestamps
+    are UTC, unparseable values give NULL.
+    """
+    if value is None:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return (datetime.now(timezone.utc).replace(tzinfo=None) - ts).total_seconds() / 86400.0
+
+
+def register_functions(conn: sqlite3.Connection):
+    """Register the portable SQL functions (PostgreSQL defines them in its schema)."""
+    conn.create_function('days_since', 1, days_since)
+
+
+# ========== SLOW QUERY LOG ==========
+
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+
+
+def param_shapes(params) -> Any:
+    """
+    Types (and lengths) of the bound parameters, never their values.
+
+    ``('+506...', 3, None)`` -> ``['str(12)', 'int', 'None']``
+    """
+    def shape(value):
+        if value is None:
+            return 'None'
+        if isinstance(value, (str, bytes)):
+            return f'{type(value).__name__}({len(value)})'
+        return type(value).__name__
+
+    if isinstance(params, dict):
+        return {key: shape(value) for key, value in params.items()}
+    return [shape(value) for value in (params or ())]
+
+
+class SlowQueryLog:
+    """
+    Structured log of statements slower than a threshold.
+
+    Each slow statement is written as one JSON line to a size-rotated file
+    with its SQL, the registry name (if any), the parameter shapes, the
+    elapsed time and its EXPLAIN QUERY PLAN. Plans are cached per SQL text
+    for ``plan_ttl`` seconds so a query that is slow on every call is not
+    explained on every call.
+
+    Statements under the threshold cost two perf_counter() calls; with
+    ``sample_rate`` < 1 only that fraction of statements is timed at all.
+    """
+
+    def __init__(self, threshold_ms: float = 250.0, sample_rate: float = 1.0,
+                 path: str = 'logs/slow_queries.log', max_bytes: int = 10 * 1024 * 1024,
+                 backups: int = 5, plan_ttl: float = 300.0):
+        self.threshold = threshold_ms / 1000.0
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.plan_ttl = plan_ttl
+        self._lock = threading.Lock()
+        self._plans = {}
+        self._logger = None
+
+    @classmethod
+    def from_env(cls) -> 'SlowQueryLog':
+        """Settings from DB_SLOW_QUERY_* (DB_SLOW_QUERY_MS=0 disables the log)."""
+        return cls(
+            threshold_ms=float(os.getenv('DB_SLOW_QUERY_MS', 250)),
+            sample_rate=float(os.getenv('DB_SLOW_QUERY_SAMPLE_RATE', 1.0)),
+            path=os.getenv('DB_SLOW_QUERY_LOG', os.path.join('logs', 'slow_queries.log')),
+            max_bytes=int(os.getenv('DB_SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+            backups=int(os.getenv('DB_SLOW_QUERY_LOG_BACKUPS', 5)),
+            plan_ttl=float(os.getenv('DB_SLOW_QUERY_PLAN_TTL', 300)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0 and self.sample_rate > 0
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, conn: sqlite3.Connection, sql: str, params, elapsed: float, many: int = 0):
+        """Write one slow statement (with its plan) to the log."""
+        name = queries.name_for(sql)
+        plan, plan_cached = self._plan(conn, sql, params)
+        entry = {
+            'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'elapsed_ms': round(elapsed * 1000, 3),
+            'threshold_ms': round(self.threshold * 1000, 3),
+            'query': name,
+            'sql': textwrap.dedent(sql).strip(),
+            'params': param_shapes(params),
+            'plan': plan,
+            'plan_cached': plan_cached,
+            'stage': _db_stage.get(),
+            'thread': threading.current_thread().name,
+        }
+        if many:
+            entry['rows'] = many
+
+        metrics.inc('db_slow_queries_total', query=name or 'inline')
+        logger.warning(f"Slow query ({entry['elapsed_ms']} ms): {name or entry['sql'][:80]}")
+        try:
+            self._get_logger().info(json.dumps(entry, ensure_ascii=False, default=str))
+        except OSError as e:
+            logger.warning(f"Could not write slow query log {self.path}: {e}")
+
+    def _plan(self, conn: sqlite3.Connection, sql: str, params):
+        if not _EXPLAINABLE.match(sql):
+            return None, False
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._plans.get(sql)
+        if cached and now - cached[0] < self.plan_ttl:
+            return cached[1], True
+
+        try:
+            # Plain connection method: the EXPLAIN itself is not timed/logged
+            rows = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plan = [row[3] for row in rows]
+        except sqlite3.Error as e:
+            plan = [f'EXPLAIN failed: {e}']
+
+        with self._lock:
+            if len(self._plans) >= 1024:
+                self._plans.clear()
+            self._plans[sql] = (now, plan)
+        return plan, False
+
+    def _get_logger(self) -> logging.Logger:
+        # The file is only created once there is something to write
+        if self._logger is None:
+            with self._lock:
+                if self._logger is None:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                  backupCount=self.backups, encoding='utf-8')
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    slow_logger = logging.getLogger(f'{__name__}.slow_queries.{id(self)}')
+                    slow_logger.setLevel(logging.INFO)
+                    slow_logger.propagate = False
+                    slow_logger.addHandler(handler)
+                    self._logger = slow_logger
+        return self._logger
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
+            self._logger = None
+
+
+# Process-wide slow query log, read by every TimedCursor
+slow_query_log = SlowQueryLog.from_env()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that sends statements slower than the threshold to the slow query log."""
+
+    def execute(self, sql, parameters=()):
+        log = slow_query_log
+        if not log.sampled():
+            return super().execute(sql, parameters)
+
+        started = time.perf_counter()
+        result = super().execute(sql, parameters)
+        elapsed = time.perf_counter() - started
+        if elapsed >= log.threshold:
+            log.record(self.connection, sql, parameters, elapsed)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        log = slow_query_log
+        if not log.sampled():
+            return super().executemany(sql, seq_of_parameters)
+
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        result = super().executemany(sql, seq_of_parameters)
+        elapsed = time.perf_counter() - started
+        if elapsed >= log.threshold:
+            first = seq_of_parameters[0] if seq_of_parameters else ()
+            log.record(self.connection, sql, first, elapsed, many=len(seq_of_parameters))
+        return result
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors (and execute shortcuts) are TimedCursors."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """sqlite3 connection class for new connections: timed while the slow query log is on."""
+    return TimedConnection if slow_query_log.enabled else sqlite3.Connection
+
+
+class _PooledConnection:
+    """A pooled sqlite3 connection plus the bookkeeping used by health checks."""
+
+    __slots__ = ('conn', 'created_at', 'last_used', 'file_id', 'overflow')
+
+    def __init__(self, conn: sqlite3.Connection, file_id: Optional[tuple], overflow: bool = False):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.file_id = file_id
+        self.overflow = overflow
+
+
+def _file_id(db_path: str) -> Optional[tuple]:
+    """Identity of the database file, to detect it being replaced under the pool."""
+    if db_path.startswith('file:'):
+        db_path = urllib.parse.unquote(db_path[len('file:'):].split('?', 1)[0])
+    if db_path in (':memory:', ''):
+        return None
+    try:
+        st = os.stat(db_path)
+        return (st.st_dev, st.st_ino)
+    except OSError:
+        return None
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections for one database file.
+
+    - At most ``max_size`` connections are checked out at once; further
+      checkouts wait up to ``checkout_timeout`` seconds.
+    - A thread that already holds a connection and asks for another one
+      (nested helpers) gets a temporary overflow connection instead of
+      waiting, so nesting can never deadlock the pool.
+    - Connections are recycled after ``max_lifetime`` seconds, when the file
+      they point to was replaced, or when the health check fails after being
+      idle for ``health_check_idle`` seconds.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 10, max_lifetime: float = 300.0,
+                 checkout_timeout: float = 30.0, health_check_idle: float = 30.0,
+                 pragmas: Optional[dict] = None):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_check_idle = health_check_idle
+        self.pragmas = _pragmas_for(db_path) if pragmas is None else pragmas
+
+        self._idle = deque()
+        self._in_use = 0
+        self._open = 0
+        self._cond = threading.Condition()
+        self._held = threading.local()
+        self._closed = False
+
+    def acquire(self) -> _PooledConnection:
+        """
+        Check a connection out of the pool.
+
+        Returns:
+            _PooledConnection: Wrapper whose ``conn`` attribute is the connection
+
+        Raises:
+            sqlite3.OperationalError: If no connection frees up within checkout_timeout
+        """
+        depth = getattr(self._held, 'depth', 0)
+        if depth > 0:
+            # Nested checkout in the same thread: never wait on ourselves
+            self._held.depth = depth + 1
+            metrics.inc('db_pool_overflow_total')
+            return self._connect(overflow=True)
+
+        started = time.perf_counter()
+        with self._cond:
+            while self._in_use >= self.max_size:
+                remaining = self.checkout_timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    metrics.inc('db_pool_checkout_timeouts_total')
+                    raise sqlite3.OperationalError(
+                        f"Connection pool exhausted ({self.max_size} in use) for {self.db_path}"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            pooled = self._idle.pop() if self._idle else None
+            self._update_gauges()
+
+        metrics.observe('db_pool_checkout_wait_seconds', time.perf_counter() - started)
+
+        try:
+            pooled = self._validate(pooled)
+            if pooled is None:
+                pooled = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._update_gauges()
+                self._cond.notify()
+            raise
+
+        self._held.depth = 1
+        return pooled
+
+    def release(self, pooled: _PooledConnection, discard: bool = False):
+        """
+        Return a connection to the pool.
+
+        Any transaction left open is rolled back first, matching the old
+        behaviour of closing the connection.
+        """
+        self._held.depth = max(0, getattr(self._held, 'depth', 1) - 1)
+
+        if not discard:
+            try:
+                if pooled.conn.in_transaction:
+                    pooled.conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        if pooled.overflow:
+            self._close(pooled)
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                keep = False
+            else:
+                keep = True
+                self._idle.append(pooled)
+            self._update_gauges()
+            self._cond.notify()
+
+        if not keep:
+            self._close(pooled)
+
+    def close(self):
+        """Close every idle connection; checked-out ones close when released."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'db_path': self.db_path,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'open': self._open,
+            }
+
+    def _validate(self, pooled: Optional[_PooledConnection]) -> Optional[_PooledConnection]:
+        """Return the connection if it is still usable, else close it and return None."""
+        if pooled is None:
+            return None
+
+        now = time.monotonic()
+        reason = None
+        if self.max_lifetime and now - pooled.created_at > self.max_lifetime:
+            reason = 'lifetime'
+        elif pooled.file_id != _file_id(self.db_path):
+            reason = 'file_replaced'
+        elif now - pooled.last_used > self.health_check_idle:
+            try:
+                pooled.conn.execute('SELECT 1').fetchone()
+            except sqlite3.Error:
+                reason = 'unhealthy'
+
+        if reason is None:
+            return pooled
+
+        metrics.inc('db_pool_recycled_total', reason=reason)
+        self._close(pooled)
+        return None
+
+    def _connect(self, overflow: bool = False) -> _PooledConnection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, uri=True,
+                               cached_statements=statement_cache_size(),
+                               factory=connection_factory())
+        apply_pragmas(conn, self.pragmas)
+        register_functions(conn)
+
+        with self._cond:
+            self._open += 1
+            self._update_gauges()
+        metrics.inc('db_pool_connections_created_total')
+        logger.debug(f"Database connection opened: {self.db_path}")
+        return _PooledConnection(conn, _file_id(self.db_path), overflow)
+
+    def _close(self, pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._update_gauges()
+        logger.debug("Database connection closed")
+
+    def _update_gauges(self):
+        # Se llama con self._cond tomado; una serie por pool (primario, lectura, snapshot)
+        metrics.set_gauge('db_pool_in_use', self._in_use, db_path=self.db_path)
+        metrics.set_gauge('db_pool_open_connections', self._open, db_path=self.db_path)
+        metrics.set_gauge('db_pool_utilization', self._in_use / self.max_size if self.max_size else 0,
+                          db_path=self.db_path)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> Optional[ConnectionPool]:
+    """
+    Get (or create) the pool for a database file.
+
+    Returns:
+        ConnectionPool, or None when pooling is disabled (DB_POOL_SIZE=0)
+    """
+    pool = _pools.get(db_path)
+    if pool is not None:
+        return pool
+
+    max_size = int(os.getenv('DB_POOL_SIZE', 10))
+    if max_size <= 0:
+        return None
+
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(
+                db_path,
+                max_size=max_size,
+                max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 300)),
+                checkout_timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+                health_check_idle=float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', 30)),
+            )
+            logger.info(f"Connection pool created for {db_path} (max {max_size})")
+        return pool
+
+
+def pool_stats() -> list:
+    """Stats of every open pool, for the stats endpoints."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools] + postgres_pool_stats()
+
+
+def close_all_pools():
+    """Close every pool (process shutdown, tests)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+    close_postgres_pools()
+
+
+atexit.register(close_all_pools)
+
+if hasattr(os, 'register_at_fork'):
+    # SQLite connections must not cross a fork: children start with no pools
+    os.register_at_fork(after_in_child=_pools.clear)
+
+
+@contextmanager
+def _checkout(db_path: str, row_factory: bool):
+    """Yield a pooled (or, with pooling disabled, a fresh) connection."""
+    if is_postgres_url(db_path):
+        with get_postgres_pool(db_path).connection(row_factory) as conn:
+            yield conn
+        return
+
+    pool = get_pool(db_path)
+    if pool is None:
+        conn = sqlite3.connect(db_path, check_same_thread=False, uri=True,
+                               cached_statements=statement_cache_size(),
+                               factory=connection_factory())
+        apply_pragmas(conn, _pragmas_for(db_path))
+        register_functions(conn)
+        conn.row_factory = sqlite3.Row if row_factory else None
+        logger.debug(f"Database connection opened: {db_path}")
+        try:
+            yield conn
+        finally:
+            conn.close()
+            logger.debug("Database connection closed")
+        return
+
+    pooled = pool.acquire()
+    pooled.conn.row_factory = sqlite3.Row if row_factory else None
+    discard = False
+    try:
+        yield pooled.conn
+    except sqlite3.DatabaseError as e:
+        # Archivo corrupto o conexión inválida: no devolverla al pool
+        discard = not isinstance(e, (sqlite3.OperationalError, sqlite3.IntegrityError))
+        raise
+    finally:
+        pool.release(pooled, discard=discard)
+
 
 @contextmanager
 def get_db_connection(db_path: Optional[str] = None, row_factory: bool = True):
@@ -63,26 +778,17 @@ def get_db_connection(db_path: Optional[str] = None, row_factory: bool = True):
     if db_path is None:
         db_path = DatabaseConfig.get_db_path()
 
-    conn = None
+    started = time.perf_counter()
     try:
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-
-        if row_factory:
-            conn.row_factory = sqlite3.Row
-
-        logger.debug(f"Database connection opened: {db_path}")
-        yield conn
-
-    except sqlite3.Error as e:
-        logger.error(f"Database error: {e}")
-        if conn:
-            conn.rollback()
-        raise
-
+        with _checkout(db_path, row_factory) as conn:
+            try:
+                yield conn
+            except sqlite3.Error as e:
+                logger.error(f"Database error: {e}")
+                conn.rollback()
+                raise
     finally:
-        if conn:
-            conn.close()
-            logger.debug("Database connection closed")
+        record_db_time(started)
 
 
 @contextmanager
@@ -106,32 +812,269 @@ def get_db_cursor(db_path: Optional[str] = None, row_factory: bool = True):
     if db_path is None:
         db_path = DatabaseConfig.get_db_path()
 
-    conn = None
+    started = time.perf_counter()
     try:
-        conn = sqlite3.connect(db_path, check_same_thread=False)
+        with _checkout(db_path, row_factory) as conn:
+            cursor = conn.cursor()
+            logger.debug(f"Database cursor created: {db_path}")
+            try:
+                yield cursor
+
+                if conn.in_transaction:
+                    metrics.inc('db_commits_total')
+                conn.commit()
+                logger.debug("Transaction committed")
+
+            except sqlite3.Error as e:
+                logger.error(f"Database error: {e}")
+                conn.rollback()
+                logger.debug("Transaction rolled back")
+                raise
+            finally:
+                cursor.close()
+    finally:
+        record_db_time(started)
+
+
+@contextmanager
+def unit_of_work(db_path: Optional[str] = None, row_factory: bool = True):
+    """
+    Context manager for one explicit write transaction.
+
+    Like ``get_db_cursor``, but the transaction starts with BEGIN IMMEDIATE:
+    the reads at the top of the block already hold the write lock, so a
+    lookup followed by an insert cannot race another writer, and every
+    statement in the block shares a single commit (one fsync).
+
+    Keep the block short and free of network calls; the write lock is held
+    until it exits. On PostgreSQL the transaction opens with the first
+    statement and concurrent writers only conflict on the rows they touch:
+    call ``lock_key`` before a lookup-then-insert to keep it race free.
 
-        if row_factory:
-            conn.row_factory = sqlite3.Row
+    Usage:
+        with unit_of_work() as cursor:
+            lead_id = get_or_create_lead(cursor, phone)
+            save_message(cursor, lead_id, text)
 
-        cursor = conn.cursor()
-        logger.debug(f"Database cursor created: {db_path}")
+    Args:
+        db_path: Optional path to database file. If None, uses configured path.
+        row_factory: If True, use Row factory for dict-like access to columns.
 
+    Yields:
+        sqlite3.Cursor: Cursor inside the open transaction
+    """
+    with get_db_cursor(db_path=db_path, row_factory=row_factory) as cursor:
+        cursor.execute("BEGIN IMMEDIATE")
         yield cursor
 
-        conn.commit()
-        logger.debug("Transaction committed")
 
-    except sqlite3.Error as e:
-        logger.error(f"Database error: {e}")
-        if conn:
-            conn.rollback()
-            logger.debug("Transaction rolled back")
-        raise
+def lock_key(cursor, key: str):
+    """
+    Serialize the writers of one key (e.g. a phone number) until the transaction ends.
+
+    SQLite needs nothing: BEGIN IMMEDIATE already holds the database write
+    lock. On PostgreSQL this takes ``pg_advisory_xact_lock`` on a hash of the
+    key, so two workers cannot both miss the same lookup and insert twice.
+    Transactions that lock several keys (group commit batches) should be
+    short: PostgreSQL aborts one side of a lock-order deadlock.
+
+    Args:
+        cursor: Cursor inside the open transaction
+        key: Value the lookup-then-insert is keyed on
+    """
+    if isinstance(cursor, PostgresCursor):
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(?))", (key,))
+
+
+READ_MODES = ('primary', 'readonly', 'snapshot')
+
+_snapshot_lock = threading.Lock()
+
+
+def snapshot_path(db_path: str) -> str:
+    """File the read snapshot of ``db_path`` is kept in (DB_READ_SNAPSHOT_PATH, default <db>.snapshot)."""
+    return os.getenv('DB_READ_SNAPSHOT_PATH') or f'{db_path}.snapshot'
 
+
+def refresh_read_snapshot(db_path: Optional[str] = None) -> dict:
+    """
+    Copy the database into its read snapshot with the online backup API.
+
+    The copy is written next to the snapshot, switched to a rollback journal
+    (so it can be opened read-only without -wal/-shm files) and renamed over
+    the old one. Readers that still have the old file open keep reading it;
+    pooled read connections are recycled on their next checkout.
+
+    Args:
+        db_path: Optional path to database file. If None, uses configured path.
+
+    Returns:
+        Dict with path, size_bytes and seconds
+    """
+    if db_path is None:
+        db_path = DatabaseConfig.get_db_path()
+    if is_postgres_url(db_path):
+        raise ValueError("Read snapshots are SQLite only; use DB_READ_URL for a PostgreSQL replica")
+
+    target = snapshot_path(db_path)
+    tmp_path = f'{target}.tmp-{os.getpid()}-{threading.get_ident()}'
+    started = time.perf_counter()
+    try:
+        with get_db_connection(db_path=db_path, row_factory=False) as source:
+            dest = sqlite3.connect(tmp_path)
+            try:
+                source.backup(dest)
+                dest.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                dest.close()
+        os.replace(tmp_path, target)
     finally:
-        if conn:
-            conn.close()
-            logger.debug("Database connection closed")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    elapsed = time.perf_counter() - started
+    metrics.inc('db_read_snapshot_refreshes_total')
+    metrics.observe('db_read_snapshot_refresh_seconds', elapsed)
+    result = {'path': target, 'size_bytes': os.path.getsize(target), 'seconds': round(elapsed, 3)}
+    logger.info(f"Read snapshot refreshed: {result}")
+    return result
+
+
+def _snapshot_age(path: str) -> Optional[float]:
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _current_snapshot(db_path: str) -> str:
+    """Snapshot of ``db_path``, refreshed first when older than DB_READ_SNAPSHOT_SECONDS."""
+    target = snapshot_path(db_path)
+    max_age = float(os.getenv('DB_READ_SNAPSHOT_SECONDS', 60))
+    age = _snapshot_age(target)
+    if age is not None and age <= max_age:
+        return target
+
+    # One thread refreshes; the others keep reading the current snapshot
+    # (or wait for the first one to exist)
+    if not _snapshot_lock.acquire(blocking=age is None):
+        return target
+    try:
+        age = _snapshot_age(target)
+        if age is None or age > max_age:
+            refresh_read_snapshot(db_path)
+    finally:
+        _snapshot_lock.release()
+    return target
+
+
+def read_db_path(db_path: Optional[str] = None) -> str:
+    """
+    Target for read-only traffic such as the dashboard.
+
+    - PostgreSQL: DB_READ_URL (a replica DSN) when set, else the primary.
+    - SQLite, by DB_READ_MODE:
+        primary   the same target and pool as the writers (default)
+        readonly  the same file through a read-only URI, in its own pool
+        snapshot  a read-only copy refreshed every DB_READ_SNAPSHOT_SECONDS
+                  (see refresh_read_snapshot); reads may lag by that much
+
+    Args:
+        db_path: Primary target. If None, uses configured path.
+
+    Returns:
+        Database target to pass to get_db_connection
+    """
+    if db_path is None:
+        db_path = DatabaseConfig.get_db_path()
+
+    if is_postgres_url(db_path):
+        replica = os.getenv('DB_READ_URL')
+        return replica if is_postgres_url(replica) else db_path
+
+    mode = os.getenv('DB_READ_MODE', 'primary').lower()
+    if mode not in READ_MODES:
+        raise ValueError(f"Unknown DB_READ_MODE '{mode}' (use {', '.join(READ_MODES)})")
+    if mode == 'primary' or db_path == ':memory:' or db_path.startswith('file:'):
+        return db_path
+    if mode == 'snapshot':
+        return read_only_uri(_current_snapshot(db_path))
+    return read_only_uri(db_path)
+
+
+@contextmanager
+def get_read_connection(db_path: Optional[str] = None, row_factory: bool = True):
+    """
+    Context manager for a connection that only reads (see read_db_path).
+
+    Usage:
+        with get_read_connection() as conn:
+            leads = queries.fetchall(conn, 'dashboard.leads')
+
+    Args:
+        db_path: Primary target. If None, uses configured path.
+        row_factory: If True, use Row factory for dict-like access to columns.
+
+    Yields:
+        Connection to the read target
+    """
+    with db_stage('read'), get_db_connection(db_path=read_db_path(db_path), row_factory=row_factory) as conn:
+        yield conn
+
+
+def wal_checkpoint(db_path: Optional[str] = None, mode: str = 'PASSIVE') -> dict:
+    """
+    Run a WAL checkpoint and report the WAL file size.
+
+    PASSIVE copies what it can without waiting for readers or writers;
+    TRUNCATE also waits for them and then shrinks the WAL file to zero.
+
+    Args:
+        db_path: Optional path to database file. If None, uses configured path.
+        mode: PASSIVE, FULL, RESTART or TRUNCATE.
+
+    Returns:
+        Dict with journal_mode, busy, log_frames, checkpointed_frames and
+        wal_size_bytes before/after the checkpoint
+    """
+    mode = mode.upper()
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f"Invalid checkpoint mode: {mode}")
+
+    if db_path is None:
+        db_path = DatabaseConfig.get_db_path()
+    if is_postgres_url(db_path):
+        # PostgreSQL checkpoints its own WAL
+        return {'journal_mode': 'postgresql', 'wal_size_bytes_before': 0, 'wal_size_bytes': 0}
+    wal_path = f'{db_path}-wal'
+
+    def wal_size():
+        return os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+
+    size_before = wal_size()
+    with get_db_connection(db_path=db_path, row_factory=False) as conn:
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if journal_mode.lower() != 'wal':
+            return {'journal_mode': journal_mode, 'wal_size_bytes_before': size_before,
+                    'wal_size_bytes': size_before}
+
+        started = time.perf_counter()
+        busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        metrics.observe('db_checkpoint_seconds', time.perf_counter() - started, mode=mode.lower())
+
+    size_after = wal_size()
+    metrics.set_gauge('db_wal_size_bytes', size_after)
+    metrics.inc('db_checkpoints_total', mode=mode.lower(), result='busy' if busy else 'ok')
+
+    return {
+        'journal_mode': journal_mode,
+        'mode': mode,
+        'busy': bool(busy),
+        'log_frames': log_frames,
+        'checkpointed_frames': checkpointed,
+        'wal_size_bytes_before': size_before,
+        'wal_size_bytes': size_after,
+    }
 
 
 def execute_query(query: str, params: tuple = (), db_path: Optional[str] = None) -> list:
@@ -196,7 +1139,10 @@ def table_exists(table_name: str, db_path: Optional[str] = None) -> bool:
     Returns:
         True if table exists, False otherwise
     """
-    query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?"
+    if DatabaseConfig.get_dialect(db_path) == 'postgresql':
+        query = "SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema() AND table_name = ?"
+    else:
+        query = "SELECT name FROM sqlite_master WHERE type='table' AND name=?"
     result = execute_query(query, (table_name,), db_path=db_path)
     return len(result) > 0
 
@@ -212,5 +1158,14 @@ def get_table_info(table_name: str, db_path: Optional[str] = None) -> list:
     Returns:
         List of column information
     """
+    if DatabaseConfig.get_dialect(db_path) == 'postgresql':
+        return execute_query("""
+            SELECT ordinal_position - 1 AS cid, column_name AS name, data_type AS type,
+                   CASE WHEN is_nullable = 'NO' THEN 1 ELSE 0 END AS notnull,
+                   column_default AS dflt_value
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ?
+            ORDER BY ordinal_position
+        """, (table_name,), db_path=db_path)
     query = f"PRAGMA table_info({table_name})"
     return execute_query(query, db_path=db_path)
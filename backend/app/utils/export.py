@@ -0,0 +1,288 @@
+"""
+Streaming export of leads and conversation messages as NDJSON or CSV.
+
+Rows are read in keyset pages ordered by primary key:
+
+    WHERE id > :after ... ORDER BY id LIMIT :page_size
+
+Each page is a short read on its own read connection (see
+``get_read_connection``), so memory stays at one page whatever the table
+size, and a slow consumer never pins a pooled connection or keeps a read
+transaction open (which would hold back WAL checkpoints on SQLite and
+vacuum on PostgreSQL). Every row carries its ``id``: an interrupted export
+resumes with ``after=<last id received>``.
+
+Messages that ``message_archive`` moved out of the ``message`` table are
+included: the chunk index of the export window is read once, its gzip
+members are opened as the id cursor reaches them, and archived and hot
+rows are merged in id order (message ids are never reused), so paging and
+``after`` work the same across both. An unreadable archive chunk is
+logged, counted in ``archive_read_errors_total`` and skipped.
+
+The export is not a snapshot: rows written while it runs show up if their
+id is past the cursor.
+
+    python -m app.utils.export leads --status interested --format csv -o leads.csv
+    python -m app.utils.export conversations --since 2026-01-01 --gzip -o messages.ndjson.gz
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import zlib
+import heapq
+import argparse
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from app.utils import message_archive
+from app.utils.database import get_read_connection
+from app.utils.metrics import metrics
+from app.utils.queries import queries, export_query_name
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+EXPORT_FIELDS = {
+    'leads': ('id', 'phone_number', 'name', 'status', 'interest_level', 'source', 'created_at',
+              'total_messages', 'last_message_at', 'last_sender', 'next_appointment'),
+    'conversations': ('id', 'conversation_id', 'lead_id', 'phone_number', 'name', 'sender', 'content',
+                      'intent_detected', 'timestamp'),
+}
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_page_size() -> int:
+    """Rows per keyset page (EXPORT_PAGE_SIZE, default 1000)."""
+    return max(1, int(os.getenv('EXPORT_PAGE_SIZE', 1000)))
+
+
+def parse_bound(value: Optional[str], end: bool = False) -> Optional[str]:
+    """
+    Normalize a date range bound to the stored timestamp format.
+
+    Args:
+        value: ISO date or datetime, or None/empty for an open bound
+        end: Upper bound. A plain date then covers that whole day.
+
+    Returns:
+        'YYYY-MM-DD HH:MM:SS' (the upper bound is exclusive), or None
+
+    Raises:
+        ValueError: If the value is not an ISO date
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def iter_pages(kind: str, status: Optional[str] = None, source: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None, after: int = 0,
+               db_path: Optional[str] = None, page_size: Optional[int] = None) -> Iterator[List[dict]]:
+    """
+    Rows to export, one keyset page at a time.
+
+    Args:
+        kind: 'leads' or 'conversations' (one row per message)
+        status: Lead status filter
+        source: Lead source filter
+        since: Lower bound (inclusive) on lead created_at / message timestamp
+        until: Upper bound (exclusive), already normalized by parse_bound
+        after: Resume cursor: only rows with a greater id
+        db_path: Primary target. Reads go through read_db_path.
+        page_size: Rows per page. Defaults to EXPORT_PAGE_SIZE.
+
+    Yields:
+        Non-empty lists of dicts with the EXPORT_FIELDS of the kind
+    """
+    if kind not in EXPORT_FIELDS:
+        raise ValueError(f"Unknown export '{kind}'")
+    page_size = page_size or export_page_size()
+    pages = _table_pages(kind, status, source, since, until, after, db_path, page_size)
+    if kind == 'conversations':
+        rows = heapq.merge(
+            (row for page in pages for row in page),
+            _archived_rows(status, source, since, until, after, db_path),
+            key=lambda row: row['id'])
+        pages = _paginate(rows, page_size)
+
+    for rows in pages:
+        metrics.inc('export_rows_total', len(rows), kind=kind)
+        yield rows
+
+
+def _table_pages(kind, status, source, since, until, after, db_path, page_size):
+    """Keyset pages of the table rows (each page on its own read connection)."""
+    name = export_query_name(kind, status=bool(status), source=bool(source))
+    filters = [value for value in (status, source) if value] + [since, until]
+
+    while True:
+        with get_read_connection(db_path) as conn:
+            rows = [dict(row) for row in queries.fetchall(conn, name, [after] + filters + [page_size])]
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1]['id']
+
+
+def _archived_rows(status, source, since, until, after, db_path):
+    """
+    Archived messages in the export window, in id order.
+
+    Chunks come sorted by their first message id, but the messages of
+    different conversations interleave: a chunk is read once the next id to
+    emit reaches its first message, and only the loaded chunks are held.
+    """
+    with get_read_connection(db_path) as conn:
+        chunks = [dict(row) for row in queries.fetchall(conn, 'archive.export_chunks',
+                                                        (after, status, source, since, until))]
+    pending = []
+    position = 0
+    while position < len(chunks) or pending:
+        while position < len(chunks) and (not pending or chunks[position]['first_message_id'] <= pending[0][0]):
+            chunk = chunks[position]
+            position += 1
+            for message in message_archive.read_chunk(chunk):
+                timestamp = str(message['timestamp'])
+                if message['id'] <= after or (since and timestamp < since) or (until and timestamp >= until):
+                    continue
+                heapq.heappush(pending, (message['id'], {
+                    'id': message['id'],
+                    'conversation_id': message['conversation_id'],
+                    'lead_id': chunk['lead_id'],
+                    'phone_number': chunk['phone_number'],
+                    'name': chunk['name'],
+                    'sender': message['sender'],
+                    'content': message['content'],
+                    'intent_detected': message['intent_detected'],
+                    'timestamp': message['timestamp'],
+                }))
+        if pending:
+            yield heapq.heappop(pending)[1]
+
+
+def _paginate(rows, page_size):
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _encode_page(rows: List[dict], fmt: str, fields: tuple) -> str:
+    if fmt == 'ndjson':
+        return ''.join(json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([row[field] for field in fields] for row in rows)
+    return buffer.getvalue()
+
+
+def encode(pages: Iterator[List[dict]], fmt: str, fields: tuple, compress: bool = False) -> Iterator[bytes]:
+    """
+    Serialize pages to NDJSON or CSV bytes, one chunk per page.
+
+    Args:
+        pages: Output of iter_pages
+        fmt: 'ndjson' or 'csv' (with a header row)
+        fields: Column order for CSV
+        compress: Gzip on the fly. Each page is sync-flushed, so whatever the
+            consumer received so far decompresses even if the stream is cut.
+
+    Yields:
+        Encoded chunks
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'")
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def chunk(text: str) -> bytes:
+        data = text.encode('utf-8')
+        if compressor:
+            data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+    if fmt == 'csv':
+        yield chunk(','.join(fields) + '\r\n')
+    for rows in pages:
+        yield chunk(_encode_page(rows, fmt, fields))
+    if compressor:
+        yield compressor.flush()
+
+
+def export(kind: str, fmt: str = 'ndjson', compress: bool = False, **filters) -> Iterator[bytes]:
+    """
+    Stream an export as encoded chunks.
+
+    Args:
+        kind: 'leads' or 'conversations'
+        fmt: 'ndjson' or 'csv'
+        compress: Gzip on the fly
+        **filters: Keyword arguments of iter_pages
+
+    Yields:
+        Encoded chunks
+    """
+    return encode(iter_pages(kind, **filters), fmt, EXPORT_FIELDS[kind], compress)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Export leads or conversation messages')
+    parser.add_argument('kind', choices=sorted(EXPORT_FIELDS))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+    parser.add_argument('--status', help='Lead status')
+    parser.add_argument('--source', help='Lead source')
+    parser.add_argument('--since', help='From this ISO date (inclusive)')
+    parser.add_argument('--until', help='Up to this ISO date (a plain date includes the whole day)')
+    parser.add_argument('--after', type=int, default=0, help='Resume after this id')
+    parser.add_argument('--gzip', action='store_true', help='Compress the output')
+    parser.add_argument('--db', help='SQLite path or postgresql:// URL (default: DB_URL or bjj_academy.db)')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        since, until = parse_bound(args.since), parse_bound(args.until, end=True)
+    except ValueError as e:
+        parser.error(str(e))
+
+    count, last_id = 0, args.after
+
+    def counted(pages):
+        nonlocal count, last_id
+        for rows in pages:
+            count += len(rows)
+            last_id = rows[-1]['id']
+            yield rows
+
+    pages = iter_pages(args.kind, status=args.status, source=args.source, since=since, until=until,
+                       after=args.after, db_path=args.db)
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for data in encode(counted(pages), args.format, EXPORT_FIELDS[args.kind], args.gzip):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+
+    print(f"{count} {args.kind} rows exported, last id {last_id} (resume with --after {last_id})",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
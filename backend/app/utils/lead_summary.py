@@ -0,0 +1,86 @@
+"""
+Incrementally maintained per-lead summary for the dashboard.
+
+``lead_summary`` (migrations/add_lead_summary.sql) holds what /api/leads
+used to aggregate from every message on each poll: message count, time and
+sender of the last message, and the next scheduled appointment. Every saved
+message calls ``record_message`` with the new message id, inside the
+transaction that inserted it. On existing SQLite databases the table is
+created and loaded at startup (``app.utils.schema``).
+
+Lead status is not copied: the dashboard joins ``lead`` by primary key, so
+status changes need no summary write. No service writes ``appointment``
+(the bot books ``trial_weeks``): the next appointment is taken when the
+table is loaded and on every rebuild.
+
+Rows written outside the services (imports, manual SQL, appointments) are
+picked up by a rebuild:
+
+    python -m app.utils.lead_summary              # configured database
+    python -m app.utils.lead_summary --db PATH    # SQLite path or postgresql:// URL
+"""
+
+import sys
+import time
+import argparse
+import logging
+from typing import Optional
+
+from app.utils.database import unit_of_work, default_db_path
+from app.utils.queries import queries
+
+logger = logging.getLogger(__name__)
+
+
+def record_message(cursor, message_id: int):
+    """
+    Count a just-inserted message in its lead's summary.
+
+    Args:
+        cursor: Cursor of the transaction that inserted the message
+        message_id: ``cursor.lastrowid`` of the message INSERT
+    """
+    queries.execute(cursor, 'lead_summary.record_message', (message_id,))
+
+
+async def arecord_message(cursor, message_id: int):
+    """record_message() for aiosqlite cursors."""
+    await queries.aexecute(cursor, 'lead_summary.record_message', (message_id,))
+
+
+def rebuild(db_path: Optional[str] = None) -> dict:
+    """
+    Recompute every summary row from lead, message and appointment.
+
+    Runs in one transaction, so readers see either the old or the new
+    summary. Rows of deleted leads are removed.
+
+    Args:
+        db_path: Database target. Defaults to DB_URL / bjj_academy.db.
+
+    Returns:
+        Dict with leads (rows upserted), removed (orphan rows) and seconds
+    """
+    started = time.perf_counter()
+    with unit_of_work(db_path=db_path or default_db_path()) as cursor:
+        leads = queries.execute(cursor, 'lead_summary.rebuild').rowcount
+        removed = queries.execute(cursor, 'lead_summary.delete_orphans').rowcount
+
+    result = {'leads': leads, 'removed': removed, 'seconds': round(time.perf_counter() - started, 3)}
+    logger.info(f"lead_summary rebuilt: {result}")
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Rebuild the lead_summary table')
+    parser.add_argument('--db', help='SQLite path or postgresql:// URL (default: DB_URL or bjj_academy.db)')
+    args = parser.parse_args(argv)
+
+    result = rebuild(args.db)
+    print(f"{result['leads']} leads summarized, {result['removed']} orphan rows removed "
+          f"in {result['seconds']} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
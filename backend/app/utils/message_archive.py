@@ -0,0 +1,258 @@
+"""
+Monthly compressed archive for old chat history.
+
+Messages of closed conversations older than ``DB_ARCHIVE_AFTER_DAYS``
+(default 180) are moved out of the ``message`` table into append-only
+monthly files:
+
+    <DB_ARCHIVE_DIR>/messages-2026-01.jsonl.gz
+
+Each (conversation, month) run is one gzip member holding its messages as
+JSON lines, so a whole file still reads with ``zcat``. The member's byte
+offset and length are indexed in ``message_archive_chunk``
+(migrations/add_message_archive.sql), which lets ``archived_messages`` read
+one lead's history without decompressing the rest of the month.
+
+A member is written and fsynced before the transaction that indexes it and
+deletes the hot rows; a crash in between leaves an unreferenced member and
+the messages still in ``message``, never a gap.
+
+Active conversations are left alone: their history is the context of the
+next reply. With ``DB_ARCHIVE_CLOSE_IDLE=true`` (or ``--close-idle``) the
+pass first closes conversations with no message since the cutoff, so their
+history is archived too and the lead's next message opens a new
+conversation without it.
+
+    python -m app.utils.message_archive                  # configured database
+    python -m app.utils.message_archive --days 90 --vacuum
+    python -m app.utils.message_archive --close-idle
+"""
+
+import os
+import sys
+import gzip
+import json
+import zlib
+import time
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.utils.database import get_db_connection, unit_of_work, default_db_path
+from app.utils.metrics import metrics
+from app.utils.postgres import is_postgres_url
+from app.utils.queries import queries
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = ('id', 'conversation_id', 'sender', 'content', 'intent_detected', 'timestamp')
+
+# Serializes appends to the month files within the process
+_append_lock = threading.Lock()
+
+
+def archive_dir() -> str:
+    """Directory of the archive files (DB_ARCHIVE_DIR, default ./archive)."""
+    return os.getenv('DB_ARCHIVE_DIR', 'archive')
+
+
+def archive_after_days() -> int:
+    """Age in days of the messages that are archived (DB_ARCHIVE_AFTER_DAYS)."""
+    return int(os.getenv('DB_ARCHIVE_AFTER_DAYS', 180))
+
+
+def archive_close_idle() -> bool:
+    """Whether the archive pass closes idle active conversations first (DB_ARCHIVE_CLOSE_IDLE)."""
+    return os.getenv('DB_ARCHIVE_CLOSE_IDLE', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _month_runs(rows: list) -> list:
+    """Split id-ordered rows into consecutive runs of the same month."""
+    runs = []
+    for row in rows:
+        month = str(row['timestamp'])[:7]
+        if runs and runs[-1][0] == month:
+            runs[-1][1].append(row)
+        else:
+            runs.append((month, [row]))
+    return runs
+
+
+def _append_member(directory: str, month: str, rows: list) -> tuple:
+    """
+    Append rows as one gzip member to the month file.
+
+    Returns:
+        Tuple (file name, byte offset, byte length)
+    """
+    lines = ''.join(json.dumps({field: row[field] for field in ARCHIVE_FIELDS}, ensure_ascii=False,
+                               default=str) + '\n' for row in rows)
+    member = gzip.compress(lines.encode('utf-8'))
+    name = f'messages-{month}.jsonl.gz'
+
+    with _append_lock, open(os.path.join(directory, name), 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(member)
+        f.flush()
+        os.fsync(f.fileno())
+    return name, offset, len(member)
+
+
+def _archive_conversation(db_path: str, directory: str, conversation_id: int, lead_id: int,
+                          cutoff: str) -> int:
+    """Move one closed conversation's old messages to the archive. Returns messages moved."""
+    with get_db_connection(db_path=db_path) as conn:
+        rows = [dict(row) for row in queries.fetchall(conn, 'archive.conversation_messages',
+                                                      (conversation_id, cutoff))]
+    if not rows:
+        return 0
+
+    chunks = []
+    for month, run in _month_runs(rows):
+        name, offset, length = _append_member(directory, month, run)
+        chunks.append((month, run, name, offset, length))
+
+    with unit_of_work(db_path=db_path) as cursor:
+        for month, run, name, offset, length in chunks:
+            first, last = run[0], run[-1]
+            queries.execute(cursor, 'archive.insert_chunk', (
+                lead_id, conversation_id, month, name, offset, length, len(run),
+                first['id'], last['id'], first['timestamp'], last['timestamp'], last['sender']
+            ))
+            deleted = queries.execute(cursor, 'archive.delete_messages',
+                                      (conversation_id, first['id'], last['id'], cutoff)).rowcount
+            if deleted != len(run):
+                # Someone changed the conversation meanwhile: keep the hot rows
+                raise RuntimeError(f"conversation {conversation_id}: expected to archive "
+                                   f"{len(run)} messages of {month}, found {deleted}")
+    return len(rows)
+
+
+def archive_messages(db_path: Optional[str] = None, older_than_days: Optional[int] = None,
+                     directory: Optional[str] = None, close_idle: Optional[bool] = None) -> dict:
+    """
+    Move the old messages of closed conversations to the archive.
+
+    Each conversation is archived in its own transaction; a failure is
+    logged and leaves that conversation's messages in place.
+
+    Args:
+        db_path: Database target. Defaults to DB_URL / bjj_academy.db.
+        older_than_days: Cutoff age. Defaults to DB_ARCHIVE_AFTER_DAYS.
+        directory: Archive directory. Defaults to DB_ARCHIVE_DIR.
+        close_idle: Close active conversations idle since the cutoff first.
+            Defaults to DB_ARCHIVE_CLOSE_IDLE (off).
+
+    Returns:
+        Dict with closed (conversations), conversations, messages, errors and seconds
+    """
+    db_path = db_path or default_db_path()
+    directory = directory or archive_dir()
+    days = archive_after_days() if older_than_days is None else older_than_days
+    cutoff = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    os.makedirs(directory, exist_ok=True)
+
+    close_idle = archive_close_idle() if close_idle is None else close_idle
+
+    started = time.perf_counter()
+    closed = 0
+    if close_idle:
+        with unit_of_work(db_path=db_path) as cursor:
+            closed = queries.execute(cursor, 'archive.close_idle_conversations', (cutoff, cutoff)).rowcount
+
+    with get_db_connection(db_path=db_path) as conn:
+        conversations = [tuple(row) for row in queries.fetchall(conn, 'archive.closed_conversations', (cutoff,))]
+
+    moved = errors = 0
+    for conversation_id, lead_id in conversations:
+        try:
+            moved += _archive_conversation(db_path, directory, conversation_id, lead_id, cutoff)
+        except Exception as e:
+            errors += 1
+            logger.error(f"Could not archive conversation {conversation_id}: {e}")
+
+    metrics.inc('message_archive_messages_total', moved)
+    result = {
+        'closed': closed,
+        'conversations': len(conversations),
+        'messages': moved,
+        'errors': errors,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"Message archive: {result}")
+    return result
+
+
+def archived_messages(conn, lead_id: int, directory: Optional[str] = None) -> list:
+    """
+    Archived messages of a lead, oldest first.
+
+    Args:
+        conn: Open connection to read the chunk index from
+        lead_id: Lead whose history is wanted
+        directory: Archive directory. Defaults to DB_ARCHIVE_DIR.
+
+    Returns:
+        List of dicts with the ``message`` columns. A chunk whose file is
+        missing, unreadable or corrupt is skipped (see ``read_chunk``), so
+        the caller still gets the rest of the history.
+    """
+    messages = []
+    for chunk in queries.fetchall(conn, 'archive.chunks_by_lead', (lead_id,)):
+        messages.extend(read_chunk(chunk, directory))
+    return messages
+
+
+def read_chunk(chunk, directory: Optional[str] = None) -> list:
+    """
+    Messages of one indexed gzip member, in id order.
+
+    Args:
+        chunk: Index row with path, byte_offset and byte_length
+        directory: Archive directory. Defaults to DB_ARCHIVE_DIR.
+
+    Returns:
+        List of dicts with the ``message`` columns. Empty (logged and counted
+        in archive_read_errors_total) if the file is missing, unreadable or
+        corrupt.
+    """
+    path = os.path.join(directory or archive_dir(), chunk['path'])
+    try:
+        with open(path, 'rb') as f:
+            f.seek(chunk['byte_offset'])
+            data = gzip.decompress(f.read(chunk['byte_length']))
+        return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+    except (OSError, EOFError, zlib.error, ValueError) as e:
+        logger.error(f"Archive chunk unreadable ({path} @ {chunk['byte_offset']}): {e}")
+        metrics.inc('archive_read_errors_total')
+        return []
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Archive old messages of closed conversations')
+    parser.add_argument('--db', help='SQLite path or postgresql:// URL (default: DB_URL or bjj_academy.db)')
+    parser.add_argument('--days', type=int, help='Cutoff age in days (default: DB_ARCHIVE_AFTER_DAYS or 180)')
+    parser.add_argument('--dir', help='Archive directory (default: DB_ARCHIVE_DIR or ./archive)')
+    parser.add_argument('--close-idle', action='store_true', default=None,
+                        help='Close active conversations idle since the cutoff first (default: DB_ARCHIVE_CLOSE_IDLE)')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM afterwards to shrink the SQLite file')
+    args = parser.parse_args(argv)
+
+    db_path = args.db or default_db_path()
+    result = archive_messages(db_path, args.days, args.dir, close_idle=args.close_idle)
+    print(f"{result['closed']} conversations closed, {result['messages']} messages from "
+          f"{result['conversations']} conversations archived in {result['seconds']} s")
+    if result['errors']:
+        print(f"{result['errors']} conversations failed, see the log")
+
+    if args.vacuum and not is_postgres_url(db_path):
+        with get_db_connection(db_path=db_path) as conn:
+            conn.execute("VACUUM")
+        print("VACUUM done")
+    return 1 if result['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
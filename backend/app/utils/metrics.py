@@ -0,0 +1,511 @@
+"""
+Lightweight in-process metrics for pipeline latency tracking.
+
+This module provides counters, gauges and latency histograms that services
+can update cheaply from any thread. Values are kept in memory and exposed as
+a plain dict through ``snapshot()`` so they can be served as JSON, or in the
+Prometheus text format through ``render_prometheus()``.
+
+Multi-process deployments (gunicorn workers, dispatcher process shards, Celery
+workers) set ``METRICS_MULTIPROC_DIR``: every process periodically writes its
+own state to ``<dir>/metrics-<pid>.json`` and ``render_prometheus()`` merges
+all files, so any worker can serve the totals of the whole deployment. A
+process removes its file when it exits; files left by processes that died
+without cleaning up (SIGKILL, ``os._exit``) are removed by the next flusher
+start or merge. To Prometheus a worker restart looks like a counter reset,
+which ``rate()`` already handles.
+"""
+
+import os
+import json
+import atexit
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds (upper bounds)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0
+)
+
+# Number of recent samples kept per histogram for percentile estimates
+RECENT_SAMPLES = 2048
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    """Build a hashable, order-independent key from a labels dict."""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _percentile(sorted_values: list, pct: float) -> Optional[float]:
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Histogram:
+    """Latency histogram with cumulative buckets and a bounded sample window."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        self.recent.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def summary(self) -> dict:
+        values = sorted(self.recent)
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else None,
+            'max': round(self.max, 6),
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'p99': _percentile(values, 99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe registry of named counters, gauges and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Increment a counter."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to an absolute value."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def add_gauge(self, name: str, amount: float, **labels):
+        """Add (or subtract) from a gauge."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a sample in a histogram."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def timed(self, name: str, **labels):
+        """
+        Decorator version of ``timer`` for whole functions.
+
+        Usage:
+            @metrics.timed('reminder_stage_seconds', stage='check_cycle')
+            def check_and_send_reminders(self): ...
+        """
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.observe(name, time.perf_counter() - start, **labels)
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Context manager that records the elapsed wall time of its block.
+
+        Usage:
+            with metrics.timer('webhook_stage_seconds', stage='persist'):
+                persist()
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def get_gauge(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._gauges.get((name, _label_key(labels)), 0)
+
+    def get_histogram(self, name: str, **labels) -> Optional[dict]:
+        with self._lock:
+            histogram = self._histograms.get((name, _label_key(labels)))
+            return histogram.summary() if histogram else None
+
+    def snapshot(self) -> dict:
+        """Return all metrics as a JSON-serializable dict."""
+        def fmt(name, labels):
+            if not labels:
+                return name
+            return name + '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+        with self._lock:
+            return {
+                'counters': {fmt(n, l): v for (n, l), v in self._counters.items()},
+                'gauges': {fmt(n, l): v for (n, l), v in self._gauges.items()},
+                'histograms': {fmt(n, l): h.summary() for (n, l), h in self._histograms.items()},
+            }
+
+    def reset(self):
+        """Drop every recorded metric (mainly for tests)."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def export_state(self) -> dict:
+        """Return the mergeable raw state (no sample windows) as plain lists."""
+        with self._lock:
+            return {
+                'counters': [[n, list(l), v] for (n, l), v in self._counters.items()],
+                'gauges': [[n, list(l), v] for (n, l), v in self._gauges.items()],
+                'histograms': [
+                    [n, list(l), list(h.buckets), list(h.bucket_counts), h.count, h.sum, h.max]
+                    for (n, l), h in self._histograms.items()
+                ],
+            }
+
+    def merge_state(self, state: dict, extra_gauge_labels: Optional[Dict[str, str]] = None):
+        """
+        Add a state produced by ``export_state()`` into this registry.
+
+        Counters and histograms are summed. Gauges are point-in-time values of
+        one process, so they keep ``extra_gauge_labels`` (e.g. the pid) apart.
+        """
+        with self._lock:
+            for name, labels, value in state.get('counters', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+
+            for name, labels, value in state.get('gauges', []):
+                label_dict = dict(tuple(pair) for pair in labels)
+                label_dict.update(extra_gauge_labels or {})
+                key = (name, _label_key(label_dict))
+                self._gauges[key] = self._gauges.get(key, 0) + value
+
+            for name, labels, buckets, bucket_counts, count, total, maximum in state.get('histograms', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(tuple(buckets))
+                if list(histogram.buckets) != list(buckets):
+                    continue
+                histogram.bucket_counts = [a + b for a, b in zip(histogram.bucket_counts, bucket_counts)]
+                histogram.count += count
+                histogram.sum += total
+                histogram.max = max(histogram.max, maximum)
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                ((key, list(h.buckets), list(h.bucket_counts), h.count, h.sum))
+                for key, h in self._histograms.items()
+            )
+
+        lines = []
+        typed = set()
+
+        def type_line(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            type_line(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for (name, labels), value in gauges:
+            type_line(name, 'gauge')
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for (name, labels), buckets, bucket_counts, count, total in histograms:
+            type_line(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, bucket_counts):
+                cumulative += bucket_count
+                le = labels + (('le', _format_value(bound)),)
+                lines.append(f'{name}_bucket{_format_labels(le)} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label_value(v)}"' for k, v in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+# Process-wide registry shared by all services
+metrics = MetricsRegistry()
+
+
+# ========== MULTI-PROCESS EXPORT ==========
+
+def multiprocess_dir() -> Optional[str]:
+    """Directory shared by all processes of the deployment, if configured."""
+    return os.getenv('METRICS_MULTIPROC_DIR') or None
+
+
+def _process_file(directory: str, pid: int) -> str:
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def write_process_file(registry: MetricsRegistry = None, directory: Optional[str] = None):
+    """
+    Atomically write this process's state to ``<directory>/metrics-<pid>.json``.
+
+    Args:
+        registry: Registry to export. Defaults to the global registry.
+        directory: Target directory. Defaults to METRICS_MULTIPROC_DIR.
+    """
+    registry = registry or metrics
+    directory = directory or multiprocess_dir()
+    if not directory:
+        return
+
+    path = _process_file(directory, os.getpid())
+    tmp_path = f'{path}.tmp'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(registry.export_state(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics file {path}: {e}")
+
+
+def remove_process_file(directory: Optional[str] = None, pid: Optional[int] = None):
+    """
+    Delete a process's metrics file, if it exists.
+
+    Args:
+        directory: Shared directory. Defaults to METRICS_MULTIPROC_DIR.
+        pid: Process whose file is removed. Defaults to this process.
+    """
+    directory = directory or multiprocess_dir()
+    if not directory:
+        return
+
+    path = _process_file(directory, os.getpid() if pid is None else pid)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove metrics file {path}: {e}")
+
+
+def _file_pid(filename: str) -> Optional[int]:
+    if not (filename.startswith('metrics-') and filename.endswith('.json')):
+        return None
+    try:
+        return int(filename[len('metrics-'):-len('.json')])
+    except ValueError:
+        return None
+
+
+def remove_dead_process_files(directory: Optional[str] = None) -> int:
+    """
+    Delete the files of processes that are no longer running.
+
+    Args:
+        directory: Shared directory. Defaults to METRICS_MULTIPROC_DIR.
+
+    Returns:
+        Number of files removed
+    """
+    directory = directory or multiprocess_dir()
+    if not directory or not os.path.isdir(directory):
+        return 0
+
+    removed = 0
+    for filename in os.listdir(directory):
+        pid = _file_pid(filename)
+        if pid is not None and not _pid_alive(pid):
+            remove_process_file(directory, pid)
+            removed += 1
+    return removed
+
+
+def collect(registry: MetricsRegistry = None, directory: Optional[str] = None) -> MetricsRegistry:
+    """
+    Build a registry with the totals of every process.
+
+    The calling process contributes its live state; the other running
+    processes contribute their last written file. Files of processes that
+    have exited are removed instead of being summed.
+
+    Args:
+        registry: Live registry of this process. Defaults to the global registry.
+        directory: Shared directory. Defaults to METRICS_MULTIPROC_DIR.
+
+    Returns:
+        MetricsRegistry: Merged registry (the live one if no directory is set)
+    """
+    registry = registry or metrics
+    directory = directory or multiprocess_dir()
+    if not directory or not os.path.isdir(directory):
+        return registry
+
+    own_pid = os.getpid()
+    merged = MetricsRegistry()
+    merged.merge_state(registry.export_state(), {'pid': str(own_pid)})
+
+    for filename in sorted(os.listdir(directory)):
+        pid = _file_pid(filename)
+        if pid is None or pid == own_pid:
+            continue
+        if not _pid_alive(pid):
+            remove_process_file(directory, pid)
+            continue
+
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable metrics file {filename}: {e}")
+            continue
+
+        merged.merge_state(state, {'pid': str(pid)})
+
+    return merged
+
+
+def render_prometheus(registry: MetricsRegistry = None) -> str:
+    """Prometheus text for this process, or for all processes when multi-process."""
+    return collect(registry).render_prometheus()
+
+
+class _Flusher:
+    """Background thread that keeps this process's metrics file fresh."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+
+    def start(self):
+        directory = multiprocess_dir()
+        if not directory:
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+
+        remove_dead_process_files(directory)
+        interval = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+        thread = threading.Thread(target=self._run, args=(interval, self._stop),
+                                  name='metrics-flusher', daemon=True)
+        thread.start()
+
+    def _run(self, interval, stop):
+        while not stop.wait(interval):
+            write_process_file()
+
+    def after_fork(self):
+        # The child inherits the parent's numbers: drop them so they are not
+        # counted twice, and restart the flusher for the child's own file
+        metrics.reset()
+        self._pid = None
+        self.start()
+
+
+_flusher = _Flusher()
+
+
+def start_multiprocess_flusher():
+    """
+    Start writing this process's metrics to METRICS_MULTIPROC_DIR.
+
+    Safe to call several times; forked children restart it automatically.
+    Does nothing when METRICS_MULTIPROC_DIR is not set.
+    """
+    _flusher.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=lambda: _flusher.after_fork() if _flusher._pid else None)
+
+@atexit.register
+def _remove_own_file():
+    # Stop flushing first so the file is not written again after removal
+    _flusher._stop.set()
+    remove_process_file()
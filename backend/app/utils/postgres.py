@@ -0,0 +1,376 @@
+"""
+PostgreSQL backend for the raw-SQL service layer.
+
+The services write SQLite-flavoured SQL (``?`` placeholders, ``lastrowid``,
+``BEGIN IMMEDIATE``). When the database target is a ``postgresql://`` URL,
+``app.utils.database`` hands the connection out of a psycopg pool wrapped in
+adapters that keep the sqlite3 DB-API surface:
+
+- ``?`` placeholders become ``%s`` (string literals are left alone)
+- plain INSERTs get ``RETURNING id`` so ``cursor.lastrowid`` works
+- rows support ``row['name']`` and ``row[0]`` like sqlite3.Row
+- timestamps and dates come back as ISO strings, like the SQLite TEXT columns
+- psycopg errors are re-raised as the matching sqlite3 exception, so the
+  existing ``except sqlite3.Error`` handlers keep working
+
+Date arithmetic goes through the ``days_since(ts)`` SQL function: defined in
+migrations/postgres/create_core_tables.sql here, registered as a Python
+function on SQLite connections.
+
+psycopg is optional (pip install "psycopg[binary]" psycopg-pool).
+"""
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from app.utils.metrics import metrics
+
+try:
+    import psycopg
+    from psycopg.pq import TransactionStatus
+    from psycopg.types.string import TextLoader
+    from psycopg_pool import ConnectionPool as PsycopgPool, PoolTimeout
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_URL_PREFIXES = ('postgresql://', 'postgres://', 'postgresql+')
+
+# '...' literals and "..." identifiers are copied verbatim; ? and % outside
+# them are rewritten. % inside literals must be doubled as well, psycopg
+# parses the whole query text.
+_TOKENS = re.compile(r"('(?:[^']|'')*'|\"[^\"]*\")|(\?)|(%)")
+_BEGIN = re.compile(r'^\s*BEGIN(\s+(DEFERRED|IMMEDIATE|EXCLUSIVE))?(\s+TRANSACTION)?\s*;?\s*$', re.IGNORECASE)
+_PLAIN_INSERT = re.compile(r'^\s*INSERT\s', re.IGNORECASE)
+_NO_LASTROWID = re.compile(r'\bRETURNING\b|\bON\s+CONFLICT\b', re.IGNORECASE)
+_PASSWORD = re.compile(r'(://[^:/@]+:)[^@]*@')
+
+
+def is_postgres_url(target: Optional[str]) -> bool:
+    """True if the database target is a PostgreSQL URL rather than a SQLite path."""
+    return bool(target) and target.startswith(_URL_PREFIXES)
+
+
+def redact_url(url: str) -> str:
+    """URL with the password hidden, for logs and stats."""
+    return _PASSWORD.sub(r'\1***@', url)
+
+
+def conninfo(url: str) -> str:
+    # SQLAlchemy-style driver suffix (postgresql+psycopg://) is not libpq syntax
+    return re.sub(r'^postgresql\+\w+://', 'postgresql://', url)
+
+
+def translate(sql: str) -> str:
+    """
+    Rewrite SQLite-style SQL for psycopg.
+
+    Args:
+        sql: Statement with ``?`` placeholders
+
+    Returns:
+        Statement with ``%s`` placeholders and literal ``%`` escaped
+    """
+    def replace(match):
+        literal, placeholder, percent = match.groups()
+        if literal is not None:
+            return literal.replace('%', '%%')
+        return '%s' if placeholder else '%%'
+
+    return _TOKENS.sub(replace, sql)
+
+
+def with_returning_id(sql: str) -> Optional[str]:
+    """
+    Append ``RETURNING id`` to a plain INSERT so lastrowid can be filled in.
+
+    Returns:
+        The rewritten statement, or None when the statement is not a plain
+        INSERT (already has RETURNING, or is an upsert whose row may not be new)
+    """
+    if not _PLAIN_INSERT.match(sql) or _NO_LASTROWID.search(sql):
+        return None
+    return sql.rstrip().rstrip(';') + ' RETURNING id'
+
+
+@contextmanager
+def _sqlite_errors():
+    """Re-raise psycopg errors as the equivalent sqlite3 exception."""
+    try:
+        yield
+    except psycopg.IntegrityError as e:
+        raise sqlite3.IntegrityError(str(e)) from e
+    except psycopg.OperationalError as e:
+        raise sqlite3.OperationalError(str(e)) from e
+    except psycopg.ProgrammingError as e:
+        raise sqlite3.ProgrammingError(str(e)) from e
+    except psycopg.Error as e:
+        raise sqlite3.DatabaseError(str(e)) from e
+
+
+class Row(tuple):
+    """Tuple row with sqlite3.Row-style access by column name."""
+
+    def __new__(cls, values, columns):
+        row = super().__new__(cls, values)
+        row._columns = columns
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._columns[key])
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._columns)
+
+
+def _row_factory(cursor):
+    if cursor.description is None:
+        return tuple
+    columns = {col.name: i for i, col in reversed(list(enumerate(cursor.description)))}
+    return lambda values: Row(values, columns)
+
+
+class PostgresCursor:
+    """sqlite3.Cursor-compatible wrapper around a psycopg cursor."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.lastrowid = None
+
+    def execute(self, sql: str, params=()):
+        if _BEGIN.match(sql):
+            # psycopg opens the transaction with the first statement
+            return self
+
+        returning = with_returning_id(sql)
+        with _sqlite_errors():
+            self._cursor.execute(translate(returning or sql), tuple(params or ()))
+            if returning:
+                self.lastrowid = self._cursor.fetchone()[0]
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        with _sqlite_errors():
+            self._cursor.executemany(translate(sql), [tuple(p) for p in seq_of_params])
+        return self
+
+    def fetchone(self):
+        with _sqlite_errors():
+            return self._cursor.fetchone()
+
+    def fetchall(self):
+        with _sqlite_errors():
+            return self._cursor.fetchall()
+
+    def fetchmany(self, size: Optional[int] = None):
+        with _sqlite_errors():
+            return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class PostgresConnection:
+    """sqlite3.Connection-compatible wrapper around a pooled psycopg connection."""
+
+    def __init__(self, conn, row_factory: bool = True):
+        self._conn = conn
+        self.row_factory = row_factory
+
+    def cursor(self) -> PostgresCursor:
+        if self.row_factory:
+            return PostgresCursor(self._conn.cursor(row_factory=_row_factory))
+        return PostgresCursor(self._conn.cursor())
+
+    def execute(self, sql: str, params=()) -> PostgresCursor:
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params) -> PostgresCursor:
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        with _sqlite_errors():
+            self._conn.commit()
+
+    def rollback(self):
+        with _sqlite_errors():
+            self._conn.rollback()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._conn.info.transaction_status != TransactionStatus.IDLE
+
+
+def _configure(conn):
+    # Timestamps and dates as text, matching what the SQLite columns hold
+    for type_name in ('timestamp', 'timestamptz', 'date'):
+        conn.adapters.register_loader(type_name, TextLoader)
+
+    # Server-side prepared statements: a query text run prepare_threshold
+    # times on this connection is prepared once and reused (the named query
+    # registry keeps the text stable). DB_PREPARE_THRESHOLD=-1 disables it,
+    # e.g. behind PgBouncer in transaction mode.
+    threshold = int(os.getenv('DB_PREPARE_THRESHOLD', 5))
+    conn.prepare_threshold = None if threshold < 0 else threshold
+    conn.prepared_max = max(1, int(os.getenv('DB_STATEMENT_CACHE_SIZE', 128)))
+
+
+class PostgresPool:
+    """
+    psycopg connection pool for one PostgreSQL database.
+
+    Connections are checked for liveness on checkout and recycled after
+    ``max_lifetime`` seconds; a connection returned inside a transaction is
+    rolled back by the pool. As in the SQLite ``ConnectionPool``, a thread
+    that already holds a connection and asks for another one gets a
+    temporary overflow connection instead of waiting on the pool.
+    """
+
+    def __init__(self, url: str, max_size: int = 10, min_size: int = 1,
+                 checkout_timeout: float = 30.0, max_lifetime: float = 300.0):
+        if not PSYCOPG_AVAILABLE:
+            raise RuntimeError('psycopg is required for PostgreSQL (pip install "psycopg[binary]" psycopg-pool)')
+
+        self.url = url
+        self.max_size = max_size
+        self._held = threading.local()
+        self._pool = PsycopgPool(
+            conninfo(url),
+            min_size=min(min_size, max_size),
+            max_size=max_size,
+            timeout=checkout_timeout,
+            max_lifetime=max_lifetime,
+            configure=_configure,
+            check=PsycopgPool.check_connection,
+            name='bjj',
+            open=True,
+        )
+
+    @contextmanager
+    def connection(self, row_factory: bool = True):
+        """Yield a PostgresConnection and return it to the pool on exit."""
+        depth = getattr(self._held, 'depth', 0)
+        if depth > 0:
+            # Nested checkout in the same thread: never wait on ourselves
+            metrics.inc('db_pool_overflow_total')
+            conn = psycopg.connect(conninfo(self.url))
+            _configure(conn)
+            self._held.depth = depth + 1
+            try:
+                yield PostgresConnection(conn, row_factory)
+            finally:
+                self._held.depth = depth
+                conn.close()
+            return
+
+        started = time.perf_counter()
+        try:
+            conn = self._pool.getconn()
+        except PoolTimeout as e:
+            metrics.inc('db_pool_checkout_timeouts_total')
+            raise sqlite3.OperationalError(
+                f"Connection pool exhausted ({self.max_size} in use) for {redact_url(self.url)}"
+            ) from e
+        metrics.observe('db_pool_checkout_wait_seconds', time.perf_counter() - started)
+        self._update_gauges()
+
+        self._held.depth = 1
+        try:
+            yield PostgresConnection(conn, row_factory)
+        finally:
+            self._held.depth = 0
+            # Reads open a transaction too; end it quietly like the SQLite pool does
+            if conn.info.transaction_status != TransactionStatus.IDLE:
+                try:
+                    conn.rollback()
+                except psycopg.Error:
+                    pass
+            self._pool.putconn(conn)
+            self._update_gauges()
+
+    def close(self):
+        self._pool.close()
+
+    def stats(self) -> dict:
+        s = self._pool.get_stats()
+        size, available = s.get('pool_size', 0), s.get('pool_available', 0)
+        return {
+            'db_path': redact_url(self.url),
+            'max_size': self.max_size,
+            'in_use': size - available,
+            'idle': available,
+            'open': size,
+        }
+
+    def _update_gauges(self):
+        s = self._pool.get_stats()
+        in_use = s.get('pool_size', 0) - s.get('pool_available', 0)
+        db_path = redact_url(self.url)
+        metrics.set_gauge('db_pool_in_use', in_use, db_path=db_path)
+        metrics.set_gauge('db_pool_open_connections', s.get('pool_size', 0), db_path=db_path)
+        metrics.set_gauge('db_pool_utilization', in_use / self.max_size if self.max_size else 0,
+                          db_path=db_path)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_postgres_pool(url: str) -> PostgresPool:
+    """Get (or create) the pool for a PostgreSQL URL."""
+    pool = _pools.get(url)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(url)
+        if pool is None:
+            pool = _pools[url] = PostgresPool(
+                url,
+                max_size=max(1, int(os.getenv('DB_POOL_SIZE', 10))),
+                min_size=int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+                checkout_timeout=float(os.getenv('DB_POOL_TIMEOUT', 30)),
+                max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', 300)),
+            )
+            logger.info(f"PostgreSQL pool created for {redact_url(url)} (max {pool.max_size})")
+        return pool
+
+
+def postgres_pool_stats() -> list:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_postgres_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+if hasattr(os, 'register_at_fork'):
+    # Sockets must not be shared across a fork: children open their own pools
+    os.register_at_fork(after_in_child=_pools.clear)
@@ -0,0 +1,705 @@
+"""
+Named query registry for the raw-SQL services.
+
+Every statement the services, the dashboard and the reminder pipeline run
+is registered here once under a dotted name (``lead.by_phone``,
+``dashboard.stats_total_leads``) and executed through the registry:
+
+    from app.utils.queries import queries
+
+    with get_db_cursor() as cursor:
+        row = queries.fetchone(cursor, 'lead.by_phone', (phone_number,))
+
+Running a query by name keeps its SQL text byte-for-byte identical on every
+call, so the per-connection statement cache (``sqlite3.connect(...,
+cached_statements=N)`` on SQLite, server-side prepared statements on
+PostgreSQL) reuses the compiled statement instead of parsing it again.
+
+The registry records, per query: calls, errors, rows returned (or affected),
+total and max time. ``queries.top(n)`` answers "which query costs the most"
+for the admin endpoint; the same timings go to the ``db_query_seconds``
+histogram so /metrics has them for every process.
+"""
+
+import time
+import textwrap
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from app.utils.metrics import metrics
+
+SORT_KEYS = ('total_seconds', 'max_seconds', 'avg_seconds', 'calls', 'rows', 'errors')
+
+
+class _QueryStats:
+    __slots__ = ('calls', 'errors', 'rows', 'total_seconds', 'max_seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_seconds': round(self.total_seconds, 6),
+            'avg_seconds': round(self.total_seconds / self.calls, 6) if self.calls else 0.0,
+            'max_seconds': round(self.max_seconds, 6),
+        }
+
+
+class QueryRegistry:
+    """Thread-safe catalogue of named SQL statements with per-query stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sql = {}
+        self._names = {}
+        self._stats = {}
+
+    def register(self, name: str, sql: str) -> str:
+        """
+        Register a statement under a name.
+
+        Args:
+            name: Dotted query name, e.g. ``lead.by_phone``
+            sql: Statement with ``?`` placeholders
+
+        Returns:
+            The normalized SQL text
+
+        Raises:
+            ValueError: If the name is already registered with different SQL
+        """
+        sql = textwrap.dedent(sql).strip()
+        with self._lock:
+            existing = self._sql.get(name)
+            if existing is not None and existing != sql:
+                raise ValueError(f"Query '{name}' is already registered with different SQL")
+            self._sql[name] = sql
+            self._names[sql] = name
+        return sql
+
+    def sql(self, name: str) -> str:
+        """SQL text of a registered query (KeyError if unknown)."""
+        try:
+            return self._sql[name]
+        except KeyError:
+            raise KeyError(f"Unknown query '{name}'") from None
+
+    def name_for(self, sql: str) -> Optional[str]:
+        """Name under which a SQL text is registered, if any."""
+        return self._names.get(sql)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._sql)
+
+    # ========== EXECUTION ==========
+
+    @contextmanager
+    def _measure(self, name: str):
+        outcome = {'rows': 0}
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield outcome
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(name, time.perf_counter() - started, outcome['rows'], failed)
+
+    def execute(self, target, name: str, params=()):
+        """
+        Run a named query on a cursor or connection.
+
+        The recorded rows are the affected rows of INSERT/UPDATE/DELETE; use
+        fetchone()/fetchall() for SELECTs so the returned rows and the fetch
+        time are counted too.
+
+        Returns:
+            The cursor returned by ``target.execute``
+        """
+        sql = self.sql(name)
+        with self._measure(name) as outcome:
+            cursor = target.execute(sql, params)
+            outcome['rows'] = max(getattr(cursor, 'rowcount', 0) or 0, 0)
+        return cursor
+
+    def fetchone(self, target, name: str, params=()):
+        """Run a named query and return its first row (or None)."""
+        sql = self.sql(name)
+        with self._measure(name) as outcome:
+            row = target.execute(sql, params).fetchone()
+            outcome['rows'] = 0 if row is None else 1
+        return row
+
+    def fetchall(self, target, name: str, params=()) -> list:
+        """Run a named query and return every row."""
+        sql = self.sql(name)
+        with self._measure(name) as outcome:
+            rows = target.execute(sql, params).fetchall()
+            outcome['rows'] = len(rows)
+        return rows
+
+    async def aexecute(self, target, name: str, params=()):
+        """execute() for aiosqlite connections and cursors."""
+        sql = self.sql(name)
+        with self._measure(name) as outcome:
+            cursor = await target.execute(sql, params)
+            outcome['rows'] = max(getattr(cursor, 'rowcount', 0) or 0, 0)
+        return cursor
+
+    async def afetchone(self, target, name: str, params=()):
+        """fetchone() for aiosqlite connections and cursors."""
+        sql = self.sql(name)
+        with self._measure(name) as outcome:
+            cursor = await target.execute(sql, params)
+            row = await cursor.fetchone()
+            outcome['rows'] = 0 if row is None else 1
+        return row
+
+    async def afetchall(self, target, name: str, params=()) -> list:
+        """fetchall() for aiosqlite connections and cursors."""
+        sql = self.sql(name)
+        with self._measure(name) as outcome:
+            cursor = await target.execute(sql, params)
+            rows = list(await cursor.fetchall())
+            outcome['rows'] = len(rows)
+        return rows
+
+    # ========== STATS ==========
+
+    def _record(self, name: str, elapsed: float, rows: int, failed: bool):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = _QueryStats()
+            stats.calls += 1
+            stats.rows += rows
+            stats.total_seconds += elapsed
+            if elapsed > stats.max_seconds:
+                stats.max_seconds = elapsed
+            if failed:
+                stats.errors += 1
+
+        metrics.observe('db_query_seconds', elapsed, query=name)
+        if rows:
+            metrics.inc('db_query_rows_total', rows, query=name)
+        if failed:
+            metrics.inc('db_query_errors_total', query=name)
+
+    def stats(self, name: Optional[str] = None) -> Dict[str, dict]:
+        """Stats of one query, or of every query that has run, keyed by name."""
+        with self._lock:
+            if name is not None:
+                stats = self._stats.get(name)
+                return stats.as_dict() if stats else _QueryStats().as_dict()
+            return {n: s.as_dict() for n, s in self._stats.items()}
+
+    def top(self, n: int = 10, by: str = 'total_seconds') -> List[dict]:
+        """
+        The n most expensive queries.
+
+        Args:
+            n: How many queries to return
+            by: Sort key, one of SORT_KEYS
+
+        Returns:
+            List of dicts with name, sql and the stats, most expensive first
+        """
+        if by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{by}' (expected one of {', '.join(SORT_KEYS)})")
+
+        ranked = sorted(self.stats().items(), key=lambda item: item[1][by], reverse=True)
+        return [dict(name=name, sql=self._sql.get(name), **stats) for name, stats in ranked[:max(0, n)]]
+
+    def reset(self):
+        """Drop the recorded stats (the registered SQL stays)."""
+        with self._lock:
+            self._stats.clear()
+
+
+# Process-wide registry shared by all services
+queries = QueryRegistry()
+
+
+# ========== MESSAGE PIPELINE (MessageHandler / AsyncMessageHandler) ==========
+
+queries.register('lead.by_phone', "SELECT id, name FROM lead WHERE phone_number = ?")
+
+queries.register('lead.insert', """
+    INSERT INTO lead (academy_id, phone_number, name, source, status, interest_level)
+    VALUES (1, ?, ?, 'whatsapp', 'new', 5)
+""")
+
+queries.register('lead.info', """
+    SELECT id, phone_number, name, status, interest_level, source
+    FROM lead WHERE id = ?
+""")
+
+queries.register('lead.mark_interested', """
+    UPDATE lead
+    SET status = 'interested', interest_level = 8
+    WHERE id = ? AND status != 'scheduled'
+""")
+
+queries.register('lead.mark_contacted', """
+    UPDATE lead
+    SET status = 'contacted'
+    WHERE id = ? AND status = 'new'
+""")
+
+queries.register('conversation.active_by_lead', """
+    SELECT id FROM conversation
+    WHERE lead_id = ? AND status = 'active'
+    LIMIT 1
+""")
+
+queries.register('conversation.insert', """
+    INSERT INTO conversation (lead_id, academy_id, status)
+    VALUES (?, 1, 'active')
+""")
+
+queries.register('message.insert', """
+    INSERT INTO message (conversation_id, sender, content, intent_detected)
+    VALUES (?, ?, ?, ?)
+""")
+
+queries.register('message.history', """
+    SELECT sender, content, timestamp, id
+    FROM message
+    WHERE conversation_id = ?
+    ORDER BY id DESC
+    LIMIT ?
+""")
+
+# Resumen de los mensajes viejos (ver CONVERSATION SUMMARY)
+queries.register('conversation.summary', """
+    SELECT summary, summary_through_id
+    FROM conversation WHERE id = ?
+""")
+
+queries.register('academy.info', """
+    SELECT name, description, instructor_name, instructor_belt,
+           phone, address_street, address_city
+    FROM academy WHERE id = 1
+""")
+
+
+# ========== APPOINTMENT SCHEDULER ==========
+
+queries.register('trial_week.active_count', """
+    SELECT COUNT(*) FROM trial_weeks
+    WHERE lead_id = ? AND status = 'active'
+""")
+
+queries.register('trial_week.insert', """
+    INSERT INTO trial_weeks
+    (lead_id, clase_tipo, start_date, end_date, status, notes)
+    VALUES (?, ?, ?, ?, 'active', ?)
+""")
+
+queries.register('leads.mark_trial_scheduled', """
+    UPDATE leads
+    SET status = 'trial_scheduled', lead_score = 9
+    WHERE id = ?
+""")
+
+queries.register('leads.contact', "SELECT phone, name FROM leads WHERE id = ?")
+
+queries.register('academies.phone', "SELECT phone FROM academies WHERE id = 1")
+
+
+# ========== REMINDERS (ReminderService / reminder_tasks) ==========
+
+queries.register('reminder.by_lead_and_time', """
+    SELECT id FROM class_reminders
+    WHERE lead_id = ? AND class_datetime = ?
+""")
+
+queries.register('reminder.insert', """
+    INSERT INTO class_reminders
+    (lead_id, trial_week_id, appointment_id, clase_tipo, class_datetime, reminder_status)
+    VALUES (?, ?, ?, ?, ?, 'pending')
+""")
+
+queries.register('reminder.due', """
+    SELECT
+        cr.id,
+        cr.lead_id,
+        cr.clase_tipo,
+        cr.class_datetime,
+        l.name,
+        l.phone_number
+    FROM class_reminders cr
+    JOIN lead l ON cr.lead_id = l.id
+    WHERE cr.reminder_status = 'pending'
+    AND cr.class_datetime BETWEEN ? AND ?
+    ORDER BY cr.class_datetime
+""")
+
+queries.register('reminder.mark_sent', """
+    UPDATE class_reminders
+    SET reminder_status = ?, reminder_sent_at = ?
+    WHERE id = ?
+""")
+
+queries.register('reminder.mark_failed', """
+    UPDATE class_reminders
+    SET reminder_status = ?, error_message = ?
+    WHERE id = ?
+""")
+
+queries.register('reminder.set_status', """
+    UPDATE class_reminders
+    SET reminder_status = ?
+    WHERE id = ?
+""")
+
+queries.register('reminder.pending_count', """
+    SELECT COUNT(*) FROM class_reminders
+    WHERE reminder_status = 'pending'
+    AND class_datetime > ?
+""")
+
+queries.register('lead.contact', "SELECT name, phone_number FROM lead WHERE id = ?")
+
+queries.register('reminder.delete_old', """
+    DELETE FROM class_reminders
+    WHERE class_datetime < ?
+    AND reminder_status IN ('sent', 'failed')
+""")
+
+queries.register('trial_week.expire', """
+    UPDATE trial_weeks
+    SET status = 'expired'
+    WHERE status = 'active'
+    AND end_date < ?
+""")
+
+
+# ========== LEAD SUMMARY (app.utils.lead_summary) ==========
+
+# Cada mensaje guardado suma uno y pasa a ser el último del lead
+queries.register('lead_summary.record_message', """
+    INSERT INTO lead_summary (lead_id, total_messages, last_message_at, last_sender)
+    SELECT c.lead_id, 1, m.timestamp, m.sender
+    FROM message m
+    JOIN conversation c ON m.conversation_id = c.id
+    WHERE m.id = ?
+    ON CONFLICT (lead_id) DO UPDATE SET
+        total_messages = lead_summary.total_messages + 1,
+        last_message_at = excluded.last_message_at,
+        last_sender = excluded.last_sender,
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+_NEXT_APPOINTMENT = """(SELECT appointment_datetime FROM appointment
+     WHERE lead_id = l.id AND status = 'scheduled'
+     ORDER BY created_at DESC LIMIT 1)"""
+
+queries.register('lead_summary.rebuild', f"""
+    INSERT INTO lead_summary (lead_id, total_messages, last_message_at, last_sender, next_appointment)
+    SELECT
+        l.id,
+        (SELECT COUNT(*) FROM message m
+         JOIN conversation c ON m.conversation_id = c.id
+         WHERE c.lead_id = l.id)
+        + (SELECT COALESCE(SUM(a.message_count), 0) FROM message_archive_chunk a
+           WHERE a.lead_id = l.id),
+        COALESCE(
+            (SELECT MAX(m.timestamp) FROM message m
+             JOIN conversation c ON m.conversation_id = c.id
+             WHERE c.lead_id = l.id),
+            (SELECT MAX(a.last_timestamp) FROM message_archive_chunk a
+             WHERE a.lead_id = l.id)),
+        COALESCE(
+            (SELECT m.sender FROM message m
+             JOIN conversation c ON m.conversation_id = c.id
+             WHERE c.lead_id = l.id
+             ORDER BY m.timestamp DESC, m.id DESC LIMIT 1),
+            (SELECT a.last_sender FROM message_archive_chunk a
+             WHERE a.lead_id = l.id
+             ORDER BY a.last_message_id DESC LIMIT 1)),
+        {_NEXT_APPOINTMENT}
+    FROM lead l
+    WHERE true
+    ON CONFLICT (lead_id) DO UPDATE SET
+        total_messages = excluded.total_messages,
+        last_message_at = excluded.last_message_at,
+        last_sender = excluded.last_sender,
+        next_appointment = excluded.next_appointment,
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+queries.register('lead_summary.delete_orphans', """
+    DELETE FROM lead_summary
+    WHERE lead_id NOT IN (SELECT id FROM lead)
+""")
+
+
+# ========== MESSAGE ARCHIVE (app.utils.message_archive) ==========
+
+# Conversaciones activas sin mensajes desde la fecha de corte (solo con DB_ARCHIVE_CLOSE_IDLE)
+queries.register('archive.close_idle_conversations', """
+    UPDATE conversation
+    SET status = 'closed'
+    WHERE status = 'active'
+    AND created_at < ?
+    AND NOT EXISTS (
+        SELECT 1 FROM message m
+        WHERE m.conversation_id = conversation.id AND m.timestamp >= ?
+    )
+""")
+
+queries.register('archive.closed_conversations', """
+    SELECT c.id, c.lead_id
+    FROM conversation c
+    WHERE c.status = 'closed'
+    AND EXISTS (
+        SELECT 1 FROM message m
+        WHERE m.conversation_id = c.id AND m.timestamp < ?
+    )
+    ORDER BY c.id
+""")
+
+queries.register('archive.conversation_messages', """
+    SELECT id, conversation_id, sender, content, intent_detected, timestamp
+    FROM message
+    WHERE conversation_id = ? AND timestamp < ?
+    ORDER BY id
+""")
+
+queries.register('archive.insert_chunk', """
+    INSERT INTO message_archive_chunk (
+        lead_id, conversation_id, month, path, byte_offset, byte_length,
+        message_count, first_message_id, last_message_id,
+        first_timestamp, last_timestamp, last_sender
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+""")
+
+queries.register('archive.delete_messages', """
+    DELETE FROM message
+    WHERE conversation_id = ? AND id BETWEEN ? AND ? AND timestamp < ?
+""")
+
+queries.register('archive.chunks_by_lead', """
+    SELECT path, byte_offset, byte_length
+    FROM message_archive_chunk
+    WHERE lead_id = ?
+    ORDER BY first_message_id
+""")
+
+# Bloques archivados para la exportación de mensajes (filtros opcionales: NULL = sin filtro)
+queries.register('archive.export_chunks', """
+    SELECT a.lead_id, l.phone_number, l.name, a.path, a.byte_offset, a.byte_length, a.first_message_id
+    FROM message_archive_chunk a
+    CROSS JOIN lead l
+    WHERE l.id = a.lead_id
+    AND a.last_message_id > ?
+    AND COALESCE(l.status = ?, true)
+    AND COALESCE(l.source = ?, true)
+    AND COALESCE(a.last_timestamp >= ?, true)
+    AND COALESCE(a.first_timestamp < ?, true)
+    ORDER BY a.first_message_id
+""")
+
+
+# ========== CONVERSATION SUMMARY (app.services.conversation_summary) ==========
+
+# Conversaciones activas con suficientes mensajes sin resumir
+queries.register('summary.pending', """
+    SELECT c.id
+    FROM conversation c
+    WHERE c.status = 'active'
+    AND (
+        SELECT COUNT(*) FROM message m
+        WHERE m.conversation_id = c.id AND m.id > COALESCE(c.summary_through_id, 0)
+    ) >= ?
+    ORDER BY c.id
+    LIMIT ?
+""")
+
+queries.register('summary.messages', """
+    SELECT id, sender, content
+    FROM message
+    WHERE conversation_id = ? AND id > ?
+    ORDER BY id
+""")
+
+# Solo si nadie más resumió la conversación mientras se llamaba a OpenAI
+queries.register('summary.save', """
+    UPDATE conversation
+    SET summary = ?, summary_through_id = ?, summary_updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND COALESCE(summary_through_id, 0) = ?
+""")
+
+
+# ========== DASHBOARD ==========
+
+queries.register('dashboard.stats_total_leads', "SELECT COUNT(*) as total FROM lead")
+
+queries.register('dashboard.stats_by_status', """
+    SELECT status, COUNT(*) as count
+    FROM lead
+    GROUP BY status
+""")
+
+queries.register('dashboard.stats_scheduled', """
+    SELECT COUNT(DISTINCT lead_id) as total
+    FROM appointment
+    WHERE status = 'scheduled' AND confirmed = 1
+""")
+
+# Leads que necesitan seguimiento (>3 días sin contacto y no agendados)
+_NEEDS_FOLLOWUP = """(s.last_message_at IS NULL OR days_since(s.last_message_at) > 3)
+    AND l.status NOT IN ('scheduled', 'engaged')"""
+
+queries.register('dashboard.stats_needs_followup', f"""
+    SELECT COUNT(*) as total
+    FROM lead l
+    LEFT JOIN lead_summary s ON s.lead_id = l.id
+    WHERE {_NEEDS_FOLLOWUP}
+""")
+
+# Lista de leads: una fila de lead_summary por lead (O(leads), sin recorrer mensajes)
+_LEADS_SELECT = """
+    SELECT
+        l.id,
+        l.phone_number,
+        l.name,
+        l.status,
+        l.interest_level,
+        l.source,
+        l.created_at,
+        COALESCE(s.total_messages, 0) as total_messages,
+        s.last_message_at as last_contact,
+        s.last_sender,
+        s.next_appointment
+    FROM lead l
+    LEFT JOIN lead_summary s ON s.lead_id = l.id
+"""
+
+
+def leads_query_name(status: bool = False, followup: bool = False) -> str:
+    """Name of the /api/leads variant for the given filters."""
+    return 'dashboard.leads' + ('_by_status' if status else '') + ('_followup' if followup else '')
+
+
+for _status in (False, True):
+    for _followup in (False, True):
+        _conditions = (['l.status = ?'] if _status else []) + ([_NEEDS_FOLLOWUP] if _followup else [])
+        queries.register(leads_query_name(_status, _followup), ''.join([
+            textwrap.dedent(_LEADS_SELECT),
+            f"WHERE {' AND '.join(_conditions)}\n" if _conditions else '',
+            "ORDER BY l.created_at DESC",
+        ]))
+
+queries.register('dashboard.lead_by_id', "SELECT * FROM lead WHERE id = ?")
+
+queries.register('dashboard.lead_messages', """
+    SELECT m.*, c.id as conv_id
+    FROM message m
+    JOIN conversation c ON m.conversation_id = c.id
+    WHERE c.lead_id = ?
+    ORDER BY m.timestamp ASC
+""")
+
+queries.register('dashboard.lead_appointments', """
+    SELECT * FROM appointment
+    WHERE lead_id = ?
+    ORDER BY appointment_datetime DESC
+""")
+
+queries.register('dashboard.update_lead_status', """
+    UPDATE lead
+    SET status = ?, updated_at = ?
+    WHERE id = ?
+""")
+
+queries.register('dashboard.appointments', """
+    SELECT
+        a.id,
+        a.appointment_datetime,
+        a.status,
+        a.confirmed,
+        l.name,
+        l.phone_number,
+        l.id as lead_id
+    FROM appointment a
+    JOIN lead l ON a.lead_id = l.id
+    WHERE a.status != 'cancelled'
+    ORDER BY a.appointment_datetime ASC
+""")
+
+
+# ========== EXPORT (app.utils.export) ==========
+
+# Páginas por clave primaria: WHERE id > ? ... ORDER BY id LIMIT ?
+# El plan tiene que recorrer la clave primaria y cortar en LIMIT; si el
+# planificador elige otro índice, cada página ordena todo lo filtrado.
+# - Fechas: COALESCE(columna >= ?, true) (NULL = sin límite) no usa índices
+# - Mensajes: CROSS JOIN fija message como tabla externa en SQLite
+#   (PostgreSQL lo trata como un JOIN normal)
+_EXPORT_SELECT = {
+    'leads': ("""
+        SELECT
+            l.id,
+            l.phone_number,
+            l.name,
+            l.status,
+            l.interest_level,
+            l.source,
+            l.created_at,
+            COALESCE(s.total_messages, 0) as total_messages,
+            s.last_message_at,
+            s.last_sender,
+            s.next_appointment
+        FROM lead l
+        LEFT JOIN lead_summary s ON s.lead_id = l.id
+        WHERE l.id > ?
+    """, 'l.created_at', 'l.id'),
+    'conversations': ("""
+        SELECT
+            m.id,
+            m.conversation_id,
+            c.lead_id,
+            l.phone_number,
+            l.name,
+            m.sender,
+            m.content,
+            m.intent_detected,
+            m.timestamp
+        FROM message m
+        CROSS JOIN conversation c
+        CROSS JOIN lead l
+        WHERE c.id = m.conversation_id AND l.id = c.lead_id
+        AND m.id > ?
+    """, 'm.timestamp', 'm.id'),
+}
+
+
+def export_query_name(kind: str, status: bool = False, source: bool = False) -> str:
+    """Name of the export page query for the given kind and filters."""
+    return f'export.{kind}' + ('_by_status' if status else '') + ('_by_source' if source else '')
+
+
+for _kind, (_select, _date_column, _key) in _EXPORT_SELECT.items():
+    for _status in (False, True):
+        for _source in (False, True):
+            _conditions = (['l.status = ?'] if _status else []) + (['l.source = ?'] if _source else []) + \
+                [f'COALESCE({_date_column} >= ?, true)', f'COALESCE({_date_column} < ?, true)']
+            queries.register(export_query_name(_kind, _status, _source), ''.join([
+                textwrap.dedent(_select).strip(), '\n',
+                ''.join(f'AND {condition}\n' for condition in _conditions),
+                f'ORDER BY {_key}\n',
+                'LIMIT ?',
+            ]))
@@ -0,0 +1,333 @@
+"""
+EXPLAIN QUERY PLAN regression harness.
+
+Takes every named query of the registry (app.utils.queries) plus any SQL
+still passed inline to ``execute()`` in the services, the Celery tasks and
+the dashboard routes, runs EXPLAIN QUERY PLAN for each one against a seeded
+database built from the migrations, and reports statements that fall back
+to a full table scan.
+
+Report-style queries that scan on purpose (dashboard aggregates over every
+lead) are listed in ALLOWED_SCANS; any other scan is a regression.
+
+Usage:
+    python -m app.utils.query_plans              # exits 1 on a regression
+    python -m app.utils.query_plans --verbose    # print every plan
+"""
+
+import os
+import re
+import ast
+import sys
+import sqlite3
+import argparse
+import tempfile
+import textwrap
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from app.utils.database import register_functions
+from app.utils.queries import queries
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MIGRATIONS_DIR = os.path.join(BACKEND_DIR, 'migrations')
+
+# Applied in order when seeding the audit database.
+MIGRATIONS = [
+    'create_core_tables.sql',
+    'add_reminders_table.sql',
+    'add_hot_path_indexes.sql',
+    'add_lead_summary.sql',
+    'add_message_archive.sql',
+    'add_conversation_summary.sql',
+]
+
+# Files and directories (relative to backend/) whose inline SQL is audited.
+SOURCE_PATHS = [
+    'app/services',
+    'app/tasks',
+    'app/api/dashboard_routes.py',
+]
+
+# Query name (or "path:function" for inline SQL) -> tables (or aliases, as
+# EXPLAIN reports them) that the statement is allowed to scan, with the reason.
+ALLOWED_SCANS = {
+    'dashboard.stats_total_leads': ({'lead'}, 'counts every lead'),
+    'dashboard.stats_by_status': ({'lead'}, 'aggregates over every lead'),
+    'dashboard.stats_needs_followup': ({'l'}, 'aggregates over every lead'),
+    'dashboard.leads': ({'l'}, 'lists every lead'),
+    'dashboard.leads_followup': ({'l'}, 'lists every lead'),
+    'dashboard.leads_by_status': ({'l'}, 'lists every lead'),
+    'dashboard.leads_by_status_followup': ({'l'}, 'lists every lead'),
+    'dashboard.appointments': ({'a'}, 'lists every non-cancelled appointment'),
+    'lead_summary.rebuild': ({'l'}, 'recomputes the summary of every lead'),
+    'lead_summary.delete_orphans': ({'lead_summary'}, 'checks every summary row'),
+    'archive.close_idle_conversations': ({'conversation'}, 'nightly pass over every conversation'),
+    'archive.closed_conversations': ({'c'}, 'nightly pass over every conversation'),
+    'archive.export_chunks': ({'a'}, 'reads the archive index once per export'),
+    'summary.pending': ({'c'}, 'periodic pass over every active conversation'),
+}
+
+_DML = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+class _StatementCollector(ast.NodeVisitor):
+    """Collects the SQL text of ``<cursor>.execute(<sql>, ...)`` calls."""
+
+    def __init__(self, relpath: str):
+        self.relpath = relpath
+        self.functions = []
+        self.statements = []
+
+    def _visit_function(self, node):
+        self.functions.append(node)
+        self.generic_visit(node)
+        self.functions.pop()
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_Call(self, node):
+        func = node.func
+        if isinstance(func, ast.Attribute) and func.attr == 'execute' and node.args:
+            sql = self._resolve(node.args[0])
+            if sql and _DML.match(sql):
+                function = self.functions[-1].name if self.functions else '<module>'
+                self.statements.append({
+                    'location': f'{self.relpath}:{node.lineno}',
+                    'function': function,
+                    'key': f'{self.relpath}:{function}',
+                    'sql': textwrap.dedent(sql).strip(),
+                })
+        self.generic_visit(node)
+
+    def _resolve(self, node) -> Optional[str]:
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return node.value
+        if isinstance(node, ast.Name) and self.functions:
+            return self._resolve_name(node.id)
+        return None
+
+    def _resolve_name(self, name: str) -> Optional[str]:
+        # Queries built as ``q = "..."`` followed by ``q += "..."``: join every
+        # literal part, which enables every optional filter at once.
+        parts = []
+        for node in ast.walk(self.functions[-1]):
+            if isinstance(node, ast.Assign) and any(
+                    isinstance(t, ast.Name) and t.id == name for t in node.targets):
+                value = node.value
+            elif (isinstance(node, ast.AugAssign) and isinstance(node.op, ast.Add)
+                    and isinstance(node.target, ast.Name) and node.target.id == name):
+                value = node.value
+            else:
+                continue
+            if isinstance(value, ast.Constant) and isinstance(value.value, str):
+                parts.append((node.lineno, value.value))
+        return ''.join(text for _, text in sorted(parts)) or None
+
+
+def _iter_source_files(paths: Iterable[str]) -> Iterable[str]:
+    for path in paths:
+        full = os.path.join(BACKEND_DIR, path)
+        if os.path.isfile(full):
+            yield path
+            continue
+        for root, _, files in os.walk(full):
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    yield os.path.relpath(os.path.join(root, name), BACKEND_DIR).replace(os.sep, '/')
+
+
+def extract_statements(paths: Optional[Iterable[str]] = None) -> List[Dict]:
+    """
+    Extract the inline SQL statements executed by the given source files.
+
+    Args:
+        paths: Files or directories relative to backend/. Defaults to SOURCE_PATHS.
+
+    Returns:
+        List of dicts with location ("path:line"), function, key ("path:function") and sql
+    """
+    statements = []
+    for relpath in _iter_source_files(paths or SOURCE_PATHS):
+        with open(os.path.join(BACKEND_DIR, relpath), encoding='utf-8-sig') as f:
+            tree = ast.parse(f.read(), filename=relpath)
+        collector = _StatementCollector(relpath)
+        collector.visit(tree)
+        statements.extend(collector.statements)
+    return statements
+
+
+def registry_statements() -> List[Dict]:
+    """
+    The named queries of the registry, in the same shape as extract_statements().
+
+    Returns:
+        List of dicts with location ("app/utils/queries.py:<name>"), sql, and
+        the query name as both function and key
+    """
+    return [{
+        'location': f'app/utils/queries.py:{name}',
+        'function': name,
+        'key': name,
+        'sql': queries.sql(name),
+    } for name in queries.names()]
+
+
+def seed_database(db_path: str, leads: int = 500, migrations: Optional[List[str]] = None) -> str:
+    """
+    Build a database from the migrations and fill it with representative data.
+
+    The planner's choices depend on table statistics, so the data is spread
+    the way production data is (several messages per conversation, few
+    appointments per lead) and ANALYZE runs at the end.
+
+    Args:
+        db_path: Path of the database file to create
+        leads: Number of leads to generate
+        migrations: Migration files to apply. Defaults to MIGRATIONS.
+
+    Returns:
+        The database path
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        for name in migrations or MIGRATIONS:
+            with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+                conn.executescript(f.read())
+
+        now = datetime.now()
+        statuses = ['new', 'contacted', 'interested', 'scheduled', 'engaged']
+        for i in range(leads):
+            phone = f'+5068{i:07d}'
+            created = (now - timedelta(days=i % 90)).isoformat()
+            lead_id = conn.execute("""
+                INSERT INTO lead (phone_number, name, status, interest_level, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (phone, f'Lead {i}', statuses[i % len(statuses)], i % 10, created)).lastrowid
+            conn.execute("INSERT INTO leads (phone, name) VALUES (?, ?)", (phone, f'Lead {i}'))
+
+            conv_id = conn.execute("""
+                INSERT INTO conversation (lead_id, status, last_message_at) VALUES (?, ?, ?)
+            """, (lead_id, 'active' if i % 4 else 'closed', created)).lastrowid
+            conn.executemany("""
+                INSERT INTO message (conversation_id, sender, content, timestamp) VALUES (?, ?, ?, ?)
+            """, [(conv_id, 'lead' if j % 2 == 0 else 'bot', f'mensaje {j}', created) for j in range(8)])
+
+            if i % 3 == 0:
+                class_dt = (now + timedelta(days=i % 7)).strftime('%Y-%m-%d %H:%M:%S')
+                conn.execute("""
+                    INSERT INTO appointment (lead_id, appointment_datetime, status, confirmed)
+                    VALUES (?, ?, ?, ?)
+                """, (lead_id, class_dt, 'scheduled' if i % 2 else 'cancelled', i % 2))
+                conn.execute("""
+                    INSERT INTO trial_weeks (lead_id, clase_tipo, start_date, end_date, status)
+                    VALUES (?, 'adultos_jiujitsu', ?, ?, ?)
+                """, (lead_id, now.strftime('%Y-%m-%d'), (now + timedelta(days=7)).strftime('%Y-%m-%d'),
+                      'active' if i % 2 else 'expired'))
+                conn.execute("""
+                    INSERT INTO class_reminders (lead_id, clase_tipo, class_datetime, reminder_status)
+                    VALUES (?, 'adultos_jiujitsu', ?, ?)
+                """, (lead_id, class_dt, 'pending' if i % 2 else 'sent'))
+
+        # The seed writes around the services: fill the dashboard summary in one go
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'lead_summary'").fetchone():
+            conn.execute(queries.sql('lead_summary.rebuild'))
+
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return db_path
+
+
+def _placeholder_count(sql: str) -> int:
+    return _STRING_LITERAL.sub('', sql).count('?')
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[str]:
+    """
+    Return the EXPLAIN QUERY PLAN detail lines of a statement.
+
+    Placeholders are bound to NULL: the plan depends on the shape of the
+    statement, not on the values.
+    """
+    params = [None] * _placeholder_count(sql)
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Tables (or aliases) that a plan reads in full."""
+    scans = []
+    for detail in plan:
+        match = _SCAN.match(detail)
+        if match and match.group(1) != 'CONSTANT':
+            scans.append(match.group(1))
+    return scans
+
+
+def audit(db_path: str, statements: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Explain every statement against a database and classify its scans.
+
+    Args:
+        db_path: Seeded database (see seed_database)
+        statements: Statements to check. Defaults to the registry plus extract_statements().
+
+    Returns:
+        The statements, each with plan, scans and regression (scans not in ALLOWED_SCANS)
+    """
+    if statements is None:
+        statements = registry_statements() + extract_statements()
+
+    results = []
+    conn = sqlite3.connect(db_path)
+    register_functions(conn)
+    try:
+        for statement in statements:
+            plan = explain(conn, statement['sql'])
+            scans = full_scans(plan)
+            allowed = ALLOWED_SCANS.get(statement['key'], (set(), None))[0]
+            results.append(dict(statement, plan=plan, scans=scans,
+                                regression=[s for s in scans if s not in allowed]))
+    finally:
+        conn.close()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='EXPLAIN QUERY PLAN regression check')
+    parser.add_argument('--db', help='Existing database to explain against (default: seeded temp DB)')
+    parser.add_argument('--leads', type=int, default=500, help='Leads in the seeded database')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args(argv)
+
+    db_path = args.db
+    if db_path is None:
+        db_path = tempfile.NamedTemporaryFile(delete=False, suffix='.db').name
+        seed_database(db_path, leads=args.leads)
+
+    try:
+        results = audit(db_path)
+    finally:
+        if args.db is None:
+            os.unlink(db_path)
+
+    regressions = [r for r in results if r['regression']]
+    for result in results:
+        if args.verbose or result['regression']:
+            mark = 'FULL SCAN' if result['regression'] else 'ok'
+            label = result['location'] if result['key'] == result['function'] else \
+                f"{result['location']} ({result['function']})"
+            print(f"[{mark}] {label}")
+            for detail in result['plan']:
+                print(f"    {detail}")
+
+    print(f"{len(results)} statements checked, {len(regressions)} full-scan regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
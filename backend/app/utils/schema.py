@@ -0,0 +1,123 @@
+"""
+Startup upgrades for the tables the raw-SQL services depend on.
+
+The hot path writes to tables that older databases do not have until a
+migration in ``migrations/`` is run by hand (``lead_summary`` for every
+saved message, ``message_archive_chunk`` for the lead detail, the
+``conversation.summary`` columns for every AI reply). ``ensure_schema`` runs at startup (Flask app, ASGI app,
+Celery workers) and applies each missing migration once, so a deploy on an
+existing SQLite file keeps answering instead of failing transaction 1.
+
+Each upgrade is checked before it runs; applying them again is a no-op.
+SQLite has no ``ADD COLUMN IF NOT EXISTS``, so for ``ALTER TABLE ... ADD
+COLUMN`` migrations only the statements whose column is missing are run.
+PostgreSQL needs none of this: migrations/postgres/create_core_tables.sql
+already creates every table and column idempotently.
+
+    python -m app.utils.schema              # configured database
+    python -m app.utils.schema --db PATH
+"""
+
+import os
+import re
+import sys
+import argparse
+import logging
+from typing import List, Optional
+
+from app.utils.database import get_db_connection, default_db_path
+from app.utils.postgres import is_postgres_url
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                              'migrations')
+
+
+_ADD_COLUMN = re.compile(r'^\s*ALTER TABLE (\w+) ADD COLUMN (\w+)[^;]*;', re.IGNORECASE | re.MULTILINE)
+
+
+def _has_table(conn, table: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def _missing_columns(conn, sql: str) -> List[str]:
+    """
+    ``ALTER TABLE ... ADD COLUMN`` statements of a migration whose column does not exist yet.
+
+    Args:
+        conn: SQLite connection
+        sql: Migration script
+
+    Returns:
+        The statements still to run, in file order
+    """
+    columns = {}
+    pending = []
+    for match in _ADD_COLUMN.finditer(sql):
+        table, column = match.group(1), match.group(2)
+        if table not in columns:
+            columns[table] = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns[table]:
+            pending.append(match.group(0).strip())
+    return pending
+
+
+# Migration file -> check(conn, sql) that tells whether it is already applied.
+# The lead_summary migration also loads the summary of the existing leads.
+SCHEMA_UPGRADES = [
+    ('add_lead_summary.sql', lambda conn, sql: _has_table(conn, 'lead_summary')),
+    ('add_message_archive.sql', lambda conn, sql: _has_table(conn, 'message_archive_chunk')),
+    ('add_conversation_summary.sql', lambda conn, sql: not _missing_columns(conn, sql)),
+]
+
+
+def ensure_schema(db_path: Optional[str] = None) -> List[str]:
+    """
+    Apply the migrations the services need that this database is missing.
+
+    Args:
+        db_path: SQLite path. Defaults to DB_URL / bjj_academy.db.
+
+    Returns:
+        Names of the migrations applied (empty when the schema was current)
+    """
+    db_path = db_path or default_db_path()
+    if is_postgres_url(db_path) or not os.path.exists(db_path):
+        return []
+
+    applied = []
+    with get_db_connection(db_path=db_path, row_factory=False) as conn:
+        # A brand new file has no core tables yet: create_all() / the core migration come first
+        if not _has_table(conn, 'lead'):
+            return applied
+
+        for name, is_applied in SCHEMA_UPGRADES:
+            with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+                sql = f.read()
+            if is_applied(conn, sql):
+                continue
+            if _ADD_COLUMN.search(sql):
+                # A half-applied ADD COLUMN script would fail on its first existing column
+                for statement in _missing_columns(conn, sql):
+                    conn.execute(statement)
+            else:
+                conn.executescript(sql)
+            applied.append(name)
+            logger.info(f"Schema upgrade applied: {name}")
+        conn.commit()
+    return applied
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Apply the missing service migrations')
+    parser.add_argument('--db', help='SQLite path (default: DB_URL or bjj_academy.db)')
+    args = parser.parse_args(argv)
+
+    applied = ensure_schema(args.db)
+    print('Applied: ' + ', '.join(applied) if applied else 'Schema is up to date')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -54,6 +54,8 @@ def test_db(test_db_path):
     cursor = conn.cursor()
 
     # Drop all tables first to ensure clean state
+    cursor.execute("DROP TABLE IF EXISTS lead_summary")
+    cursor.execute("DROP TABLE IF EXISTS message_archive_chunk")
     cursor.execute("DROP TABLE IF EXISTS message")
     cursor.execute("DROP TABLE IF EXISTS appointment")
     cursor.execute("DROP TABLE IF EXISTS trial_weeks")
@@ -101,6 +103,9 @@ def test_db(test_db_path):
             status TEXT DEFAULT 'active',
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             last_message_at TEXT,
+            summary TEXT,
+            summary_through_id INTEGER,
+            summary_updated_at TEXT,
             FOREIGN KEY (lead_id) REFERENCES lead(id),
             FOREIGN KEY (academy_id) REFERENCES academy(id)
         )
@@ -169,6 +174,39 @@ def test_db(test_db_path):
         )
     """)
 
+    # Resumen por lead que lee el dashboard (migrations/add_lead_summary.sql)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lead_summary (
+            lead_id INTEGER PRIMARY KEY,
+            total_messages INTEGER NOT NULL DEFAULT 0,
+            last_message_at TEXT,
+            last_sender TEXT,
+            next_appointment TEXT,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (lead_id) REFERENCES lead(id)
+        )
+    """)
+
+    # Índice del archivo de mensajes (migrations/add_message_archive.sql)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS message_archive_chunk (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lead_id INTEGER NOT NULL,
+            conversation_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            path TEXT NOT NULL,
+            byte_offset INTEGER NOT NULL,
+            byte_length INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            first_message_id INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            first_timestamp TEXT,
+            last_timestamp TEXT,
+            last_sender TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
     # Insert test data
     cursor.execute("""
         INSERT INTO academy (id, name, description, instructor_name, instructor_belt,
@@ -190,6 +228,8 @@ def test_db(test_db_path):
     # Cleanup - clear all tables for next test
     conn = sqlite3.connect(test_db_path)
     cursor = conn.cursor()
+    cursor.execute("DELETE FROM lead_summary")
+    cursor.execute("DELETE FROM message_archive_chunk")
     cursor.execute("DELETE FROM message")
     cursor.execute("DELETE FROM appointment")
     cursor.execute("DELETE FROM trial_weeks")
@@ -0,0 +1,13 @@
+-- Resumen acumulado de cada conversación (app/services/conversation_summary.py)
+-- Se aplica sola al arrancar (app/utils/schema.py agrega solo las columnas
+-- que faltan: SQLite no tiene ADD COLUMN IF NOT EXISTS). A mano:
+--   python -m app.utils.schema --db bjj_academy.db
+--
+-- La tarea summarize_conversations junta los mensajes viejos en summary;
+-- summary_through_id es el último mensaje incluido. El prompt de OpenAI
+-- lleva el resumen + los mensajes posteriores a summary_through_id, así su
+-- tamaño no crece con el largo de la conversación
+
+ALTER TABLE conversation ADD COLUMN summary TEXT;
+ALTER TABLE conversation ADD COLUMN summary_through_id INTEGER;
+ALTER TABLE conversation ADD COLUMN summary_updated_at TEXT;
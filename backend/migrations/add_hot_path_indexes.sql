@@ -0,0 +1,31 @@
+-- Índices para las consultas calientes del pipeline de mensajes y del dashboard
+-- Verificar con: python -m app.utils.query_plans
+--
+-- lead.phone_number y leads.phone ya son UNIQUE, así que SQLite les crea un
+-- índice automático (sqlite_autoindex_*) y no hace falta repetirlo aquí.
+
+-- Conversación activa de un lead (cada mensaje entrante)
+CREATE INDEX IF NOT EXISTS idx_conversation_lead_status ON conversation(lead_id, status);
+
+-- Historial de una conversación: el rowid (id) es la última columna implícita
+-- del índice, así que ORDER BY id DESC LIMIT ? recorre el índice hacia atrás
+-- sin ordenar. También sirve los JOIN del dashboard por conversation_id.
+CREATE INDEX IF NOT EXISTS idx_message_conversation ON message(conversation_id);
+
+-- Citas de un lead por estado (subconsulta de próxima cita en /api/leads)
+CREATE INDEX IF NOT EXISTS idx_appointment_lead_status ON appointment(lead_id, status);
+
+-- Conteo de leads con cita confirmada en /api/stats: cubre la consulta completa
+CREATE INDEX IF NOT EXISTS idx_appointment_status_confirmed ON appointment(status, confirmed, lead_id);
+
+-- Semana de prueba activa de un lead (al agendar)
+CREATE INDEX IF NOT EXISTS idx_trial_weeks_lead_status ON trial_weeks(lead_id, status);
+
+-- Expiración diaria de semanas de prueba: status = 'active' AND end_date < ?
+CREATE INDEX IF NOT EXISTS idx_trial_weeks_status_end ON trial_weeks(status, end_date);
+
+-- Recordatorios pendientes en una ventana de tiempo: igualdad primero, rango después
+CREATE INDEX IF NOT EXISTS idx_class_reminders_status_datetime ON class_reminders(reminder_status, class_datetime);
+
+-- Recordatorio existente para un lead y horario (evita duplicados)
+CREATE INDEX IF NOT EXISTS idx_class_reminders_lead_datetime ON class_reminders(lead_id, class_datetime);
@@ -0,0 +1,43 @@
+-- Resumen por lead para /api/leads y /api/stats
+-- Se aplica sola al arrancar si falta la tabla (app/utils/schema.py)
+-- A mano: sqlite3 bjj_academy.db < migrations/add_lead_summary.sql
+--
+-- Se actualiza en la misma transacción que cada mensaje guardado (ver
+-- app/utils/lead_summary.py), así el listado de leads cuesta O(leads) sin
+-- importar cuántos mensajes tenga el historial. Si alguien escribe en
+-- message/appointment por fuera de los servicios, reconstruir con:
+--   python -m app.utils.lead_summary
+
+CREATE TABLE IF NOT EXISTS lead_summary (
+    lead_id INTEGER PRIMARY KEY,
+    total_messages INTEGER NOT NULL DEFAULT 0,
+    last_message_at TEXT,
+    last_sender TEXT,
+    next_appointment TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (lead_id) REFERENCES lead(id)
+);
+
+-- /api/leads recorre los leads en orden de creación sin ordenar en memoria
+CREATE INDEX IF NOT EXISTS idx_lead_created_at ON lead(created_at);
+
+-- Carga inicial (misma consulta que la reconstrucción)
+INSERT INTO lead_summary (lead_id, total_messages, last_message_at, last_sender, next_appointment)
+SELECT
+    l.id,
+    (SELECT COUNT(*) FROM message m
+     JOIN conversation c ON m.conversation_id = c.id
+     WHERE c.lead_id = l.id),
+    (SELECT MAX(m.timestamp) FROM message m
+     JOIN conversation c ON m.conversation_id = c.id
+     WHERE c.lead_id = l.id),
+    (SELECT m.sender FROM message m
+     JOIN conversation c ON m.conversation_id = c.id
+     WHERE c.lead_id = l.id
+     ORDER BY m.timestamp DESC, m.id DESC LIMIT 1),
+    (SELECT appointment_datetime FROM appointment
+     WHERE lead_id = l.id AND status = 'scheduled'
+     ORDER BY created_at DESC LIMIT 1)
+FROM lead l
+WHERE true
+ON CONFLICT (lead_id) DO NOTHING;
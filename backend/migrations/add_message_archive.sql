@@ -0,0 +1,28 @@
+-- Índice del archivo mensual de mensajes (app/utils/message_archive.py)
+-- Se aplica sola al arrancar si falta la tabla (app/utils/schema.py)
+-- A mano: sqlite3 bjj_academy.db < migrations/add_message_archive.sql
+--
+-- Los mensajes de conversaciones cerradas hace más de DB_ARCHIVE_AFTER_DAYS
+-- se mueven a archive/messages-AAAA-MM.jsonl.gz; cada fila apunta al bloque
+-- gzip (posición y largo en bytes) de una conversación en un mes. Archivar:
+--   python -m app.utils.message_archive
+
+CREATE TABLE IF NOT EXISTS message_archive_chunk (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER NOT NULL,
+    conversation_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    path TEXT NOT NULL,
+    byte_offset INTEGER NOT NULL,
+    byte_length INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    first_message_id INTEGER NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    first_timestamp TEXT,
+    last_timestamp TEXT,
+    last_sender TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Historial archivado de un lead (detalle del dashboard, reconstrucción de lead_summary)
+CREATE INDEX IF NOT EXISTS idx_message_archive_chunk_lead ON message_archive_chunk(lead_id, first_message_id);
@@ -0,0 +1,97 @@
+-- Tablas principales usadas por el pipeline de mensajes (SQL directo)
+-- lead / conversation / message / appointment / trial_weeks
+
+CREATE TABLE IF NOT EXISTS academy (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    instructor_name TEXT,
+    instructor_belt TEXT,
+    phone TEXT,
+    address_street TEXT,
+    address_city TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS academies (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS lead (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    academy_id INTEGER DEFAULT 1,
+    phone_number TEXT NOT NULL UNIQUE,
+    name TEXT,
+    source TEXT DEFAULT 'whatsapp',
+    status TEXT DEFAULT 'new',
+    interest_level INTEGER DEFAULT 5,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (academy_id) REFERENCES academy(id)
+);
+
+-- Tabla usada por AppointmentScheduler
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    academy_id INTEGER DEFAULT 1,
+    phone TEXT NOT NULL UNIQUE,
+    name TEXT,
+    source TEXT DEFAULT 'whatsapp',
+    status TEXT DEFAULT 'new',
+    lead_score INTEGER DEFAULT 5,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (academy_id) REFERENCES academy(id)
+);
+
+CREATE TABLE IF NOT EXISTS conversation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER NOT NULL,
+    academy_id INTEGER DEFAULT 1,
+    status TEXT DEFAULT 'active',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    last_message_at TEXT,
+    FOREIGN KEY (lead_id) REFERENCES lead(id),
+    FOREIGN KEY (academy_id) REFERENCES academy(id)
+);
+
+CREATE TABLE IF NOT EXISTS message (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    content TEXT NOT NULL,
+    intent_detected TEXT,
+    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (conversation_id) REFERENCES conversation(id)
+);
+
+CREATE TABLE IF NOT EXISTS appointment (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER NOT NULL,
+    appointment_datetime TEXT NOT NULL,
+    status TEXT DEFAULT 'scheduled',
+    confirmed INTEGER DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (lead_id) REFERENCES lead(id)
+);
+
+CREATE TABLE IF NOT EXISTS trial_weeks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER NOT NULL,
+    clase_tipo TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    status TEXT DEFAULT 'active',
+    notes TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (lead_id) REFERENCES lead(id)
+);
+
+INSERT OR IGNORE INTO academy (id, name, phone, address_street, address_city)
+VALUES (1, 'BJJ Mingo', '+506-7015-0369', 'Santo Domingo', 'Heredia');
+
+INSERT OR IGNORE INTO academies (id, name, phone)
+VALUES (1, 'BJJ Mingo', '+506-7015-0369');
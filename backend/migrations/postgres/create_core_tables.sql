@@ -0,0 +1,161 @@
+-- Esquema PostgreSQL del pipeline de mensajes (equivalente a create_core_tables.sql,
+-- add_reminders_table.sql, add_hot_path_indexes.sql, add_lead_summary.sql,
+-- add_message_archive.sql y add_conversation_summary.sql)
+-- Uso: psql "$DB_URL" -f migrations/postgres/create_core_tables.sql
+--
+-- Los timestamps se guardan en UTC sin zona, igual que CURRENT_TIMESTAMP en SQLite.
+
+-- Días transcurridos desde un timestamp; en SQLite se registra como función de Python
+CREATE OR REPLACE FUNCTION days_since(ts TIMESTAMP) RETURNS DOUBLE PRECISION AS $$
+    SELECT EXTRACT(EPOCH FROM ((now() AT TIME ZONE 'UTC') - ts))::DOUBLE PRECISION / 86400.0
+$$ LANGUAGE SQL STABLE;
+
+CREATE TABLE IF NOT EXISTS academy (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    instructor_name TEXT,
+    instructor_belt TEXT,
+    phone TEXT,
+    address_street TEXT,
+    address_city TEXT,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE IF NOT EXISTS academies (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    phone TEXT,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE IF NOT EXISTS lead (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    academy_id INTEGER DEFAULT 1 REFERENCES academy(id),
+    phone_number TEXT NOT NULL UNIQUE,
+    name TEXT,
+    source TEXT DEFAULT 'whatsapp',
+    status TEXT DEFAULT 'new',
+    interest_level INTEGER DEFAULT 5,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC'),
+    updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+-- Tabla usada por AppointmentScheduler
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    academy_id INTEGER DEFAULT 1 REFERENCES academy(id),
+    phone TEXT NOT NULL UNIQUE,
+    name TEXT,
+    source TEXT DEFAULT 'whatsapp',
+    status TEXT DEFAULT 'new',
+    lead_score INTEGER DEFAULT 5,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC'),
+    updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE IF NOT EXISTS conversation (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    lead_id INTEGER NOT NULL REFERENCES lead(id),
+    academy_id INTEGER DEFAULT 1 REFERENCES academy(id),
+    status TEXT DEFAULT 'active',
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC'),
+    last_message_at TIMESTAMP,
+    summary TEXT,
+    summary_through_id INTEGER,
+    summary_updated_at TIMESTAMP
+);
+
+-- Bases creadas antes del resumen de conversaciones
+ALTER TABLE conversation ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE conversation ADD COLUMN IF NOT EXISTS summary_through_id INTEGER;
+ALTER TABLE conversation ADD COLUMN IF NOT EXISTS summary_updated_at TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS message (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversation(id),
+    sender TEXT NOT NULL,
+    content TEXT NOT NULL,
+    intent_detected TEXT,
+    timestamp TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE IF NOT EXISTS appointment (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    lead_id INTEGER NOT NULL REFERENCES lead(id),
+    appointment_datetime TIMESTAMP NOT NULL,
+    status TEXT DEFAULT 'scheduled',
+    confirmed INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE IF NOT EXISTS trial_weeks (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    lead_id INTEGER NOT NULL,
+    clase_tipo TEXT NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status TEXT DEFAULT 'active',
+    notes TEXT,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE IF NOT EXISTS class_reminders (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    lead_id INTEGER NOT NULL,
+    appointment_id INTEGER,
+    trial_week_id INTEGER,
+    clase_tipo TEXT NOT NULL,
+    class_datetime TIMESTAMP NOT NULL,
+    reminder_sent_at TIMESTAMP,
+    reminder_status TEXT DEFAULT 'pending',  -- pending, sent, failed
+    error_message TEXT,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+-- Resumen por lead del dashboard (ver migrations/add_lead_summary.sql)
+CREATE TABLE IF NOT EXISTS lead_summary (
+    lead_id INTEGER PRIMARY KEY REFERENCES lead(id),
+    total_messages INTEGER NOT NULL DEFAULT 0,
+    last_message_at TIMESTAMP,
+    last_sender TEXT,
+    next_appointment TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+-- Índice del archivo mensual de mensajes (ver migrations/add_message_archive.sql)
+CREATE TABLE IF NOT EXISTS message_archive_chunk (
+    id SERIAL PRIMARY KEY,
+    lead_id INTEGER NOT NULL,
+    conversation_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    path TEXT NOT NULL,
+    byte_offset BIGINT NOT NULL,
+    byte_length INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    first_message_id INTEGER NOT NULL,
+    last_message_id INTEGER NOT NULL,
+    first_timestamp TIMESTAMP,
+    last_timestamp TIMESTAMP,
+    last_sender TEXT,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC')
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_lead_status ON conversation(lead_id, status);
+CREATE INDEX IF NOT EXISTS idx_message_conversation ON message(conversation_id, id);
+CREATE INDEX IF NOT EXISTS idx_appointment_lead_status ON appointment(lead_id, status);
+CREATE INDEX IF NOT EXISTS idx_appointment_status_confirmed ON appointment(status, confirmed, lead_id);
+CREATE INDEX IF NOT EXISTS idx_trial_weeks_lead_status ON trial_weeks(lead_id, status);
+CREATE INDEX IF NOT EXISTS idx_trial_weeks_status_end ON trial_weeks(status, end_date);
+CREATE INDEX IF NOT EXISTS idx_class_reminders_status_datetime ON class_reminders(reminder_status, class_datetime);
+CREATE INDEX IF NOT EXISTS idx_class_reminders_lead_datetime ON class_reminders(lead_id, class_datetime);
+CREATE INDEX IF NOT EXISTS idx_lead_created_at ON lead(created_at);
+CREATE INDEX IF NOT EXISTS idx_message_archive_chunk_lead ON message_archive_chunk(lead_id, first_message_id);
+
+INSERT INTO academy (id, name, phone, address_street, address_city)
+VALUES (1, 'BJJ Mingo', '+506-7015-0369', 'Santo Domingo', 'Heredia')
+ON CONFLICT (id) DO NOTHING;
+
+INSERT INTO academies (id, name, phone)
+VALUES (1, 'BJJ Mingo', '+506-7015-0369')
+ON CONFLICT (id) DO NOTHING;
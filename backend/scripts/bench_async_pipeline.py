@@ -0,0 +1,195 @@
+"""
+Benchmark: conversaciones concurrentes en el webhook síncrono (Flask) vs asíncrono (ASGI)
+
+OpenAI se reemplaza por un cliente falso con latencia fija, así que el resultado
+mide cuántas conversaciones en vuelo soporta cada pipeline, no la velocidad del LLM.
+
+Uso:
+    python scripts/bench_async_pipeline.py --conversations 200 --messages 3 --llm-latency-ms 800
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import sqlite3
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import urlencode
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+SCHEMA_FILES = ['create_core_tables.sql', 'add_reminders_table.sql', 'add_hot_path_indexes.sql',
+                'add_lead_summary.sql', 'add_message_archive.sql', 'add_conversation_summary.sql']
+
+MESSAGES = ['Hola', 'Quiero información de las clases', '¿Cuánto cuesta la mensualidad?',
+            '¿Qué horarios tienen para adultos?', 'Gracias']
+
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeSyncOpenAI:
+    """Cliente OpenAI falso que bloquea el hilo durante la latencia configurada"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        time.sleep(self.latency)
+        return _completion('¡Pura vida! Te cuento sobre la semana de prueba GRATIS.')
+
+
+class FakeAsyncOpenAI:
+    """Cliente AsyncOpenAI falso que cede el event loop durante la latencia"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _completion('¡Pura vida! Te cuento sobre la semana de prueba GRATIS.')
+
+
+def create_bench_db():
+    """Crea una BD temporal con el esquema principal y sus índices"""
+    path = tempfile.NamedTemporaryFile(delete=False, suffix='.db').name
+    conn = sqlite3.connect(path)
+    for name in SCHEMA_FILES:
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+            conn.executescript(f.read())
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    return path
+
+
+def _configure(handler, db_path, client):
+    handler.db_path = db_path
+    handler.openai_client = client
+    handler.ai_enabled = True
+    handler.model = 'bench'
+    handler.max_tokens = 100
+    handler.temperature = 0
+    handler.scheduler = None
+
+
+def _payload(phone, i):
+    return {'Body': MESSAGES[i % len(MESSAGES)], 'From': f'whatsapp:{phone}', 'ProfileName': 'Bench'}
+
+
+def _report(name, latencies, elapsed):
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(f"\n{name}")
+    print(f"  mensajes:     {len(latencies)}")
+    print(f"  duración:     {elapsed:.2f} s")
+    print(f"  throughput:   {len(latencies) / elapsed:.1f} msg/s")
+    print(f"  latencia p50: {pct(50):.0f} ms | p95: {pct(95):.0f} ms | p99: {pct(99):.0f} ms "
+          f"| media: {statistics.mean(latencies) * 1000:.0f} ms")
+
+
+def bench_sync(args, latency):
+    """Flask + MessageHandler con un pool de hilos del tamaño de los workers"""
+    from app import create_app
+    from app.utils.database import DatabaseConfig
+
+    db_path = create_bench_db()
+    DatabaseConfig.set_db_path(db_path)
+    app = create_app()
+
+    _configure(app.extensions['message_handler'], db_path, FakeSyncOpenAI(latency))
+
+    def conversation(index):
+        client = app.test_client()
+        phone = f'+5068{index:07d}'
+        timings = []
+        for i in range(args.messages):
+            start = time.perf_counter()
+            client.post('/', data=_payload(phone, i))
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sync_workers) as pool:
+        results = list(pool.map(conversation, range(args.conversations)))
+    elapsed = time.perf_counter() - start
+
+    _report(f"SYNC  (Flask, {args.sync_workers} workers)", [t for r in results for t in r], elapsed)
+    os.unlink(db_path)
+
+
+def bench_async(args, latency):
+    """ASGI + AsyncMessageHandler en un solo event loop"""
+    from app.asgi import AsyncWebhookApp
+    from app.services.async_message_handler import AsyncMessageHandler
+
+    db_path = create_bench_db()
+    handler = AsyncMessageHandler()
+    _configure(handler, db_path, FakeAsyncOpenAI(latency))
+    asgi_app = AsyncWebhookApp(message_handler=handler)
+
+    async def post(form):
+        body = urlencode(form).encode('utf-8')
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'path': '/', 'method': 'POST'}
+        await asgi_app(scope, receive, send)
+        return sent
+
+    async def conversation(index):
+        phone = f'+5069{index:07d}'
+        timings = []
+        for i in range(args.messages):
+            start = time.perf_counter()
+            await post(_payload(phone, i))
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    async def run():
+        return await asyncio.gather(*(conversation(i) for i in range(args.conversations)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    _report("ASYNC (ASGI, 1 event loop)", [t for r in results for t in r], elapsed)
+    os.unlink(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del pipeline síncrono vs asíncrono')
+    parser.add_argument('--conversations', type=int, default=200, help='Conversaciones concurrentes')
+    parser.add_argument('--messages', type=int, default=3, help='Mensajes por conversación')
+    parser.add_argument('--llm-latency-ms', type=int, default=800, help='Latencia simulada de OpenAI')
+    parser.add_argument('--sync-workers', type=int, default=16, help='Hilos del servidor Flask')
+    parser.add_argument('--only', choices=['sync', 'async'], help='Correr solo un pipeline')
+    args = parser.parse_args()
+
+    latency = args.llm_latency_ms / 1000.0
+    print(f"📊 {args.conversations} conversaciones x {args.messages} mensajes, "
+          f"OpenAI simulado a {args.llm_latency_ms} ms")
+
+    if args.only != 'async':
+        bench_sync(args, latency)
+    if args.only != 'sync':
+        bench_async(args, latency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Servidores falsos de OpenAI y Twilio para pruebas de carga sin red
+
+Cada servidor responde con el formato real de la API después de una latencia
+tomada de una distribución configurable, así que el pipeline completo
+(cliente HTTP, reintentos, serialización) se ejercita igual que en producción.
+
+Distribuciones de latencia (milisegundos):
+    fixed:800              siempre 800 ms
+    uniform:200,1200       uniforme entre 200 y 1200 ms
+    normal:800,150         normal (media, desviación), nunca negativa
+    lognormal:800,0.5      lognormal (mediana, sigma): cola larga como un LLM real
+
+Uso independiente:
+    python scripts/fake_services.py --openai-latency lognormal:800,0.5 --twilio-latency fixed:80
+    OPENAI_BASE_URL=http://127.0.0.1:8901/v1 TWILIO_API_BASE_URL=http://127.0.0.1:8902 python run.py
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLIES = [
+    '¡Pura vida! 🥋 Te cuento que tenemos una semana de prueba GRATIS. ¿Te gustaría agendarla?',
+    'La mensualidad de adultos es ₡33,000 e incluye clases ilimitadas. ¿Querés venir a probar?',
+    'Tenemos clases de lunes a viernes en la mañana y en la noche. ¿Qué horario te sirve más?',
+]
+
+
+class LatencyDistribution:
+    """Generador de latencias a partir de un spec como 'lognormal:800,0.5'"""
+
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, spec, seed=None):
+        self.spec = spec
+        kind, _, raw = spec.partition(':')
+        if kind not in self.KINDS:
+            raise ValueError(f"Distribución desconocida '{kind}' (usar {', '.join(self.KINDS)})")
+
+        self.kind = kind
+        self.params = [float(p) for p in raw.split(',') if p] if raw else [0.0]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Devuelve una latencia en segundos"""
+        with self._lock:
+            p = self.params
+            if self.kind == 'fixed':
+                ms = p[0]
+            elif self.kind == 'uniform':
+                ms = self._random.uniform(p[0], p[1])
+            elif self.kind == 'normal':
+                ms = self._random.gauss(p[0], p[1])
+            else:
+                ms = self._random.lognormvariate(math.log(p[0]), p[1])
+        return max(ms, 0.0) / 1000.0
+
+    def __str__(self):
+        return self.spec
+
+
+class _FakeServer:
+    """Servidor HTTP con hilos en un puerto local"""
+
+    def __init__(self, latency='fixed:0', error_rate=0.0, host='127.0.0.1', port=0, seed=None):
+        self.latency = latency if isinstance(latency, LatencyDistribution) \
+            else LatencyDistribution(latency, seed)
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                status, payload = owner._handle(self.path, self.headers, body)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 1024
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, path, headers, body):
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+
+        time.sleep(self.latency.sample())
+
+        if failed:
+            return 500, {'error': {'message': 'Fake upstream error', 'type': 'server_error'}}
+        return self.respond(path, headers, body)
+
+    def respond(self, path, headers, body):
+        raise NotImplementedError
+
+
+class FakeOpenAIServer(_FakeServer):
+    """Imita POST /v1/chat/completions (usar OPENAI_BASE_URL=<url>/v1)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_request = None
+
+    def respond(self, path, headers, body):
+        if not path.rstrip('/').endswith('/chat/completions'):
+            return 404, {'error': {'message': f'Unknown path {path}'}}
+
+        request = json.loads(body or b'{}')
+        self.last_request = request
+        prompt_chars = sum(len(m.get('content') or '') for m in request.get('messages', []))
+        content = REPLIES[self.requests % len(REPLIES)]
+
+        return 200, {
+            'id': f'chatcmpl-fake{self.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_chars // 4,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': (prompt_chars + len(content)) // 4
+            }
+        }
+
+
+class FakeTwilioServer(_FakeServer):
+    """
+    Imita POST /2010-04-01/Accounts/<sid>/Messages.json (usar TWILIO_API_BASE_URL=<url>)
+    Registra cada mensaje enviado para medir la latencia de punta a punta
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deliveries = []
+
+    def respond(self, path, headers, body):
+        if not path.endswith('/Messages.json'):
+            return 404, {'message': f'Unknown path {path}', 'status': 404}
+
+        form = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+        to = form.get('To', '')
+        with self._lock:
+            self.deliveries.append((to.replace('whatsapp:', ''), time.perf_counter()))
+            sid = f'SM{len(self.deliveries):032d}'
+
+        return 201, {
+            'sid': sid,
+            'status': 'queued',
+            'to': to,
+            'from': form.get('From', ''),
+            'body': form.get('Body', ''),
+            'num_segments': '1',
+            'direction': 'outbound-api',
+            'api_version': '2010-04-01'
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidores falsos de OpenAI y Twilio')
+    parser.add_argument('--openai-latency', default='lognormal:800,0.5')
+    parser.add_argument('--twilio-latency', default='fixed:80')
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-port', type=int, default=8901)
+    parser.add_argument('--twilio-port', type=int, default=8902)
+    args = parser.parse_args()
+
+    openai_server = FakeOpenAIServer(args.openai_latency, args.openai_error_rate,
+                                     port=args.openai_port).start()
+    twilio_server = FakeTwilioServer(args.twilio_latency, port=args.twilio_port).start()
+
+    print(f"🤖 OpenAI falso:  OPENAI_BASE_URL={openai_server.url}/v1 ({args.openai_latency})")
+    print(f"📱 Twilio falso:  TWILIO_API_BASE_URL={twilio_server.url} ({args.twilio_latency})")
+    print("Ctrl+C para detener")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        openai_server.stop()
+        twilio_server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Unit tests for webhook admission control and load shedding.
+"""
+
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from app.services.admission_control import AdmissionController
+from app.services.message_handler import MessageHandler
+from app.utils.database import execute_query
+from app.utils.metrics import metrics
+
+
+class TestAdmissionController:
+    """Test in-flight cap, bounded queue and timeouts."""
+
+    def test_disabled_admits_everything(self):
+        controller = AdmissionController(max_in_flight=0)
+        assert all(controller.acquire() for _ in range(100))
+
+    def test_admits_up_to_cap(self):
+        controller = AdmissionController(max_in_flight=2, max_queue=0, queue_timeout=0.1)
+        assert controller.acquire() is True
+        assert controller.acquire() is True
+        assert controller.acquire() is False
+
+    def test_queue_full_is_shed(self):
+        metrics.reset()
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1)
+        controller.acquire()
+
+        assert controller.acquire() is False
+        assert metrics.get_counter('admission_shed_total', reason='queue_full') == 1
+
+    def test_queue_timeout_is_shed(self):
+        metrics.reset()
+        controller = AdmissionController(max_in_flight=1, max_queue=5, queue_timeout=0.05)
+        controller.acquire()
+
+        assert controller.acquire() is False
+        assert metrics.get_counter('admission_shed_total', reason='timeout') == 1
+
+    def test_waiter_is_admitted_on_release(self):
+        metrics.reset()
+        controller = AdmissionController(max_in_flight=1, max_queue=5, queue_timeout=2)
+        controller.acquire()
+        results = []
+
+        waiter = threading.Thread(target=lambda: results.append(controller.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+        assert controller.stats()['waiting'] == 1
+
+        controller.release()
+        waiter.join(timeout=2)
+
+        assert results == [True]
+        assert metrics.get_histogram('admission_queue_wait_seconds')['max'] > 0
+
+    def test_admit_context_releases(self):
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=0)
+        with controller.admit() as admitted:
+            assert admitted is True
+        assert controller.stats()['in_flight'] == 0
+
+
+class TestDegradedResponse:
+    """Test the fast degraded reply."""
+
+    def test_prices_question_gets_price_list(self):
+        handler = MessageHandler()
+        assert '₡33,000' in handler._get_degraded_response('¿Cuánto cuesta?')
+
+    def test_schedule_question_gets_schedule(self):
+        handler = MessageHandler()
+        assert 'HORARIOS' in handler._get_degraded_response('¿Qué horario tienen?')
+
+    def test_other_question_gets_emergency_text(self):
+        handler = MessageHandler()
+        response = handler._get_degraded_response('Tengo una lesión en la rodilla')
+        assert response == handler._get_emergency_response('')
+
+    def test_degraded_reply_is_saved(self, test_db):
+        handler = MessageHandler()
+        handler.db_path = test_db
+
+        handler.process_degraded('+50611111111', '¿precio?', 'Shed User')
+
+        rows = execute_query("SELECT sender, intent_detected FROM message ORDER BY id", db_path=test_db)
+        assert [(r['sender'], r['intent_detected']) for r in rows] == [('user', None), ('assistant', 'degraded')]
+
+
+class TestWebhookShedding:
+    """Test that an overloaded webhook answers with the degraded path."""
+
+    def test_shed_request_skips_openai(self, test_db):
+        with patch.dict('os.environ', {'WEBHOOK_MAX_IN_FLIGHT': '1', 'WEBHOOK_MAX_QUEUE': '0'}):
+            from app import create_app
+            app = create_app()
+
+        # Occupy the only slot
+        app.extensions['admission'].acquire()
+        client = app.test_client()
+
+        with patch('app.services.message_handler.MessageHandler.process_message') as process:
+            response = client.post('/webhook/whatsapp', data={
+                'Body': '¿Cuánto cuesta?', 'From': 'whatsapp:+50611111111'
+            })
+
+        process.assert_not_called()
+        assert response.status_code == 200
+        assert '₡33,000' in response.get_data(as_text=True)
@@ -0,0 +1,147 @@
+"""
+Unit tests for the asyncio message pipeline (AsyncMessageHandler + ASGI webhook).
+"""
+
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from urllib.parse import urlencode
+from app.asgi import AsyncWebhookApp
+from app.services.async_message_handler import AsyncMessageHandler
+from app.services.idempotency import IdempotencyGuard, InMemoryIdempotencyStore
+from app.utils.async_database import async_execute_query, get_async_db_connection, get_async_db_cursor
+from app.utils.database import execute_query
+
+
+@pytest.fixture
+def async_handler(test_db):
+    """AsyncMessageHandler with a mocked AsyncOpenAI client."""
+    handler = AsyncMessageHandler()
+    handler.db_path = test_db
+    handler.scheduler = None
+    handler.ai_enabled = True
+    handler.model = 'test'
+    handler.max_tokens = 50
+    handler.temperature = 0
+    completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='Respuesta async'))])
+    handler.openai_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=completion)))
+    )
+    return handler
+
+
+async def _post(app, form, path='/'):
+    """Call the ASGI app with a form POST and return (status, body)."""
+    body = urlencode(form).encode('utf-8')
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({'type': 'http', 'path': path, 'method': 'POST'}, receive, send)
+    return sent[0]['status'], sent[1]['body'].decode('utf-8')
+
+
+class TestAsyncDatabase:
+    """Test the aiosqlite helpers."""
+
+    @pytest.mark.asyncio
+    async def test_cursor_commits(self, test_db):
+        async with get_async_db_cursor(db_path=test_db) as cursor:
+            await cursor.execute(
+                "INSERT INTO lead (phone_number, name) VALUES (?, ?)", ('+50655555555', 'Async')
+            )
+
+        rows = await async_execute_query("SELECT name FROM lead", db_path=test_db)
+        assert rows[0]['name'] == 'Async'
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writers_do_not_lock(self, test_db):
+        async def write(i):
+            async with get_async_db_cursor(db_path=test_db) as cursor:
+                await cursor.execute(
+                    "INSERT INTO lead (phone_number) VALUES (?)", (f'+5067{i:07d}',)
+                )
+
+        await asyncio.gather(*(write(i) for i in range(50)))
+
+        rows = await async_execute_query("SELECT COUNT(*) AS n FROM lead", db_path=test_db)
+        assert rows[0]['n'] == 50
+
+    @pytest.mark.asyncio
+    async def test_connections_use_the_pragma_profile(self, test_db, monkeypatch):
+        monkeypatch.setenv('DB_PRAGMA_PROFILE', 'performance')
+        monkeypatch.setenv('DB_BUSY_TIMEOUT', '7000')
+        async with get_async_db_connection(db_path=test_db, row_factory=False) as conn:
+            pragmas = {}
+            for name in ('journal_mode', 'busy_timeout', 'synchronous'):
+                async with conn.execute(f"PRAGMA {name}") as cursor:
+                    pragmas[name] = (await cursor.fetchone())[0]
+
+        assert pragmas == {'journal_mode': 'wal', 'busy_timeout': 7000, 'synchronous': 1}
+
+
+class TestAsyncMessageHandler:
+    """Test the async pipeline end to end against SQLite."""
+
+    @pytest.mark.asyncio
+    async def test_process_message(self, test_db, async_handler):
+        response = await async_handler.process_message('+50611111111', 'Hola', 'Async User')
+
+        assert response == 'Respuesta async'
+        rows = execute_query("SELECT sender FROM message ORDER BY id", db_path=test_db)
+        assert [r['sender'] for r in rows] == ['user', 'assistant']
+
+        lead = execute_query("SELECT status FROM lead", db_path=test_db)[0]
+        assert lead['status'] == 'contacted'
+
+    @pytest.mark.asyncio
+    async def test_fallback_without_ai(self, test_db, async_handler):
+        async_handler.ai_enabled = False
+
+        response = await async_handler.process_message('+50611111111', 'Hola')
+
+        assert 'problemas técnicos' in response
+
+    @pytest.mark.asyncio
+    async def test_pending_turn_not_duplicated(self, test_db, async_handler):
+        await async_handler.process_message('+50611111111', 'Hola')
+
+        messages = async_handler.openai_client.chat.completions.create.call_args.kwargs['messages']
+        assert [m['content'] for m in messages[1:]] == ['Hola']
+
+
+class TestAsgiWebhook:
+    """Test the ASGI entry point."""
+
+    @pytest.mark.asyncio
+    async def test_webhook_returns_twiml(self, test_db, async_handler):
+        app = AsyncWebhookApp(
+            message_handler=async_handler,
+            idempotency=IdempotencyGuard(InMemoryIdempotencyStore())
+        )
+
+        status, body = await _post(app, {'Body': 'Hola', 'From': 'whatsapp:+50611111111',
+                                         'MessageSid': 'SM_ASGI_1'})
+
+        assert status == 200
+        assert 'Respuesta async' in body
+
+    @pytest.mark.asyncio
+    async def test_webhook_retry_is_deduplicated(self, test_db, async_handler):
+        app = AsyncWebhookApp(
+            message_handler=async_handler,
+            idempotency=IdempotencyGuard(InMemoryIdempotencyStore())
+        )
+        form = {'Body': 'Hola', 'From': 'whatsapp:+50611111111', 'MessageSid': 'SM_ASGI_2'}
+
+        await _post(app, form)
+        status, body = await _post(app, form)
+
+        assert status == 200
+        assert 'Respuesta async' in body
+        assert async_handler.openai_client.chat.completions.create.await_count == 1
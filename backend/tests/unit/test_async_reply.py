@@ -0,0 +1,113 @@
+"""
+Unit tests for the out-of-band reply service.
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+from app.services.async_reply import AsyncReplyService, async_reply_enabled
+from app.services.message_dispatcher import MessageDispatcher
+from app.services.message_handler import MessageHandler
+from app.utils.database import execute_query
+from app.utils.metrics import metrics
+
+
+@pytest.fixture
+def handler(test_db):
+    """MessageHandler pointed at the test database, AI disabled."""
+    handler = MessageHandler()
+    handler.db_path = test_db
+    handler.ai_enabled = False
+    return handler
+
+
+@pytest.fixture
+def notifier():
+    """Twilio-backed notifier mock."""
+    notifier = Mock()
+    notifier.twilio_available = True
+    notifier._send_whatsapp_notification.return_value = {'success': True, 'sid': 'SM123'}
+    return notifier
+
+
+class TestAsyncReplyEnabled:
+    """Test the feature flag."""
+
+    def test_disabled_by_default(self):
+        with patch.dict('os.environ', {}, clear=True):
+            assert async_reply_enabled() is False
+
+    def test_enabled_by_env(self):
+        with patch.dict('os.environ', {'WEBHOOK_ASYNC_REPLY': 'true'}):
+            assert async_reply_enabled() is True
+
+
+class TestAccept:
+    """Test accept() and background delivery."""
+
+    def test_accept_persists_and_delivers(self, test_db, handler, notifier):
+        """The inbound message is saved and the reply is sent via REST."""
+        metrics.reset()
+        service = AsyncReplyService(
+            handler, notifier=notifier, dispatcher=MessageDispatcher(num_shards=2)
+        )
+
+        future = service.accept('+50611111111', 'Hola', 'Async User')
+        result = future.result(timeout=5)
+        service.shutdown()
+
+        assert result['success'] is True
+        notifier._send_whatsapp_notification.assert_called_once()
+        assert notifier._send_whatsapp_notification.call_args[0][0] == '+50611111111'
+
+        rows = execute_query(
+            "SELECT sender FROM message ORDER BY id",
+            db_path=test_db
+        )
+        assert [r['sender'] for r in rows] == ['user', 'assistant']
+
+        assert metrics.get_counter('reply_sent_total') == 1
+        assert metrics.get_histogram('reply_stage_seconds', stage='generate')['count'] == 1
+        assert metrics.get_histogram('webhook_stage_seconds', stage='persist')['count'] == 1
+
+    def test_send_failure_is_counted(self, test_db, handler):
+        """Without Twilio the reply is still saved but counted as a failure."""
+        metrics.reset()
+        service = AsyncReplyService(
+            handler, notifier=None, dispatcher=MessageDispatcher(num_shards=1)
+        )
+        service.notifier = None
+
+        result = service.accept('+50622222222', 'Hola').result(timeout=5)
+        service.shutdown()
+
+        assert result['success'] is False
+        assert metrics.get_counter('reply_send_failures_total') == 1
+
+
+class TestAsyncWebhook:
+    """Test the webhook in async reply mode."""
+
+    def test_webhook_returns_empty_twiml(self, test_db, notifier):
+        with patch.dict('os.environ', {'WEBHOOK_ASYNC_REPLY': 'true'}):
+            from app import create_app
+            app = create_app()
+
+        service = app.extensions['reply_service']
+        service.notifier = notifier
+        service.message_handler.db_path = test_db
+        service.message_handler.ai_enabled = False
+
+        client = app.test_client()
+        response = client.post('/', data={
+            'Body': 'Hola',
+            'From': 'whatsapp:+50633333333',
+            'ProfileName': 'Webhook User'
+        })
+        service.shutdown()
+
+        assert response.status_code == 200
+        assert '<Message>' not in response.get_data(as_text=True)
+        notifier._send_whatsapp_notification.assert_called_once()
+
+        stats = client.get('/webhook/stats').get_json()
+        assert 'webhook_request_seconds{mode="async"}' in stats['histograms']
@@ -0,0 +1,115 @@
+"""
+Unit tests for burst coalescing of inbound WhatsApp messages.
+"""
+
+import time
+import pytest
+from unittest.mock import Mock
+from app.services.async_reply import AsyncReplyService
+from app.services.burst_coalescer import BurstCoalescer
+from app.services.message_dispatcher import MessageDispatcher
+from app.services.message_handler import MessageHandler
+from app.utils.database import execute_query
+from app.utils.metrics import metrics
+
+
+class TestBurstCoalescer:
+    """Test debounce and flush behaviour."""
+
+    def test_burst_is_flushed_once(self):
+        flushed = []
+        coalescer = BurstCoalescer(
+            lambda phone, items: flushed.append((phone, items)) or len(items),
+            window_seconds=0.1,
+            max_wait_seconds=2
+        )
+
+        futures = [coalescer.add('+50611111111', text) for text in ['hola', 'quiero info', 'precio?']]
+
+        assert futures[0].result(timeout=5) == 3
+        assert futures[0] is futures[2]
+        assert flushed == [('+50611111111', ['hola', 'quiero info', 'precio?'])]
+        coalescer.shutdown()
+
+    def test_senders_are_independent(self):
+        flushed = []
+        coalescer = BurstCoalescer(
+            lambda phone, items: flushed.append(phone),
+            window_seconds=0.05,
+            max_wait_seconds=1
+        )
+
+        a = coalescer.add('+50611111111', 'hola')
+        b = coalescer.add('+50622222222', 'hola')
+        a.result(timeout=5)
+        b.result(timeout=5)
+
+        assert sorted(flushed) == ['+50611111111', '+50622222222']
+        coalescer.shutdown()
+
+    def test_max_wait_caps_the_window(self):
+        coalescer = BurstCoalescer(lambda phone, items: items, window_seconds=0.2, max_wait_seconds=0.3)
+
+        start = time.monotonic()
+        future = coalescer.add('+50611111111', 'uno')
+        # Keep the sender typing: without a cap the burst would never close
+        while not future.done() and time.monotonic() - start < 2:
+            coalescer.add('+50611111111', 'otro')
+            time.sleep(0.05)
+
+        assert future.done()
+        assert time.monotonic() - start < 1
+        coalescer.shutdown()
+
+    def test_shutdown_flushes_pending(self):
+        coalescer = BurstCoalescer(lambda phone, items: 'ok', window_seconds=10, max_wait_seconds=10)
+        future = coalescer.add('+50611111111', 'hola')
+
+        coalescer.shutdown()
+
+        assert future.result(timeout=1) == 'ok'
+        assert coalescer.pending_count() == 0
+
+
+class TestAsyncReplyWithCoalescing:
+    """Test that a burst produces one reply but keeps every message row."""
+
+    def test_burst_gets_single_reply(self, test_db):
+        metrics.reset()
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.ai_enabled = False
+
+        notifier = Mock()
+        notifier.twilio_available = True
+        notifier._send_whatsapp_notification.return_value = {'success': True}
+
+        service = AsyncReplyService(handler, notifier=notifier, dispatcher=MessageDispatcher(num_shards=1))
+        service.coalescer = BurstCoalescer(service._flush_burst, window_seconds=0.1, max_wait_seconds=2)
+
+        futures = [service.accept('+50611111111', text) for text in ['hola', 'quiero info', 'precio?']]
+        futures[-1].result(timeout=5)
+        service.shutdown()
+
+        notifier._send_whatsapp_notification.assert_called_once()
+
+        rows = execute_query("SELECT sender, content FROM message ORDER BY id", db_path=test_db)
+        assert [r['sender'] for r in rows] == ['user', 'user', 'user', 'assistant']
+        assert [r['content'] for r in rows[:3]] == ['hola', 'quiero info', 'precio?']
+        assert metrics.get_counter('burst_messages_total') == 3
+        assert metrics.get_counter('burst_flushes_total') == 1
+
+
+class TestStripPendingTurn:
+    """Test that the pending user turn is not sent twice to OpenAI."""
+
+    def test_trailing_user_messages_are_removed(self):
+        handler = MessageHandler()
+        history = [
+            {'sender': 'user', 'content': 'hola'},
+            {'sender': 'assistant', 'content': '¡Hola!'},
+            {'sender': 'user', 'content': 'quiero info'},
+            {'sender': 'user', 'content': 'precio?'},
+        ]
+
+        assert handler._strip_pending_turn(history) == history[:2]
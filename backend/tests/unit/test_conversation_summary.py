@@ -0,0 +1,160 @@
+"""
+Unit tests for rolling conversation summaries.
+"""
+
+import os
+import sys
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.services.conversation_summary import ConversationSummarizer, SUMMARY_HEADER
+from app.services.message_handler import MessageHandler
+from app.tasks.maintenance_tasks import summarize_conversations
+from app.utils.database import execute_query, get_db_cursor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), 'scripts'))
+
+from fake_services import FakeOpenAIServer, REPLIES  # noqa: E402
+
+
+def _seed(db_path, count):
+    """One conversation with `count` alternating messages; returns its id."""
+    with get_db_cursor(db_path=db_path) as cursor:
+        cursor.execute("INSERT INTO lead (phone_number, name) VALUES ('+50611111111', 'Ana')")
+        cursor.execute("INSERT INTO conversation (lead_id, status) VALUES (?, 'active')", (cursor.lastrowid,))
+        conv_id = cursor.lastrowid
+        for i in range(count):
+            sender = 'user' if i % 2 == 0 else 'assistant'
+            cursor.execute("INSERT INTO message (conversation_id, sender, content) VALUES (?, ?, ?)",
+                           (conv_id, sender, f'mensaje {i}'))
+    return conv_id
+
+
+def _summary(db_path, conv_id):
+    return execute_query("SELECT summary, summary_through_id FROM conversation WHERE id = ?",
+                         (conv_id,), db_path=db_path)[0]
+
+
+@pytest.fixture
+def fake_openai():
+    server = FakeOpenAIServer('fixed:0').start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def summarizer(test_db, fake_openai):
+    from openai import OpenAI
+    client = OpenAI(api_key='sk-test', base_url=f'{fake_openai.url}/v1', max_retries=0)
+    with patch.dict('os.environ', {'SUMMARY_KEEP_MESSAGES': '4', 'SUMMARY_MIN_NEW_MESSAGES': '4',
+                                   'SUMMARY_MAX_FOLD': '6'}):
+        yield ConversationSummarizer(db_path=test_db, client=client, model='fake')
+
+
+class TestSummarizer:
+    """Test folding old messages into the conversation row."""
+
+    def test_short_conversations_are_left_alone(self, summarizer, test_db, fake_openai):
+        conv_id = _seed(test_db, 7)
+
+        assert summarizer.run() == {'conversations': 0, 'messages': 0, 'errors': 0}
+        assert fake_openai.requests == 0
+        assert _summary(test_db, conv_id)['summary'] is None
+
+    def test_old_messages_are_folded_and_recent_ones_kept(self, summarizer, test_db, fake_openai):
+        conv_id = _seed(test_db, 10)
+
+        assert summarizer.run() == {'conversations': 1, 'messages': 6, 'errors': 0}
+
+        row = _summary(test_db, conv_id)
+        assert row['summary'] in REPLIES
+        ids = [r['id'] for r in execute_query("SELECT id FROM message ORDER BY id", db_path=test_db)]
+        assert row['summary_through_id'] == ids[5]
+        transcript = fake_openai.last_request['messages'][1]['content']
+        assert 'Prospecto: mensaje 0' in transcript and 'Asistente: mensaje 5' in transcript
+        assert 'mensaje 6' not in transcript
+
+    def test_next_pass_extends_the_previous_summary(self, summarizer, test_db, fake_openai):
+        conv_id = _seed(test_db, 10)
+        summarizer.run()
+        first = _summary(test_db, conv_id)['summary']
+        with get_db_cursor(db_path=test_db) as cursor:
+            for i in range(10, 14):
+                cursor.execute("INSERT INTO message (conversation_id, sender, content) VALUES (?, 'user', ?)",
+                               (conv_id, f'mensaje {i}'))
+
+        assert summarizer.run()['messages'] == 4
+
+        transcript = fake_openai.last_request['messages'][1]['content']
+        assert first in transcript and 'mensaje 6' in transcript and 'mensaje 5' not in transcript
+
+    def test_concurrent_pass_does_not_overwrite(self, summarizer, test_db, mocker):
+        conv_id = _seed(test_db, 10)
+        original = summarizer.client.chat.completions.create
+
+        def racing_create(**kwargs):
+            with get_db_cursor(db_path=test_db) as cursor:
+                cursor.execute("UPDATE conversation SET summary = 'otra', summary_through_id = 1 "
+                               "WHERE id = ?", (conv_id,))
+            return original(**kwargs)
+
+        mocker.patch.object(summarizer.client.chat.completions, 'create', side_effect=racing_create)
+
+        assert summarizer.summarize(conv_id) == 0
+        assert _summary(test_db, conv_id)['summary'] == 'otra'
+
+    def test_openai_errors_are_counted(self, test_db, mocker):
+        _seed(test_db, 20)
+        client = mocker.Mock()
+        client.chat.completions.create.side_effect = RuntimeError('boom')
+
+        assert ConversationSummarizer(db_path=test_db, client=client).run()['errors'] == 1
+
+
+class TestSummaryInPrompt:
+    """Test that replies use the summary plus the messages after it."""
+
+    def test_prompt_is_summary_plus_recent_turns(self, test_db, mocker):
+        conv_id = _seed(test_db, 10)
+        ids = [r['id'] for r in execute_query("SELECT id FROM message ORDER BY id", db_path=test_db)]
+        with get_db_cursor(db_path=test_db) as cursor:
+            cursor.execute("UPDATE conversation SET summary = 'Ana pregunta por clases de adultos', "
+                           "summary_through_id = ? WHERE id = ?", (ids[5], conv_id))
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.scheduler = None
+        handler.ai_enabled = True
+        handler.model = 'test'
+        handler.max_tokens = 50
+        handler.temperature = 0
+        handler.fast_path.templates = {}
+        handler.openai_client = mocker.Mock()
+        handler.openai_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='Respuesta IA'))])
+
+        handler.process_message('+50611111111', '¿Y los sábados?', 'Ana')
+
+        messages = handler.openai_client.chat.completions.create.call_args.kwargs['messages']
+        assert messages[1] == {'role': 'system', 'content': SUMMARY_HEADER + 'Ana pregunta por clases de adultos'}
+        assert [m['content'] for m in messages[2:]] == \
+            ['mensaje 6', 'mensaje 7', 'mensaje 8', 'mensaje 9', '¿Y los sábados?']
+
+
+class TestSummarizeTask:
+    """Test the Celery task wrapper."""
+
+    def test_task_against_fake_server(self, test_db, fake_openai):
+        conv_id = _seed(test_db, 20)
+        env = {'OPENAI_API_KEY': 'sk-test', 'OPENAI_BASE_URL': f'{fake_openai.url}/v1'}
+        with patch.dict('os.environ', env):
+            result = summarize_conversations(db_path=test_db)
+
+        assert result['success'] is True and result['conversations'] == 1
+        assert _summary(test_db, conv_id)['summary'] in REPLIES
+
+    def test_without_openai_is_a_no_op(self, test_db):
+        _seed(test_db, 20)
+        with patch.dict('os.environ', {'OPENAI_API_KEY': ''}):
+            assert summarize_conversations(db_path=test_db) == \
+                {'success': True, 'conversations': 0, 'messages': 0, 'errors': 0}
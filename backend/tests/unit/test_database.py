@@ -2,8 +2,12 @@
 Unit tests for database utilities module.
 """
 
+import os
+import time
 import pytest
 import sqlite3
+import threading
+from unittest.mock import patch
 from app.utils.database import (
     DatabaseConfig,
     get_db_connection,
@@ -12,8 +16,25 @@ from app.utils.database import (
     execute_insert,
     execute_update,
     table_exists,
-    get_table_info
+    get_table_info,
+    db_stage,
+    ConnectionPool,
+    get_pool,
+    close_all_pools,
+    unit_of_work,
+    get_pragmas,
+    wal_checkpoint,
+    SlowQueryLog,
+    TimedConnection,
+    connection_factory,
+    param_shapes,
+    get_read_connection,
+    read_db_path,
+    read_only_uri,
+    refresh_read_snapshot
 )
+from app.utils.metrics import metrics
+from app.utils.queries import queries
 
 
 class TestDatabaseConfig:
@@ -211,3 +232,424 @@ class TestGetTableInfo:
         assert 'phone_number' in columns
         assert 'name' in columns
         assert 'status' in columns
+
+
+class TestDbStage:
+    """Test per-stage database time accounting."""
+
+    def test_connection_time_recorded_under_stage(self, test_db):
+        """Connections opened inside db_stage are attributed to that stage."""
+        metrics.reset()
+
+        with db_stage('persist'):
+            execute_query("SELECT 1", db_path=test_db)
+            with get_db_cursor(db_path=test_db) as cursor:
+                cursor.execute("SELECT 1")
+        execute_query("SELECT 1", db_path=test_db)
+
+        assert metrics.get_histogram('db_seconds', stage='persist')['count'] == 2
+        assert metrics.get_histogram('db_seconds', stage='other')['count'] == 1
+
+    def test_nested_stage_restores_outer(self, test_db):
+        """Leaving an inner stage restores the outer one."""
+        metrics.reset()
+
+        with db_stage('outer'):
+            with db_stage('inner'):
+                execute_query("SELECT 1", db_path=test_db)
+            execute_query("SELECT 1", db_path=test_db)
+
+        assert metrics.get_histogram('db_seconds', stage='inner')['count'] == 1
+        assert metrics.get_histogram('db_seconds', stage='outer')['count'] == 1
+
+
+class TestConnectionPool:
+    """Test pooled connection reuse, recycling and limits."""
+
+    def test_connection_is_reused(self, test_db):
+        """Consecutive checkouts get the same connection back."""
+        with get_db_connection(db_path=test_db) as first:
+            pass
+        with get_db_cursor(db_path=test_db) as cursor:
+            assert cursor.connection is first
+
+    def test_uncommitted_work_is_rolled_back_on_release(self, test_db):
+        """get_db_connection never commits implicitly, as before pooling."""
+        with get_db_connection(db_path=test_db) as conn:
+            conn.execute("INSERT INTO lead (academy_id, phone_number, name) VALUES (1, '+50600000001', 'X')")
+
+        assert execute_query("SELECT * FROM lead WHERE phone_number = '+50600000001'", db_path=test_db) == []
+
+    def test_error_rolls_back_and_keeps_pool_usable(self, test_db):
+        """A failed transaction does not leak into the next checkout."""
+        with pytest.raises(sqlite3.OperationalError):
+            with get_db_cursor(db_path=test_db) as cursor:
+                cursor.execute("INSERT INTO lead (academy_id, phone_number, name) VALUES (1, '+50600000002', 'Y')")
+                cursor.execute("SELECT * FROM non_existent_table")
+
+        assert execute_query("SELECT * FROM lead WHERE phone_number = '+50600000002'", db_path=test_db) == []
+        assert get_pool(test_db).stats()['in_use'] == 0
+
+    def test_row_factory_is_reset_per_checkout(self, test_db):
+        """A connection returned with row_factory=False comes back with Row when asked."""
+        with get_db_connection(db_path=test_db, row_factory=False) as conn:
+            assert isinstance(conn.execute("SELECT 1").fetchone(), tuple)
+        with get_db_connection(db_path=test_db) as conn:
+            assert isinstance(conn.execute("SELECT 1").fetchone(), sqlite3.Row)
+
+    def test_max_lifetime_recycles(self, test_db):
+        """Connections older than max_lifetime are replaced."""
+        pool = ConnectionPool(test_db, max_size=1, max_lifetime=0.01)
+        first = pool.acquire()
+        pool.release(first)
+        time.sleep(0.02)
+
+        second = pool.acquire()
+        assert second is not first
+        pool.release(second)
+        pool.close()
+
+    def test_replaced_file_recycles(self, tmp_path):
+        """A pooled connection is dropped when the database file is replaced."""
+        path = str(tmp_path / 'pool.db')
+        sqlite3.connect(path).close()
+        pool = ConnectionPool(path, max_size=1)
+        first = pool.acquire()
+        pool.release(first)
+
+        os.unlink(path)
+        sqlite3.connect(path).close()
+
+        second = pool.acquire()
+        assert second is not first
+        pool.release(second)
+        pool.close()
+
+    def test_nested_checkout_does_not_deadlock(self, test_db):
+        """A thread holding the only slot can still open a nested connection."""
+        pool = ConnectionPool(test_db, max_size=1, checkout_timeout=0.5)
+        outer = pool.acquire()
+        inner = pool.acquire()
+
+        assert inner.overflow is True
+        pool.release(inner)
+        pool.release(outer)
+        assert pool.stats() == {'db_path': test_db, 'max_size': 1, 'in_use': 0, 'idle': 1, 'open': 1}
+        pool.close()
+
+    def test_checkout_waits_and_times_out(self, test_db):
+        """Other threads wait for a free slot and give up after checkout_timeout."""
+        metrics.reset()
+        pool = ConnectionPool(test_db, max_size=1, checkout_timeout=0.05)
+        held = pool.acquire()
+        errors = []
+
+        def other():
+            try:
+                pool.acquire()
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+
+        assert len(errors) == 1
+        assert metrics.get_counter('db_pool_checkout_timeouts_total') == 1
+        pool.release(held)
+        pool.close()
+
+    def test_waiter_gets_released_connection(self, test_db):
+        """A waiting thread is handed the connection as soon as it is released."""
+        metrics.reset()
+        pool = ConnectionPool(test_db, max_size=1, checkout_timeout=2)
+        held = pool.acquire()
+        got = []
+
+        thread = threading.Thread(target=lambda: got.append(pool.acquire()))
+        thread.start()
+        time.sleep(0.05)
+        pool.release(held)
+        thread.join()
+
+        assert got[0] is held
+        assert metrics.get_histogram('db_pool_checkout_wait_seconds')['max'] >= 0.04
+        pool.release(got[0])
+        pool.close()
+
+    def test_gauges_are_labelled_per_pool(self, test_db, tmp_path):
+        """Each pool reports its own in-use/open series."""
+        metrics.reset()
+        other_db = str(tmp_path / 'other.db')
+        pool = ConnectionPool(test_db, max_size=2)
+        other = ConnectionPool(other_db, max_size=2)
+        held = pool.acquire()
+        other.release(other.acquire())
+
+        assert metrics.get_gauge('db_pool_in_use', db_path=test_db) == 1
+        assert metrics.get_gauge('db_pool_utilization', db_path=test_db) == 0.5
+        assert metrics.get_gauge('db_pool_in_use', db_path=other_db) == 0
+        assert metrics.get_gauge('db_pool_open_connections', db_path=other_db) == 1
+        pool.release(held)
+        pool.close()
+        other.close()
+
+    def test_pool_disabled(self, test_db):
+        """DB_POOL_SIZE=0 opens a fresh connection per call."""
+        close_all_pools()
+        with patch.dict('os.environ', {'DB_POOL_SIZE': '0'}):
+            assert get_pool(test_db) is None
+            with get_db_connection(db_path=test_db) as first:
+                pass
+            with get_db_connection(db_path=test_db) as second:
+                assert second is not first
+
+
+class TestUnitOfWork:
+    """Test the explicit write transaction helper."""
+
+    def test_commits_all_statements_together(self, test_db):
+        """Every write in the block is committed at once."""
+        metrics.reset()
+        with unit_of_work(db_path=test_db) as cursor:
+            cursor.execute("INSERT INTO lead (academy_id, phone_number, name) VALUES (1, '+50600000010', 'A')")
+            cursor.execute("INSERT INTO lead (academy_id, phone_number, name) VALUES (1, '+50600000011', 'B')")
+
+        assert len(execute_query("SELECT * FROM lead WHERE phone_number LIKE '+5060000001%'", db_path=test_db)) == 2
+        assert metrics.get_counter('db_commits_total') == 1
+
+    def test_rolls_back_on_error(self, test_db):
+        """A failure leaves no partial writes."""
+        with pytest.raises(sqlite3.OperationalError):
+            with unit_of_work(db_path=test_db) as cursor:
+                cursor.execute("INSERT INTO lead (academy_id, phone_number, name) VALUES (1, '+50600000012', 'C')")
+                cursor.execute("SELECT * FROM non_existent_table")
+
+        assert execute_query("SELECT * FROM lead WHERE phone_number = '+50600000012'", db_path=test_db) == []
+
+    def test_holds_write_lock_from_the_start(self, test_db):
+        """Reads at the top of the block already exclude other writers."""
+        with unit_of_work(db_path=test_db) as cursor:
+            cursor.execute("SELECT COUNT(*) FROM lead")
+            other = sqlite3.connect(test_db, timeout=0)
+            with pytest.raises(sqlite3.OperationalError):
+                other.execute("BEGIN IMMEDIATE")
+            other.close()
+
+
+class TestPragmaProfile:
+    """Test the connection pragma profile."""
+
+    def test_performance_profile_is_default(self):
+        with patch.dict('os.environ', {}, clear=False):
+            os.environ.pop('DB_PRAGMA_PROFILE', None)
+            pragmas = get_pragmas()
+        assert pragmas['journal_mode'] == 'WAL'
+        assert pragmas['synchronous'] == 'NORMAL'
+        assert list(pragmas)[0] == 'busy_timeout'
+
+    def test_env_overrides(self):
+        with patch.dict('os.environ', {'DB_PRAGMA_PROFILE': 'default', 'DB_SYNCHRONOUS': 'FULL'}):
+            pragmas = get_pragmas()
+        assert pragmas == {'busy_timeout': 5000, 'synchronous': 'FULL'}
+
+    def test_rejects_unknown_profile_and_bad_values(self):
+        with pytest.raises(ValueError):
+            get_pragmas('turbo')
+        with patch.dict('os.environ', {'DB_CACHE_SIZE': '1; DROP TABLE lead'}):
+            with pytest.raises(ValueError):
+                get_pragmas()
+
+    def test_connections_use_profile(self, test_db):
+        close_all_pools()
+        with get_db_connection(db_path=test_db, row_factory=False) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+    def test_reader_does_not_block_writer(self, test_db):
+        """With WAL an open read transaction does not stop a commit."""
+        close_all_pools()
+        with get_db_connection(db_path=test_db) as reader:
+            reader.execute("BEGIN")
+            reader.execute("SELECT COUNT(*) FROM lead").fetchone()
+
+            writer = sqlite3.connect(test_db, timeout=0)
+            writer.execute("INSERT INTO lead (academy_id, phone_number, name) VALUES (1, '+50600000020', 'W')")
+            writer.commit()
+            writer.close()
+
+
+class TestWalCheckpoint:
+    """Test WAL checkpointing."""
+
+    def test_truncate_empties_wal(self, test_db):
+        close_all_pools()
+        with get_db_cursor(db_path=test_db) as cursor:
+            for i in range(50):
+                cursor.execute("INSERT INTO lead (academy_id, phone_number, name) VALUES (1, ?, 'C')",
+                               (f'+5069{i:07d}',))
+
+        metrics.reset()
+        result = wal_checkpoint(db_path=test_db, mode='TRUNCATE')
+
+        assert result['journal_mode'] == 'wal'
+        assert result['busy'] is False
+        assert result['wal_size_bytes_before'] > 0
+        assert result['wal_size_bytes'] == 0
+        assert metrics.get_gauge('db_wal_size_bytes') == 0
+        assert metrics.get_counter('db_checkpoints_total', mode='truncate', result='ok') == 1
+
+    def test_rollback_journal_is_reported(self, tmp_path):
+        path = str(tmp_path / 'rollback.db')
+        with patch.dict('os.environ', {'DB_PRAGMA_PROFILE': 'default'}):
+            result = wal_checkpoint(db_path=path)
+        close_all_pools()
+        assert result['journal_mode'] == 'delete'
+
+    def test_invalid_mode(self, test_db):
+        with pytest.raises(ValueError):
+            wal_checkpoint(db_path=test_db, mode='NOW')
+
+
+class TestSlowQueryLog:
+    """Test the slow query log and its plan capture."""
+
+    @pytest.fixture
+    def slow_log(self, tmp_path):
+        log = SlowQueryLog(threshold_ms=0.000001, path=str(tmp_path / 'slow.log'))
+        close_all_pools()
+        with patch('app.utils.database.slow_query_log', log):
+            yield log
+        log.close()
+        close_all_pools()
+
+    def _entries(self, log):
+        import json
+        with open(log.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_slow_statement_is_logged_with_plan(self, test_db, slow_log):
+        with get_db_connection(db_path=test_db) as conn:
+            assert isinstance(conn, TimedConnection)
+            queries.fetchone(conn, 'lead.by_phone', ('+50611111111',))
+
+        entry = [e for e in self._entries(slow_log) if e['query'] == 'lead.by_phone'][0]
+        assert entry['sql'] == queries.sql('lead.by_phone')
+        assert entry['params'] == ['str(12)']
+        assert entry['elapsed_ms'] > 0
+        assert entry['plan_cached'] is False
+        assert any(step.startswith('SEARCH lead') for step in entry['plan'])
+        assert '+50611111111' not in open(slow_log.path, encoding='utf-8').read()
+
+    def test_plan_is_cached_per_statement(self, test_db, slow_log):
+        with get_db_cursor(db_path=test_db) as cursor:
+            for _ in range(2):
+                cursor.execute("SELECT id FROM lead WHERE phone_number = ?", ('+50611111111',))
+
+        entries = [e for e in self._entries(slow_log) if e['sql'].startswith('SELECT id FROM lead')]
+        assert [e['plan_cached'] for e in entries] == [False, True]
+        assert entries[0]['plan'] == entries[1]['plan']
+
+    def test_fast_statements_are_not_logged(self, test_db, tmp_path):
+        log = SlowQueryLog(threshold_ms=10000, path=str(tmp_path / 'slow.log'))
+        with patch('app.utils.database.slow_query_log', log):
+            close_all_pools()
+            execute_query("SELECT * FROM lead", db_path=test_db)
+            close_all_pools()
+
+        assert not os.path.exists(log.path)
+
+    def test_disabled_log_uses_plain_connections(self):
+        for log in (SlowQueryLog(threshold_ms=0), SlowQueryLog(sample_rate=0)):
+            with patch('app.utils.database.slow_query_log', log):
+                assert connection_factory() is sqlite3.Connection
+
+    def test_log_rotates(self, test_db, tmp_path):
+        log = SlowQueryLog(threshold_ms=0.000001, path=str(tmp_path / 'slow.log'), max_bytes=2000, backups=1)
+        with patch('app.utils.database.slow_query_log', log):
+            close_all_pools()
+            with get_db_connection(db_path=test_db) as conn:
+                for i in range(20):
+                    conn.execute(f"SELECT {i}, * FROM lead")
+            close_all_pools()
+        log.close()
+
+        assert os.path.exists(log.path + '.1')
+        assert not os.path.exists(log.path + '.2')
+
+    def test_param_shapes(self):
+        assert param_shapes(('+50611111111', 3, None, 1.5)) == ['str(12)', 'int', 'None', 'float']
+        assert param_shapes({'phone': b'ab'}) == {'phone': 'bytes(2)'}
+        assert param_shapes(None) == []
+
+
+class TestReadRouting:
+    """Test where get_read_connection sends dashboard reads."""
+
+    @pytest.fixture
+    def snapshot_env(self, test_db, tmp_path):
+        snapshot = str(tmp_path / 'read.snapshot')
+        with patch.dict('os.environ', {'DB_READ_MODE': 'snapshot', 'DB_READ_SNAPSHOT_PATH': snapshot,
+                                       'DB_READ_SNAPSHOT_SECONDS': '3600'}):
+            yield snapshot
+
+    def test_primary_by_default(self, test_db):
+        assert read_db_path() == test_db
+
+    def test_readonly_uri_has_its_own_pool(self, test_db):
+        execute_insert("INSERT INTO lead (phone_number) VALUES ('+50611111111')", db_path=test_db)
+
+        with patch.dict('os.environ', {'DB_READ_MODE': 'readonly'}):
+            assert read_db_path() == read_only_uri(test_db)
+            with get_read_connection() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM lead").fetchone()[0] == 1
+                with pytest.raises(sqlite3.OperationalError):
+                    conn.execute("INSERT INTO lead (phone_number) VALUES ('+50622222222')")
+
+        assert get_pool(read_only_uri(test_db)) is not get_pool(test_db)
+
+    def test_snapshot_is_refreshed_when_stale(self, test_db, snapshot_env):
+        execute_insert("INSERT INTO lead (phone_number) VALUES ('+50611111111')", db_path=test_db)
+        with get_read_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM lead").fetchone()[0] == 1
+
+        execute_insert("INSERT INTO lead (phone_number) VALUES ('+50622222222')", db_path=test_db)
+        with get_read_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM lead").fetchone()[0] == 1
+
+        os.utime(snapshot_env, (time.time() - 7200, time.time() - 7200))
+        with get_read_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM lead").fetchone()[0] == 2
+
+    def test_snapshot_uses_rollback_journal(self, test_db, snapshot_env):
+        result = refresh_read_snapshot(test_db)
+
+        assert result['path'] == snapshot_env and result['size_bytes'] > 0
+        with sqlite3.connect(snapshot_env) as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+        assert not os.path.exists(snapshot_env + '-wal')
+
+    def test_postgres_replica(self):
+        primary = 'postgresql://u:p@primary/db'
+
+        assert read_db_path(primary) == primary
+        with patch.dict('os.environ', {'DB_READ_URL': 'postgresql://u:p@replica/db'}):
+            assert read_db_path(primary) == 'postgresql://u:p@replica/db'
+            assert read_db_path('app.db') == 'app.db'
+
+    def test_unknown_mode(self, test_db):
+        with patch.dict('os.environ', {'DB_READ_MODE': 'nope'}):
+            with pytest.raises(ValueError):
+                read_db_path()
+
+    def test_dashboard_reads_the_snapshot(self, test_db, snapshot_env):
+        from app import create_app
+        client = create_app().test_client()
+        execute_insert("INSERT INTO lead (phone_number, name) VALUES ('+50611111111', 'Ana')", db_path=test_db)
+
+        assert client.get('/api/stats').get_json()['total_leads'] == 1
+        execute_insert("INSERT INTO lead (phone_number, name) VALUES ('+50622222222', 'Beto')", db_path=test_db)
+
+        assert client.get('/api/stats').get_json()['total_leads'] == 1
+        assert len(client.get('/api/leads').get_json()) == 1
@@ -0,0 +1,205 @@
+"""
+Unit tests for the streaming export of leads and conversations.
+"""
+
+import csv
+import gzip
+import json
+import zlib
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app import create_app
+from app.utils import export, lead_summary, message_archive
+from app.utils.database import get_db_cursor
+
+
+def _seed(db_path):
+    """Three leads with two messages each; the last lead is from Instagram and interested."""
+    leads = [('+50611111111', 'Ana', 'new', 'whatsapp', '2026-01-10 09:00:00'),
+             ('+50622222222', 'Beto', 'new', 'whatsapp', '2026-02-10 09:00:00'),
+             ('+50633333333', 'Caro', 'interested', 'instagram', '2026-03-10 09:00:00')]
+    with get_db_cursor(db_path=db_path) as cursor:
+        for phone, name, status, source, created_at in leads:
+            cursor.execute("INSERT INTO lead (phone_number, name, status, source, created_at) "
+                           "VALUES (?, ?, ?, ?, ?)", (phone, name, status, source, created_at))
+            lead_id = cursor.lastrowid
+            cursor.execute("INSERT INTO conversation (lead_id) VALUES (?)", (lead_id,))
+            conv_id = cursor.lastrowid
+            for sender in ('user', 'assistant'):
+                cursor.execute("INSERT INTO message (conversation_id, sender, content, timestamp) "
+                               "VALUES (?, ?, ?, ?)", (conv_id, sender, f'{name} {sender}', created_at))
+
+
+def _rows(kind, **filters):
+    return [row for page in export.iter_pages(kind, **filters) for row in page]
+
+
+@pytest.fixture
+def client(test_db):
+    return create_app().test_client()
+
+
+class TestIterPages:
+    """Test keyset pagination and filters."""
+
+    def test_pages_are_bounded_and_in_id_order(self, test_db):
+        _seed(test_db)
+
+        pages = list(export.iter_pages('conversations', page_size=4))
+
+        assert [len(page) for page in pages] == [4, 2]
+        ids = [row['id'] for page in pages for row in page]
+        assert ids == sorted(ids) and len(set(ids)) == 6
+
+    def test_filters(self, test_db):
+        _seed(test_db)
+
+        assert [r['name'] for r in _rows('leads', status='new')] == ['Ana', 'Beto']
+        assert [r['name'] for r in _rows('leads', source='instagram')] == ['Caro']
+        assert _rows('leads', status='new', source='instagram') == []
+        assert [r['name'] for r in _rows('leads', since=export.parse_bound('2026-02-01'),
+                                         until=export.parse_bound('2026-02-10', end=True))] == ['Beto']
+        assert {r['content'] for r in _rows('conversations', status='interested')} == \
+            {'Caro user', 'Caro assistant'}
+
+    def test_resume_after_cursor(self, test_db):
+        _seed(test_db)
+        everything = _rows('conversations')
+
+        resumed = _rows('conversations', after=everything[2]['id'], page_size=2)
+
+        assert resumed == everything[3:]
+
+    def test_leads_include_summary_columns(self, test_db):
+        _seed(test_db)
+        lead_summary.rebuild(test_db)
+
+        lead = _rows('leads')[0]
+
+        assert tuple(lead) == export.EXPORT_FIELDS['leads']
+        assert lead['total_messages'] == 2 and lead['last_sender'] == 'assistant'
+
+    def test_parse_bound(self):
+        assert export.parse_bound('2026-02-10') == '2026-02-10 00:00:00'
+        assert export.parse_bound('2026-02-10', end=True) == '2026-02-11 00:00:00'
+        assert export.parse_bound('2026-02-10T12:30:00', end=True) == '2026-02-10 12:30:00'
+        assert export.parse_bound('') is None
+        with pytest.raises(ValueError):
+            export.parse_bound('ayer')
+
+
+class TestArchivedMessages:
+    """Test that archived history is part of the conversations export."""
+
+    @pytest.fixture
+    def archived(self, test_db, tmp_path):
+        """Two leads whose old messages are archived; the second keeps a recent message in the table."""
+        def ts(days_ago):
+            return (datetime.utcnow() - timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+
+        with get_db_cursor(db_path=test_db) as cursor:
+            for phone, name, source in (('+50611111111', 'Ana', 'whatsapp'), ('+50622222222', 'Beto', 'instagram')):
+                cursor.execute("INSERT INTO lead (phone_number, name, source) VALUES (?, ?, ?)", (phone, name, source))
+                cursor.execute("INSERT INTO conversation (lead_id, status, created_at) VALUES (?, 'closed', ?)",
+                               (cursor.lastrowid, ts(300)))
+            # Mensajes de las dos conversaciones intercalados por id
+            for conv_id, days_ago in ((1, 300), (2, 299), (1, 298), (2, 297)):
+                cursor.execute("INSERT INTO message (conversation_id, sender, content, timestamp) "
+                               "VALUES (?, 'user', ?, ?)", (conv_id, f'viejo {days_ago}', ts(days_ago)))
+        directory = str(tmp_path / 'archive')
+        assert message_archive.archive_messages(test_db, older_than_days=180, directory=directory)['messages'] == 4
+        with get_db_cursor(db_path=test_db) as cursor:
+            cursor.execute("INSERT INTO conversation (lead_id) VALUES (2)")
+            cursor.execute("INSERT INTO message (conversation_id, sender, content) VALUES (?, 'user', 'nuevo')",
+                           (cursor.lastrowid,))
+        with patch.dict('os.environ', {'DB_ARCHIVE_DIR': directory}):
+            yield directory
+
+    def test_archived_and_hot_rows_are_merged_by_id(self, archived):
+        pages = list(export.iter_pages('conversations', page_size=2))
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        rows = [row for page in pages for row in page]
+        assert [r['id'] for r in rows] == [1, 2, 3, 4, 5]
+        assert [r['content'] for r in rows] == ['viejo 300', 'viejo 299', 'viejo 298', 'viejo 297', 'nuevo']
+        assert [r['name'] for r in rows] == ['Ana', 'Beto', 'Ana', 'Beto', 'Beto']
+        assert list(rows[0]) == list(export.EXPORT_FIELDS['conversations'])
+
+    def test_filters_and_resume_apply_to_archived_rows(self, archived):
+        assert [r['id'] for r in _rows('conversations', source='instagram')] == [2, 4, 5]
+        assert [r['id'] for r in _rows('conversations', after=2)] == [3, 4, 5]
+        until = (datetime.utcnow() - timedelta(days=299)).strftime('%Y-%m-%d %H:%M:%S')
+        assert [r['id'] for r in _rows('conversations', until=until)] == [1]
+
+    def test_missing_archive_file_is_skipped(self, archived, tmp_path):
+        for path in (tmp_path / 'archive').iterdir():
+            path.unlink()
+
+        assert [r['content'] for r in _rows('conversations')] == ['nuevo']
+
+
+class TestEncode:
+    """Test NDJSON, CSV and on-the-fly gzip."""
+
+    def test_csv_has_header_and_quotes_content(self):
+        pages = iter([[{'id': 1, 'content': 'Hola, "profe"\nmañana'}]])
+
+        data = b''.join(export.encode(pages, 'csv', ('id', 'content'))).decode('utf-8')
+
+        assert list(csv.reader(data.splitlines(keepends=True))) == \
+            [['id', 'content'], ['1', 'Hola, "profe"\nmañana']]
+
+    def test_gzip_chunks_decode_as_they_arrive(self):
+        pages = iter([[{'id': 1}], [{'id': 2}]])
+
+        chunks = list(export.encode(pages, 'ndjson', ('id',), compress=True))
+
+        partial = zlib.decompressobj(31).decompress(b''.join(chunks[:1]))
+        assert partial == b'{"id": 1}\n'
+        assert gzip.decompress(b''.join(chunks)) == b'{"id": 1}\n{"id": 2}\n'
+
+
+class TestExportEndpoints:
+    """Test /api/export/leads and /api/export/conversations."""
+
+    def test_ndjson_stream(self, client, test_db):
+        _seed(test_db)
+
+        response = client.get('/api/export/conversations?source=whatsapp')
+
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        assert [r['content'] for r in rows] == ['Ana user', 'Ana assistant', 'Beto user', 'Beto assistant']
+
+    def test_csv_gzip_when_accepted(self, client, test_db):
+        _seed(test_db)
+
+        response = client.get('/api/export/leads?format=csv&status=new', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        lines = gzip.decompress(response.data).decode('utf-8').splitlines()
+        assert lines[0] == ','.join(export.EXPORT_FIELDS['leads'])
+        assert len(lines) == 3
+
+    def test_invalid_parameters(self, client):
+        assert client.get('/api/export/leads?format=xml').status_code == 400
+        assert client.get('/api/export/leads?since=ayer').status_code == 400
+        assert client.get('/api/export/leads?after=x').status_code == 400
+        assert client.get('/api/export/appointments').status_code == 404
+
+
+class TestCli:
+    """Test python -m app.utils.export."""
+
+    def test_export_to_file(self, test_db, tmp_path, capsys):
+        _seed(test_db)
+        output = str(tmp_path / 'leads.ndjson.gz')
+
+        assert export.main(['leads', '--db', test_db, '--gzip', '-o', output, '--after', '1']) == 0
+
+        with gzip.open(output, 'rt', encoding='utf-8') as f:
+            assert [json.loads(line)['name'] for line in f] == ['Beto', 'Caro']
+        assert 'last id 3' in capsys.readouterr().err
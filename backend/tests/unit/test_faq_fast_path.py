@@ -0,0 +1,131 @@
+"""
+Unit tests for the deterministic FAQ fast path.
+"""
+
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from app.config.academy_info import get_precios_texto, get_horarios_texto
+from app.services.async_message_handler import AsyncMessageHandler
+from app.services.faq_fast_path import FaqFastPath
+from app.services.message_handler import MessageHandler
+from app.utils.database import execute_query
+from app.utils.metrics import metrics
+
+
+@pytest.fixture
+def fast_path():
+    return FaqFastPath(threshold=0.7)
+
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+@pytest.fixture
+def handler(test_db, mocker, monkeypatch):
+    """MessageHandler with a mocked OpenAI client and the fast path switched on."""
+    monkeypatch.setenv('FAQ_FAST_PATH', 'true')
+    handler = MessageHandler()
+    handler.db_path = test_db
+    handler.scheduler = None
+    handler.ai_enabled = True
+    handler.model = 'test'
+    handler.max_tokens = 50
+    handler.temperature = 0
+    handler.openai_client = mocker.Mock()
+    handler.openai_client.chat.completions.create.return_value = _completion('Respuesta IA')
+    return handler
+
+
+class TestClassify:
+    """Test intent and confidence scoring."""
+
+    @pytest.mark.parametrize('message,intents', [
+        ('Hola, ¿cuánto cuesta?', ['precios']),
+        ('¿Qué horario tienen para adultos?', ['horarios']),
+        ('¿A qué hora son las clases de kids?', ['horarios']),
+        ('¿Dónde están ubicados?', ['ubicacion']),
+        ('¿Dónde quedan y cuánto cuesta la mensualidad?', ['precios', 'ubicacion']),
+    ])
+    def test_confident_questions(self, fast_path, message, intents):
+        result = fast_path.classify(message)
+
+        assert result['intents'] == intents
+        assert result['confidence'] >= fast_path.threshold
+
+    def test_is_deterministic_and_accent_insensitive(self, fast_path):
+        assert fast_path.classify('¿CUÁNTO CUESTA?') == fast_path.classify('cuanto cuesta')
+
+    def test_booking_messages_are_blocked(self, fast_path):
+        for message in ('Quiero agendar una clase', 'Horario del lunes a las 6pm', 'Me llamo Ana, ¿precio?'):
+            assert fast_path.classify(message)['blocked']
+            assert fast_path.answer(message) is None
+
+    def test_extra_detail_lowers_confidence(self, fast_path):
+        short = fast_path.classify('¿Cuánto cuesta?')['confidence']
+        long = fast_path.classify('Tengo una lesión en la rodilla, ¿puedo entrenar? ¿y cuánto cuesta?')['confidence']
+
+        assert long < fast_path.threshold <= short
+
+    def test_answer_uses_academy_info(self, fast_path):
+        assert fast_path.answer('precios?') == ('precios', get_precios_texto())
+        assert fast_path.answer('horarios y precios') == \
+            ('precios+horarios', get_precios_texto() + '\n\n' + get_horarios_texto())
+        assert fast_path.answer('Hola') is None
+
+
+class TestMessageHandlerFastPath:
+    """Test the fast path in front of OpenAI."""
+
+    def test_faq_is_answered_without_openai(self, handler, test_db):
+        metrics.reset()
+
+        response = handler.process_message('+50611111111', '¿Cuánto cuesta la mensualidad?', 'Ana')
+
+        assert response.startswith(get_precios_texto())
+        handler.openai_client.chat.completions.create.assert_not_called()
+        rows = execute_query("SELECT sender, intent_detected FROM message ORDER BY id", db_path=test_db)
+        assert [(r['sender'], r['intent_detected']) for r in rows] == \
+            [('user', None), ('assistant', 'fast_path:precios')]
+        assert metrics.get_counter('faq_fast_path_total', result='hit', intent='precios', band='1.0') == 1
+
+    def test_other_messages_go_to_openai(self, handler):
+        metrics.reset()
+
+        assert handler.process_message('+50611111111', 'Tengo una lesión, ¿puedo entrenar?', 'Ana') == \
+            'Respuesta IA'
+        assert handler.process_message('+50611111111', 'Quiero agendar el martes a las 6pm', 'Ana') == \
+            'Respuesta IA'
+        assert handler.process_message('+50611111111', '¿Precio para el sábado a las 9am?', 'Ana') == \
+            'Respuesta IA'
+        assert metrics.get_counter('faq_fast_path_total', result='none', intent='none', band='0.0') == 2
+        assert metrics.get_counter('faq_fast_path_total', result='blocked', intent='precios', band='0.0') == 1
+
+    def test_threshold_and_switch(self, handler):
+        handler.fast_path.threshold = 1.0
+        assert handler.process_message('+50611111111', '¿Precio?', 'Ana') == 'Respuesta IA'
+
+        handler.fast_path.threshold = 0.7
+        with patch.dict('os.environ', {'FAQ_FAST_PATH': 'false'}):
+            assert handler.process_message('+50611111111', '¿Precio?', 'Ana') == 'Respuesta IA'
+
+    def test_off_by_default(self, handler, monkeypatch):
+        monkeypatch.delenv('FAQ_FAST_PATH')
+
+        assert handler.process_message('+50611111111', '¿Precio?', 'Ana') == 'Respuesta IA'
+
+    @pytest.mark.asyncio
+    async def test_async_handler(self, test_db, monkeypatch):
+        monkeypatch.setenv('FAQ_FAST_PATH', 'true')
+        handler = AsyncMessageHandler()
+        handler.db_path = test_db
+        handler.ai_enabled = True
+        handler.openai_client = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=AsyncMock(return_value=_completion('IA'))))
+        )
+
+        response = await handler.process_message('+50611111111', '¿Dónde quedan?', 'Ana')
+
+        assert 'Waze' in response
+        handler.openai_client.chat.completions.create.assert_not_called()
@@ -0,0 +1,152 @@
+"""
+Unit tests for the group-commit writer.
+"""
+
+import os
+import sqlite3
+import threading
+import pytest
+from unittest.mock import patch
+from app.services.group_commit import (
+    GroupCommitWriter,
+    get_group_commit_writer,
+    shutdown_group_commit_writers
+)
+from app.services.message_handler import MessageHandler
+from app.utils.database import db_stage, execute_query, _db_stage
+from app.utils.metrics import metrics
+
+
+def insert_lead(phone):
+    def work(cursor):
+        cursor.execute("INSERT INTO lead (phone_number) VALUES (?)", (phone,))
+        return cursor.lastrowid
+    return work
+
+
+@pytest.fixture
+def writer(test_db):
+    writer = GroupCommitWriter(test_db, max_batch=64, max_delay_seconds=0.05)
+    yield writer
+    writer.shutdown()
+
+
+class TestGroupCommitWriter:
+    """Test batching, durability and per-unit failures."""
+
+    def test_concurrent_units_share_commits(self, writer, test_db):
+        metrics.reset()
+        start = threading.Barrier(8)
+        results = []
+
+        def caller(i):
+            start.wait()
+            results.append(writer.run(insert_lead(f'+5061000000{i}')))
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(set(results)) == 8
+        assert len(execute_query("SELECT id FROM lead", db_path=test_db)) == 8
+        assert metrics.get_counter('group_commit_units_total') == 8
+        assert metrics.get_counter('group_commit_batches_total') < 8
+
+    def test_result_is_visible_once_resolved(self, writer, test_db):
+        lead_id = writer.submit(insert_lead('+50611111111')).result(timeout=5)
+
+        with sqlite3.connect(test_db) as conn:
+            assert conn.execute("SELECT phone_number FROM lead WHERE id = ?", (lead_id,)).fetchone() == \
+                ('+50611111111',)
+
+    def test_failing_unit_is_rolled_back_alone(self, writer, test_db):
+        def half_done(cursor):
+            insert_lead('+50622222222')(cursor)
+            raise ValueError('boom')
+
+        writer.max_delay_seconds = 0.2
+        futures = [writer.submit(insert_lead('+50611111111')),
+                   writer.submit(half_done),
+                   writer.submit(insert_lead('+50611111111')),
+                   writer.submit(insert_lead('+50633333333'))]
+
+        assert futures[0].result(timeout=5)
+        with pytest.raises(ValueError):
+            futures[1].result(timeout=5)
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[2].result(timeout=5)
+        assert futures[3].result(timeout=5)
+
+        phones = {r['phone_number'] for r in execute_query("SELECT phone_number FROM lead", db_path=test_db)}
+        assert phones == {'+50611111111', '+50633333333'}
+
+    def test_max_batch(self, test_db):
+        metrics.reset()
+        writer = GroupCommitWriter(test_db, max_batch=2, max_delay_seconds=0.2)
+        futures = [writer.submit(insert_lead(f'+5061000000{i}')) for i in range(5)]
+
+        for future in futures:
+            future.result(timeout=5)
+        writer.shutdown()
+
+        assert metrics.get_counter('group_commit_batches_total') == 3
+
+    def test_runs_in_callers_context(self, writer):
+        with db_stage('save_reply'):
+            assert writer.run(lambda cursor: _db_stage.get()) == 'save_reply'
+
+    def test_shutdown_flushes_pending(self, test_db):
+        writer = GroupCommitWriter(test_db, max_delay_seconds=1)
+        future = writer.submit(insert_lead('+50611111111'))
+
+        writer.shutdown()
+
+        assert future.done() and future.result()
+        with pytest.raises(RuntimeError):
+            writer.submit(insert_lead('+50622222222'))
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+    def test_forked_child_gets_its_own_writer(self, test_db):
+        parent = get_group_commit_writer(test_db)
+        parent.run(insert_lead('+50611111111'))
+
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                writer = get_group_commit_writer(test_db)
+                writer.submit(insert_lead('+50622222222')).result(timeout=5)
+                code = 0 if writer is not parent else 2
+            finally:
+                os._exit(code)
+
+        _, status = os.waitpid(pid, 0)
+        shutdown_group_commit_writers()
+
+        assert os.waitstatus_to_exitcode(status) == 0
+        assert len(execute_query("SELECT id FROM lead", db_path=test_db)) == 2
+
+
+class TestMessageHandlerGroupCommit:
+    """Test the MessageHandler writes with DB_GROUP_COMMIT=true."""
+
+    def test_pipeline_goes_through_the_writer(self, test_db):
+        metrics.reset()
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.ai_enabled = False
+
+        try:
+            with patch.dict('os.environ', {'DB_GROUP_COMMIT': 'true'}):
+                handler.process_message('+50611111111', 'Hola', 'Ana')
+                handler.process_degraded('+50611111111', '¿precio?', 'Ana')
+
+            assert get_group_commit_writer(test_db).pending_count() == 0
+        finally:
+            shutdown_group_commit_writers()
+
+        messages = execute_query("SELECT sender FROM message ORDER BY id", db_path=test_db)
+        assert [m['sender'] for m in messages] == ['user', 'assistant', 'user', 'assistant']
+        assert metrics.get_counter('group_commit_units_total') == 3
@@ -0,0 +1,130 @@
+"""
+Unit tests for the token-budgeted history assembler.
+"""
+
+import pytest
+from types import SimpleNamespace
+from app.services import history_assembler
+from app.services.history_assembler import (
+    TOKENS_PER_MESSAGE, TRUNCATION_MARK, assemble_history, count_tokens, truncate
+)
+from app.services.message_handler import MessageHandler
+from app.utils.metrics import metrics
+
+
+@pytest.fixture(autouse=True)
+def heuristic_tokenizer(monkeypatch):
+    """Deterministic token counts (4 characters per token) whether or not tiktoken is installed."""
+    monkeypatch.setattr(history_assembler, 'TIKTOKEN_AVAILABLE', False)
+    history_assembler.get_tokenizer.cache_clear()
+    history_assembler.count_tokens.cache_clear()
+    yield
+    history_assembler.get_tokenizer.cache_clear()
+    history_assembler.count_tokens.cache_clear()
+
+
+def _turn(role, tokens, tag='x'):
+    """A turn whose content is exactly `tokens` heuristic tokens."""
+    return {'role': role, 'content': (tag * 4 * tokens)[:4 * tokens]}
+
+
+class TestTokens:
+    """Test local token counting and truncation."""
+
+    def test_count_tokens(self):
+        assert count_tokens('') == 0
+        assert count_tokens('hola') == 1
+        assert count_tokens('hola!') == 2
+
+    def test_truncate_keeps_the_beginning(self):
+        text = 'a' * 40
+
+        result = truncate(text, 5)
+
+        assert result.endswith(TRUNCATION_MARK)
+        assert count_tokens(result) <= 5
+        assert truncate('corto', 5) == 'corto'
+
+
+class TestAssembleHistory:
+    """Test filling the budget from the newest turn backward."""
+
+    def test_everything_fits(self):
+        turns = [_turn('user', 10), _turn('assistant', 10)]
+
+        assert assemble_history(turns, budget=100, max_turn_tokens=50) == turns
+
+    def test_newest_turns_win_and_order_is_kept(self):
+        turns = [_turn('user', 10, 'a'), _turn('assistant', 10, 'b'), _turn('user', 10, 'c')]
+
+        result = assemble_history(turns, budget=2 * (10 + TOKENS_PER_MESSAGE), max_turn_tokens=50)
+
+        assert result == turns[1:]
+
+    def test_history_stops_at_the_first_turn_that_does_not_fit(self):
+        turns = [_turn('user', 2, 'a'), _turn('assistant', 40, 'b'), _turn('user', 2, 'c')]
+
+        result = assemble_history(turns, budget=30, max_turn_tokens=50)
+
+        assert result == turns[2:]
+
+    def test_oversize_turn_is_truncated(self):
+        turns = [_turn('user', 5), _turn('assistant', 100)]
+
+        result = assemble_history(turns, budget=100, max_turn_tokens=20)
+
+        assert result[0] == turns[0]
+        assert result[1]['content'].endswith(TRUNCATION_MARK)
+        assert count_tokens(result[1]['content']) <= 20
+
+    def test_saved_tokens_are_reported(self):
+        metrics.reset()
+        turns = [_turn('user', 10), _turn('assistant', 100)]
+
+        assemble_history(turns, budget=100, max_turn_tokens=20)
+
+        assert metrics.get_counter('history_tokens_saved_total') == (100 + 4) - (20 + 4)
+        assert metrics.get_counter('history_turns_truncated_total') == 1
+
+    def test_budget_from_environment(self, monkeypatch):
+        monkeypatch.setenv('HISTORY_TOKEN_BUDGET', '0')
+
+        assert assemble_history([_turn('user', 1)]) == []
+
+
+class TestHandlers:
+    """Test that the handlers send the budgeted history to OpenAI."""
+
+    def test_long_replies_are_trimmed_in_the_prompt(self, test_db, mocker, monkeypatch):
+        monkeypatch.setenv('HISTORY_MAX_TURN_TOKENS', '20')
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.scheduler = None
+        handler.ai_enabled = True
+        handler.model = 'test'
+        handler.max_tokens = 50
+        handler.temperature = 0
+        handler.fast_path.templates = {}
+        client = handler.openai_client = mocker.Mock()
+        client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='Respuesta ' * 50))])
+
+        handler.process_message('+50611111111', 'Tengo una lesión, ¿puedo entrenar?', 'Ana')
+        handler.process_message('+50611111111', '¿Y los sábados?', 'Ana')
+
+        messages = client.chat.completions.create.call_args.kwargs['messages']
+        assert [m['role'] for m in messages] == ['system', 'user', 'assistant', 'user']
+        assert messages[2]['content'].endswith(TRUNCATION_MARK)
+        assert messages[-1]['content'] == '¿Y los sábados?'
+
+    def test_ai_service_reads_history_fetch_limit(self, mocker, monkeypatch):
+        from app.services import ai_service
+        monkeypatch.setenv('HISTORY_FETCH_LIMIT', '40')
+        message = mocker.patch.object(ai_service, 'Message')
+        query = message.query.filter_by.return_value.order_by.return_value
+        query.limit.return_value.all.return_value = []
+        service = ai_service.AIService.__new__(ai_service.AIService)
+
+        service._get_conversation_history(SimpleNamespace(id=1))
+
+        query.limit.assert_called_once_with(40)
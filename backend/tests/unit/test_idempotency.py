@@ -0,0 +1,133 @@
+"""
+Unit tests for MessageSid-based webhook deduplication.
+"""
+
+import time
+import pytest
+from unittest.mock import Mock, patch
+from app.services.idempotency import (
+    InMemoryIdempotencyStore,
+    RedisIdempotencyStore,
+    IdempotencyGuard,
+    get_idempotency_store
+)
+from app.utils.database import execute_query
+from app.utils.metrics import metrics
+
+
+class TestInMemoryStore:
+    """Test the bounded LRU + TTL store."""
+
+    def test_first_claim_is_new(self):
+        store = InMemoryIdempotencyStore(max_entries=10, ttl_seconds=60)
+        assert store.claim('SM1') == (True, None)
+        assert store.claim('SM1') == (False, None)
+
+    def test_stored_reply_is_returned(self):
+        store = InMemoryIdempotencyStore(max_entries=10, ttl_seconds=60)
+        store.claim('SM1')
+        store.store_reply('SM1', 'Hola!')
+        assert store.claim('SM1') == (False, 'Hola!')
+
+    def test_lru_eviction(self):
+        store = InMemoryIdempotencyStore(max_entries=2, ttl_seconds=60)
+        store.claim('SM1')
+        store.claim('SM2')
+        store.claim('SM3')
+
+        assert len(store) == 2
+        assert store.claim('SM1')[0] is True
+
+    def test_ttl_expiry(self):
+        store = InMemoryIdempotencyStore(max_entries=10, ttl_seconds=0.05)
+        store.claim('SM1')
+        time.sleep(0.1)
+        assert store.claim('SM1')[0] is True
+
+    def test_release_allows_retry(self):
+        store = InMemoryIdempotencyStore(max_entries=10, ttl_seconds=60)
+        store.claim('SM1')
+        store.release('SM1')
+        assert store.claim('SM1')[0] is True
+
+
+class TestRedisStore:
+    """Test the Redis store against a mocked client."""
+
+    def test_claim_uses_set_nx(self):
+        client = Mock()
+        client.set.return_value = True
+        store = RedisIdempotencyStore(client, ttl_seconds=60)
+
+        assert store.claim('SM1') == (True, None)
+        client.set.assert_called_once_with('bjj:msgsid:SM1', '', nx=True, ex=60)
+
+    def test_duplicate_returns_cached_reply(self):
+        client = Mock()
+        client.set.return_value = None
+        client.get.return_value = b'r:Hola!'
+        store = RedisIdempotencyStore(client, ttl_seconds=60)
+
+        assert store.claim('SM1') == (False, 'Hola!')
+
+    def test_redis_errors_fail_open(self):
+        client = Mock()
+        client.set.side_effect = ConnectionError('down')
+        store = RedisIdempotencyStore(client, ttl_seconds=60)
+
+        assert store.claim('SM1') == (True, None)
+
+    def test_fallback_to_memory_when_redis_unavailable(self):
+        with patch.dict('os.environ', {'IDEMPOTENCY_BACKEND': 'redis',
+                                       'REDIS_URL': 'redis://127.0.0.1:1/0'}):
+            store = get_idempotency_store()
+        assert store.backend == 'memory'
+
+    def test_redis_url_from_app_config(self):
+        with patch.dict('os.environ', {'IDEMPOTENCY_BACKEND': 'redis',
+                                       'REDIS_URL': 'redis://127.0.0.1:1/0'}), \
+                patch('redis.Redis.from_url') as from_url:
+            store = get_idempotency_store('redis://cache.internal:6380/3')
+
+        from_url.assert_called_once_with('redis://cache.internal:6380/3')
+        assert store.backend == 'redis'
+
+
+class TestGuardCounters:
+    """Test hit/miss counters."""
+
+    def test_hits_and_misses(self):
+        metrics.reset()
+        guard = IdempotencyGuard(InMemoryIdempotencyStore(max_entries=10, ttl_seconds=60))
+
+        guard.claim('SM1')
+        guard.claim('SM1')
+        guard.claim('SM1')
+
+        assert metrics.get_counter('idempotency_misses_total', backend='memory') == 1
+        assert metrics.get_counter('idempotency_hits_total', backend='memory') == 2
+
+
+class TestWebhookRetries:
+    """Test that Twilio retries skip the pipeline."""
+
+    def test_retry_returns_cached_reply(self, test_db):
+        from app import create_app
+        app = create_app()
+        client = app.test_client()
+
+        payload = {
+            'Body': 'Hola',
+            'From': 'whatsapp:+50644444444',
+            'ProfileName': 'Retry User',
+            'MessageSid': 'SM_RETRY_1'
+        }
+
+        with patch('app.services.message_handler.MessageHandler.process_message',
+                   return_value='Respuesta única') as process:
+            first = client.post('/', data=payload)
+            second = client.post('/', data=payload)
+
+        assert process.call_count == 1
+        assert 'Respuesta única' in first.get_data(as_text=True)
+        assert 'Respuesta única' in second.get_data(as_text=True)
@@ -0,0 +1,131 @@
+"""
+Unit tests for the incrementally maintained lead_summary table.
+"""
+
+import json
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from app.services.message_handler import MessageHandler
+from app.utils import lead_summary
+from app.utils.database import get_db_connection, get_db_cursor, execute_insert, execute_query
+
+
+def _summary(db_path, lead_id):
+    rows = execute_query("SELECT * FROM lead_summary WHERE lead_id = ?", (lead_id,), db_path=db_path)
+    return dict(rows[0]) if rows else None
+
+
+def _insert_history(db_path, phone, messages, days_ago=0):
+    """Lead, conversation and messages written directly, around the services."""
+    ts = (datetime.utcnow() - timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+    with get_db_cursor(db_path=db_path) as cursor:
+        cursor.execute("INSERT INTO lead (phone_number, name, status) VALUES (?, 'Directo', 'contacted')", (phone,))
+        lead_id = cursor.lastrowid
+        cursor.execute("INSERT INTO conversation (lead_id) VALUES (?)", (lead_id,))
+        conv_id = cursor.lastrowid
+        for sender in messages:
+            cursor.execute("INSERT INTO message (conversation_id, sender, content, timestamp) VALUES (?, ?, 'x', ?)",
+                           (conv_id, sender, ts))
+    return lead_id
+
+
+@pytest.fixture
+def handler(test_db):
+    handler = MessageHandler()
+    handler.db_path = test_db
+    handler.ai_enabled = False
+    return handler
+
+
+@pytest.fixture
+def client(test_db):
+    return create_app().test_client()
+
+
+class TestIncrementalMaintenance:
+    """Test that the writers keep the summary current."""
+
+    def test_messages_update_summary(self, handler, test_db):
+        handler.process_message('+50611111111', 'Hola', 'Ana')
+        handler.process_message('+50611111111', 'Quiero una clase de prueba', 'Ana')
+
+        lead_id = execute_query("SELECT id FROM lead WHERE phone_number = ?", ('+50611111111',),
+                                db_path=test_db)[0]['id']
+        summary = _summary(test_db, lead_id)
+
+        assert summary['total_messages'] == 4
+        assert summary['last_sender'] == 'assistant'
+        assert summary['last_message_at'] is not None
+
+    def test_matches_a_full_rebuild(self, handler, test_db):
+        handler.process_message('+50622222222', 'Hola', 'Beto')
+        handler.process_message('+50622222222', 'Horarios?', 'Beto')
+        before = execute_query("SELECT lead_id, total_messages, last_message_at, last_sender "
+                               "FROM lead_summary ORDER BY lead_id", db_path=test_db)
+
+        lead_summary.rebuild(test_db)
+        after = execute_query("SELECT lead_id, total_messages, last_message_at, last_sender "
+                              "FROM lead_summary ORDER BY lead_id", db_path=test_db)
+
+        assert [tuple(r) for r in before] == [tuple(r) for r in after]
+
+    def test_admin_note_counts(self, client, handler, test_db):
+        handler.process_message('+50633333333', 'Hola', 'Caro')
+        lead_id = execute_query("SELECT id FROM lead", db_path=test_db)[0]['id']
+
+        client.post(f'/api/leads/{lead_id}/add-note', json={'note': 'Llamar el lunes'})
+
+        summary = _summary(test_db, lead_id)
+        assert summary['total_messages'] == 3
+        assert summary['last_sender'] == 'admin'
+
+
+class TestRebuild:
+    """Test the full rebuild."""
+
+    def test_picks_up_direct_writes_and_drops_orphans(self, test_db):
+        lead_id = _insert_history(test_db, '+50655555555', ['user', 'assistant', 'user'])
+        with get_db_cursor(db_path=test_db) as cursor:
+            cursor.execute("INSERT INTO lead_summary (lead_id, total_messages) VALUES (9999, 7)")
+
+        result = lead_summary.rebuild(test_db)
+
+        summary = _summary(test_db, lead_id)
+        assert summary['total_messages'] == 3
+        assert summary['last_sender'] == 'user'
+        assert _summary(test_db, 9999) is None
+        assert result['leads'] == 1 and result['removed'] == 1
+
+    def test_cli(self, test_db, capsys):
+        _insert_history(test_db, '+50666666666', ['user'])
+
+        assert lead_summary.main(['--db', test_db]) == 0
+        assert '1 leads summarized' in capsys.readouterr().out
+
+
+class TestDashboardReadsSummary:
+    """Test /api/leads and /api/stats on top of the summary."""
+
+    def test_leads_list(self, client, handler, test_db):
+        handler.process_message('+50677777777', 'Hola', 'Dani')
+        execute_insert("INSERT INTO lead (phone_number, name) VALUES ('+50688888888', 'Sin mensajes')", db_path=test_db)
+
+        leads = {l['phone']: l for l in json.loads(client.get('/api/leads').data)}
+
+        assert leads['+50677777777']['total_messages'] == 2
+        assert leads['+50677777777']['last_sender'] == 'assistant'
+        assert leads['+50677777777']['days_since_contact'] == 0
+        assert leads['+50688888888']['total_messages'] == 0
+        assert leads['+50688888888']['last_contact'] is None
+
+    def test_followup_uses_last_message(self, client, handler, test_db):
+        handler.process_message('+50699999999', 'Hola', 'Reciente')
+        stale = _insert_history(test_db, '+50600000001', ['user'], days_ago=5)
+        lead_summary.rebuild(test_db)
+
+        leads = json.loads(client.get('/api/leads?needs_followup=true').data)
+        stats = json.loads(client.get('/api/stats').data)
+
+        assert [l['id'] for l in leads] == [stale]
+        assert stats['needs_followup'] == 1
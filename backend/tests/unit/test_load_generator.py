@@ -0,0 +1,103 @@
+"""
+Unit tests for the load generator's fake OpenAI/Twilio servers.
+"""
+
+import os
+import sys
+import pytest
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), 'scripts'))
+
+from fake_services import LatencyDistribution, FakeOpenAIServer, FakeTwilioServer  # noqa: E402
+from load_generator import MessageMix, percentile, summarize  # noqa: E402
+
+
+class TestLatencyDistribution:
+    """Test latency spec parsing and sampling."""
+
+    def test_fixed(self):
+        assert LatencyDistribution('fixed:250').sample() == 0.25
+
+    def test_uniform_within_bounds(self):
+        dist = LatencyDistribution('uniform:100,200', seed=1)
+        assert all(0.1 <= dist.sample() <= 0.2 for _ in range(200))
+
+    def test_lognormal_median(self):
+        dist = LatencyDistribution('lognormal:800,0.5', seed=1)
+        samples = sorted(dist.sample() for _ in range(2001))
+        assert 0.7 < samples[1000] < 0.9
+
+    def test_normal_never_negative(self):
+        dist = LatencyDistribution('normal:1,50', seed=1)
+        assert all(dist.sample() >= 0 for _ in range(200))
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError):
+            LatencyDistribution('pareto:1')
+
+
+class TestFakeServers:
+    """Test that the fakes speak the real client protocols."""
+
+    def test_openai_client_against_fake(self):
+        from openai import OpenAI
+
+        server = FakeOpenAIServer('fixed:1').start()
+        try:
+            client = OpenAI(api_key='sk-test', base_url=f'{server.url}/v1')
+            response = client.chat.completions.create(
+                model='gpt-test', messages=[{'role': 'user', 'content': 'Hola'}]
+            )
+        finally:
+            server.stop()
+
+        assert response.choices[0].message.content
+        assert server.requests == 1
+
+    def test_openai_error_rate(self):
+        server = FakeOpenAIServer('fixed:0', error_rate=1.0).start()
+        try:
+            status = requests.post(f'{server.url}/v1/chat/completions', json={}).status_code
+        finally:
+            server.stop()
+
+        assert status == 500
+        assert server.errors == 1
+
+    def test_twilio_client_against_fake(self):
+        from twilio.rest import Client
+
+        server = FakeTwilioServer('fixed:1').start()
+        try:
+            client = Client('AC' + '0' * 32, 'token')
+            client.api.base_url = server.url
+            message = client.messages.create(
+                from_='whatsapp:+14155238886', to='whatsapp:+50688888888', body='Hola'
+            )
+        finally:
+            server.stop()
+
+        assert message.sid.startswith('SM')
+        assert server.deliveries[0][0] == '+50688888888'
+
+
+class TestReportHelpers:
+    """Test mix selection and percentile summaries."""
+
+    def test_mix_respects_weights(self):
+        mix = MessageMix({'a': 1, 'b': 0}, seed=1)
+        assert {mix.pick() for _ in range(50)} == {'a'}
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) is None
+
+    def test_summarize_in_ms(self):
+        summary = summarize([0.1, 0.2, 0.3])
+        assert summary['count'] == 3
+        assert summary['p50_ms'] == 200.0
+        assert summary['max_ms'] == 300.0
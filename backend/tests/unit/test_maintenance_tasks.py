@@ -0,0 +1,80 @@
+"""
+Unit tests for database maintenance Celery tasks.
+"""
+
+import os
+import sys
+import pytest
+import subprocess
+from unittest.mock import patch
+from app.celery_app import celery_app
+from app.tasks.maintenance_tasks import checkpoint_wal, refresh_snapshot, archive_old_messages
+
+
+class TestCheckpointWal:
+    """Test the periodic WAL checkpoint task."""
+
+    def test_scheduled_in_beat(self):
+        entry = celery_app.conf.beat_schedule['checkpoint-wal']
+        assert entry['task'] == 'app.tasks.maintenance_tasks.checkpoint_wal'
+
+    def test_passive_checkpoint(self, test_db):
+        result = checkpoint_wal(db_path=test_db)
+
+        assert result['success'] is True
+        assert result['mode'] == 'PASSIVE'
+        assert 'wal_size_bytes' in result
+
+    def test_truncates_large_wal(self, test_db):
+        with patch.dict('os.environ', {'DB_WAL_TRUNCATE_BYTES': '-1'}):
+            result = checkpoint_wal(db_path=test_db)
+
+        assert result['mode'] == 'TRUNCATE'
+        assert result['wal_size_bytes'] == 0
+
+    def test_errors_are_reported(self, test_db):
+        with patch('app.tasks.maintenance_tasks.wal_checkpoint', side_effect=RuntimeError('boom')):
+            result = checkpoint_wal(db_path=test_db)
+
+        assert result == {'success': False, 'error': 'boom'}
+
+
+class TestRefreshSnapshot:
+    """Test the read snapshot refresh task."""
+
+    def test_refreshes_snapshot(self, test_db, tmp_path):
+        snapshot = str(tmp_path / 'read.snapshot')
+        with patch.dict('os.environ', {'DB_READ_SNAPSHOT_PATH': snapshot}):
+            result = refresh_snapshot(db_path=test_db)
+
+        assert result['success'] is True
+        assert result['path'] == snapshot
+
+    def test_errors_are_reported(self):
+        result = refresh_snapshot(db_path='postgresql://u:p@h/db')
+
+        assert result['success'] is False
+
+
+class TestArchiveOldMessages:
+    """Test the daily message archive task."""
+
+    def test_scheduled_in_beat_only_when_enabled(self):
+        code = "from app.celery_app import celery_app; print('archive-old-messages' in celery_app.conf.beat_schedule)"
+        backend = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        def scheduled(**env):
+            environ = {k: v for k, v in os.environ.items() if k != 'DB_ARCHIVE_ENABLED'}
+            out = subprocess.run([sys.executable, '-c', code], cwd=backend, env={**environ, **env},
+                                 capture_output=True, text=True, check=True).stdout
+            return out.strip().splitlines()[-1] == 'True'
+
+        assert scheduled() is False
+        assert scheduled(DB_ARCHIVE_ENABLED='true') is True
+
+    def test_archives(self, test_db, tmp_path):
+        with patch.dict('os.environ', {'DB_ARCHIVE_DIR': str(tmp_path)}):
+            result = archive_old_messages(db_path=test_db)
+
+        assert result['success'] is True
+        assert result['messages'] == 0
@@ -0,0 +1,192 @@
+"""
+Unit tests for the monthly message archive.
+"""
+
+import os
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app import create_app
+from app.services.message_handler import MessageHandler
+from app.utils import lead_summary, message_archive
+from app.utils.database import get_db_connection, get_db_cursor, execute_query
+from app.utils.metrics import metrics
+
+
+def _ts(days_ago):
+    return (datetime.utcnow() - timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _insert_conversation(db_path, phone, days_ago_list, status='closed'):
+    """Lead and one conversation whose messages are the given number of days old."""
+    with get_db_cursor(db_path=db_path) as cursor:
+        cursor.execute("INSERT INTO lead (phone_number, name) VALUES (?, 'Archivo')", (phone,))
+        lead_id = cursor.lastrowid
+        cursor.execute("INSERT INTO conversation (lead_id, status, created_at) VALUES (?, ?, ?)",
+                       (lead_id, status, _ts(max(days_ago_list))))
+        conv_id = cursor.lastrowid
+        for i, days_ago in enumerate(days_ago_list):
+            cursor.execute("INSERT INTO message (conversation_id, sender, content, timestamp) VALUES (?, ?, ?, ?)",
+                           (conv_id, 'user' if i % 2 == 0 else 'assistant', f'mensaje {i}', _ts(days_ago)))
+    return lead_id, conv_id
+
+
+def _hot_count(db_path, conv_id):
+    return execute_query("SELECT COUNT(*) AS n FROM message WHERE conversation_id = ?", (conv_id,),
+                         db_path=db_path)[0]['n']
+
+
+@pytest.fixture
+def archive_dir(tmp_path):
+    return str(tmp_path / 'archive')
+
+
+class TestArchiveMessages:
+    """Test moving the old messages of closed conversations."""
+
+    def test_closed_conversation_is_archived_by_month(self, test_db, archive_dir):
+        lead_id, old_conv = _insert_conversation(test_db, '+50611111111', [260, 250, 230, 220])
+        _, recent_conv = _insert_conversation(test_db, '+50622222222', [200, 2], status='active')
+
+        result = message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        assert result['closed'] == 0 and result['messages'] == 4 and result['errors'] == 0
+        assert _hot_count(test_db, old_conv) == 0
+        assert _hot_count(test_db, recent_conv) == 2
+
+        chunks = execute_query("SELECT month, path, message_count FROM message_archive_chunk", db_path=test_db)
+        assert sum(c['message_count'] for c in chunks) == 4
+        assert {c['path'] for c in chunks} == {f"messages-{c['month']}.jsonl.gz" for c in chunks}
+
+    def test_idle_active_conversation_keeps_its_history(self, test_db, archive_dir):
+        _, conv_id = _insert_conversation(test_db, '+50611111111', [300, 299], status='active')
+
+        result = message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        assert result['closed'] == 0 and result['messages'] == 0
+        assert _hot_count(test_db, conv_id) == 2
+        status = execute_query("SELECT status FROM conversation WHERE id = ?", (conv_id,), db_path=test_db)
+        assert status[0]['status'] == 'active'
+
+    def test_close_idle_is_opt_in(self, test_db, archive_dir):
+        _, idle_conv = _insert_conversation(test_db, '+50611111111', [300, 299], status='active')
+        _, recent_conv = _insert_conversation(test_db, '+50622222222', [200, 2], status='active')
+
+        with patch.dict('os.environ', {'DB_ARCHIVE_CLOSE_IDLE': 'true'}):
+            result = message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        assert result['closed'] == 1 and result['messages'] == 2
+        assert _hot_count(test_db, idle_conv) == 0
+        assert _hot_count(test_db, recent_conv) == 2
+        statuses = execute_query("SELECT status FROM conversation ORDER BY id", db_path=test_db)
+        assert [s['status'] for s in statuses] == ['closed', 'active']
+
+    def test_month_files_are_plain_gzip(self, test_db, archive_dir):
+        _insert_conversation(test_db, '+50611111111', [300, 299])
+        _insert_conversation(test_db, '+50622222222', [300])
+
+        message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        lines = []
+        for name in os.listdir(archive_dir):
+            with gzip.open(os.path.join(archive_dir, name), 'rt', encoding='utf-8') as f:
+                lines.extend(json.loads(line) for line in f)
+        assert sorted(m['content'] for m in lines) == ['mensaje 0', 'mensaje 0', 'mensaje 1']
+
+    def test_second_run_is_a_no_op(self, test_db, archive_dir):
+        _insert_conversation(test_db, '+50611111111', [300, 299])
+        message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        result = message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        assert result['closed'] == 0 and result['messages'] == 0
+
+    def test_failed_transaction_keeps_hot_rows(self, test_db, archive_dir):
+        lead_id, conv_id = _insert_conversation(test_db, '+50611111111', [300, 299])
+
+        with patch.object(message_archive, 'unit_of_work', side_effect=RuntimeError('disk full')):
+            result = message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        assert result['errors'] == 1
+        assert _hot_count(test_db, conv_id) == 2
+
+        message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+        with get_db_cursor(db_path=test_db) as cursor:
+            archived = message_archive.archived_messages(cursor.connection, lead_id, directory=archive_dir)
+        assert [m['content'] for m in archived] == ['mensaje 0', 'mensaje 1']
+
+    def test_cli(self, test_db, archive_dir, capsys):
+        _insert_conversation(test_db, '+50611111111', [300])
+
+        assert message_archive.main(['--db', test_db, '--days', '180', '--dir', archive_dir, '--vacuum']) == 0
+        assert '1 messages from 1 conversations archived' in capsys.readouterr().out
+
+
+class TestTransparentReads:
+    """Test that readers see archived history."""
+
+    def test_lead_detail_merges_archive_and_hot_table(self, test_db, archive_dir):
+        lead_id, _ = _insert_conversation(test_db, '+50611111111', [300, 299])
+        with patch.dict('os.environ', {'DB_ARCHIVE_DIR': archive_dir}):
+            message_archive.archive_messages(test_db, older_than_days=180)
+
+            handler = MessageHandler()
+            handler.db_path = test_db
+            handler.ai_enabled = False
+            handler.process_message('+50611111111', 'Volví', 'Archivo')
+
+            detail = create_app().test_client().get(f'/api/leads/{lead_id}').get_json()
+
+        contents = [m['content'] for m in detail['messages']]
+        assert contents[:3] == ['mensaje 0', 'mensaje 1', 'Volví']
+        assert len(contents) == 4
+        conversations = execute_query("SELECT status FROM conversation WHERE lead_id = ? ORDER BY id",
+                                      (lead_id,), db_path=test_db)
+        assert [c['status'] for c in conversations] == ['closed', 'active']
+
+    def test_missing_archive_file_still_shows_hot_messages(self, test_db, archive_dir):
+        metrics.reset()
+        lead_id, _ = _insert_conversation(test_db, '+50611111111', [300, 299])
+        with patch.dict('os.environ', {'DB_ARCHIVE_DIR': archive_dir}):
+            message_archive.archive_messages(test_db, older_than_days=180)
+            for name in os.listdir(archive_dir):
+                os.remove(os.path.join(archive_dir, name))
+
+            handler = MessageHandler()
+            handler.db_path = test_db
+            handler.ai_enabled = False
+            handler.process_message('+50611111111', 'Volví', 'Archivo')
+
+            response = create_app().test_client().get(f'/api/leads/{lead_id}')
+
+        assert response.status_code == 200
+        assert [m['content'] for m in response.get_json()['messages']][0] == 'Volví'
+        assert metrics.get_counter('archive_read_errors_total') == 1
+
+    def test_corrupt_chunk_is_skipped(self, test_db, archive_dir):
+        lead_id, _ = _insert_conversation(test_db, '+50611111111', [300])
+        other_lead, _ = _insert_conversation(test_db, '+50622222222', [300])
+        message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+        chunk = execute_query("SELECT path, byte_offset FROM message_archive_chunk WHERE lead_id = ?",
+                              (lead_id,), db_path=test_db)[0]
+        with open(os.path.join(archive_dir, chunk['path']), 'r+b') as f:
+            f.seek(chunk['byte_offset'])
+            f.write(b'not gzip')
+
+        with get_db_connection(db_path=test_db) as conn:
+            assert message_archive.archived_messages(conn, lead_id, archive_dir) == []
+            assert len(message_archive.archived_messages(conn, other_lead, archive_dir)) == 1
+
+    def test_summary_rebuild_counts_archived_messages(self, test_db, archive_dir):
+        lead_id, _ = _insert_conversation(test_db, '+50611111111', [300, 299, 298])
+        message_archive.archive_messages(test_db, older_than_days=180, directory=archive_dir)
+
+        lead_summary.rebuild(test_db)
+
+        summary = execute_query("SELECT total_messages, last_sender, last_message_at FROM lead_summary "
+                                "WHERE lead_id = ?", (lead_id,), db_path=test_db)[0]
+        assert summary['total_messages'] == 3
+        assert summary['last_sender'] == 'user'
+        assert summary['last_message_at'].startswith(_ts(298)[:10])
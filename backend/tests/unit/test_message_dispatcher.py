@@ -0,0 +1,101 @@
+"""
+Unit tests for the phone-sharded message dispatcher.
+"""
+
+import threading
+import time
+import pytest
+from app.services.message_dispatcher import MessageDispatcher
+from app.utils.metrics import metrics
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = MessageDispatcher(num_shards=4, mode='thread')
+    yield dispatcher
+    dispatcher.shutdown()
+
+
+class TestSharding:
+    """Test shard assignment."""
+
+    def test_shard_is_stable(self, dispatcher):
+        assert dispatcher.shard_for('+50611111111') == dispatcher.shard_for('+50611111111')
+        assert 0 <= dispatcher.shard_for('+50611111111') < 4
+
+    def test_lock_is_per_shard(self, dispatcher):
+        assert dispatcher.lock_for('+50611111111') is dispatcher.lock_for('+50611111111')
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            MessageDispatcher(num_shards=1, mode='fibers')
+
+
+class TestOrdering:
+    """Test per-sender ordering and cross-sender parallelism."""
+
+    def test_same_sender_runs_in_order(self, dispatcher):
+        seen = []
+
+        def work(i):
+            # Earlier jobs sleep longer; order must still be preserved
+            time.sleep(0.01 * (5 - i))
+            seen.append(i)
+
+        futures = [dispatcher.submit('+50611111111', work, i) for i in range(5)]
+        for f in futures:
+            f.result(timeout=5)
+
+        assert seen == [0, 1, 2, 3, 4]
+
+    def test_different_senders_run_in_parallel(self):
+        dispatcher = MessageDispatcher(num_shards=2, mode='thread')
+        phones = [f'+5060000{i:04d}' for i in range(50)]
+        a = next(p for p in phones if dispatcher.shard_for(p) == 0)
+        b = next(p for p in phones if dispatcher.shard_for(p) == 1)
+
+        barrier = threading.Barrier(2, timeout=5)
+        futures = [dispatcher.submit(a, barrier.wait), dispatcher.submit(b, barrier.wait)]
+
+        # Would raise BrokenBarrierError if the shards ran serially
+        for f in futures:
+            f.result(timeout=5)
+        dispatcher.shutdown()
+
+
+class TestStats:
+    """Test queue depth and wait time reporting."""
+
+    def test_stats_report_depth_and_wait(self, dispatcher):
+        metrics.reset()
+        gate = threading.Event()
+        phone = '+50611111111'
+        shard = dispatcher.shard_for(phone)
+
+        first = dispatcher.submit(phone, gate.wait, 5)
+        second = dispatcher.submit(phone, lambda: 'done')
+        time.sleep(0.05)
+
+        stats = dispatcher.stats()
+        assert stats[shard]['queue_depth'] == 1
+
+        gate.set()
+        assert second.result(timeout=5) == 'done'
+        first.result(timeout=5)
+
+        stats = dispatcher.stats()
+        assert stats[shard]['queue_depth'] == 0
+        assert stats[shard]['wait_seconds']['count'] == 2
+
+
+class TestProcessMode:
+    """Test the process-pool variant."""
+
+    def test_process_mode_returns_results_in_order(self):
+        dispatcher = MessageDispatcher(num_shards=2, mode='process')
+        futures = [dispatcher.submit('+50611111111', pow, 2, i) for i in range(4)]
+        results = [f.result(timeout=30) for f in futures]
+        dispatcher.shutdown()
+
+        assert results == [1, 2, 4, 8]
+        assert sum(s['queue_depth'] for s in dispatcher.stats()) == 0
@@ -273,3 +273,62 @@ class TestProcessMessage:
             db_path=test_db
         )
         assert len(conv_results) == 1
+
+
+class TestUnitOfWork:
+    """Test that a message is handled in two short transactions."""
+
+    def _ai_handler(self, test_db, create):
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.ai_enabled = True
+        handler.model = 'test'
+        handler.max_tokens = 10
+        handler.temperature = 0
+        handler.scheduler = None
+        handler.openai_client = Mock()
+        handler.openai_client.chat.completions.create.side_effect = create
+        return handler
+
+    def test_two_commits_per_message(self, test_db):
+        """Inbound save + context read share one commit; reply + status share another."""
+        from app.utils.metrics import metrics
+        handler = self._ai_handler(test_db, lambda **kw: Mock(choices=[Mock(message=Mock(content='¡Hola!'))]))
+        metrics.reset()
+
+        handler.process_message('+50611111111', 'Hola', 'UoW User')
+
+        assert metrics.get_counter('db_commits_total') == 2
+        rows = execute_query("SELECT sender FROM message ORDER BY id", db_path=test_db)
+        assert [r['sender'] for r in rows] == ['user', 'assistant']
+
+    def test_write_lock_is_free_during_openai_call(self, test_db):
+        """Another writer can take the write lock while OpenAI is answering."""
+        import sqlite3
+
+        def create(**kwargs):
+            other = sqlite3.connect(test_db, timeout=0)
+            other.execute("BEGIN IMMEDIATE")
+            other.rollback()
+            other.close()
+            return Mock(choices=[Mock(message=Mock(content='¡Hola!'))])
+
+        handler = self._ai_handler(test_db, create)
+        response = handler.process_message('+50611111111', 'Hola', 'UoW User')
+
+        assert response == '¡Hola!'
+
+    def test_context_comes_from_first_transaction(self, test_db):
+        """The prompt history includes the message saved in the same transaction."""
+        captured = {}
+
+        def create(**kwargs):
+            captured['messages'] = kwargs['messages']
+            return Mock(choices=[Mock(message=Mock(content='Claro'))])
+
+        handler = self._ai_handler(test_db, create)
+        handler.process_message('+50611111111', 'Hola', 'UoW User')
+        handler.process_message('+50611111111', '¿Tienen clases para principiantes?', 'UoW User')
+
+        contents = [m['content'] for m in captured['messages'][1:]]
+        assert contents == ['Hola', 'Claro', '¿Tienen clases para principiantes?']
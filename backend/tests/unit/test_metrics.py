@@ -0,0 +1,206 @@
+"""
+Unit tests for the metrics registry, Prometheus export and multi-process merge.
+"""
+
+import os
+import sys
+import json
+import asyncio
+import pytest
+import subprocess
+from unittest.mock import Mock, patch
+from app.services.message_handler import MessageHandler
+from app.utils.metrics import (
+    MetricsRegistry, metrics, collect, write_process_file, remove_process_file, remove_dead_process_files
+)
+
+
+class TestPrometheusRendering:
+    """Test the text exposition format."""
+
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry()
+        registry.inc('reply_sent_total', 2, mode='async')
+        registry.set_gauge('admission_in_flight', 3)
+
+        text = registry.render_prometheus()
+
+        assert '# TYPE reply_sent_total counter' in text
+        assert 'reply_sent_total{mode="async"} 2' in text
+        assert '# TYPE admission_in_flight gauge' in text
+        assert 'admission_in_flight 3' in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        for value in (0.002, 0.02, 0.2, 40):
+            registry.observe('message_stage_seconds', value, stage='openai')
+
+        lines = registry.render_prometheus().splitlines()
+
+        assert 'message_stage_seconds_bucket{stage="openai",le="0.0025"} 1' in lines
+        assert 'message_stage_seconds_bucket{stage="openai",le="0.025"} 2' in lines
+        assert 'message_stage_seconds_bucket{stage="openai",le="30"} 3' in lines
+        assert 'message_stage_seconds_bucket{stage="openai",le="+Inf"} 4' in lines
+        assert 'message_stage_seconds_count{stage="openai"} 4' in lines
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.inc('errors_total', reason='bad "quote"\nline')
+        assert 'errors_total{reason="bad \\"quote\\"\\nline"} 1' in registry.render_prometheus()
+
+    def test_one_type_line_per_family(self):
+        registry = MetricsRegistry()
+        registry.observe('db_seconds', 0.1, stage='persist')
+        registry.observe('db_seconds', 0.1, stage='context')
+        assert registry.render_prometheus().count('# TYPE db_seconds histogram') == 1
+
+
+class TestTimedDecorator:
+    """Test function timing decorators."""
+
+    def test_sync_function(self):
+        registry = MetricsRegistry()
+
+        @registry.timed('stage_seconds', stage='work')
+        def work():
+            return 42
+
+        assert work() == 42
+        assert registry.get_histogram('stage_seconds', stage='work')['count'] == 1
+
+    def test_async_function_times_the_await(self):
+        registry = MetricsRegistry()
+
+        @registry.timed('stage_seconds', stage='io')
+        async def io():
+            await asyncio.sleep(0.02)
+            return 'ok'
+
+        assert asyncio.run(io()) == 'ok'
+        assert registry.get_histogram('stage_seconds', stage='io')['max'] >= 0.02
+
+    def test_records_on_exception(self):
+        registry = MetricsRegistry()
+
+        @registry.timed('stage_seconds', stage='fail')
+        def fail():
+            raise ValueError
+
+        with pytest.raises(ValueError):
+            fail()
+        assert registry.get_histogram('stage_seconds', stage='fail')['count'] == 1
+
+
+class TestMultiProcess:
+    """Test merging the per-process files."""
+
+    def _write_other_process(self, directory, pid, registry):
+        with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+            json.dump(registry.export_state(), f)
+
+    def test_counters_and_histograms_are_summed(self, tmp_path):
+        local = MetricsRegistry()
+        local.inc('reply_sent_total')
+        local.observe('db_seconds', 0.01, stage='persist')
+
+        other = MetricsRegistry()
+        other.inc('reply_sent_total', 4)
+        other.observe('db_seconds', 0.2, stage='persist')
+        self._write_other_process(str(tmp_path), os.getppid(), other)
+
+        merged = collect(local, str(tmp_path))
+
+        assert merged.get_counter('reply_sent_total') == 5
+        text = merged.render_prometheus()
+        assert 'db_seconds_count{stage="persist"} 2' in text
+
+    def test_files_of_dead_processes_are_removed(self, tmp_path):
+        other = MetricsRegistry()
+        other.inc('reply_sent_total')
+        other.set_gauge('admission_in_flight', 7)
+        self._write_other_process(str(tmp_path), 2 ** 22 + 12345, other)
+
+        merged = collect(MetricsRegistry(), str(tmp_path))
+
+        assert merged.get_counter('reply_sent_total') == 0
+        assert 'admission_in_flight' not in merged.render_prometheus()
+        assert os.listdir(tmp_path) == []
+
+    def test_dead_files_are_swept_and_live_ones_kept(self, tmp_path):
+        self._write_other_process(str(tmp_path), 2 ** 22 + 12345, MetricsRegistry())
+        self._write_other_process(str(tmp_path), os.getppid(), MetricsRegistry())
+
+        assert remove_dead_process_files(str(tmp_path)) == 1
+        assert os.listdir(tmp_path) == [f'metrics-{os.getppid()}.json']
+
+    def test_exiting_process_removes_its_file(self, tmp_path):
+        write_process_file(MetricsRegistry(), str(tmp_path))
+
+        remove_process_file(str(tmp_path))
+        remove_process_file(str(tmp_path))
+
+        assert os.listdir(tmp_path) == []
+
+    def test_worker_file_is_gone_after_exit(self, tmp_path):
+        backend = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        code = ("from app.utils.metrics import metrics, write_process_file; "
+                "metrics.inc('reply_sent_total'); write_process_file()")
+
+        subprocess.run([sys.executable, '-c', code], cwd=backend, check=True,
+                       env={**os.environ, 'METRICS_MULTIPROC_DIR': str(tmp_path)})
+
+        assert os.listdir(tmp_path) == []
+
+    def test_gauges_keep_pid_label(self, tmp_path):
+        local = MetricsRegistry()
+        local.set_gauge('admission_in_flight', 2)
+
+        merged = collect(local, str(tmp_path))
+
+        assert merged.get_gauge('admission_in_flight', pid=str(os.getpid())) == 2
+
+    def test_write_process_file(self, tmp_path):
+        registry = MetricsRegistry()
+        registry.inc('reply_sent_total', 3)
+
+        write_process_file(registry, str(tmp_path))
+
+        with open(tmp_path / f'metrics-{os.getpid()}.json') as f:
+            state = json.load(f)
+        assert state['counters'] == [['reply_sent_total', [], 3]]
+
+
+class TestStageInstrumentation:
+    """Test that the pipeline stages are timed and exported."""
+
+    def test_message_handler_stages(self, test_db):
+        metrics.reset()
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.ai_enabled = True
+        handler.model = 'test'
+        handler.max_tokens = 10
+        handler.temperature = 0
+        handler.openai_client = Mock()
+        handler.openai_client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content='¡Hola!'))]
+        )
+
+        handler.process_message('+50611111111', 'Hola', 'Stage User')
+
+        for stage in ('lead_lookup', 'conversation_lookup', 'save_message', 'lead_info',
+                      'academy_info', 'history_fetch', 'prompt_build', 'openai',
+                      'booking_detect', 'status_update'):
+            assert metrics.get_histogram('message_stage_seconds', stage=stage), stage
+        assert metrics.get_histogram('message_stage_seconds', stage='save_message')['count'] == 2
+
+    def test_metrics_endpoint(self, test_db):
+        from app import create_app
+        metrics.reset()
+        metrics.inc('reply_sent_total')
+
+        response = create_app().test_client().get('/metrics')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        assert 'reply_sent_total 1' in response.get_data(as_text=True)
@@ -0,0 +1,124 @@
+"""
+Unit tests for the precompiled system prompt.
+"""
+
+import os
+import copy
+import pytest
+from types import SimpleNamespace
+from app.config import academy_info
+from app.services import prompt_compiler
+from app.services.prompt_compiler import SystemPromptCompiler, get_prompt_compiler, render_lead_context
+from app.services.message_handler import MessageHandler
+from app.utils.metrics import metrics
+
+
+LEAD = {'name': 'Ana', 'phone': '+50611111111', 'status': 'new', 'source': 'whatsapp'}
+
+
+@pytest.fixture(autouse=True)
+def fresh_compiler():
+    metrics.reset()
+    prompt_compiler.reset_prompt_compiler()
+    yield
+    prompt_compiler.reset_prompt_compiler()
+
+
+@pytest.fixture
+def handler():
+    return MessageHandler.__new__(MessageHandler)
+
+
+class TestCompiler:
+    """Test compiling the prefix once per config version."""
+
+    def test_prefix_is_compiled_once(self):
+        compiler = SystemPromptCompiler(check_seconds=0)
+
+        first = compiler.get_prefix()
+        second = compiler.get_prefix()
+
+        assert first is second
+        assert compiler.compiles == 1
+        assert metrics.get_counter('system_prompt_compiles_total') == 1
+        assert len(compiler.prefix_hash) == 16
+
+    def test_prefix_is_normalized(self):
+        prefix = SystemPromptCompiler(check_seconds=0).get_prefix()
+
+        assert prefix.endswith('\n') and not prefix.endswith('\n\n')
+        assert '\r' not in prefix
+        assert all(line == line.rstrip() for line in prefix.split('\n'))
+
+    def test_config_change_recompiles(self, monkeypatch):
+        compiler = SystemPromptCompiler(check_seconds=0)
+        compiler.get_prefix()
+        old_hash, old_version = compiler.prefix_hash, compiler.version
+        info = copy.deepcopy(academy_info.ACADEMY_INFO)
+        info['phone'] = '+506-0000-0000'
+        monkeypatch.setattr(academy_info, 'ACADEMY_INFO', info)
+
+        prefix = compiler.get_prefix()
+
+        assert '+506-0000-0000' in prefix
+        assert compiler.compiles == 2
+        assert (compiler.prefix_hash, compiler.version) != (old_hash, old_version)
+        assert metrics.get_gauge('system_prompt_prefix_info', hash=old_hash, version=old_version) == 0
+        assert metrics.get_gauge('system_prompt_prefix_info', hash=compiler.prefix_hash,
+                                 version=compiler.version) == 1
+
+    def test_price_text_change_recompiles(self, monkeypatch):
+        compiler = SystemPromptCompiler(check_seconds=0)
+        compiler.get_prefix()
+        old_hash = compiler.prefix_hash
+        precios = academy_info.get_precios_texto() + '\n- Seminario: ₡15,000'
+        monkeypatch.setattr(academy_info, 'get_precios_texto', lambda: precios)
+
+        assert 'Seminario: ₡15,000' in compiler.get_prefix()
+        assert compiler.compiles == 2
+        assert compiler.prefix_hash != old_hash
+
+    def test_config_is_checked_at_most_every_interval(self, monkeypatch):
+        compiler = SystemPromptCompiler(check_seconds=3600)
+        compiler.get_prefix()
+        info = copy.deepcopy(academy_info.ACADEMY_INFO)
+        info['phone'] = '+506-0000-0000'
+        monkeypatch.setattr(academy_info, 'ACADEMY_INFO', info)
+
+        assert '+506-0000-0000' not in compiler.get_prefix()
+
+        compiler.invalidate()
+        assert '+506-0000-0000' in compiler.get_prefix()
+
+    def test_shared_compiler(self):
+        assert get_prompt_compiler() is get_prompt_compiler()
+
+
+class TestPromptLayout:
+    """Test that the lead context goes after a byte-stable prefix."""
+
+    def test_lead_context_goes_last(self, handler):
+        prompt = handler._build_system_prompt({}, LEAD)
+        prefix = get_prompt_compiler().get_prefix()
+
+        assert prompt.startswith(prefix)
+        assert prompt[len(prefix):] == render_lead_context([
+            ('Nombre', 'Ana'), ('Teléfono', '+50611111111'), ('Estado actual', 'new'), ('Fuente', 'whatsapp')])
+
+    def test_leads_share_the_prefix(self, handler):
+        first = handler._build_system_prompt({}, LEAD)
+        second = handler._build_system_prompt({}, {**LEAD, 'name': 'Beto', 'phone': '+50622222222'})
+
+        common = os.path.commonprefix([first, second])
+        assert common.startswith(get_prompt_compiler().get_prefix())
+        assert get_prompt_compiler().compiles == 1
+
+    def test_ai_service_uses_the_same_prefix(self):
+        from app.services.ai_service import AIService
+        service = AIService.__new__(AIService)
+        lead = SimpleNamespace(name='Ana', phone='+50611111111', status='new', source='whatsapp')
+
+        prompt = service._build_system_prompt(SimpleNamespace(name='BJJ Mingo'), lead)
+
+        assert prompt.startswith(get_prompt_compiler().get_prefix())
+        assert '- Nombre: Ana' in prompt
@@ -0,0 +1,165 @@
+"""
+Unit tests for the named query registry and the /api/admin/queries endpoint.
+"""
+
+import json
+import sqlite3
+import pytest
+from unittest.mock import patch
+from app import create_app
+from app.services.message_handler import MessageHandler
+from app.utils.database import get_db_connection, get_db_cursor, statement_cache_size
+from app.utils.metrics import metrics
+from app.utils.queries import QueryRegistry, queries, leads_query_name
+
+
+@pytest.fixture
+def registry():
+    registry = QueryRegistry()
+    registry.register('lead.by_phone', "SELECT id, name FROM lead WHERE phone_number = ?")
+    registry.register('lead.insert', "INSERT INTO lead (phone_number, name) VALUES (?, ?)")
+    registry.register('lead.all', "SELECT id FROM lead ORDER BY id")
+    return registry
+
+
+class TestRegistration:
+    """Test how statements are registered."""
+
+    def test_sql_is_normalized(self):
+        registry = QueryRegistry()
+        sql = registry.register('a', """
+            SELECT id
+            FROM lead
+        """)
+
+        assert sql == "SELECT id\nFROM lead"
+        assert registry.sql('a') == sql
+
+    def test_conflicting_duplicate_is_rejected(self, registry):
+        registry.register('lead.by_phone', "SELECT id, name FROM lead WHERE phone_number = ?")
+
+        with pytest.raises(ValueError):
+            registry.register('lead.by_phone', "SELECT * FROM lead")
+
+    def test_unknown_query(self, registry):
+        with pytest.raises(KeyError):
+            registry.sql('lead.nope')
+
+    def test_leads_variants_are_registered(self):
+        names = {leads_query_name(status, followup) for status in (False, True) for followup in (False, True)}
+
+        assert names <= set(queries.names())
+        assert 'l.status = ?' in queries.sql(leads_query_name(status=True))
+        assert 'days_since(s.last_message_at)' in queries.sql(leads_query_name(followup=True))
+        assert 'WHERE' not in queries.sql(leads_query_name())
+
+
+class TestStats:
+    """Test per-query call counts, rows and timings."""
+
+    def test_calls_rows_and_time(self, registry, test_db):
+        with get_db_cursor(db_path=test_db) as cursor:
+            registry.execute(cursor, 'lead.insert', ('+50611111111', 'Ana'))
+            registry.execute(cursor, 'lead.insert', ('+50622222222', 'Beto'))
+            row = registry.fetchone(cursor, 'lead.by_phone', ('+50611111111',))
+            missing = registry.fetchone(cursor, 'lead.by_phone', ('+50699999999',))
+            rows = registry.fetchall(cursor, 'lead.all')
+
+        assert row['name'] == 'Ana' and missing is None and len(rows) == 2
+
+        by_phone = registry.stats('lead.by_phone')
+        assert by_phone['calls'] == 2
+        assert by_phone['rows'] == 1
+        assert by_phone['errors'] == 0
+        assert 0 < by_phone['max_seconds'] <= by_phone['total_seconds']
+        assert registry.stats('lead.insert')['rows'] == 2
+        assert registry.stats('lead.all')['rows'] == 2
+
+    def test_errors_are_counted(self, registry, test_db):
+        with pytest.raises(sqlite3.IntegrityError):
+            with get_db_cursor(db_path=test_db) as cursor:
+                registry.execute(cursor, 'lead.insert', ('+50611111111', 'Ana'))
+                registry.execute(cursor, 'lead.insert', ('+50611111111', 'Ana'))
+
+        stats = registry.stats('lead.insert')
+        assert stats['calls'] == 2
+        assert stats['errors'] == 1
+
+    def test_top_orders_by_key(self):
+        registry = QueryRegistry()
+        registry.register('slow', "SELECT 1")
+        registry.register('frequent', "SELECT 2")
+        registry._record('slow', 0.5, 1, False)
+        for _ in range(5):
+            registry._record('frequent', 0.01, 1, False)
+
+        assert [q['name'] for q in registry.top(2)] == ['slow', 'frequent']
+        assert [q['name'] for q in registry.top(1, by='calls')] == ['frequent']
+        assert registry.top(1)[0]['sql'] == "SELECT 1"
+        with pytest.raises(ValueError):
+            registry.top(by='nope')
+
+    def test_feeds_the_metrics_histogram(self, registry, test_db):
+        metrics.reset()
+        with get_db_connection(db_path=test_db) as conn:
+            registry.fetchall(conn, 'lead.all')
+
+        assert metrics.get_histogram('db_query_seconds', query='lead.all')['count'] == 1
+
+    def test_message_handler_runs_named_queries(self, test_db):
+        queries.reset()
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.ai_enabled = False
+
+        handler.process_message('+50633333333', 'Hola', 'Caro')
+
+        ran = queries.stats()
+        assert ran['lead.by_phone']['calls'] == 1
+        assert ran['lead.insert']['calls'] == 1
+        assert ran['message.insert']['calls'] == 2
+
+
+class TestStatementCache:
+    """Test the per-connection statement cache setting."""
+
+    def test_default_and_override(self):
+        assert statement_cache_size() == 128
+        with patch.dict('os.environ', {'DB_STATEMENT_CACHE_SIZE': '256'}):
+            assert statement_cache_size() == 256
+
+
+class TestAdminQueriesEndpoint:
+    """Test /api/admin/queries."""
+
+    @pytest.fixture
+    def client(self, test_db):
+        return create_app().test_client()
+
+    def test_top_queries(self, client):
+        queries.reset()
+        client.get('/api/stats')
+        client.get('/api/leads?status=new')
+
+        data = json.loads(client.get('/api/admin/queries?top=3').data)
+
+        assert data['sort'] == 'total_seconds'
+        assert len(data['queries']) == 3
+        totals = [q['total_seconds'] for q in data['queries']]
+        assert totals == sorted(totals, reverse=True)
+        assert {'name', 'sql', 'calls', 'rows', 'avg_seconds', 'max_seconds'} <= set(data['queries'][0])
+
+    def test_sort_by_calls(self, client):
+        queries.reset()
+        client.get('/api/leads')
+        client.get('/api/leads')
+        client.get('/api/stats')
+
+        data = json.loads(client.get('/api/admin/queries?top=1&sort=calls').data)
+
+        assert data['queries'][0]['name'] == 'dashboard.leads'
+        assert data['queries'][0]['calls'] == 2
+
+    def test_invalid_params(self, client):
+        assert client.get('/api/admin/queries?top=x').status_code == 400
+        assert client.get('/api/admin/queries?sort=nope').status_code == 400
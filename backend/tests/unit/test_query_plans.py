@@ -0,0 +1,85 @@
+"""
+Unit tests for the EXPLAIN QUERY PLAN regression harness.
+"""
+
+import pytest
+import sqlite3
+from app.utils.query_plans import (
+    ALLOWED_SCANS,
+    MIGRATIONS,
+    audit,
+    explain,
+    extract_statements,
+    full_scans,
+    registry_statements,
+    seed_database
+)
+
+
+@pytest.fixture(scope='module')
+def seeded_db(tmp_path_factory):
+    return seed_database(str(tmp_path_factory.mktemp('plans') / 'plans.db'), leads=300)
+
+
+class TestExtractStatements:
+    """Test SQL extraction from the source tree."""
+
+    def test_finds_hot_queries(self):
+        sqls = [s['sql'] for s in registry_statements()]
+
+        assert "SELECT id, name FROM lead WHERE phone_number = ?" in sqls
+        assert any('FROM message' in s and 'ORDER BY id DESC' in s for s in sqls)
+
+    def test_services_have_no_inline_sql(self):
+        """Service SQL goes through the named registry, so it is cached and measured."""
+        assert extract_statements() == []
+
+    def test_resolves_concatenated_queries(self, tmp_path):
+        source = tmp_path / 'routes.py'
+        source.write_text(
+            'def get_leads(cursor, status):\n'
+            '    query = "SELECT * FROM lead l WHERE 1=1"\n'
+            '    if status:\n'
+            '        query += " AND l.status = ?"\n'
+            '    query += " ORDER BY l.created_at DESC"\n'
+            '    cursor.execute(query, [status])\n'
+        )
+
+        statements = extract_statements([str(source)])
+
+        assert len(statements) == 1
+        assert statements[0]['function'] == 'get_leads'
+        assert statements[0]['sql'] == \
+            "SELECT * FROM lead l WHERE 1=1 AND l.status = ? ORDER BY l.created_at DESC"
+
+
+class TestQueryPlans:
+    """Test plans against the seeded database."""
+
+    def test_no_hot_query_scans_a_table(self, seeded_db):
+        regressions = [(r['location'], r['plan']) for r in audit(seeded_db) if r['regression']]
+        assert regressions == []
+
+    def test_allowed_scans_are_still_needed(self, seeded_db):
+        """An allowlist entry whose scan disappeared should be removed."""
+        scanned = {r['key'] for r in audit(seeded_db) if r['scans']}
+        assert set(ALLOWED_SCANS) <= scanned
+
+    def test_missing_index_is_a_regression(self, tmp_path):
+        db_path = seed_database(str(tmp_path / 'no_indexes.db'), leads=50,
+                                migrations=[m for m in MIGRATIONS if m != 'add_hot_path_indexes.sql'])
+        statements = [s for s in registry_statements() if s['key'] == 'conversation.active_by_lead']
+
+        result = audit(db_path, statements)[0]
+
+        assert result['regression'] == ['conversation']
+
+    def test_full_scans_parsing(self, seeded_db):
+        conn = sqlite3.connect(seeded_db)
+        try:
+            plan = explain(conn, "SELECT * FROM message WHERE content = 'a?'")
+        finally:
+            conn.close()
+
+        assert full_scans(plan) == ['message']
+        assert full_scans(['SEARCH lead USING INTEGER PRIMARY KEY (rowid=?)', 'SCAN CONSTANT ROW']) == []
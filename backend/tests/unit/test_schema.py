@@ -0,0 +1,112 @@
+"""
+Unit tests for the startup schema upgrades.
+"""
+
+import sqlite3
+from types import SimpleNamespace
+from app.services.message_handler import MessageHandler
+from app.utils.database import execute_query, get_db_cursor
+from app.utils.schema import ensure_schema
+
+
+def _drop(db_path, table):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"DROP TABLE {table}")
+    conn.commit()
+    conn.close()
+
+
+def _drop_columns(db_path, *columns):
+    conn = sqlite3.connect(db_path)
+    for column in columns:
+        conn.execute(f"ALTER TABLE conversation DROP COLUMN {column}")
+    conn.commit()
+    conn.close()
+
+
+def _columns(db_path, table):
+    return {row['name'] for row in execute_query(f"PRAGMA table_info({table})", db_path=db_path)}
+
+
+def _tables(db_path):
+    return {row['name'] for row in execute_query("SELECT name FROM sqlite_master WHERE type = 'table'",
+                                                 db_path=db_path)}
+
+
+class TestEnsureSchema:
+    """Test applying the migrations an existing database is missing."""
+
+    def test_current_schema_is_left_alone(self, test_db):
+        assert ensure_schema(test_db) == []
+
+    def test_missing_lead_summary_is_created_and_loaded(self, test_db):
+        with get_db_cursor(db_path=test_db) as cursor:
+            cursor.execute("INSERT INTO lead (phone_number) VALUES ('+50611111111')")
+            lead_id = cursor.lastrowid
+            cursor.execute("INSERT INTO conversation (lead_id) VALUES (?)", (lead_id,))
+            cursor.execute("INSERT INTO message (conversation_id, sender, content) VALUES (?, 'user', 'Hola')",
+                           (cursor.lastrowid,))
+        _drop(test_db, 'lead_summary')
+
+        assert 'add_lead_summary.sql' in ensure_schema(test_db)
+        assert ensure_schema(test_db) == []
+
+        row = execute_query("SELECT total_messages FROM lead_summary WHERE lead_id = ?", (lead_id,),
+                            db_path=test_db)[0]
+        assert row['total_messages'] == 1
+
+    def test_messages_are_saved_after_the_upgrade(self, test_db):
+        _drop(test_db, 'lead_summary')
+        ensure_schema(test_db)
+        handler = MessageHandler()
+        handler.db_path = test_db
+
+        lead_id, _ = handler.persist_inbound('+50622222222', 'Hola', 'Ana')
+
+        assert execute_query("SELECT total_messages FROM lead_summary WHERE lead_id = ?", (lead_id,),
+                             db_path=test_db)[0]['total_messages'] == 1
+
+    def test_missing_archive_index_is_created(self, test_db):
+        _drop(test_db, 'message_archive_chunk')
+
+        assert ensure_schema(test_db) == ['add_message_archive.sql']
+        assert 'message_archive_chunk' in _tables(test_db)
+
+    def test_missing_summary_columns_are_added(self, test_db):
+        _drop_columns(test_db, 'summary', 'summary_through_id', 'summary_updated_at')
+
+        assert ensure_schema(test_db) == ['add_conversation_summary.sql']
+        assert ensure_schema(test_db) == []
+        assert {'summary', 'summary_through_id', 'summary_updated_at'} <= _columns(test_db, 'conversation')
+
+    def test_half_applied_summary_migration_is_completed(self, test_db):
+        _drop_columns(test_db, 'summary_updated_at')
+
+        assert ensure_schema(test_db) == ['add_conversation_summary.sql']
+        assert 'summary_updated_at' in _columns(test_db, 'conversation')
+
+    def test_ai_replies_after_the_summary_upgrade(self, test_db, mocker):
+        _drop_columns(test_db, 'summary', 'summary_through_id', 'summary_updated_at')
+        ensure_schema(test_db)
+        handler = MessageHandler()
+        handler.db_path = test_db
+        handler.scheduler = None
+        handler.ai_enabled = True
+        handler.model = 'test'
+        handler.max_tokens = 50
+        handler.temperature = 0
+        handler.fast_path.templates = {}
+        handler.openai_client = mocker.Mock()
+        handler.openai_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='Respuesta IA'))])
+
+        assert handler.process_message('+50633333333', '¿Tienen clases para niños?', 'Ana') == 'Respuesta IA'
+
+    def test_missing_or_empty_files_are_skipped(self, tmp_path):
+        empty = str(tmp_path / 'empty.db')
+        sqlite3.connect(empty).close()
+
+        assert ensure_schema(str(tmp_path / 'missing.db')) == []
+        assert ensure_schema(empty) == []
+        assert not (tmp_path / 'missing.db').exists()
+        assert _tables(empty) == set()
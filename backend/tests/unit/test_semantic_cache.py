@@ -0,0 +1,168 @@
+"""
+Unit tests for the semantic response cache.
+"""
+
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from app.services import semantic_cache
+from app.services.message_handler import MessageHandler
+from app.services.semantic_cache import SemanticCache, prompt_version
+from app.utils.metrics import metrics
+
+pytest.importorskip('numpy')
+
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(threshold=0.85, capacity=3, dim=1024)
+
+
+@pytest.fixture
+def enabled():
+    semantic_cache.reset_semantic_cache()
+    with patch.dict('os.environ', {'SEMANTIC_CACHE': 'true', 'SEMANTIC_CACHE_THRESHOLD': '0.85'}):
+        yield
+    semantic_cache.reset_semantic_cache()
+
+
+@pytest.fixture
+def handler(test_db, mocker):
+    """MessageHandler with a mocked OpenAI client and no FAQ fast path."""
+    handler = MessageHandler()
+    handler.db_path = test_db
+    handler.scheduler = None
+    handler.ai_enabled = True
+    handler.model = 'test'
+    handler.max_tokens = 50
+    handler.temperature = 0
+    handler.fast_path.templates = {}
+    handler.openai_client = mocker.Mock()
+    handler.openai_client.chat.completions.create.return_value = _completion('Sí, hay clases para principiantes')
+    return handler
+
+
+class TestSemanticCache:
+    """Test similarity lookup, LRU eviction and invalidation."""
+
+    def test_near_identical_questions_hit(self, cache):
+        cache.store('mingo', '¿Cuánto cuesta la mensualidad?', 'v1', '₡33,000')
+
+        assert cache.lookup('mingo', 'cuanto cuesta la mensualidad', 'v1') == '₡33,000'
+        assert cache.lookup('mingo', 'cuanto cuesta mensualidad?', 'v1') == '₡33,000'
+        assert cache.lookup('mingo', 'cuanto cuesta la clase de kids', 'v1') is None
+
+    def test_namespaces_are_separate(self, cache):
+        cache.store('mingo', '¿Tienen clases para principiantes?', 'v1', 'Sí')
+
+        assert cache.lookup('otra', '¿Tienen clases para principiantes?', 'v1') is None
+
+    def test_prompt_version_change_invalidates(self, cache):
+        metrics.reset()
+        cache.store('mingo', '¿Tienen clases para principiantes?', 'v1', 'Sí')
+
+        assert cache.lookup('mingo', '¿Tienen clases para principiantes?', 'v2') is None
+        assert cache.lookup('mingo', '¿Tienen clases para principiantes?', 'v1') is None
+        assert metrics.get_counter('semantic_cache_invalidations_total') == 2
+
+    def test_similar_question_replaces_entry(self, cache):
+        cache.store('mingo', '¿Tienen clases para principiantes?', 'v1', 'Sí')
+        cache.store('mingo', 'tienen clases para principiantes', 'v1', 'Claro')
+
+        assert cache.stats()['entries'] == {'mingo': 1}
+        assert cache.lookup('mingo', '¿Tienen clases para principiantes?', 'v1') == 'Claro'
+
+    def test_least_recently_used_is_evicted(self, cache):
+        questions = ['¿Tienen clases para principiantes?', '¿Puedo entrenar con una lesión?',
+                     '¿Necesito llevar kimono propio?']
+        for i, question in enumerate(questions):
+            cache.store('mingo', question, 'v1', str(i))
+        cache.lookup('mingo', questions[0], 'v1')
+
+        cache.store('mingo', '¿Hay parqueo para carros?', 'v1', '3')
+
+        assert cache.stats()['entries'] == {'mingo': 3}
+        assert cache.lookup('mingo', questions[0], 'v1') == '0'
+        assert cache.lookup('mingo', questions[1], 'v1') is None
+        assert cache.lookup('mingo', '¿Hay parqueo para carros?', 'v1') == '3'
+
+    def test_empty_message_is_ignored(self, cache):
+        cache.store('mingo', '???', 'v1', 'Sí')
+
+        assert cache.lookup('mingo', '???', 'v1') is None
+        assert cache.stats()['entries'] == {}
+
+    def test_prompt_version(self):
+        assert prompt_version('prompt', 'gpt', 0.2) == prompt_version('prompt', 'gpt', 0.2)
+        assert prompt_version('prompt', 'gpt', 0.2) != prompt_version('prompt 2', 'gpt', 0.2)
+        assert prompt_version('ab', 'c') != prompt_version('a', 'bc')
+
+
+class TestMessageHandlerCache:
+    """Test the cache in front of OpenAI."""
+
+    def test_first_question_of_another_lead_is_reused(self, handler, enabled):
+        first = handler.process_message('+50611111111', '¿Tienen clases para principiantes?', 'Ana')
+        second = handler.process_message('+50622222222', 'tienen clases para principiantes', 'Beto')
+
+        assert first == second == 'Sí, hay clases para principiantes'
+        assert handler.openai_client.chat.completions.create.call_count == 1
+
+    def test_later_turns_are_not_cached(self, handler, enabled):
+        handler.process_message('+50611111111', '¿Tienen clases para principiantes?', 'Ana')
+        handler.process_message('+50611111111', '¿Tienen clases para principiantes?', 'Ana')
+
+        assert handler.openai_client.chat.completions.create.call_count == 2
+
+    def test_replies_naming_the_lead_are_not_shared(self, handler, enabled):
+        handler.openai_client.chat.completions.create.return_value = _completion('¡Hola Ana! Sí, hay clases')
+
+        handler.process_message('+50611111111', '¿Tienen clases para principiantes?', 'Ana')
+        handler.process_message('+50622222222', '¿Tienen clases para principiantes?', 'Beto')
+
+        assert handler.openai_client.chat.completions.create.call_count == 2
+
+    def test_disabled_by_default(self, handler):
+        semantic_cache.reset_semantic_cache()
+
+        handler.process_message('+50611111111', '¿Tienen clases para principiantes?', 'Ana')
+        handler.process_message('+50622222222', '¿Tienen clases para principiantes?', 'Beto')
+
+        assert handler.openai_client.chat.completions.create.call_count == 2
+
+
+class TestAIServiceCache:
+    """Test the same cache rules in AIService."""
+
+    @pytest.fixture
+    def service(self, mocker):
+        from app.services.ai_service import AIService
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test'}):
+            service = AIService()
+        service.client = mocker.Mock()
+        service.client.chat.completions.create.return_value = _completion('Sí, hay clases para principiantes')
+        return service
+
+    def _ask(self, service, message, name):
+        lead = SimpleNamespace(name=name, phone='+50611111111', status='new', source='whatsapp')
+        return service.generate_response(message, lead, SimpleNamespace(), SimpleNamespace(name='BJJ Mingo'),
+                                         use_history=False)
+
+    def test_first_question_of_another_lead_is_reused(self, service, enabled):
+        self._ask(service, '¿Tienen clases para principiantes?', 'Ana')
+        self._ask(service, 'tienen clases para principiantes', 'Beto')
+
+        assert service.client.chat.completions.create.call_count == 1
+
+    def test_booking_messages_are_never_cached(self, service, enabled):
+        service.client.chat.completions.create.return_value = _completion('¡Listo! Te espero el lunes a las 6pm')
+
+        self._ask(service, 'Quiero agendar una clase el lunes a las 6pm', 'Ana')
+        self._ask(service, 'Quiero agendar una clase el lunes a las 6pm', 'Beto')
+
+        assert service.client.chat.completions.create.call_count == 2
+        assert sum(semantic_cache.get_semantic_cache().stats()['entries'].values()) == 0